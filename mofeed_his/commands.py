@@ -0,0 +1,7 @@
+"""Delegate bench commands to the packaged app module.
+
+Frappe looks up `<app>.commands`, so we re-export the command list defined
+next to the nested module's hooks.
+"""
+
+from mofeed_his.mofeed_his.commands import commands  # noqa: F401
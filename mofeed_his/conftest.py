@@ -0,0 +1,12 @@
+"""Pytest setup for the app's unit tests.
+
+The unit tests in `mofeed_his/tests` run without a Frappe site. DocType
+tests (`doctype/*/test_*.py`) are FrappeTestCase tests for
+``bench --site <site> run-tests --app mofeed_his`` and are not collected
+when Frappe is not installed.
+"""
+
+import importlib.util
+
+if importlib.util.find_spec("frappe") is None:
+    collect_ignore_glob = ["*/doctype/*/test_*.py"]
@@ -0,0 +1,113 @@
+"""Bench commands for Mofeed HIS.
+
+Usage:
+    bench --site mysite import-patients /path/to/patients.csv --hospital "Karbala General Hospital"
+    bench --site mysite import-icd10 /path/to/icd10.csv
+    bench --site test_site benchmark-mrn --hospital "Test Hospital" --output report.json
+"""
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("import-patients")
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False, resolve_path=True))
+@click.option("--hospital", help="Hospital for the imported patients (not needed when resuming)")
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows per transaction")
+@pass_context
+def import_patients(context, file_path, hospital=None, chunk_size=1000):
+    """Bulk import patients from a CSV/XLSX file. Re-run to resume after a crash."""
+    import frappe
+
+    from mofeed_his.mofeed_his.utils.patient_import import run_import
+
+    def progress(done, total):
+        click.echo(f"\r{done}/{total} rows", nl=False)
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        summary = run_import(file_path, hospital=hospital, chunk_size=chunk_size, progress=progress)
+        click.echo(
+            f"\n{summary.status}: {summary.imported} imported, {summary.skipped} skipped "
+            f"(see Patient Import {summary.name})"
+        )
+    finally:
+        frappe.destroy()
+
+
+@click.command("import-icd10")
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False, resolve_path=True))
+@click.option("--chunk-size", default=2000, show_default=True, help="Rows per transaction")
+@pass_context
+def import_icd10(context, file_path, chunk_size=2000):
+    """Load or update ICD-10 codes from a CSV/XLSX file. Safe to re-run."""
+    import frappe
+
+    from mofeed_his.mofeed_his.utils.icd10 import import_icd10_codes
+
+    def progress(done):
+        click.echo(f"\r{done} codes", nl=False)
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        written = import_icd10_codes(file_path, chunk_size=chunk_size, progress=progress)
+        click.echo(f"\n{written} codes imported")
+    finally:
+        frappe.destroy()
+
+
+@click.command("benchmark-mrn")
+@click.option("--hospital", required=True, help="Hospital to register the patients under")
+@click.option("--workers", default=8, show_default=True, help="Concurrent workers")
+@click.option("--patients", default=50, show_default=True, help="Patients per worker")
+@click.option(
+    "--mode", type=click.Choice(["process", "thread"]), default="process", show_default=True
+)
+@click.option(
+    "--allocation", type=click.Choice(["Block", "Strict"]), help="Override the hospital's mode"
+)
+@click.option("--block-size", type=int, help="Override the hospital's MRN block size")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the report as JSON")
+@pass_context
+def benchmark_mrn(
+    context,
+    hospital,
+    workers=8,
+    patients=50,
+    mode="process",
+    allocation=None,
+    block_size=None,
+    output=None,
+):
+    """Benchmark concurrent patient registration. Test sites only: creates patients."""
+    import json
+
+    import frappe
+
+    from mofeed_his.mofeed_his.utils.mrn_benchmark import run_benchmark
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        report = run_benchmark(
+            site,
+            hospital,
+            workers=workers,
+            patients_per_worker=patients,
+            mode=mode,
+            allocation=allocation,
+            block_size=block_size,
+            output=output,
+        )
+        click.echo(json.dumps(report, indent=2, default=str))
+    finally:
+        frappe.destroy()
+
+    if not report["mrn_audit"]["ok"]:
+        raise click.ClickException("MRN audit failed: duplicated or skipped MRNs")
+
+
+commands = [import_patients, import_icd10, benchmark_mrn]
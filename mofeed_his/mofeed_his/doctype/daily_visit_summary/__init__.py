@@ -0,0 +1 @@
+"""Daily Visit Summary doctype package."""
@@ -0,0 +1,25 @@
+"""Daily Visit Summary DocType controller.
+
+Rows are written only by `utils.visit_summary`, with set-based statements
+that bypass this controller.
+"""
+
+from frappe.model.document import Document
+
+
+class DailyVisitSummary(Document):
+    """Visits and invoiced amounts of one day, hospital, clinic and practitioner.
+
+    Attributes:
+        date: Encounter or posting date
+        hospital: The patients' hospital
+        clinic: Clinic of the appointments
+        practitioner: Healthcare Practitioner
+        visits: Submitted encounters
+        invoices: Submitted invoices, returns not counted
+        revenue: Grand total of the invoices, net of returns
+        insurance_amount: Insurers' share of the revenue
+        patient_amount: Patients' share of the revenue
+    """
+
+    pass
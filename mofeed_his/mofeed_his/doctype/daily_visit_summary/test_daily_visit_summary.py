@@ -0,0 +1,88 @@
+"""Tests for Daily Visit Summary deltas and rebuilds."""
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.test_patient_extension import (
+    make_patient,
+)
+from mofeed_his.mofeed_his.utils.daily_summary import summary_key, summary_name
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.visit_summary import (
+    rebuild_visit_summaries,
+    update_encounter_summary,
+    update_invoice_summary,
+)
+
+DATE = "2025-03-01"
+
+
+class TestDailyVisitSummary(FrappeTestCase):
+    """Test the Patient Encounter and Sales Invoice doc events."""
+
+    def setUp(self):
+        self.hospital = make_hospital("TSTSUM")
+        self.patient = make_patient(self.hospital.name).name
+        self.row = summary_name(summary_key(DATE, self.hospital.name))
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_hospital_cache()
+
+    def encounter(self):
+        """Fields of a Patient Encounter the hook reads."""
+        return frappe._dict(
+            encounter_date=DATE, patient=self.patient, practitioner=None, appointment=None
+        )
+
+    def invoice(self, grand_total):
+        """Fields of a patient Sales Invoice the hook reads."""
+        return frappe._dict(
+            name="_Test Summary Invoice",
+            patient=self.patient,
+            posting_date=DATE,
+            grand_total=grand_total,
+            items=[
+                frappe._dict(
+                    item_code="_Test Service", item_group="Services", qty=1, amount=grand_total
+                )
+            ],
+        )
+
+    def measures(self):
+        return frappe.db.get_value(
+            "Daily Visit Summary",
+            self.row,
+            ["visits", "invoices", "revenue", "patient_amount"],
+            as_dict=True,
+        )
+
+    def test_encounter_submit_and_cancel(self):
+        """Test that visits are added on submit and taken back on cancel."""
+        update_encounter_summary(self.encounter(), "on_submit")
+        update_encounter_summary(self.encounter(), "on_submit")
+        update_encounter_summary(self.encounter(), "on_cancel")
+
+        self.assertEqual(self.measures().visits, 1)
+
+    def test_invoice_amounts(self):
+        """Test that an uninsured invoice is counted as the patient's share."""
+        update_invoice_summary(self.invoice(25000), "on_submit")
+
+        measures = self.measures()
+        self.assertEqual(measures.invoices, 1)
+        self.assertEqual(measures.revenue, 25000)
+        self.assertEqual(measures.patient_amount, 25000)
+
+    def test_rebuild_replaces_deltas(self):
+        """Test that a rebuild keeps only what the documents account for."""
+        update_encounter_summary(self.encounter(), "on_submit")
+
+        # The job commits per chunk; keep the test inside its transaction
+        with patch.object(frappe.db, "commit"):
+            rebuild_visit_summaries(DATE, DATE)
+
+        self.assertFalse(frappe.db.exists("Daily Visit Summary", self.row))
@@ -16,6 +16,8 @@ class Hospital(Document):
         code: Unique code used as MRN prefix (e.g., KRBHOSP)
         location: Hospital location
         address: Full address
+        mrn_allocation: MRN allocation mode (Block or Strict)
+        mrn_block_size: Numbers reserved per worker in Block mode
     """
 
     def validate(self):
@@ -27,3 +29,6 @@ class Hospital(Document):
         # Validate code format (alphanumeric only)
         if self.code and not self.code.isalnum():
             frappe.throw("Hospital Code must contain only alphanumeric characters")
+
+        if self.mrn_allocation == "Block" and (self.mrn_block_size or 0) < 1:
+            frappe.throw("MRN Block Size must be at least 1")
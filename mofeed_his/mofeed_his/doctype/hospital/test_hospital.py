@@ -0,0 +1,51 @@
+"""Tests for Hospital and its site cache."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.utils.hospital_cache import (
+    clear_hospital_cache,
+    get_hospital,
+    get_hospital_by_code,
+)
+
+
+def make_hospital(code, **fields):
+    """Insert a Hospital with the given MRN code for a test."""
+    return frappe.get_doc(
+        {"doctype": "Hospital", "hospital_name": f"_Test Hospital {code}", "code": code, **fields}
+    ).insert()
+
+
+class TestHospital(FrappeTestCase):
+    """Test that cached hospital data follows changes to the Hospital."""
+
+    def setUp(self):
+        self.hospital = make_hospital("TSTCACHE", mrn_allocation="Block", mrn_block_size=20)
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_hospital_cache()
+
+    def test_save_drops_stale_values(self):
+        """Test that a save is seen by the next lookup, by name and by code."""
+        self.assertEqual(get_hospital(self.hospital.name).mrn_block_size, 20)
+        self.assertEqual(get_hospital_by_code("TSTCACHE").name, self.hospital.name)
+
+        self.hospital.code = "TSTCACHE2"
+        self.hospital.mrn_block_size = 50
+        self.hospital.save()
+
+        self.assertEqual(get_hospital(self.hospital.name).code, "TSTCACHE2")
+        self.assertEqual(get_hospital(self.hospital.name).mrn_block_size, 50)
+        self.assertEqual(get_hospital_by_code("TSTCACHE2").name, self.hospital.name)
+        self.assertIsNone(get_hospital_by_code("TSTCACHE"))
+
+    def test_delete_drops_cached_hospital(self):
+        """Test that a deleted hospital is no longer returned."""
+        self.assertIsNotNone(get_hospital(self.hospital.name))
+
+        self.hospital.delete()
+
+        self.assertIsNone(get_hospital(self.hospital.name))
+        self.assertIsNone(get_hospital_by_code("TSTCACHE"))
@@ -0,0 +1 @@
+"""ICD10 Code doctype package."""
@@ -0,0 +1,21 @@
+"""ICD10 Code DocType controller.
+
+Searched through the in-memory index of `utils.icd10`, which is rebuilt
+when a code changes (see `hooks.py`). Bulk loads go through
+`utils.icd10.import_icd10_codes`.
+"""
+
+from frappe.model.document import Document
+
+
+class ICD10Code(Document):
+    """One ICD-10 diagnosis code.
+
+    Attributes:
+        code: ICD-10 code, with its dot (e.g. E11.9)
+        description: English description
+        description_ar: Arabic description
+        disabled: Hidden from diagnosis search
+    """
+
+    pass
@@ -0,0 +1,65 @@
+"""Tests for ICD10 Code search and its doc events."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.utils.icd10 import (
+    USAGE_KEY,
+    bump_icd10_version,
+    get_icd10_version,
+    record_icd10_use,
+    search_icd10,
+)
+
+
+def make_icd10_code(code, description, **fields):
+    """Insert an ICD10 Code for a test."""
+    return frappe.get_doc(
+        {"doctype": "ICD10 Code", "code": code, "description": description, **fields}
+    ).insert()
+
+
+class TestICD10Code(FrappeTestCase):
+    """Test that code changes reach the per-worker search index."""
+
+    def tearDown(self):
+        frappe.db.rollback()
+        # Workers must not keep serving the rolled back codes
+        bump_icd10_version()
+        frappe.db.after_commit.run()
+        frappe.cache().delete_value(f"{USAGE_KEY}:{frappe.session.user}")
+
+    def codes(self, txt):
+        return [result["code"] for result in search_icd10(txt)]
+
+    def test_index_is_rebuilt_after_commit(self):
+        """Test that a new code is searchable once its transaction commits."""
+        version = get_icd10_version()
+        make_icd10_code("U99.9", "Mofeed test condition")
+
+        self.assertEqual(get_icd10_version(), version)
+
+        # Run the after-commit callbacks without committing the test data
+        frappe.db.after_commit.run()
+
+        self.assertNotEqual(get_icd10_version(), version)
+        self.assertIn("U99.9", self.codes("U99"))
+        self.assertIn("U99.9", self.codes("mofeed cond"))
+
+    def test_disabled_code_is_not_searched(self):
+        """Test that disabling a code drops it from the search."""
+        code = make_icd10_code("U99.8", "Mofeed disabled condition")
+        code.disabled = 1
+        code.save()
+        frappe.db.after_commit.run()
+
+        self.assertNotIn("U99.8", self.codes("U99.8"))
+
+    def test_recorded_use_lists_code_first(self):
+        """Test that a picked code is offered before anything is typed."""
+        make_icd10_code("U99.7", "Mofeed frequent condition")
+        frappe.db.after_commit.run()
+
+        record_icd10_use("U99.7")
+
+        self.assertEqual(self.codes("")[0], "U99.7")
@@ -0,0 +1 @@
+"""Insurance Claim Batch doctype package."""
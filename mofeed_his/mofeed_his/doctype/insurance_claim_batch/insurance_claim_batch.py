@@ -0,0 +1,59 @@
+"""Insurance Claim Batch DocType controller.
+
+One claim file for one insurer and date range. The file is written by a
+background job (`utils.claim_batch`) that commits a checkpoint after each
+page of invoices, so an interrupted batch resumes where it stopped.
+"""
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import getdate
+
+
+class InsuranceClaimBatch(Document):
+    """Insurer claim batch and its resume checkpoint.
+
+    Attributes:
+        insurer: Insurance company, matched to Patient Extension.insurance_company
+        from_date: First posting date included
+        to_date: Last posting date included
+        file_format: CSV, JSON or XML
+        status: Queued, Running, Completed or Failed
+        last_invoice: Last Sales Invoice written and committed
+        file_offset: Size of the output file at the last checkpoint
+        invoices_written: Invoices written so far
+        lines_written: Invoice lines written so far
+        total_amount: Billed amount of the written invoices
+        claimed_amount: Amount claimed from the insurer
+        output_file: The finished claim file
+        error_log: Traceback of the last failure
+    """
+
+    def validate(self):
+        if getdate(self.from_date) > getdate(self.to_date):
+            frappe.throw("From Date must not be after To Date.", frappe.ValidationError)
+
+        overlapping = frappe.db.get_value(
+            "Insurance Claim Batch",
+            {
+                "name": ["!=", self.name],
+                "insurer": self.insurer,
+                "status": ["!=", "Failed"],
+                "from_date": ["<=", self.to_date],
+                "to_date": [">=", self.from_date],
+            },
+            "name",
+        )
+        if overlapping:
+            frappe.throw(
+                _("Claim batch {0} already covers part of this period for {1}.").format(
+                    overlapping, self.insurer
+                ),
+                frappe.ValidationError,
+            )
+
+    def after_insert(self):
+        from mofeed_his.mofeed_his.utils.claim_batch import enqueue_claim_batch
+
+        enqueue_claim_batch(self.name)
@@ -0,0 +1,79 @@
+"""Tests for Insurance Claim Batch and its background job."""
+
+import json
+import os
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.utils.claim_batch import enqueue_claim_batch, generate_claim_batch
+from mofeed_his.mofeed_his.utils.claim_writers import CSV_COLUMNS
+
+INSURER = "_Test Insurer"
+
+
+def make_claim_batch(from_date="2025-01-01", to_date="2025-01-31", **fields):
+    """Insert an Insurance Claim Batch for a test."""
+    return frappe.get_doc(
+        {
+            "doctype": "Insurance Claim Batch",
+            "insurer": INSURER,
+            "from_date": from_date,
+            "to_date": to_date,
+            **fields,
+        }
+    ).insert()
+
+
+class TestInsuranceClaimBatch(FrappeTestCase):
+    """Test batch validation, queueing and the written file."""
+
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def generate(self, batch):
+        """Run the job inside the test transaction and return the file's text."""
+        # The job commits per page; keep the test inside its transaction
+        with patch.object(frappe.db, "commit"):
+            generate_claim_batch(batch.name)
+
+        batch.reload()
+        path = frappe.get_site_path(batch.output_file.lstrip("/"))
+        self.addCleanup(os.remove, path)
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_overlapping_batch_is_refused(self):
+        """Test that an insurer's period is claimed by one batch only."""
+        make_claim_batch()
+
+        with self.assertRaises(frappe.ValidationError):
+            make_claim_batch(from_date="2025-01-15", to_date="2025-02-15")
+
+    def test_completed_batch_is_not_queued_again(self):
+        """Test that a finished batch cannot be regenerated."""
+        batch = make_claim_batch()
+        batch.db_set("status", "Completed")
+
+        with self.assertRaises(frappe.ValidationError):
+            enqueue_claim_batch(batch.name)
+
+    def test_empty_csv_batch_completes(self):
+        """Test that a period without invoices gives a header-only file."""
+        batch = make_claim_batch(insurer="_Test Insurer Without Claims")
+
+        content = self.generate(batch)
+
+        self.assertEqual(content.splitlines(), [",".join(CSV_COLUMNS)])
+        self.assertEqual(batch.status, "Completed")
+        self.assertEqual(batch.invoices_written, 0)
+
+    def test_empty_json_batch_is_valid_json(self):
+        """Test that the JSON writer closes the claims array."""
+        batch = make_claim_batch(insurer="_Test Insurer Without Claims", file_format="JSON")
+
+        data = json.loads(self.generate(batch))
+
+        self.assertEqual(data["name"], batch.name)
+        self.assertEqual(data["claims"], [])
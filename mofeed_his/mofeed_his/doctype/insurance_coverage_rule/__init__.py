@@ -0,0 +1 @@
+"""Insurance Coverage Rule doctype package."""
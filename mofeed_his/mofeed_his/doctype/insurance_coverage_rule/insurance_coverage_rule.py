@@ -0,0 +1,42 @@
+"""Insurance Coverage Rule DocType controller.
+
+One coverage rule of an insurance plan. A plan's rules are compiled and
+cached as a whole (`utils.insurance_coverage`); saving or deleting a rule
+drops its plan from the cache (see `hooks.py`).
+"""
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, getdate
+
+
+class InsuranceCoverageRule(Document):
+    """Coverage, co-pay, cap or exclusion of services under a plan.
+
+    Attributes:
+        insurance_plan: Plan the rule belongs to
+        enabled: Whether the rule is applied
+        applies_to: All Services, Item Group or Item
+        item_code: Item the rule applies to
+        item_group: Item group (and sub-groups) the rule applies to
+        valid_from: First date the rule applies
+        valid_upto: Last date the rule applies
+        excluded: The services are not covered
+        coverage_percentage: Insurer's share; 0 uses the patient's
+        copay_amount: Patient's share per unit, before coverage
+        cap_amount: Most the insurer pays per unit; 0 for no cap
+    """
+
+    def validate(self):
+        if self.applies_to != "Item":
+            self.item_code = None
+        if self.applies_to != "Item Group":
+            self.item_group = None
+
+        if self.valid_from and self.valid_upto:
+            if getdate(self.valid_from) > getdate(self.valid_upto):
+                frappe.throw("Valid From must not be after Valid Upto.", frappe.ValidationError)
+        if not 0 <= flt(self.coverage_percentage) <= 100:
+            frappe.throw("Coverage Percentage must be between 0 and 100.", frappe.ValidationError)
+        if flt(self.copay_amount) < 0 or flt(self.cap_amount) < 0:
+            frappe.throw("Co-pay and cap amounts must not be negative.", frappe.ValidationError)
@@ -0,0 +1,81 @@
+"""Tests for Insurance Coverage Rule and the compiled plan cache."""
+
+from datetime import date
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.utils.insurance_coverage import apply_coverage, clear_coverage_plans
+
+PLAN = "_Test Gold"
+
+
+class TestInsuranceCoverageRule(FrappeTestCase):
+    """Test that rule changes reach the next invoice split."""
+
+    def setUp(self):
+        self.rule = frappe.get_doc(
+            {
+                "doctype": "Insurance Coverage Rule",
+                "insurance_plan": PLAN,
+                "applies_to": "All Services",
+                "coverage_percentage": 50,
+            }
+        ).insert()
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_coverage_plans()
+
+    def insurer_amount(self, plan=PLAN):
+        """Split a 1000 service line under `plan` at the patient's 80%."""
+        invoice = {
+            "invoice": "_Test Invoice",
+            "posting_date": date(2025, 3, 1),
+            "insurance_plan": plan,
+            "coverage_percentage": 80,
+            "insurance_expiry": None,
+        }
+        line = {
+            "parent": "_Test Invoice",
+            "item_code": "_Test Service",
+            "item_group": "Services",
+            "qty": 1,
+            "amount": 1000,
+        }
+        return apply_coverage([invoice], [line])["_Test Invoice"]["insurer_amount"]
+
+    def test_saved_rule_replaces_cached_plan(self):
+        """Test that a changed percentage applies to the next split."""
+        self.assertEqual(self.insurer_amount(), 500)
+
+        self.rule.coverage_percentage = 100
+        self.rule.save()
+
+        self.assertEqual(self.insurer_amount(), 1000)
+
+    def test_rule_moved_to_another_plan_clears_both(self):
+        """Test that both the old and the new plan are recompiled."""
+        self.assertEqual(self.insurer_amount(), 500)
+        self.assertEqual(self.insurer_amount("_Test Silver"), 800)
+
+        self.rule.insurance_plan = "_Test Silver"
+        self.rule.save()
+
+        self.assertEqual(self.insurer_amount(), 800)
+        self.assertEqual(self.insurer_amount("_Test Silver"), 500)
+
+    def test_deleted_rule_clears_cached_plan(self):
+        """Test that the patient's own coverage applies once the rule is gone."""
+        self.assertEqual(self.insurer_amount(), 500)
+
+        self.rule.delete()
+
+        self.assertEqual(self.insurer_amount(), 800)
+
+    def test_invalid_percentage_is_refused(self):
+        """Test that coverage above 100% is rejected."""
+        self.rule.coverage_percentage = 120
+
+        with self.assertRaises(frappe.ValidationError):
+            self.rule.save()
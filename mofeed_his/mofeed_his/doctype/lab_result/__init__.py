@@ -0,0 +1 @@
+"""Lab Result doctype package."""
@@ -0,0 +1,28 @@
+"""Lab Result DocType controller.
+
+Rows are bulk-inserted by the OCR pipeline (`utils.document_ocr`) from
+the lines of a lab report it could read as results.
+"""
+
+from frappe.model.document import Document
+
+
+class LabResult(Document):
+    """One test result read from an uploaded lab report.
+
+    Attributes:
+        medical_document: Lab report the result was read from
+        patient: Patient of the report
+        result_date: Date of the report
+        test_name: Test name as printed
+        result_value: Value as printed, with any < or > sign
+        numeric_value: Value as a number
+        unit: Unit as printed
+        reference_range: Reference range as printed
+        reference_low: Lower bound of the reference range
+        reference_high: Upper bound of the reference range
+        flag: Normal, Low or High, printed or computed from the range
+        source_line: Report line the result was read from
+    """
+
+    pass
@@ -0,0 +1 @@
+"""Medical Document doctype package."""
@@ -0,0 +1,41 @@
+"""Medical Document DocType controller.
+
+Rows are created by `utils.medical_documents.complete_upload`; the file
+itself lives in the content-addressed blob store (see
+`utils.chunked_upload`), found from `content_hash`.
+"""
+
+import frappe
+from frappe.model.document import Document
+
+
+class MedicalDocument(Document):
+    """A lab, radiology or other document uploaded for a patient.
+
+    Attributes:
+        patient: Patient the document belongs to
+        encounter: Encounter the document was uploaded for
+        document_type: Lab Result, Radiology, Report, Prescription or Other
+        title: Short description shown in the medical record
+        document_date: Date of the document, for the medical record
+        document_time: Time of the document, for the medical record
+        file_name: Name of the uploaded file
+        content_type: Detected file type
+        file_size: Size in bytes
+        content_hash: SHA-256 of the content, the blob's address
+        preview_status: Pending, Ready, Not Supported or Failed
+        ocr_status: Not Required, Pending, Processing, Done or Failed
+        ocr_attempts: OCR runs that failed so far
+        ocr_retry_after: Earliest time of the next OCR attempt
+        ocr_timings: Seconds spent per OCR pipeline stage
+        ocr_error: Error of the last failed OCR attempt
+    """
+
+    pass
+
+
+def on_doctype_update():
+    # Keyset index of the medical record timeline
+    frappe.db.add_index(
+        "Medical Document", ["patient", "document_date", "document_time"], "timeline_index"
+    )
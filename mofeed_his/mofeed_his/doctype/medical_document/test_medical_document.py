@@ -0,0 +1,135 @@
+"""Tests for Medical Document uploads and the medical record timeline."""
+
+import io
+import os
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.test_patient_extension import (
+    make_patient,
+)
+from mofeed_his.mofeed_his.utils.chunked_upload import write_chunk
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.medical_documents import (
+    _part_path,
+    complete_upload,
+    document_path,
+    start_upload,
+)
+from mofeed_his.mofeed_his.utils.medical_timeline import get_timeline, get_timeline_detail
+
+
+def make_medical_document(patient, title, document_date, document_time, **fields):
+    """Insert a Medical Document row for a test, without a stored file."""
+    return frappe.get_doc(
+        {
+            "doctype": "Medical Document",
+            "patient": patient,
+            "document_type": "Report",
+            "title": title,
+            "document_date": document_date,
+            "document_time": document_time,
+            "file_name": f"{title}.pdf",
+            "content_type": "application/pdf",
+            "content_hash": frappe.generate_hash(length=64),
+            **fields,
+        }
+    ).insert()
+
+
+def remove_blob(content_hash):
+    path = document_path(content_hash)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class TestMedicalDocument(FrappeTestCase):
+    """Test the upload and timeline endpoints over a patient's documents."""
+
+    def setUp(self):
+        self.hospital = make_hospital("TSTDOC")
+        self.patient = make_patient(self.hospital.name).name
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_hospital_cache()
+
+    def test_timeline_pages_newest_first(self):
+        """Test that the cursor walks every document once, newest first."""
+        for title, date, time in (
+            ("Oldest", "2025-01-01", "08:00:00"),
+            ("Middle", "2025-01-02", "09:00:00"),
+            ("Newest", "2025-01-02", "17:30:00"),
+        ):
+            make_medical_document(self.patient, title, date, time)
+
+        first = get_timeline(self.patient, page_size=2, sources=["document"])
+        second = get_timeline(
+            self.patient, cursor=first["next_cursor"], page_size=2, sources=["document"]
+        )
+
+        self.assertEqual([event["title"] for event in first["events"]], ["Newest", "Middle"])
+        self.assertEqual([event["title"] for event in second["events"]], ["Oldest"])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_invalid_cursor_is_refused(self):
+        """Test that a tampered cursor raises a validation error."""
+        with self.assertRaises(frappe.ValidationError):
+            get_timeline(self.patient, cursor="not-a-cursor")
+
+    def test_detail_returns_the_document(self):
+        """Test that an event's detail panel loads its document."""
+        document = make_medical_document(self.patient, "Report", "2025-01-01", "08:00:00")
+
+        detail = get_timeline_detail("document", document.name)
+
+        self.assertEqual(detail.patient, self.patient)
+        self.assertEqual(detail.title, "Report")
+
+    def upload(self, content, document_type="Radiology"):
+        """Send `content` through the upload endpoints in one chunk."""
+        upload = start_upload(self.patient, "scan.pdf", len(content), document_type)
+        upload_id = upload["upload_id"]
+        write_chunk(_part_path(upload_id), 0, io.BytesIO(content), len(content))
+        result = complete_upload(upload_id)
+
+        content_hash = frappe.db.get_value("Medical Document", result["name"], "content_hash")
+        self.addCleanup(remove_blob, content_hash)
+        return result
+
+    def test_upload_creates_document(self):
+        """Test that a completed upload is stored and recorded."""
+        content = b"%PDF-1.4\n" + frappe.generate_hash().encode()
+
+        result = self.upload(content)
+
+        document = frappe.get_doc("Medical Document", result["name"])
+        self.assertFalse(result["duplicate"])
+        self.assertEqual(document.content_type, "application/pdf")
+        self.assertEqual(document.file_size, len(content))
+        with open(document_path(document.content_hash), "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_same_upload_returns_existing_document(self):
+        """Test that the same file, type and encounter is not recorded twice."""
+        content = b"%PDF-1.4\n" + frappe.generate_hash().encode()
+
+        first = self.upload(content)
+        second = self.upload(content)
+
+        self.assertEqual(second, {"name": first["name"], "duplicate": True})
+
+    def test_upload_as_another_type_gets_its_own_document(self):
+        """Test that a re-upload keeps its own document type over one blob."""
+        content = b"%PDF-1.4\n" + frappe.generate_hash().encode()
+
+        first = self.upload(content)
+        second = self.upload(content, document_type="Report")
+
+        self.assertFalse(second["duplicate"])
+        self.assertNotEqual(second["name"], first["name"])
+        self.assertEqual(
+            frappe.db.get_value("Medical Document", second["name"], "document_type"), "Report"
+        )
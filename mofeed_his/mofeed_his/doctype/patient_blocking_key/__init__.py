@@ -0,0 +1 @@
+"""Patient Blocking Key doctype package."""
@@ -0,0 +1,20 @@
+"""Patient Blocking Key DocType controller.
+
+Index table behind duplicate-patient detection. Rows are written in bulk
+by `utils.duplicates` and never edited by hand.
+"""
+
+from frappe.model.document import Document
+
+
+class PatientBlockingKey(Document):
+    """One blocking key of a patient.
+
+    Attributes:
+        patient: Patient the key belongs to
+        hospital: Patient's hospital
+        key_type: Key type, e.g. national_id, phone, name_year, mother
+        block_key: Normalized key; patients sharing a key are compared
+    """
+
+    pass
@@ -0,0 +1,88 @@
+"""Tests for duplicate-patient detection and its doc events."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.test_patient_extension import (
+    make_patient,
+)
+from mofeed_his.mofeed_his.utils.duplicates import get_duplicate_candidates
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.patient_matching import LIKELY_THRESHOLD
+
+
+class TestPatientBlockingKey(FrappeTestCase):
+    """Test that registrations are keyed and compared with their blocks."""
+
+    def setUp(self):
+        self.hospital = make_hospital("TSTDUP")
+        self.patient = self.make_patient("Mohammed", "Hassan", "07701234567")
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_hospital_cache()
+
+    def make_patient(self, first_name, last_name, mobile):
+        return make_patient(
+            self.hospital.name,
+            first_name=first_name,
+            middle_name="Ali",
+            last_name=last_name,
+            sex="Male",
+            dob="1990-05-01",
+            mobile=mobile,
+        )
+
+    def test_insert_indexes_keys(self):
+        """Test that a new patient is keyed by phone and by name and year."""
+        key_types = frappe.get_all(
+            "Patient Blocking Key", filters={"patient": self.patient.name}, pluck="key_type"
+        )
+
+        self.assertIn("phone", key_types)
+        self.assertIn("name_year", key_types)
+
+    def test_candidates_match_spelling_variants(self):
+        """Test that the console check finds a differently spelled name."""
+        candidates = get_duplicate_candidates(
+            patient_name="Muhammad Ali Hasan",
+            dob="1990-05-01",
+            sex="Male",
+            mobile="+9647701234567",
+            hospital=self.hospital.name,
+        )
+
+        self.assertEqual([candidate.name for candidate in candidates], [self.patient.name])
+        self.assertGreaterEqual(candidates[0].score, LIKELY_THRESHOLD)
+
+    def test_candidates_exclude_the_edited_patient(self):
+        """Test that a patient is not reported as its own duplicate."""
+        candidates = get_duplicate_candidates(
+            patient_name=self.patient.patient_name,
+            dob="1990-05-01",
+            mobile="07701234567",
+            patient=self.patient.name,
+            hospital=self.hospital.name,
+        )
+
+        self.assertEqual(candidates, [])
+
+    def test_likely_duplicate_warns_without_blocking(self):
+        """Test that saving a likely duplicate warns and still saves."""
+        frappe.clear_messages()
+
+        duplicate = self.make_patient("Muhammad", "Hasan", "+9647701234567")
+
+        self.assertTrue(frappe.db.exists("Patient", duplicate.name))
+        self.assertTrue(
+            any("Possible Duplicate Patient" in str(message) for message in frappe.message_log)
+        )
+
+    def test_delete_removes_keys(self):
+        """Test that a deleted patient leaves no keys behind."""
+        extension = frappe.db.get_value("Patient Extension", {"patient_link": self.patient.name})
+        frappe.delete_doc("Patient Extension", extension)
+        self.patient.delete()
+
+        self.assertFalse(frappe.db.exists("Patient Blocking Key", {"patient": self.patient.name}))
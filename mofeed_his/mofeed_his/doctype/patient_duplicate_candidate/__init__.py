@@ -0,0 +1 @@
+"""Patient Duplicate Candidate doctype package."""
@@ -0,0 +1,22 @@
+"""Patient Duplicate Candidate DocType controller.
+
+Pairs of patients found by the batch duplicate scan, for review by
+medical records staff.
+"""
+
+from frappe.model.document import Document
+
+
+class PatientDuplicateCandidate(Document):
+    """A pair of patients that may be the same person.
+
+    Attributes:
+        patient: First patient of the pair (the smaller name)
+        duplicate_of: Second patient of the pair
+        score: Match score between 0 and 1
+        reasons: Comma-separated fields that matched
+        cluster: Cluster id shared by all pairs of the same person
+        status: Open, Confirmed or Dismissed
+    """
+
+    pass
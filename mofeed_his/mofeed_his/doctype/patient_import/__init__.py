@@ -0,0 +1 @@
+"""Patient Import doctype package."""
@@ -0,0 +1,26 @@
+"""Patient Import DocType controller.
+
+Tracks one bulk patient import run. The checkpoint (`last_row`) is written
+in the same transaction as each imported chunk, so a crashed import can be
+resumed from the last committed chunk.
+"""
+
+from frappe.model.document import Document
+
+
+class PatientImport(Document):
+    """Bulk patient import run and its resume checkpoint.
+
+    Attributes:
+        file_path: Absolute path of the imported CSV/XLSX file
+        file_hash: SHA-256 of the file, used to find the run on resume
+        hospital: Hospital the patients are registered under
+        status: Queued, Running, Completed or Failed
+        total_rows: Data rows in the file
+        last_row: Data rows processed and committed so far
+        imported_rows: Patients created
+        skipped_rows: Rows rejected as invalid or duplicate
+        error_log: Per-row errors and the last failure traceback
+    """
+
+    pass
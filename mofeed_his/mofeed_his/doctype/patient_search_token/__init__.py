@@ -0,0 +1 @@
+"""Patient Search Token doctype package."""
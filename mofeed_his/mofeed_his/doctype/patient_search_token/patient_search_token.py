@@ -0,0 +1,27 @@
+"""Patient Search Token DocType controller.
+
+Projection table behind the Reception Console patient search. Rows are
+written in bulk by `utils.patient_search` and never edited by hand.
+"""
+
+import frappe
+from frappe.model.document import Document
+
+
+class PatientSearchToken(Document):
+    """One normalized search token of a patient.
+
+    Attributes:
+        patient: Patient the token belongs to
+        hospital: Patient's hospital, for scoped searches
+        token: Normalized token (name word, n-gram, phone, MRN or national ID)
+        kind: Token kind, e.g. name, ngram, phone
+        weight: Ranking weight of the token kind
+    """
+
+    pass
+
+
+def on_doctype_update():
+    # Searches look tokens up by value, scoped to a hospital
+    frappe.db.add_index("Patient Search Token", ["token", "hospital"], "token_hospital_index")
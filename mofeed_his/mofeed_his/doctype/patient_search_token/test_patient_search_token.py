@@ -0,0 +1,56 @@
+"""Tests for the patient search projection and its doc events."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.test_patient_extension import (
+    make_patient,
+)
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.patient_search import search_patients
+
+
+class TestPatientSearchToken(FrappeTestCase):
+    """Test that Patient and Patient Extension changes reach the search."""
+
+    def setUp(self):
+        self.hospital = make_hospital("TSTSRCH")
+        self.patient = make_patient(self.hospital.name, first_name="أحمد", last_name="Karimi")
+
+    def tearDown(self):
+        frappe.db.rollback()
+        clear_hospital_cache()
+
+    def search(self, txt):
+        return [row.name for row in search_patients(txt, hospital=self.hospital.name)]
+
+    def test_insert_is_searchable(self):
+        """Test that a new patient is found by name variant and MRN."""
+        self.assertIn(self.patient.name, self.search("احمد"))
+        self.assertIn(self.patient.name, self.search("karimi"))
+        self.assertIn(self.patient.name, self.search(self.patient.custom_mrn))
+
+    def test_update_reindexes_patient(self):
+        """Test that a renamed patient is found by the new name only."""
+        self.patient.last_name = "Saadi"
+        self.patient.save()
+
+        self.assertIn(self.patient.name, self.search("saadi"))
+        self.assertNotIn(self.patient.name, self.search("karimi"))
+
+    def test_extension_update_reindexes_patient(self):
+        """Test that a national ID set on the extension is searchable."""
+        extension = frappe.get_doc("Patient Extension", {"patient_link": self.patient.name})
+        extension.national_id = "199012345678"
+        extension.save()
+
+        self.assertEqual(self.search("199012345678"), [self.patient.name])
+
+    def test_delete_removes_tokens(self):
+        """Test that a deleted patient leaves no tokens behind."""
+        extension = frappe.db.get_value("Patient Extension", {"patient_link": self.patient.name})
+        frappe.delete_doc("Patient Extension", extension)
+        self.patient.delete()
+
+        self.assertFalse(frappe.db.exists("Patient Search Token", {"patient": self.patient.name}))
@@ -0,0 +1 @@
+"""Waiting Queue Entry doctype package."""
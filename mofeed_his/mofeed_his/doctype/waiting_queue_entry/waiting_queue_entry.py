@@ -0,0 +1,29 @@
+"""Waiting Queue Entry DocType controller.
+
+Durable copy of the Redis waiting queues (see `utils.queue_engine`).
+Rows are written asynchronously by `utils.waiting_queue.flush_queue_journal`
+and read back to rebuild a queue after Redis loses it.
+"""
+
+from frappe.model.document import Document
+
+
+class WaitingQueueEntry(Document):
+    """One patient in one practitioner's or clinic's queue on one day.
+
+    Attributes:
+        queue_name: Queue the patient waits in (date:practitioner:clinic)
+        queue_date: Day of the queue
+        practitioner: Practitioner the patient waits for
+        clinic: Clinic the patient waits in
+        member: Member id in the Redis queue, usually the appointment name
+        patient: Waiting patient
+        appointment: Appointment the patient checked in for
+        priority: Normal, Urgent or Emergency
+        status: Waiting, Called or Left
+        sort_offset: Order within the priority band (milliseconds)
+        arrival_time: Check-in time
+        called_time: Time the doctor called the patient
+    """
+
+    pass
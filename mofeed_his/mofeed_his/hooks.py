@@ -9,6 +9,12 @@ required_apps = ["frappe", "erpnext", "healthcare"]
 # Web assets
 web_include_css = "/assets/mofeed_his/css/mofeed_login.css"
 
+# Installation
+# ------------
+
+after_install = "mofeed_his.mofeed_his.install.after_install"
+after_migrate = "mofeed_his.mofeed_his.install.after_migrate"
+
 # Document Events
 # ---------------
 # Hook on document methods and events
@@ -16,30 +22,136 @@ web_include_css = "/assets/mofeed_his/css/mofeed_login.css"
 doc_events = {
 	"Patient": {
 		"before_insert": "mofeed_his.mofeed_his.utils.mrn.generate_patient_mrn",
-		"validate": "mofeed_his.mofeed_his.utils.mrn.validate_mrn_unique",
-	}
+		"after_insert": "mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.patient_extension.create_patient_extension",
+		"validate": [
+			"mofeed_his.mofeed_his.utils.mrn.validate_mrn_unique",
+			"mofeed_his.mofeed_his.utils.duplicates.warn_possible_duplicates",
+		],
+		"on_update": [
+			"mofeed_his.mofeed_his.utils.patient_search.update_patient_index",
+			"mofeed_his.mofeed_his.utils.duplicates.update_patient_keys",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+		],
+		"on_trash": [
+			"mofeed_his.mofeed_his.utils.patient_search.remove_patient_index",
+			"mofeed_his.mofeed_his.utils.duplicates.remove_patient_keys",
+		],
+	},
+	"Patient Extension": {
+		"on_update": [
+			"mofeed_his.mofeed_his.utils.patient_search.update_extension_index",
+			"mofeed_his.mofeed_his.utils.duplicates.update_extension_keys",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+		],
+		"after_delete": [
+			"mofeed_his.mofeed_his.utils.patient_search.update_extension_index",
+			"mofeed_his.mofeed_his.utils.duplicates.update_extension_keys",
+		],
+	},
+	"Patient Appointment": {
+		"validate": "mofeed_his.mofeed_his.utils.slot_availability.reserve_slots",
+		"on_update": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_appointment_delta",
+			"mofeed_his.mofeed_his.utils.waiting_queue.sync_appointment_queue",
+		],
+		"on_trash": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_appointment_delta",
+			"mofeed_his.mofeed_his.utils.waiting_queue.remove_appointment",
+			"mofeed_his.mofeed_his.utils.slot_availability.release_slots",
+		],
+	},
+	"Patient Encounter": {
+		"on_update": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_encounter_delta",
+		],
+		"on_submit": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_encounter_delta",
+			"mofeed_his.mofeed_his.utils.visit_summary.update_encounter_summary",
+		],
+		"on_cancel": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_encounter_delta",
+			"mofeed_his.mofeed_his.utils.visit_summary.update_encounter_summary",
+		],
+		"on_trash": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.publish_encounter_delta",
+		],
+	},
+	"Sales Invoice": {
+		"on_submit": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.utils.visit_summary.update_invoice_summary",
+		],
+		"on_cancel": [
+			"mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+			"mofeed_his.mofeed_his.utils.visit_summary.update_invoice_summary",
+		],
+	},
+	"Payment Entry": {
+		"on_submit": "mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+		"on_cancel": "mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.bump_console_version",
+	},
+	"Hospital": {
+		"on_update": "mofeed_his.mofeed_his.utils.hospital_cache.clear_hospital_cache",
+		"on_trash": "mofeed_his.mofeed_his.utils.hospital_cache.clear_hospital_cache",
+		"after_rename": "mofeed_his.mofeed_his.utils.hospital_cache.clear_hospital_cache",
+	},
+	"Clinic": {
+		"on_update": "mofeed_his.mofeed_his.utils.pricing.clear_clinic_pricing",
+		"on_trash": "mofeed_his.mofeed_his.utils.pricing.clear_clinic_pricing",
+		"after_rename": "mofeed_his.mofeed_his.utils.pricing.clear_clinic_pricing",
+	},
+	"Item Price": {
+		"on_update": "mofeed_his.mofeed_his.utils.pricing.clear_price_list_rates",
+		"on_trash": "mofeed_his.mofeed_his.utils.pricing.clear_price_list_rates",
+	},
+	"ICD10 Code": {
+		"on_update": "mofeed_his.mofeed_his.utils.icd10.bump_icd10_version",
+		"on_trash": "mofeed_his.mofeed_his.utils.icd10.bump_icd10_version",
+	},
+	"Insurance Coverage Rule": {
+		"on_update": "mofeed_his.mofeed_his.utils.insurance_coverage.clear_coverage_plan",
+		"on_trash": "mofeed_his.mofeed_his.utils.insurance_coverage.clear_coverage_plan",
+	},
+	"Item Group": {
+		"on_update": "mofeed_his.mofeed_his.utils.insurance_coverage.clear_coverage_plans",
+		"on_trash": "mofeed_his.mofeed_his.utils.insurance_coverage.clear_coverage_plans",
+		"after_rename": "mofeed_his.mofeed_his.utils.insurance_coverage.clear_coverage_plans",
+	},
+	"Mofeed HIS Settings": {
+		"on_update": "mofeed_his.mofeed_his.utils.hospital_cache.clear_hospital_cache",
+		"on_trash": "mofeed_his.mofeed_his.utils.hospital_cache.clear_hospital_cache",
+	},
 }
 
+# MRN Format
+# ----------
+# Template for new Medical Record Numbers, shared by Patient and Patient Extension.
+# Available fields: code, prefix, year, number
+
+# mrn_format = "{code}-{year}-{number:06d}"
+
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"mofeed_his.tasks.all"
-# 	],
-# 	"daily": [
-# 		"mofeed_his.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"mofeed_his.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"mofeed_his.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"mofeed_his.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"all": [
+		"mofeed_his.mofeed_his.utils.waiting_queue.flush_queue_journal",
+		"mofeed_his.mofeed_his.utils.document_ocr.enqueue_pending_ocr",
+	],
+	"daily": [
+		"mofeed_his.mofeed_his.utils.medical_documents.remove_stale_uploads",
+		"mofeed_his.mofeed_his.utils.visit_summary.reconcile_visit_summaries",
+	],
+	"monthly": [
+		"mofeed_his.mofeed_his.utils.visit_archive.archive_closed_years",
+	],
+}
 
 # Testing
 # -------
@@ -71,13 +183,13 @@ doc_events = {
 
 # Request Events
 # ----------------
-# before_request = ["mofeed_his.utils.before_request"]
-# after_request = ["mofeed_his.utils.after_request"]
+before_request = ["mofeed_his.mofeed_his.utils.instrumentation.before_request"]
+after_request = ["mofeed_his.mofeed_his.utils.instrumentation.after_request"]
 
 # Job Events
 # ----------
-# before_job = ["mofeed_his.utils.before_job"]
-# after_job = ["mofeed_his.utils.after_job"]
+before_job = ["mofeed_his.mofeed_his.utils.instrumentation.before_job"]
+after_job = ["mofeed_his.mofeed_his.utils.instrumentation.after_job"]
 
 # User Data Protection
 # --------------------
@@ -113,7 +225,17 @@ doc_events = {
 fixtures = [
 	{
 		"dt": "Custom Field",
-		"filters": [["name", "in", ["Patient-custom_mrn", "Patient-custom_hospital"]]],
+		"filters": [
+			[
+				"name",
+				"in",
+				[
+					"Patient-custom_mrn",
+					"Patient-custom_hospital",
+					"Patient Appointment-custom_clinic",
+				],
+			],
+		],
 	},
 	{
 		"dt": "Property Setter",
@@ -0,0 +1,47 @@
+"""Install and migrate hooks.
+
+Composite indexes on doctypes of other apps (Patient, Patient Appointment,
+the timeline's Healthcare sources) and on custom fields cannot be declared in this app's doctypes, so they
+are added after every install and migrate, once the fixtures have
+created the custom fields. Adding an index that exists is a no-op.
+Indexes on this app's own doctypes are added by their controllers'
+`on_doctype_update`.
+"""
+
+import frappe
+
+from mofeed_his.mofeed_his.utils.hospital_scope import HOSPITAL_INDEXES
+from mofeed_his.mofeed_his.utils.medical_timeline import TIMELINE_INDEXES
+
+
+def after_install():
+    add_indexes()
+
+
+def after_migrate():
+    add_indexes()
+
+
+def add_indexes():
+    """Add the composite indexes of the app, logging any that cannot be added yet."""
+    logger = frappe.logger("mofeed_his.install")
+    for doctype, indexes in _app_indexes().items():
+        if not frappe.db.table_exists(doctype):
+            logger.warning(f"Skipped the indexes of {doctype}: the doctype is not installed")
+            continue
+        for index_name, fields in indexes.items():
+            missing = [field for field in fields if not frappe.db.has_column(doctype, field)]
+            if missing:
+                logger.warning(
+                    f"Skipped index {index_name} of {doctype}: missing columns {missing}"
+                )
+                continue
+            frappe.db.add_index(doctype, fields, index_name)
+
+
+def _app_indexes():
+    """Return doctype -> index name -> fields of every index added here."""
+    indexes = {doctype: dict(named) for doctype, named in HOSPITAL_INDEXES.items()}
+    for doctype, fields in TIMELINE_INDEXES.items():
+        indexes.setdefault(doctype, {})["timeline_index"] = fields
+    return indexes
@@ -15,6 +15,7 @@ class Clinic(Document):
 		from frappe.types import DF
 		from mofeed_his.mofeed_his.mofeed_his.doctype.clinic_service.clinic_service import ClinicService
 
+		cash_price_list: DF.Link | None
 		clinic_code: DF.Data
 		clinic_name: DF.Data
 		clinic_type: DF.Literal["", "Outpatient", "Inpatient", "Emergency", "Daycare", "Diagnostic"]
@@ -22,11 +23,13 @@ class Clinic(Document):
 		default_followup_fee: DF.Currency
 		description: DF.SmallText | None
 		hospital: DF.Link
+		insurance_price_list: DF.Link | None
 		is_active: DF.Check
 		max_patients_per_slot: DF.Int
 		services: DF.Table[ClinicService]
 		slot_duration: DF.Int
 		specialty: DF.Literal["", "General Practice", "Internal Medicine", "Pediatrics", "Dermatology", "Orthopedics", "Cardiology", "Neurology", "Ophthalmology", "ENT", "Obstetrics & Gynecology", "General Surgery", "Urology", "Psychiatry", "Dentistry", "Radiology", "Pathology", "Emergency Medicine", "Anesthesiology", "Oncology", "Nephrology", "Gastroenterology", "Pulmonology", "Endocrinology", "Rheumatology", "Physical Therapy"]
+		walk_in_overbooking: DF.Int
 		working_days: DF.Literal["", "Sunday to Thursday", "Saturday to Thursday", "Saturday to Wednesday", "All Week"]
 		working_hours_end: DF.Time | None
 		working_hours_start: DF.Time | None
@@ -0,0 +1,95 @@
+# Copyright (c) 2025, Al-Mofeed Team and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.pricing import (
+	CLINIC_PRICING_CACHE_KEY,
+	PRICE_LIST_CACHE_KEY,
+	price_lines,
+)
+
+ITEM = "_Test Mofeed Service"
+PRICE_LIST = "Standard Selling"
+
+
+def make_clinic(hospital, clinic_name="_Test Clinic", **fields):
+	"""Insert a Clinic of `hospital` for a test."""
+	return frappe.get_doc(
+		{
+			"doctype": "Clinic",
+			"clinic_name": clinic_name,
+			"clinic_code": frappe.scrub(clinic_name).upper(),
+			"hospital": hospital,
+			"is_active": 1,
+			**fields,
+		}
+	).insert()
+
+
+class TestClinic(FrappeTestCase):
+	def setUp(self):
+		hospital = make_hospital("TSTCLN")
+		if not frappe.db.exists("Item", ITEM):
+			frappe.get_doc(
+				{
+					"doctype": "Item",
+					"item_code": ITEM,
+					"item_group": "Services",
+					"stock_uom": "Nos",
+					"is_stock_item": 0,
+				}
+			).insert()
+		self.clinic = make_clinic(
+			hospital.name, default_consultation_fee=10000, cash_price_list=PRICE_LIST
+		)
+
+	def tearDown(self):
+		frappe.db.rollback()
+		clear_hospital_cache()
+		frappe.cache().delete_value(CLINIC_PRICING_CACHE_KEY)
+		frappe.cache().delete_value(f"{PRICE_LIST_CACHE_KEY}:{PRICE_LIST}")
+
+	def rate(self):
+		return price_lines(self.clinic.name, [ITEM])["lines"][0]["rate"]
+
+	def test_saved_fee_reaches_next_price(self):
+		self.assertEqual(price_lines(self.clinic.name, visit_type="Consultation")["total"], 10000)
+
+		self.clinic.default_consultation_fee = 15000
+		self.clinic.save()
+
+		self.assertEqual(price_lines(self.clinic.name, visit_type="Consultation")["total"], 15000)
+
+	def test_saved_service_rate_reaches_next_price(self):
+		self.clinic.append("services", {"service": ITEM, "rate": 5000})
+		self.clinic.save()
+		self.assertEqual(self.rate(), 5000)
+
+		self.clinic.services[0].rate = 6000
+		self.clinic.save()
+
+		self.assertEqual(self.rate(), 6000)
+
+	def test_item_price_change_reaches_cash_rate(self):
+		self.assertIsNone(self.rate())
+
+		item_price = frappe.get_doc(
+			{
+				"doctype": "Item Price",
+				"item_code": ITEM,
+				"price_list": PRICE_LIST,
+				"price_list_rate": 7000,
+			}
+		).insert()
+		self.assertEqual(self.rate(), 7000)
+
+		item_price.price_list_rate = 8000
+		item_price.save()
+		self.assertEqual(self.rate(), 8000)
+
+		item_price.delete()
+		self.assertIsNone(self.rate())
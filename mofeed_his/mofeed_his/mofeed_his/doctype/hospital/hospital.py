@@ -24,6 +24,8 @@ class Hospital(Document):
 		hospital_name: DF.Data
 		hospital_type: DF.Literal["", "General Hospital", "Specialized Hospital", "Medical Center", "Clinic", "Polyclinic"]
 		is_active: DF.Check
+		mrn_allocation: DF.Literal["Block", "Strict"]
+		mrn_block_size: DF.Int
 		mrn_prefix: DF.Data
 		phone: DF.Data | None
 		website: DF.Data | None
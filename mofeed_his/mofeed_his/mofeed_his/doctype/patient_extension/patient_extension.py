@@ -1,8 +1,39 @@
 # Copyright (c) 2025, Al-Mofeed Team and contributors
 # For license information, please see license.txt
 
+"""
+Patient Extension: the Iraqi identity, contact and insurance details of a Patient.
+
+Every patient gets its extension when it is inserted (`create_patient_extension`,
+a Patient `after_insert` hook), so read paths only read. Lists and queues load
+the extensions of many patients in one query with `get_patient_extensions`.
+Patients registered before extensions were provisioned on insert are filled in
+by `backfill_patient_extensions`.
+"""
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import getdate, now
+
+from mofeed_his.mofeed_his.utils.hospital_cache import get_default_hospital
+
+# Fields returned by get_patient_extensions when none are asked for
+DEFAULT_FIELDS = (
+	"name",
+	"mrn",
+	"hospital",
+	"primary_phone",
+	"national_id",
+	"has_insurance",
+	"insurance_company",
+	"insurance_plan",
+	"coverage_percentage",
+	"insurance_expiry",
+)
+
+BACKFILL_BATCH_SIZE = 1000
+BACKFILL_JOB_ID = "mofeed_his:backfill_patient_extensions"
 
 
 class PatientExtension(Document):
@@ -49,47 +80,98 @@ class PatientExtension(Document):
 
 	def generate_mrn(self):
 		"""
-		Generate a Medical Record Number with facility prefix.
-		Format: YYYY-PREFIX-NNNNN (e.g., 2025-KRB-00001)
-		Uses database MAX to avoid race conditions.
+		Return the Medical Record Number for this extension.
+		Reuses the linked Patient's MRN so both records carry the same number.
+		Otherwise allocates one through the shared MRN allocator and stores it
+		on the Patient as well.
 		"""
-		import datetime
-		import re
+		from mofeed_his.mofeed_his.utils.mrn import get_mrn_for_hospital, mrn_unique_guard
+
+		patient_mrn = None
+		if self.patient_link:
+			patient_mrn = frappe.db.get_value("Patient", self.patient_link, "custom_mrn")
+		if patient_mrn:
+			return patient_mrn
 
-		year = datetime.datetime.now().year
+		mrn = get_mrn_for_hospital(self.hospital)
+		if self.patient_link:
+			with mrn_unique_guard():
+				frappe.db.set_value("Patient", self.patient_link, "custom_mrn", mrn, update_modified=False)
 
-		# Get hospital prefix
-		prefix = "MFD"  # Default prefix
-		if self.hospital:
-			hospital = frappe.get_doc("Hospital", self.hospital)
-			if hospital.mrn_prefix:
-				prefix = hospital.mrn_prefix
+		return mrn
 
-		# Pattern for this hospital and year
-		mrn_pattern = f"{year}-{prefix}-%"
 
-		# Get the maximum MRN number for this hospital and year using SQL
-		# This is more reliable than counting for concurrent insertions
-		result = frappe.db.sql("""
-			SELECT MAX(mrn) as max_mrn
-			FROM `tabPatient Extension`
-			WHERE hospital = %s AND mrn LIKE %s
-		""", (self.hospital, mrn_pattern), as_dict=True)
+def create_patient_extension(doc, method=None):
+	"""
+	Hook: create the Patient Extension of a newly inserted Patient.
 
-		next_number = 1
-		if result and result[0].max_mrn:
-			# Extract the number from the MRN (e.g., "2025-KRB-00005" -> 5)
-			match = re.search(r'-(\d+)$', result[0].max_mrn)
-			if match:
-				next_number = int(match.group(1)) + 1
+	The extension takes the patient's MRN and hospital (the default hospital
+	if the patient has none), so it needs no MRN allocation of its own.
+	"""
+	hospital = doc.get("custom_hospital") or get_default_hospital()
+	if not hospital:
+		# Left to backfill_patient_extensions once a hospital is configured
+		return
 
-		return f"{year}-{prefix}-{next_number:05d}"
+	frappe.get_doc(
+		{
+			"doctype": "Patient Extension",
+			"patient_link": doc.name,
+			"mrn": doc.get("custom_mrn"),
+			"hospital": hospital,
+		}
+	).insert(ignore_permissions=True)
+
+
+def get_patient_extensions(patient_names, fields=None):
+	"""
+	Load the Patient Extensions of many patients in one query.
+
+	For server code that lists patients (queues, reports, claim batches);
+	no permission check is made.
+
+	Args:
+		patient_names (list): Patient names
+		fields (list, optional): Extension fields to load; DEFAULT_FIELDS if not given
+
+	Returns:
+		dict: Patient name -> frappe._dict of the requested fields.
+		Patients without an extension are left out.
+
+	Raises:
+		frappe.ValidationError: If a field is not a Patient Extension field
+	"""
+	fields = list(fields or DEFAULT_FIELDS)
+
+	meta = frappe.get_meta("Patient Extension")
+	unknown = [field for field in fields if field != "name" and not meta.has_field(field)]
+	if unknown:
+		frappe.throw(
+			_("Unknown Patient Extension fields: {0}").format(", ".join(unknown)),
+			frappe.ValidationError
+		)
+
+	patient_names = list({name for name in patient_names or [] if name})
+	if not patient_names:
+		return {}
+
+	rows = frappe.get_all(
+		"Patient Extension",
+		filters={"patient_link": ["in", patient_names]},
+		fields=["patient_link"] + [field for field in fields if field != "patient_link"],
+	)
+	extensions = {}
+	for row in rows:
+		patient = row.patient_link if "patient_link" in fields else row.pop("patient_link")
+		extensions[patient] = row
+	return extensions
 
 
 def get_or_create_patient_extension(patient_name, hospital=None):
 	"""
 	Returns the PatientExtension document for the given patient.
-	If it doesn't exist, creates a new one and returns it.
+	Extensions are created when the patient is inserted; one is only created
+	here for a patient registered before that and not yet backfilled.
 
 	Args:
 		patient_name (str): The name/id of the Patient document
@@ -104,23 +186,21 @@ def get_or_create_patient_extension(patient_name, hospital=None):
 	if not patient_name:
 		frappe.throw("Patient name is required")
 
-	# Verify patient exists
-	if not frappe.db.exists("Patient", patient_name):
-		frappe.throw(
-			f"Patient {patient_name} does not exist",
-			frappe.DoesNotExistError
-		)
-
-	# Try to get existing extension
 	extension_name = frappe.db.get_value(
 		"Patient Extension",
 		{"patient_link": patient_name},
 		"name"
 	)
-
 	if extension_name:
 		return frappe.get_doc("Patient Extension", extension_name)
 
+	# Only a miss needs to tell a missing patient from a missing extension
+	if not frappe.db.exists("Patient", patient_name):
+		frappe.throw(
+			f"Patient {patient_name} does not exist",
+			frappe.DoesNotExistError
+		)
+
 	# Create new extension
 	extension_data = {
 		"doctype": "Patient Extension",
@@ -133,3 +213,90 @@ def get_or_create_patient_extension(patient_name, hospital=None):
 	extension.insert(ignore_permissions=True)
 
 	return extension
+
+
+def enqueue_extension_backfill():
+	"""Run `backfill_patient_extensions` in the background, once at a time."""
+	frappe.enqueue(
+		"mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.patient_extension.backfill_patient_extensions",
+		queue="long",
+		timeout=6 * 60 * 60,
+		job_id=BACKFILL_JOB_ID,
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def backfill_patient_extensions(batch_size=BACKFILL_BATCH_SIZE):
+	"""
+	Job: create the missing Patient Extension of every existing patient.
+
+	Patients without an extension are read by keyset in batches. Each batch
+	is written with one multi-row insert, as patient import does, and
+	committed, so an interrupted run simply starts again where it stopped.
+	Extensions take the patient's MRN, hospital and creation date; a patient
+	with no MRN is given one from its hospital's sequence first. A patient
+	whose MRN already names another extension is skipped, to be resolved by
+	hand, rather than failing its batch.
+
+	Args:
+		batch_size (int): Patients per batch
+
+	Returns:
+		int: Patients processed
+	"""
+	from mofeed_his.mofeed_his.utils.mrn import get_mrn_for_hospital, mrn_unique_guard
+
+	default_hospital = get_default_hospital()
+	user = frappe.session.user
+	standard_fields = ["name", "creation", "modified", "owner", "modified_by"]
+	written, last = 0, ""
+
+	while True:
+		patients = frappe.db.sql(
+			"""
+			SELECT p.name, p.custom_mrn, p.custom_hospital, p.creation
+			FROM `tabPatient` p
+			LEFT JOIN `tabPatient Extension` e ON e.patient_link = p.name
+			WHERE p.name > %(last)s AND e.name IS NULL
+			ORDER BY p.name
+			LIMIT %(limit)s
+			""",
+			{"last": last, "limit": batch_size},
+			as_dict=True,
+		)
+		if not patients:
+			break
+
+		timestamp = now()
+		values = []
+		for patient in patients:
+			hospital = patient.custom_hospital or default_hospital
+			if not hospital:
+				continue
+			mrn = patient.custom_mrn
+			if not mrn:
+				mrn = get_mrn_for_hospital(hospital)
+				with mrn_unique_guard():
+					frappe.db.set_value(
+						"Patient", patient.name, "custom_mrn", mrn, update_modified=False
+					)
+			values.append(
+				[mrn, timestamp, timestamp, user, user, patient.name, mrn, hospital]
+				+ [getdate(patient.creation), 1, "Iraqi"]
+			)
+
+		if values:
+			frappe.db.bulk_insert(
+				"Patient Extension",
+				standard_fields
+				+ ["patient_link", "mrn", "hospital", "registration_date", "is_active", "nationality"],
+				values,
+				ignore_duplicates=True,
+			)
+		frappe.db.commit()
+		written += len(values)
+		last = patients[-1].name
+
+	return written
+
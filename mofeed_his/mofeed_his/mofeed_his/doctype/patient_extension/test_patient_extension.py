@@ -0,0 +1,86 @@
+# Copyright (c) 2025, Al-Mofeed Team and contributors
+# For license information, please see license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.patient_extension import (
+	backfill_patient_extensions,
+	get_or_create_patient_extension,
+)
+from mofeed_his.mofeed_his.doctype.hospital.test_hospital import make_hospital
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+
+
+def make_patient(hospital, first_name="_Test Patient", **fields):
+	"""Insert a Patient of `hospital` for a test."""
+	return frappe.get_doc(
+		{
+			"doctype": "Patient",
+			"first_name": first_name,
+			"sex": "Female",
+			"custom_hospital": hospital,
+			**fields,
+		}
+	).insert()
+
+
+class TestPatientExtension(FrappeTestCase):
+	def setUp(self):
+		self.hospital = make_hospital("TSTEXT", mrn_allocation="Strict")
+
+	def tearDown(self):
+		frappe.db.rollback()
+		clear_hospital_cache()
+
+	def make_patient(self):
+		return make_patient(self.hospital.name)
+
+	def get_extensions(self, patient):
+		return frappe.get_all(
+			"Patient Extension",
+			filters={"patient_link": patient},
+			fields=["mrn", "hospital"],
+		)
+
+	def test_insert_creates_one_extension(self):
+		patient = self.make_patient()
+
+		self.assertEqual(
+			self.get_extensions(patient.name),
+			[{"mrn": patient.custom_mrn, "hospital": self.hospital.name}],
+		)
+
+	def test_backfill_is_idempotent(self):
+		patient = self.make_patient()
+		frappe.db.delete("Patient Extension", {"patient_link": patient.name})
+
+		# The backfill commits per batch; keep the test inside its transaction
+		with patch.object(frappe.db, "commit"):
+			self.assertGreaterEqual(backfill_patient_extensions(), 1)
+			self.assertEqual(backfill_patient_extensions(), 0)
+
+		self.assertEqual(
+			self.get_extensions(patient.name),
+			[{"mrn": patient.custom_mrn, "hospital": self.hospital.name}],
+		)
+
+	def test_extension_shares_the_patient_mrn(self):
+		patient = self.make_patient()
+		frappe.db.delete("Patient Extension", {"patient_link": patient.name})
+
+		extension = get_or_create_patient_extension(patient.name, self.hospital.name)
+
+		self.assertEqual(extension.mrn, patient.custom_mrn)
+
+	def test_extension_allocates_missing_mrn_for_both(self):
+		patient = self.make_patient()
+		frappe.db.delete("Patient Extension", {"patient_link": patient.name})
+		frappe.db.set_value("Patient", patient.name, "custom_mrn", None)
+
+		extension = get_or_create_patient_extension(patient.name, self.hospital.name)
+
+		self.assertTrue(extension.mrn.startswith("TSTEXT-"))
+		self.assertEqual(frappe.db.get_value("Patient", patient.name, "custom_mrn"), extension.mrn)
@@ -0,0 +1 @@
+"""Database patches for Mofeed HIS."""
@@ -0,0 +1,12 @@
+"""Backfill the patient search tokens."""
+
+import frappe
+
+
+def execute():
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.patient_search.rebuild_search_index",
+        queue="long",
+        timeout=6 * 60 * 60,
+        enqueue_after_commit=True,
+    )
@@ -0,0 +1,9 @@
+"""Create the Patient Extension of patients registered before they were provisioned on insert."""
+
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.patient_extension import (
+    enqueue_extension_backfill,
+)
+
+
+def execute():
+    enqueue_extension_backfill()
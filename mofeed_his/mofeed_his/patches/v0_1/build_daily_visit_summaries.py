@@ -0,0 +1,8 @@
+"""Build the Daily Visit Summary rows of existing encounters and invoices."""
+
+from mofeed_his.mofeed_his.utils.visit_summary import enqueue_summary_rebuild
+
+
+def execute():
+    # Every date, from the earliest encounter or invoice to today
+    enqueue_summary_rebuild(None, None)
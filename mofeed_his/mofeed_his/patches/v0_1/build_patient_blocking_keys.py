@@ -0,0 +1,12 @@
+"""Backfill the duplicate-detection blocking keys of existing patients."""
+
+import frappe
+
+
+def execute():
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.duplicates.rebuild_blocking_keys",
+        queue="long",
+        timeout=6 * 60 * 60,
+        enqueue_after_commit=True,
+    )
@@ -7,8 +7,46 @@
  * - View today's appointments
  * - Manage waiting queues
  * - Check-in patients
+ *
+ * Today's appointments and recently seen patients are kept in IndexedDB,
+ * so the page opens from the browser cache and each sync fetches only the
+ * rows changed since the desk's cursor. While the network is down the
+ * console keeps working from the cache: check-ins are queued in an outbox
+ * and replayed, each once, when the connection returns.
  */
 
+// Milliseconds between polls; unchanged polls cost the server one cache read
+const POLL_INTERVAL = 10 * 1000;
+
+// While realtime deltas arrive, a full reload only reconciles panels that
+// have no deltas (selected patient, outstanding balance)
+const RECONCILE_INTERVAL = 60 * 1000;
+
+const DELTA_EVENT = 'reception_console_delta';
+
+// Browser cache of the console (see ConsoleStore)
+const CACHE_DB = 'mofeed_his_reception_console';
+const CACHE_DB_VERSION = 1;
+
+// Patients kept for offline search, most recently seen first
+const RECENT_PATIENTS = 500;
+const OFFLINE_SEARCH_LIMIT = 20;
+
+// Console state (see utils/console_view.py) -> badge class and label
+const STATE_CLASSES = {
+    'booked': 'booked',
+    'arrived': 'arrived',
+    'in-progress': 'in-progress',
+    'completed': 'completed'
+};
+
+const STATE_LABELS = {
+    'booked': 'Booked',
+    'arrived': 'Arrived',
+    'in-progress': 'In Progress',
+    'completed': 'Completed'
+};
+
 frappe.pages['reception-console'].on_page_load = function(wrapper) {
     var page = frappe.ui.make_app_page({
         parent: wrapper,
@@ -36,65 +74,23 @@ class ReceptionConsole {
         this.page = page;
         this.wrapper = $(page.body);
         
-        // Placeholder data for appointments
-        this.appointments = [
-            {
-                id: 'APT-001',
-                time: '09:00',
-                patient_name: 'Ali Hassan',
-                patient_id: 'PAT-001',
-                doctor: 'Dr. Ahmed',
-                department: 'Dermatology',
-                status: 'Booked'
-            },
-            {
-                id: 'APT-002',
-                time: '09:15',
-                patient_name: 'Zainab Ahmed',
-                patient_id: 'PAT-002',
-                doctor: 'Dr. Ahmed',
-                department: 'Dermatology',
-                status: 'Arrived'
-            },
-            {
-                id: 'APT-003',
-                time: '09:30',
-                patient_name: 'Ahmad Saeed',
-                patient_id: 'PAT-003',
-                doctor: 'Dr. Fatima',
-                department: 'General',
-                status: 'Booked'
-            }
-        ];
-
-        // Placeholder data for waiting queue
-        this.queue = [
-            {
-                position: 1,
-                patient_name: 'Zainab Ahmed',
-                patient_id: 'PAT-002',
-                arrival_time: '09:10',
-                wait_time: '5 min'
-            },
-            {
-                position: 2,
-                patient_name: 'Ali Hassan',
-                patient_id: 'PAT-001',
-                arrival_time: '09:05',
-                wait_time: '10 min'
-            }
-        ];
-
-        // Selected patient placeholder
-        this.selected_patient = {
-            name: 'Zainab Ahmed',
-            mrn: '2025-KRB-00123',
-            insurance: 'Al-Waha',
-            coverage: '90%',
-            outstanding: 0,
-            phone: '0770 XXX XXX',
-            visit_type: 'Follow-up'
-        };
+        // Console data, filled by get_console_data
+        this.appointments = [];
+        this.queues = [];
+        this.selected_patient = null;
+        this.selected_patient_id = null;
+        this.selected_appointment = null;
+        this.hospital = frappe.defaults.get_user_default('Hospital');
+        this.clinic = frappe.defaults.get_user_default('Clinic');
+        // Cursor of the last sync_console response
+        this.cursor = null;
+        // Sequence number of the last applied realtime delta
+        this.seq = null;
+        this.date = null;
+        // Offline check-ins not yet replayed, by appointment
+        this.pending = {};
+        this.offline = !navigator.onLine;
+        this.store = new ConsoleStore();
 
         this.init();
     }
@@ -106,17 +102,17 @@ class ReceptionConsole {
         this.make();
         this.bind_events();
         this.setup_keyboard_shortcuts();
+        this.load_cached().then(() => this.load_data());
+        this.setup_realtime();
+        this.setup_offline();
+        this.start_polling();
     }
 
     /**
-     * Render the page content
+     * Render the page shell; panels are filled by render_board
      */
     make() {
-        this.wrapper.html(frappe.render_template('reception_console', {
-            appointments: this.appointments,
-            queue: this.queue,
-            selected_patient: this.selected_patient
-        }));
+        this.wrapper.html(frappe.render_template('reception_console', {}));
     }
 
     /**
@@ -130,8 +126,10 @@ class ReceptionConsole {
             let search_term = $(this).val();
             if (search_term.length >= 2) {
                 me.search_patient(search_term);
+            } else {
+                me.wrapper.find('#patient-search-results').hide();
             }
-        }, 300));
+        }, 200));
 
         // New Patient button
         this.wrapper.find('.btn-new-patient').on('click', function() {
@@ -148,28 +146,25 @@ class ReceptionConsole {
             me.show_today_appointments();
         });
 
-        // Appointment row selection
-        this.wrapper.find('.appointment-row').on('click', function() {
+        // Rows and patient actions are re-rendered on every refresh, so
+        // their handlers are delegated to the wrapper
+        this.wrapper.on('click', '.appointment-row', function() {
             me.select_appointment($(this));
         });
 
-        // Queue row selection
-        this.wrapper.find('.queue-row').on('click', function() {
+        this.wrapper.on('click', '.queue-row', function() {
             me.select_queue_patient($(this));
         });
 
-        // Check-in buttons
-        this.wrapper.find('.btn-check-in, #btn-check-in').on('click', function() {
+        this.wrapper.on('click', '.btn-check-in, #btn-check-in', function() {
             me.check_in_patient();
         });
 
-        // View File button
-        this.wrapper.find('.btn-view-file, #btn-view-file').on('click', function() {
+        this.wrapper.on('click', '.btn-view-file, #btn-view-file', function() {
             me.view_patient_file();
         });
 
-        // Billing button
-        this.wrapper.find('#btn-billing').on('click', function() {
+        this.wrapper.on('click', '#btn-billing', function() {
             me.open_billing();
         });
 
@@ -222,14 +217,554 @@ class ReceptionConsole {
      * Refresh the page data
      */
     refresh() {
-        // TODO: Fetch fresh data from server
-        // For now, just re-render with placeholder data
-        this.make();
-        this.bind_events();
-        frappe.show_alert({
-            message: __('Reception Console refreshed'),
-            indicator: 'green'
-        }, 3);
+        this.load_data();
+    }
+
+    /**
+     * Poll for changes while the console is on screen
+     */
+    start_polling() {
+        let me = this;
+        this.poll_timer = setInterval(function() {
+            if (document.hidden || frappe.get_route()[0] !== 'reception-console') {
+                return;
+            }
+            if (me.realtime_connected() && Date.now() - me.last_loaded < RECONCILE_INTERVAL) {
+                return;
+            }
+            me.load_data();
+        }, POLL_INTERVAL);
+    }
+
+    /**
+     * Show today's appointments and offline check-ins from the browser cache
+     * @returns {Promise} Resolved once the cached panels are rendered
+     */
+    load_cached() {
+        return Promise.all([
+            this.store.get_meta('sync'),
+            this.store.get_all('appointments'),
+            this.store.get_all('outbox')
+        ]).then(([sync, appointments, outbox]) => {
+            outbox.forEach(op => {
+                this.pending[op.appointment] = op;
+            });
+            // A cache of another day or desk scope is replaced by the first sync
+            if (!sync || sync.scope !== this.scope() || sync.date !== frappe.datetime.get_today()) {
+                return;
+            }
+            this.cursor = sync.cursor;
+            this.date = sync.date;
+            this.appointments = appointments.sort(compare_appointments);
+            this.render_board();
+        });
+    }
+
+    /**
+     * Sync today's appointments: the server sends only the rows changed
+     * since this desk's cursor, and a small "unchanged" reply otherwise
+     */
+    load_data() {
+        let me = this;
+        if (this.loading || this.offline) {
+            return;
+        }
+        this.loading = true;
+
+        this.replay_outbox().then(() => {
+            frappe.call({
+                method: 'mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.sync_console',
+                args: {
+                    hospital: this.hospital,
+                    clinic: this.clinic,
+                    cursor: this.cursor
+                },
+                callback: function(r) {
+                    if (r.message) {
+                        me.apply_sync(r.message);
+                    }
+                },
+                always: function() {
+                    me.loading = false;
+                }
+            });
+        });
+    }
+
+    /**
+     * Apply a sync_console response to the page and the browser cache
+     * @param {Object} result - {unchanged} or {cursor, seq, date, reset, appointments, removed}
+     */
+    apply_sync(result) {
+        this.seq = result.seq;
+        this.last_loaded = Date.now();
+        if (result.unchanged) {
+            return;
+        }
+
+        if (result.reset) {
+            this.appointments = result.appointments;
+        } else {
+            let changed = new Set(result.appointments.map(row => row.name).concat(result.removed));
+            this.appointments = this.appointments
+                .filter(row => !changed.has(row.name))
+                .concat(result.appointments)
+                .sort(compare_appointments);
+        }
+        this.date = result.date;
+        this.cursor = result.cursor;
+        this.render_board();
+        if (this.selected_patient_id) {
+            this.load_selected_patient();
+        }
+
+        // The cursor is saved last, so an interrupted write is synced again
+        let saved = result.reset
+            ? this.store.replace_appointments(result.appointments)
+            : this.store.apply_appointments(result.appointments, result.removed);
+        saved.then(() => this.store.set_meta('sync', {
+            scope: this.scope(),
+            date: result.date,
+            cursor: result.cursor
+        }));
+        this.store.remember_patients(result.appointments
+            .filter(row => row.patient)
+            .map(row => ({ name: row.patient, patient_name: row.patient_name, mrn: row.mrn })));
+    }
+
+    /**
+     * @returns {string} Filters of this desk; a cache of other filters is not reused
+     */
+    scope() {
+        return `${this.hospital || ''}|${this.clinic || ''}`;
+    }
+
+    /**
+     * Render the appointments and queue panels from this.appointments
+     */
+    render_board() {
+        this.appointments = this.appointments.map(row => this.with_pending(row));
+        this.queues = this.build_queues();
+        this.render_appointments();
+        this.render_queue_filter();
+        this.render_queue();
+    }
+
+    /**
+     * Show an appointment checked in offline as arrived until the server has it
+     * @param {Object} appointment - Console appointment row
+     * @returns {Object} The row, or a copy marked pending
+     */
+    with_pending(appointment) {
+        let op = this.pending[appointment.name];
+        if (!op || appointment.state !== 'booked') {
+            return appointment;
+        }
+        return Object.assign({}, appointment, {
+            state: 'arrived',
+            arrival_time: op.at,
+            priority: op.priority,
+            pending: true
+        });
+    }
+
+    /**
+     * Fetch the Selected Patient panel, falling back to the browser cache offline
+     */
+    load_selected_patient() {
+        let me = this;
+        let patient_id = this.selected_patient_id;
+        if (!patient_id) {
+            return;
+        }
+
+        if (this.offline) {
+            this.store.get('patients', patient_id).then(patient => {
+                if (patient && patient_id === me.selected_patient_id) {
+                    me.selected_patient = Object.assign({}, patient, {
+                        appointment: me.todays_appointment(patient_id)
+                    });
+                    me.render_patient_details();
+                }
+            });
+            return;
+        }
+
+        frappe.call({
+            method: 'mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.get_selected_patient',
+            args: {
+                patient: patient_id,
+                hospital: this.hospital
+            },
+            callback: function(r) {
+                if (patient_id !== me.selected_patient_id) {
+                    return;
+                }
+                me.selected_patient = r.message;
+                me.render_patient_details();
+                if (r.message) {
+                    me.store.remember_patients([r.message]);
+                }
+            }
+        });
+    }
+
+    /**
+     * @param {string} patient_id - Patient ID
+     * @returns {string} The patient's first appointment today, if any
+     */
+    todays_appointment(patient_id) {
+        let appointment = this.appointments.find(row => row.patient === patient_id);
+        return appointment ? appointment.name : null;
+    }
+
+    /**
+     * Render today's appointments table
+     */
+    render_appointments() {
+        let me = this;
+        let $body = this.wrapper.find('#appointments-body');
+        this.wrapper.find('.appointment-count').text(this.appointments.length);
+
+        if (!this.appointments.length) {
+            $body.html(`<tr class="empty-row"><td colspan="5" class="text-muted">${__('No appointments today')}</td></tr>`);
+            return;
+        }
+
+        $body.html(this.appointments.map(appointment => this.appointment_row_html(appointment)).join(''));
+    }
+
+    /**
+     * Build the table row of one appointment
+     * @param {Object} appointment - Appointment from get_console_data or a delta
+     * @returns {string} Row HTML
+     */
+    appointment_row_html(appointment) {
+        let doctor = frappe.utils.escape_html(appointment.practitioner_name || appointment.practitioner || '');
+        if (appointment.department) {
+            doctor += ` (${frappe.utils.escape_html(appointment.department)})`;
+        }
+        let action = appointment.state === 'booked'
+            ? `<button class="btn btn-xs btn-success btn-check-in" title="${__('F4: Check-in')}">${__('Check-In')}</button>`
+            : `<button class="btn btn-xs btn-info btn-view-file">${__('View File')}</button>`;
+        let pending = appointment.pending
+            ? ` <span class="pending-sync-badge" title="${__('Checked in offline, not yet sent')}">${__('Not synced')}</span>`
+            : '';
+
+        return `
+            <tr class="appointment-row ${appointment.name === this.selected_appointment ? 'selected' : ''}"
+                data-appointment-id="${frappe.utils.escape_html(appointment.name)}"
+                data-patient-id="${frappe.utils.escape_html(appointment.patient || '')}">
+                <td class="time-cell">${appointment.time}</td>
+                <td class="patient-cell">${frappe.utils.escape_html(appointment.patient_name || '')}</td>
+                <td class="doctor-cell">${doctor}</td>
+                <td class="status-cell"><span class="status-badge status-${STATE_CLASSES[appointment.state]}">${__(STATE_LABELS[appointment.state])}</span>${pending}</td>
+                <td class="actions-cell">${action}</td>
+            </tr>
+        `;
+    }
+
+    /**
+     * Fill the doctor filter from today's queues, keeping the current choice
+     */
+    render_queue_filter() {
+        let $filter = this.wrapper.find('#doctor-queue-filter');
+        let current = $filter.val() || 'all';
+
+        $filter.html([`<option value="all">${__('All Doctors')}</option>`].concat(
+            this.queues.map(queue => `
+                <option value="${frappe.utils.escape_html(queue.practitioner)}">
+                    ${frappe.utils.escape_html(queue.practitioner_name)}${queue.department ? ' (' + frappe.utils.escape_html(queue.department) + ')' : ''}
+                </option>
+            `)
+        ).join(''));
+        $filter.val($filter.find(`option[value="${current}"]`).length ? current : 'all');
+    }
+
+    /**
+     * Render the waiting queue for the selected doctor
+     */
+    render_queue() {
+        let doctor = this.wrapper.find('#doctor-queue-filter').val() || 'all';
+        let $body = this.wrapper.find('#queue-body');
+        let queues = this.queues.filter(queue => doctor === 'all' || queue.practitioner === doctor);
+        let patients = [].concat(...queues.map(queue => queue.patients));
+
+        if (doctor === 'all') {
+            patients.sort((a, b) => (a.arrival_time || '').localeCompare(b.arrival_time || ''));
+            patients = patients.map((patient, i) => Object.assign({}, patient, { position: i + 1 }));
+        }
+
+        if (!patients.length) {
+            $body.html(`<tr class="empty-row"><td colspan="4" class="text-muted">${__('No patients waiting')}</td></tr>`);
+            return;
+        }
+
+        $body.html(patients.map(patient => {
+            let arrival = patient.arrival_time ? moment(patient.arrival_time) : null;
+            let priority = patient.priority && patient.priority !== 'Normal'
+                ? ` <span class="priority-badge priority-${patient.priority.toLowerCase()}">${__(patient.priority)}</span>`
+                : '';
+            // Estimated wait from the queue engine, else time waited so far
+            let wait = patient.wait_minutes != null
+                ? __('~{0} min', [patient.wait_minutes])
+                : (arrival ? __('{0} min', [Math.max(moment().diff(arrival, 'minutes'), 0)]) : '');
+            return `
+                <tr class="queue-row" data-patient-id="${frappe.utils.escape_html(patient.patient || '')}">
+                    <td class="queue-number">${patient.position}</td>
+                    <td class="patient-cell">${frappe.utils.escape_html(patient.patient_name || '')}${priority}</td>
+                    <td class="arrival-cell">${arrival ? arrival.format('HH:mm') : ''}</td>
+                    <td class="wait-time-cell">${wait}</td>
+                </tr>
+            `;
+        }).join(''));
+    }
+
+    /**
+     * Render the Selected Patient panel
+     */
+    render_patient_details() {
+        let $body = this.wrapper.find('#patient-details-body');
+        let patient = this.selected_patient;
+
+        if (!patient) {
+            $body.html(`<p class="text-muted no-patient-selected">${__('Select an appointment, a queued patient or a search result.')}</p>`);
+            return;
+        }
+
+        let name = patient.patient_name || patient.name;
+        let initials = name.split(/\s+/).slice(0, 2).map(word => word.charAt(0)).join('').toUpperCase();
+        let insurance = patient.has_insurance && patient.insurance_company
+            ? `${frappe.utils.escape_html(patient.insurance_company)} – ${flt(patient.coverage_percentage)}% ${__('coverage')}`
+            : __('None');
+
+        $body.html(`
+            <div class="patient-card">
+                <div class="patient-info">
+                    <div class="patient-avatar">
+                        <span class="avatar-initials">${frappe.utils.escape_html(initials)}</span>
+                    </div>
+                    <div class="patient-main-info">
+                        <h3 class="patient-name">${frappe.utils.escape_html(name)}</h3>
+                        <p class="patient-mrn">${__('MRN:')} ${frappe.utils.escape_html(patient.mrn || '')}</p>
+                    </div>
+                </div>
+
+                <div class="patient-details-grid">
+                    <div class="detail-item">
+                        <label>${__('Insurance:')}</label>
+                        <span class="detail-value">${insurance}</span>
+                    </div>
+                    <div class="detail-item">
+                        <label>${__('Outstanding:')}</label>
+                        <span class="detail-value ${patient.outstanding ? '' : 'outstanding-zero'}">${format_currency(patient.outstanding || 0, 'IQD')}</span>
+                    </div>
+                    <div class="detail-item">
+                        <label>${__('Phone:')}</label>
+                        <span class="detail-value">${frappe.utils.escape_html(patient.phone || '')}</span>
+                    </div>
+                    <div class="detail-item">
+                        <label>${__('Visit Type:')}</label>
+                        <span class="detail-value">${frappe.utils.escape_html(patient.visit_type || '')}</span>
+                    </div>
+                </div>
+
+                <div class="patient-actions">
+                    <button class="btn btn-primary btn-lg btn-block btn-action" id="btn-check-in">
+                        <span class="icon">✓</span> ${__('Check-In')}
+                    </button>
+                    <button class="btn btn-secondary btn-lg btn-action" id="btn-view-file">
+                        <span class="icon">📁</span> ${__('View File')}
+                    </button>
+                    <button class="btn btn-secondary btn-lg btn-action" id="btn-billing">
+                        <span class="icon">💳</span> ${__('Billing')}
+                    </button>
+                </div>
+            </div>
+        `);
+    }
+
+    /**
+     * Subscribe to appointment deltas for this desk's hospital
+     */
+    setup_realtime() {
+        let me = this;
+        if (this.hospital) {
+            frappe.realtime.doc_subscribe('Hospital', this.hospital);
+        } else {
+            frappe.realtime.doctype_subscribe('Patient Appointment');
+        }
+
+        frappe.realtime.on(DELTA_EVENT, function(delta) {
+            me.on_delta(delta);
+        });
+
+        // Deltas published while disconnected are fetched from the server log
+        if (frappe.realtime.socket) {
+            frappe.realtime.socket.on('connect', function() {
+                me.catch_up();
+            });
+        }
+    }
+
+    /**
+     * @returns {boolean} Whether the realtime socket is connected
+     */
+    realtime_connected() {
+        return Boolean(frappe.realtime.socket && frappe.realtime.socket.connected);
+    }
+
+    /**
+     * Apply a realtime delta, or catch up if one was missed
+     * @param {Object} delta - {scope, seq, op, name, date, appointment}
+     */
+    on_delta(delta) {
+        if (delta.scope !== (this.hospital || 'all') || this.seq === null) {
+            return;
+        }
+        if (delta.seq <= this.seq) {
+            return;
+        }
+        if (delta.seq > this.seq + 1) {
+            this.catch_up();
+            return;
+        }
+        this.apply_delta(delta);
+    }
+
+    /**
+     * Fetch and apply the deltas missed since the last one applied
+     */
+    catch_up() {
+        let me = this;
+        if (this.seq === null || this.catching_up) {
+            return;
+        }
+        this.catching_up = true;
+
+        frappe.call({
+            method: 'mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.get_console_deltas',
+            args: {
+                hospital: this.hospital,
+                since: this.seq
+            },
+            callback: function(r) {
+                let result = r.message;
+                if (!result) {
+                    return;
+                }
+                // The cursor sync fetches whatever the delta log no longer holds
+                if (result.resync) {
+                    me.load_data();
+                    return;
+                }
+                result.deltas.forEach(delta => {
+                    if (delta.seq > me.seq) {
+                        me.apply_delta(delta);
+                    }
+                });
+            },
+            always: function() {
+                me.catching_up = false;
+            }
+        });
+    }
+
+    /**
+     * Update one appointment row and the waiting queue from a delta
+     * @param {Object} delta - Delta with op 'upsert' or 'remove'
+     */
+    apply_delta(delta) {
+        this.seq = delta.seq;
+
+        let index = this.appointments.findIndex(row => row.name === delta.name);
+        let $body = this.wrapper.find('#appointments-body');
+        let $row = $body.find(`.appointment-row[data-appointment-id="${CSS.escape(delta.name)}"]`);
+        let appointment = delta.appointment && this.with_pending(delta.appointment);
+
+        if (delta.op === 'remove' || !appointment || appointment.date !== this.date
+            || (this.clinic && appointment.clinic !== this.clinic)) {
+            if (index === -1) {
+                return;
+            }
+            this.appointments.splice(index, 1);
+            this.store.apply_appointments([], [delta.name]);
+            $row.remove();
+        } else {
+            let html = this.appointment_row_html(appointment);
+            if (index !== -1) {
+                this.appointments.splice(index, 1);
+            }
+            // Keep the list ordered by appointment time
+            let position = this.appointments.findIndex(row =>
+                row.appointment_time > appointment.appointment_time
+                || (row.appointment_time === appointment.appointment_time && row.name > appointment.name)
+            );
+            if (position === -1) {
+                position = this.appointments.length;
+            }
+            this.appointments.splice(position, 0, appointment);
+            this.store.apply_appointments([delta.appointment], []);
+
+            $row.remove();
+            $body.find('.empty-row').remove();
+            let $next = $body.find('.appointment-row').eq(position);
+            if ($next.length) {
+                $next.before(html);
+            } else {
+                $body.append(html);
+            }
+        }
+
+        this.wrapper.find('.appointment-count').text(this.appointments.length);
+        if (!this.appointments.length) {
+            this.render_appointments();
+        }
+
+        this.queues = this.build_queues();
+        this.render_queue_filter();
+        this.render_queue();
+    }
+
+    /**
+     * Derive the per-doctor waiting queues from the appointment list,
+     * as the server does in console_view.group_queues
+     * @returns {Array} Queues ordered by practitioner name
+     */
+    build_queues() {
+        let queues = {};
+        this.appointments.filter(row => row.state === 'arrived').forEach(row => {
+            let practitioner = row.practitioner || '';
+            if (!queues[practitioner]) {
+                queues[practitioner] = {
+                    practitioner: practitioner,
+                    practitioner_name: row.practitioner_name || practitioner,
+                    department: row.department,
+                    patients: []
+                };
+            }
+            queues[practitioner].patients.push(row);
+        });
+
+        // Queue engine order first, then patients it does not hold by arrival
+        let untracked = Number.MAX_SAFE_INTEGER;
+        return Object.values(queues)
+            .sort((a, b) => a.practitioner_name.localeCompare(b.practitioner_name))
+            .map(queue => Object.assign(queue, {
+                patients: queue.patients
+                    .sort((a, b) => (a.queue_position || untracked) - (b.queue_position || untracked)
+                        || (a.arrival_time || '').localeCompare(b.arrival_time || '')
+                        || (a.appointment_time || '').localeCompare(b.appointment_time || ''))
+                    .map((row, i) => ({
+                        position: i + 1,
+                        appointment: row.name,
+                        patient: row.patient,
+                        patient_name: row.patient_name,
+                        arrival_time: row.arrival_time,
+                        priority: row.priority,
+                        wait_minutes: row.wait_minutes
+                    }))
+            }));
     }
 
     /**
@@ -237,27 +772,153 @@ class ReceptionConsole {
      * @param {string} search_term - Search query
      */
     search_patient(search_term) {
-        // TODO: Implement actual patient search via API
-        // For now, show placeholder message
-        console.log('Searching for patient:', search_term);
-        frappe.show_alert({
-            message: __('Searching for: {0}', [search_term]),
-            indicator: 'blue'
-        }, 2);
+        let me = this;
+        // Ignore responses to keystrokes that were superseded
+        let request_id = this.search_request_id = (this.search_request_id || 0) + 1;
+
+        // Offline, only patients seen on this desk can be found
+        if (this.offline) {
+            this.store.search_patients(search_term).then(results => {
+                if (request_id === me.search_request_id) {
+                    me.render_search_results(results);
+                }
+            });
+            return;
+        }
+
+        frappe.call({
+            method: 'mofeed_his.mofeed_his.utils.patient_search.search_patients',
+            args: {
+                txt: search_term,
+                hospital: this.hospital
+            },
+            callback: function(r) {
+                if (request_id === me.search_request_id) {
+                    me.render_search_results(r.message || []);
+                }
+                me.store.remember_patients(r.message || []);
+            }
+        });
+    }
+
+    /**
+     * Render the search results dropdown
+     * @param {Array} results - Patients returned by search_patients
+     */
+    render_search_results(results) {
+        let me = this;
+        let $results = this.wrapper.find('#patient-search-results');
+
+        if (!results.length) {
+            $results.html(`<div class="search-no-results">${__('No patients found')}</div>`).show();
+            return;
+        }
+
+        $results.html(results.map(patient => `
+            <div class="search-result" data-patient-id="${frappe.utils.escape_html(patient.name)}">
+                <div class="search-result-name">${frappe.utils.escape_html(patient.patient_name || patient.name)}</div>
+                <div class="search-result-meta">
+                    ${frappe.utils.escape_html(patient.mrn || '')}
+                    ${patient.primary_phone || patient.mobile ? ' · ' + frappe.utils.escape_html(patient.primary_phone || patient.mobile) : ''}
+                    ${patient.national_id ? ' · ' + frappe.utils.escape_html(patient.national_id) : ''}
+                </div>
+            </div>
+        `).join('')).show();
+
+        $results.find('.search-result').on('click', function() {
+            $results.hide();
+            me.load_patient_details_by_id($(this).data('patient-id'));
+        });
     }
 
     /**
      * Open new patient form
      */
     new_patient() {
-        // TODO: Connect to actual Patient doctype
-        frappe.show_alert({
-            message: __('Opening New Patient form...'),
-            indicator: 'blue'
-        }, 2);
-        
-        // This will work when connected to ERPNext
-        // frappe.new_doc('Patient');
+        let me = this;
+        let dialog = new frappe.ui.Dialog({
+            title: __('New Patient'),
+            fields: [
+                { fieldname: 'patient_name', fieldtype: 'Data', label: __('Full Name'), reqd: 1 },
+                { fieldname: 'sex', fieldtype: 'Link', label: __('Gender'), options: 'Gender' },
+                { fieldname: 'dob', fieldtype: 'Date', label: __('Date of Birth') },
+                { fieldname: 'column_break_1', fieldtype: 'Column Break' },
+                { fieldname: 'mobile', fieldtype: 'Data', label: __('Mobile'), options: 'Phone' },
+                { fieldname: 'national_id', fieldtype: 'Data', label: __('National ID') },
+                { fieldname: 'mother_name', fieldtype: 'Data', label: __('Mother Name') }
+            ],
+            primary_action_label: __('Continue'),
+            primary_action(values) {
+                me.check_duplicates(values, () => {
+                    dialog.hide();
+                    me.open_new_patient_form(values);
+                });
+            }
+        });
+        dialog.show();
+    }
+
+    /**
+     * Look for existing patients matching new registration details
+     * @param {Object} values - Details entered in the New Patient dialog
+     * @param {Function} proceed - Called when no duplicate is found or the user continues anyway
+     */
+    check_duplicates(values, proceed) {
+        let me = this;
+
+        frappe.call({
+            method: 'mofeed_his.mofeed_his.utils.duplicates.get_duplicate_candidates',
+            args: values,
+            callback: function(r) {
+                let candidates = r.message || [];
+                if (!candidates.length) {
+                    proceed();
+                    return;
+                }
+
+                let rows = candidates.map(patient => `
+                    <tr>
+                        <td><a href="#" class="duplicate-candidate" data-patient-id="${frappe.utils.escape_html(patient.name)}">
+                            ${frappe.utils.escape_html(patient.patient_name || patient.name)}</a></td>
+                        <td>${frappe.utils.escape_html(patient.mrn || '')}</td>
+                        <td>${frappe.utils.escape_html(patient.mobile || patient.primary_phone || '')}</td>
+                        <td>${Math.round(patient.score * 100)}%</td>
+                    </tr>
+                `).join('');
+
+                let dialog = frappe.warn(
+                    __('Possible Duplicate Patient'),
+                    `<p>${__('This patient may already be registered. Select an existing patient or continue to register a new one.')}</p>
+                    <table class="table table-bordered table-condensed">
+                        <thead><tr><th>${__('Name')}</th><th>${__('MRN')}</th><th>${__('Phone')}</th><th>${__('Match')}</th></tr></thead>
+                        <tbody>${rows}</tbody>
+                    </table>`,
+                    proceed,
+                    __('Register New Patient')
+                );
+
+                dialog.$wrapper.find('.duplicate-candidate').on('click', function(e) {
+                    e.preventDefault();
+                    dialog.hide();
+                    me.load_patient_details_by_id($(this).data('patient-id'));
+                });
+            }
+        });
+    }
+
+    /**
+     * Open the Patient form prefilled from the New Patient dialog
+     * @param {Object} values - Details entered in the New Patient dialog
+     */
+    open_new_patient_form(values) {
+        let names = values.patient_name.trim().split(/\s+/);
+        frappe.new_doc('Patient', {
+            first_name: names.shift(),
+            last_name: names.join(' '),
+            sex: values.sex,
+            dob: values.dob,
+            mobile: values.mobile
+        });
     }
 
     /**
@@ -313,12 +974,11 @@ class ReceptionConsole {
      * @param {string} appointment_id - Appointment ID
      */
     load_patient_details(appointment_id) {
-        // TODO: Fetch actual patient details from server
-        console.log('Loading patient for appointment:', appointment_id);
-        frappe.show_alert({
-            message: __('Loading patient details...'),
-            indicator: 'blue'
-        }, 1);
+        let appointment = this.appointments.find(row => row.name === appointment_id);
+        this.selected_appointment = appointment_id;
+        if (appointment && appointment.patient) {
+            this.load_patient_details_by_id(appointment.patient);
+        }
     }
 
     /**
@@ -326,47 +986,185 @@ class ReceptionConsole {
      * @param {string} patient_id - Patient ID
      */
     load_patient_details_by_id(patient_id) {
-        // TODO: Fetch actual patient details from server
-        console.log('Loading patient:', patient_id);
+        if (!patient_id) {
+            return;
+        }
+        this.selected_patient_id = patient_id;
+        this.load_selected_patient();
     }
 
     /**
      * Check-in the selected patient
      */
     check_in_patient() {
-        // TODO: Implement actual check-in functionality
-        frappe.confirm(
-            __('Check-in {0}?', [this.selected_patient.name]),
-            () => {
-                frappe.show_alert({
-                    message: __('Patient checked in successfully!'),
-                    indicator: 'green'
-                }, 3);
+        let me = this;
+        let patient = this.selected_patient;
+        if (!patient) {
+            return;
+        }
+        if (!patient.appointment) {
+            frappe.msgprint(__('{0} has no appointment today',
+                [frappe.utils.escape_html(patient.patient_name)]));
+            return;
+        }
+
+        frappe.prompt({
+            fieldname: 'priority',
+            fieldtype: 'Select',
+            label: __('Priority'),
+            options: ['Normal', 'Urgent', 'Emergency'],
+            default: 'Normal'
+        }, values => {
+            if (me.offline) {
+                me.queue_check_in(patient, values.priority);
+                return;
             }
-        );
+            frappe.call({
+                method: 'mofeed_his.mofeed_his.utils.waiting_queue.check_in',
+                args: {
+                    appointment: patient.appointment,
+                    priority: values.priority
+                },
+                freeze: true,
+                callback: function(r) {
+                    let estimate = r.message || {};
+                    frappe.show_alert({
+                        message: __('{0} checked in: number {1}, about {2} min',
+                            [frappe.utils.escape_html(patient.patient_name), estimate.position,
+                                estimate.wait_minutes]),
+                        indicator: 'green'
+                    }, 5);
+                    me.load_data();
+                    me.load_selected_patient();
+                }
+            }).fail(xhr => {
+                // No response at all: the connection dropped, keep the check-in for later
+                if (xhr && xhr.status === 0) {
+                    me.set_offline(true);
+                    me.queue_check_in(patient, values.priority);
+                }
+            });
+        }, __('Check-in {0}', [frappe.utils.escape_html(patient.patient_name)]), __('Check-In'));
+    }
+
+    /**
+     * Record a check-in made offline, to be replayed by replay_outbox
+     * @param {Object} patient - Selected patient with today's appointment
+     * @param {string} priority - Normal, Urgent or Emergency
+     */
+    queue_check_in(patient, priority) {
+        let op = {
+            // Lets the server apply the check-in once however often it is sent
+            op_id: frappe.utils.get_random(20),
+            appointment: patient.appointment,
+            patient_name: patient.patient_name,
+            priority: priority,
+            at: frappe.datetime.now_datetime()
+        };
+        this.pending[op.appointment] = op;
+        this.store.put('outbox', op);
+        this.render_board();
+        frappe.show_alert({
+            message: __('{0} checked in offline; it will be sent when the connection returns',
+                [frappe.utils.escape_html(patient.patient_name)]),
+            indicator: 'orange'
+        }, 5);
+    }
+
+    /**
+     * Send the offline check-ins, oldest first; resolves when done or offline
+     * @returns {Promise}
+     */
+    replay_outbox() {
+        let me = this;
+        let ops = Object.values(this.pending).sort((a, b) => a.at.localeCompare(b.at));
+        if (!ops.length || this.offline) {
+            return Promise.resolve();
+        }
+
+        return new Promise(resolve => {
+            frappe.call({
+                method: 'mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console.replay_check_ins',
+                args: {
+                    operations: ops.map(op => ({
+                        op_id: op.op_id,
+                        appointment: op.appointment,
+                        priority: op.priority,
+                        at: op.at
+                    }))
+                },
+                callback: function(r) {
+                    (r.message || []).forEach(result => {
+                        let op = ops.find(row => row.op_id === result.op_id);
+                        if (!op || result.retry) {
+                            return;
+                        }
+                        delete me.pending[op.appointment];
+                        me.store.delete('outbox', op.op_id);
+                        if (result.error) {
+                            frappe.show_alert({
+                                message: __('Offline check-in of {0} failed: {1}', [
+                                    frappe.utils.escape_html(op.patient_name),
+                                    frappe.utils.escape_html(result.error)
+                                ]),
+                                indicator: 'red'
+                            }, 10);
+                        }
+                    });
+                },
+                always: function() {
+                    resolve();
+                }
+            });
+        });
+    }
+
+    /**
+     * Follow the browser's connection state
+     */
+    setup_offline() {
+        $(window).on('online', () => this.set_offline(false));
+        $(window).on('offline', () => this.set_offline(true));
+        if (this.offline) {
+            this.page.set_indicator(__('Offline'), 'orange');
+        }
+    }
+
+    /**
+     * Switch between the cache and the server; going online replays and syncs
+     * @param {boolean} offline - Whether the desk lost its connection
+     */
+    set_offline(offline) {
+        this.offline = offline;
+        if (offline) {
+            this.page.set_indicator(__('Offline'), 'orange');
+            return;
+        }
+        this.page.clear_indicator();
+        this.load_data();
+        this.load_selected_patient();
     }
 
     /**
      * Open patient medical file
      */
     view_patient_file() {
-        // TODO: Navigate to patient medical record
-        frappe.show_alert({
-            message: __('Opening patient file for: {0}', [this.selected_patient.name]),
-            indicator: 'blue'
-        }, 2);
-        
-        // This will work when connected to ERPNext
-        // frappe.set_route('Form', 'Patient', this.selected_patient.mrn);
+        if (this.selected_patient) {
+            frappe.set_route('Form', 'Patient', this.selected_patient.name);
+        }
     }
 
     /**
      * Open billing for selected patient
      */
     open_billing() {
+        if (!this.selected_patient) {
+            return;
+        }
         // TODO: Navigate to billing
         frappe.show_alert({
-            message: __('Opening billing for: {0}', [this.selected_patient.name]),
+            message: __('Opening billing for: {0}',
+                [frappe.utils.escape_html(this.selected_patient.patient_name)]),
             indicator: 'blue'
         }, 2);
     }
@@ -376,11 +1174,172 @@ class ReceptionConsole {
      * @param {string} doctor_id - Doctor ID to filter by
      */
     filter_queue(doctor_id) {
-        // TODO: Implement actual queue filtering
-        console.log('Filtering queue for doctor:', doctor_id);
-        frappe.show_alert({
-            message: __('Filtering queue...'),
-            indicator: 'blue'
-        }, 1);
+        this.render_queue();
+    }
+}
+
+/**
+ * Order console rows by appointment time, then name, as the server does
+ */
+function compare_appointments(a, b) {
+    return (a.appointment_time || '').localeCompare(b.appointment_time || '')
+        || a.name.localeCompare(b.name);
+}
+
+/**
+ * ConsoleStore Class
+ * IndexedDB cache of today's appointments, recently seen patients and
+ * check-ins waiting to be sent. Without IndexedDB (e.g. some private
+ * windows) every read resolves empty and the console works online only.
+ */
+class ConsoleStore {
+    constructor() {
+        this.db = this.open();
+    }
+
+    /**
+     * @returns {Promise} The database, or null when it cannot be opened
+     */
+    open() {
+        return new Promise(resolve => {
+            if (!window.indexedDB) {
+                resolve(null);
+                return;
+            }
+            let request = indexedDB.open(CACHE_DB, CACHE_DB_VERSION);
+            request.onupgradeneeded = () => {
+                let db = request.result;
+                db.createObjectStore('appointments', { keyPath: 'name' });
+                db.createObjectStore('patients', { keyPath: 'name' }).createIndex('seen', 'seen');
+                db.createObjectStore('outbox', { keyPath: 'op_id' });
+                db.createObjectStore('meta', { keyPath: 'key' });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+        });
+    }
+
+    /**
+     * Run work in one transaction
+     * @param {Array} stores - Object store names
+     * @param {string} mode - 'readonly' or 'readwrite'
+     * @param {Function} work - Called with the transaction; may return a request
+     * @returns {Promise} The request's result once the transaction completes
+     */
+    transaction(stores, mode, work) {
+        return this.db.then(db => new Promise(resolve => {
+            if (!db) {
+                resolve(null);
+                return;
+            }
+            let tx = db.transaction(stores, mode);
+            let request = work(tx);
+            tx.oncomplete = () => resolve(request ? request.result : null);
+            // A failed cache write only costs a larger next sync
+            tx.onerror = tx.onabort = () => resolve(null);
+        }));
+    }
+
+    get(store, key) {
+        return this.transaction([store], 'readonly', tx => tx.objectStore(store).get(key));
+    }
+
+    get_all(store) {
+        return this.transaction([store], 'readonly', tx => tx.objectStore(store).getAll())
+            .then(rows => rows || []);
+    }
+
+    put(store, record) {
+        return this.transaction([store], 'readwrite', tx => {
+            tx.objectStore(store).put(record);
+        });
+    }
+
+    delete(store, key) {
+        return this.transaction([store], 'readwrite', tx => {
+            tx.objectStore(store).delete(key);
+        });
+    }
+
+    get_meta(key) {
+        return this.get('meta', key).then(record => record ? record.value : null);
+    }
+
+    set_meta(key, value) {
+        return this.put('meta', { key: key, value: value });
+    }
+
+    /**
+     * Replace the cached appointments with a full day
+     * @param {Array} appointments - Console appointment rows
+     */
+    replace_appointments(appointments) {
+        return this.transaction(['appointments'], 'readwrite', tx => {
+            let store = tx.objectStore('appointments');
+            store.clear();
+            appointments.forEach(row => store.put(row));
+        });
+    }
+
+    /**
+     * Update the cached appointments with changed and removed rows
+     * @param {Array} appointments - Changed console appointment rows
+     * @param {Array} removed - Names of appointments to drop
+     */
+    apply_appointments(appointments, removed) {
+        return this.transaction(['appointments'], 'readwrite', tx => {
+            let store = tx.objectStore('appointments');
+            appointments.forEach(row => store.put(row));
+            removed.forEach(name => store.delete(name));
+        });
+    }
+
+    /**
+     * Add patients to the offline search index, keeping the most recent ones
+     * @param {Array} patients - Records with name and any of patient_name, mrn,
+     *     phone and the Selected Patient fields; merged into what is cached
+     */
+    remember_patients(patients) {
+        if (!patients.length) {
+            return Promise.resolve();
+        }
+        let seen = Date.now();
+        return this.transaction(['patients'], 'readwrite', tx => {
+            let store = tx.objectStore('patients');
+            patients.forEach(patient => {
+                let request = store.get(patient.name);
+                request.onsuccess = () => store.put(Object.assign({}, request.result, patient, { seen: seen }));
+            });
+
+            let count = store.count();
+            count.onsuccess = () => {
+                let excess = count.result - RECENT_PATIENTS;
+                if (excess <= 0) {
+                    return;
+                }
+                store.index('seen').openCursor().onsuccess = event => {
+                    let cursor = event.target.result;
+                    if (cursor && excess-- > 0) {
+                        cursor.delete();
+                        cursor.continue();
+                    }
+                };
+            };
+        });
+    }
+
+    /**
+     * Search the cached patients by name, MRN, phone or national ID
+     * @param {string} search_term - Search query
+     * @returns {Promise} Matching patients, most recently seen first
+     */
+    search_patients(search_term) {
+        let txt = search_term.toLowerCase();
+        return this.get_all('patients').then(patients => patients
+            .filter(patient => [patient.patient_name, patient.mrn, patient.phone, patient.mobile,
+                patient.primary_phone, patient.national_id]
+                .some(value => value && String(value).toLowerCase().includes(txt)))
+            .sort((a, b) => b.seen - a.seen)
+            .slice(0, OFFLINE_SEARCH_LIMIT));
     }
 }
@@ -7,76 +7,589 @@ This page provides a unified workspace for receptionists to manage:
 - Today's appointments
 - Waiting queues
 - Check-in operations
+
+Queue order, priority and estimated waits come from the Redis waiting
+queues of `utils.waiting_queue`.
+
+All panels are served by one endpoint, `get_console_data`, so a refresh is
+a single round trip. Desks poll it with the ETag of their last response;
+while nothing has changed the answer is a small "unchanged" reply that
+costs one cache read and no database query.
+
+Between full loads, appointment changes are pushed as deltas over Frappe
+realtime: one appointment row per message, published after commit to the
+appointment's hospital room (the Hospital document room), to the
+practitioner's room and to the Patient Appointment doctype room. Deltas of
+each scope carry a sequence number and are kept in a short Redis log, so a
+desk that reconnects catches up with `get_console_deltas` instead of
+reloading.
+
+The page itself keeps today's appointments in the browser (IndexedDB)
+and syncs them with `sync_console`, which sends only the rows changed
+since the desk's cursor, so a page load costs a small delta and the
+console keeps working through a network drop; `get_console_data` remains
+for clients without a cache. Check-ins made while offline are queued
+by the desk and replayed with `replay_check_ins`; each carries an
+operation id, so a replay sent twice checks the patient in once.
 """
 
+import json
+
 import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, flt, get_time, now_datetime, today
+
+from mofeed_his.mofeed_his.utils.console_view import (
+    HIDDEN_STATUSES,
+    appointment_state,
+    can_check_in,
+    group_queues,
+    make_cursor,
+    make_etag,
+    missed_deltas,
+    parse_cursor,
+)
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.queue_engine import NORMAL
+from mofeed_his.mofeed_his.utils.waiting_queue import CHECKED_IN, check_in, get_queue_positions
+
+# Bumped by doc events whenever anything shown on the console changes
+VERSION_KEY = "mofeed_his:reception_console_version"
+# Built payloads are shared by every desk asking for the same version
+PAYLOAD_TTL = 5 * 60
+
+DELTA_EVENT = "reception_console_delta"
+# Scope of desks not restricted to one hospital
+ALL_HOSPITALS = "all"
+DELTA_SEQUENCE_KEY = "mofeed_his:reception_console_seq"
+DELTA_LOG_KEY = "mofeed_his:reception_console_log"
+# Deltas kept per scope for reconnecting desks; older gaps force a reload
+DELTA_LOG_SIZE = 500
+DELTA_LOG_TTL = 24 * 60 * 60
+
+# Syncs re-send rows changed this long before the desk's cursor, so rows
+# committed by transactions that started before the last sync are not missed
+SYNC_OVERLAP_SECONDS = 60
+# Results of replayed offline check-ins, by operation id
+OPERATION_KEY = "mofeed_his:reception_console_op"
+OPERATION_TTL = 7 * 24 * 60 * 60
 
 
 def get_context(context):
     """
     Provide context data for the reception console page.
-    This will be used when the template is rendered.
+    The page renders its data client-side from `get_console_data`.
     """
     context.no_cache = 1
-    
-    # Placeholder data for appointments
-    context.appointments = [
-        {
-            "id": "APT-001",
-            "time": "09:00",
-            "patient_name": "Ali Hassan",
-            "patient_id": "PAT-001",
-            "doctor": "Dr. Ahmed",
-            "department": "Dermatology",
-            "status": "Booked"
-        },
-        {
-            "id": "APT-002",
-            "time": "09:15",
-            "patient_name": "Zainab Ahmed",
-            "patient_id": "PAT-002",
-            "doctor": "Dr. Ahmed",
-            "department": "Dermatology",
-            "status": "Arrived"
-        },
-        {
-            "id": "APT-003",
-            "time": "09:30",
-            "patient_name": "Ahmad Saeed",
-            "patient_id": "PAT-003",
-            "doctor": "Dr. Fatima",
-            "department": "General",
-            "status": "Booked"
+    return context
+
+
+@frappe.whitelist()
+@hospital_scoped
+def get_console_data(hospital=None, patient=None, etag=None):
+    """
+    Return everything the Reception Console shows, in one response.
+
+    Args:
+        hospital: Restrict appointments and queues to one hospital
+        patient: Patient shown in the Selected Patient panel
+        etag: ETag of the desk's previous response
+
+    Returns:
+        dict: {"unchanged": True, "etag": ...} when nothing changed since
+        `etag`, otherwise {"etag", "date", "appointments", "queues",
+        "selected_patient"}
+    """
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+
+    date = today()
+    # Read before building, so a delta published meanwhile is re-applied
+    # rather than missed
+    seq = _get_sequence(hospital or ALL_HOSPITALS)
+    version = get_console_version()
+    current_etag = make_etag(version, date, hospital, patient)
+    if etag and etag == current_etag:
+        return {"unchanged": True, "etag": current_etag, "seq": seq}
+
+    board = _get_cached(
+        f"board:{version}:{date}:{hospital or ''}",
+        lambda: _build_board(date, hospital),
+    )
+    selected_patient = None
+    if patient:
+        frappe.has_permission("Patient", "read", doc=patient, throw=True)
+        selected_patient = _get_cached(
+            f"patient:{version}:{date}:{hospital or ''}:{patient}",
+            lambda: _build_patient_summary(patient, board["appointments"], hospital),
+        )
+
+    return {
+        "etag": current_etag,
+        "seq": seq,
+        "date": date,
+        "appointments": board["appointments"],
+        "queues": board["queues"],
+        "selected_patient": selected_patient,
+    }
+
+
+def get_console_version():
+    """Return the current console data version, creating one if needed."""
+    cache = frappe.cache()
+    version = cache.get_value(VERSION_KEY)
+    if not version:
+        version = frappe.generate_hash(length=10)
+        cache.set_value(VERSION_KEY, version)
+    return version
+
+
+def bump_console_version(doc=None, method=None, *args, **kwargs):
+    """Hook: mark console data as changed after the transaction commits."""
+    frappe.db.after_commit.add(_set_new_version)
+
+
+def _set_new_version():
+    frappe.cache().set_value(VERSION_KEY, frappe.generate_hash(length=10))
+
+
+@frappe.whitelist()
+@hospital_scoped
+def get_console_deltas(hospital=None, since=0):
+    """
+    Return the deltas a desk missed while disconnected.
+
+    Args:
+        hospital: Hospital scope of the desk, as passed to `get_console_data`
+        since: Sequence number of the last delta the desk applied
+
+    Returns:
+        dict: {"seq", "deltas", "resync"}. `resync` is set when the log no
+        longer holds every missed delta and the desk must reload.
+    """
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+
+    scope = hospital or ALL_HOSPITALS
+    seq = _get_sequence(scope)
+    log = [json.loads(entry) for entry in frappe.cache().lrange(f"{DELTA_LOG_KEY}:{scope}", 0, -1)]
+    deltas, resync = missed_deltas(log, cint(since), seq)
+    return {"seq": seq, "deltas": deltas, "resync": resync}
+
+
+@frappe.whitelist()
+@hospital_scoped
+def sync_console(hospital=None, clinic=None, cursor=None):
+    """
+    Return the appointment rows changed since a desk's last sync.
+
+    Args:
+        hospital: Restrict appointments to one hospital
+        clinic: Restrict appointments to one clinic
+        cursor: Cursor of the desk's previous sync, if it has a cache
+
+    Returns:
+        dict: {"unchanged": True, "cursor", "seq"} when nothing changed,
+        otherwise {"cursor", "seq", "date", "reset", "appointments",
+        "removed"}. With `reset` the appointments are the whole day and
+        replace the desk's cache; without it they are the changed rows,
+        and `removed` names the rows to drop.
+    """
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+
+    date = today()
+    seq = _get_sequence(hospital or ALL_HOSPITALS)
+    version = get_console_version()
+    scope = make_etag(hospital, clinic)
+    previous = parse_cursor(cursor, date, scope)
+    if previous and previous["version"] == version:
+        return {"unchanged": True, "cursor": cursor, "seq": seq}
+
+    since = add_to_date(now_datetime(), seconds=-SYNC_OVERLAP_SECONDS)
+    result = {
+        "cursor": make_cursor(date, scope, version, since),
+        "seq": seq,
+        "date": date,
+        "reset": not previous,
+        "removed": [],
+    }
+    if not previous:
+        result["appointments"] = _load_appointments(date=date, hospital=hospital, clinic=clinic)
+        return result
+
+    modified, refreshed, deleted = _changed_appointments(date, previous["since"])
+    names = modified | refreshed
+    result["appointments"] = (
+        _load_appointments(date=date, hospital=hospital, clinic=clinic, names=names)
+        if names
+        else []
+    )
+    loaded = {row["name"] for row in result["appointments"]}
+    result["removed"] = sorted((modified | deleted) - loaded)
+    return result
+
+
+@frappe.whitelist()
+@hospital_scoped
+def get_selected_patient(patient, hospital=None):
+    """
+    Return the Selected Patient panel for a desk that syncs with `sync_console`.
+
+    Shares the cached summaries of `get_console_data`.
+
+    Args:
+        patient: Patient shown in the panel
+        hospital: Hospital scope of the desk; a patient of another hospital
+            is not shown
+    """
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+    frappe.has_permission("Patient", "read", doc=patient, throw=True)
+
+    date = today()
+    version = get_console_version()
+    return _get_cached(
+        f"patient:{version}:{date}:{hospital or ''}:{patient}",
+        lambda: _build_patient_summary(
+            patient,
+            frappe.get_all(
+                "Patient Appointment",
+                filters={
+                    "patient": patient,
+                    "appointment_date": date,
+                    "status": ["not in", HIDDEN_STATUSES],
+                },
+                fields=["name", "patient", "appointment_type"],
+                order_by="appointment_time, name",
+            ),
+            hospital,
+        ),
+    )
+
+
+def _changed_appointments(date, since):
+    """Find the appointments a desk synced at `since` has to update.
+
+    Returns:
+        tuple: (appointments modified since then, on any day; today's
+        appointments whose encounter changed or that wait in a queue,
+        whose position moves without the appointment changing;
+        appointments deleted since then)
+    """
+    values = {"date": date, "since": since, "checked_in": CHECKED_IN}
+    modified = frappe.db.sql_list(
+        "SELECT name FROM `tabPatient Appointment` WHERE modified > %(since)s", values
+    )
+    refreshed = frappe.db.sql_list(
+        """
+        SELECT appointment FROM `tabPatient Encounter`
+        WHERE encounter_date = %(date)s AND modified > %(since)s AND appointment IS NOT NULL
+        UNION
+        SELECT name FROM `tabPatient Appointment`
+        WHERE appointment_date = %(date)s AND status = %(checked_in)s
+        """,
+        values,
+    )
+    deleted = frappe.db.sql_list(
+        """
+        SELECT deleted_name FROM `tabDeleted Document`
+        WHERE deleted_doctype = 'Patient Appointment' AND creation > %(since)s
+        """,
+        values,
+    )
+    return set(modified), set(refreshed), set(deleted)
+
+
+@frappe.whitelist(methods=["POST"])
+def replay_check_ins(operations):
+    """
+    Apply the check-ins a desk queued while offline, each at most once.
+
+    Args:
+        operations: List of {"op_id", "appointment", "priority", "at"},
+            oldest first; `at` is when the patient arrived at the desk
+
+    Returns:
+        list: One result per operation with its op_id and either
+        "estimate" (position and wait), "error" when the check-in can no
+        longer be applied, or "retry" when it should be sent again later.
+        An operation replayed twice returns its first result.
+    """
+    frappe.has_permission("Patient Appointment", "write", throw=True)
+    if isinstance(operations, str):
+        operations = frappe.parse_json(operations)
+    return [_replay_check_in(operation) for operation in operations]
+
+
+def _replay_check_in(operation):
+    op_id = operation.get("op_id")
+    if not op_id:
+        return {"op_id": None, "error": _("Missing operation id")}
+
+    cache = frappe.cache()
+    key = cache.make_key(f"{OPERATION_KEY}:{op_id}")
+    # Claim the operation; a concurrent replay of the same one is told to retry
+    if not cache.set(key, json.dumps({"retry": True}), nx=True, ex=OPERATION_TTL):
+        stored = cache.get(key)
+        return dict(json.loads(stored) if stored else {"retry": True}, op_id=op_id)
+
+    appointment = operation.get("appointment")
+    try:
+        status = frappe.db.get_value("Patient Appointment", appointment, "status")
+        if status is None:
+            raise frappe.DoesNotExistError(_("Appointment {0} not found").format(appointment))
+        if not can_check_in(status):
+            raise frappe.ValidationError(
+                _("Appointment {0} is {1} and was not checked in").format(appointment, _(status))
+            )
+        estimate = check_in(
+            appointment=appointment,
+            priority=operation.get("priority") or NORMAL,
+            arrival=operation.get("at"),
+        )
+        frappe.db.commit()
+        result = {"estimate": estimate}
+    except (frappe.ValidationError, frappe.PermissionError) as e:
+        frappe.db.rollback()
+        # The desk reports the failure itself, once per operation
+        frappe.clear_messages()
+        result = {"error": str(e)}
+    except Exception:
+        frappe.db.rollback()
+        cache.delete(key)
+        frappe.log_error(title=f"Offline check-in {op_id} failed")
+        return {"op_id": op_id, "retry": True}
+
+    cache.set(key, json.dumps(result, default=str), ex=OPERATION_TTL)
+    return dict(result, op_id=op_id)
+
+
+def publish_appointment_delta(doc, method=None, *args, **kwargs):
+    """Hook: push a changed Patient Appointment to the consoles after commit."""
+    before = doc.get_doc_before_save()
+    practitioners = {doc.practitioner, before.practitioner if before else None}
+    patients = {doc.patient, before.patient if before else None}
+    _queue_delta(doc.name, patients, practitioners, removed=method == "on_trash")
+
+
+def publish_encounter_delta(doc, method=None, *args, **kwargs):
+    """Hook: push the appointment of a changed Patient Encounter."""
+    if doc.appointment:
+        _queue_delta(doc.appointment, {doc.patient}, {doc.practitioner})
+
+
+def publish_queue_change(entries):
+    """Push the appointments of a changed waiting queue after commit.
+
+    A call, skip or priority change moves every patient behind it, so all
+    queued appointments are published, not only the one acted on.
+    """
+    bump_console_version()
+    for entry in entries:
+        if entry.get("appointment"):
+            _queue_delta(entry["appointment"], {entry.get("patient")}, {entry.get("practitioner")})
+
+
+def _queue_delta(appointment, patients, practitioners, removed=False):
+    """Collect an appointment to publish once the transaction commits.
+
+    Several hooks firing for one appointment in a transaction publish a
+    single delta.
+    """
+    pending = getattr(frappe.local, "console_deltas", None)
+    if pending is None:
+        pending = frappe.local.console_deltas = {}
+        frappe.db.after_commit.add(_publish_pending_deltas)
+        frappe.db.after_rollback.add(_discard_pending_deltas)
+
+    entry = pending.setdefault(
+        appointment, {"hospitals": set(), "practitioners": set(), "removed": False}
+    )
+    for patient in filter(None, patients):
+        entry["hospitals"].add(frappe.get_cached_value("Patient", patient, "custom_hospital"))
+    entry["practitioners"].update(practitioners)
+    entry["removed"] = entry["removed"] or removed
+
+
+def _discard_pending_deltas():
+    frappe.local.console_deltas = None
+
+
+def _publish_pending_deltas():
+    pending = getattr(frappe.local, "console_deltas", None) or {}
+    frappe.local.console_deltas = None
+    if not pending:
+        return
+
+    rows = {row["name"]: row for row in _load_appointments(names=list(pending))}
+    for name, entry in pending.items():
+        row = None if entry["removed"] else rows.get(name)
+        if row:
+            entry["hospitals"].add(row["hospital"])
+            entry["practitioners"].add(row["practitioner"])
+
+        delta = {
+            # A cancelled or deleted appointment leaves the console
+            "op": "upsert" if row else "remove",
+            "name": name,
+            "date": row["date"] if row else None,
+            "appointment": row,
         }
-    ]
-    
-    # Placeholder data for waiting queue
-    context.queue = [
-        {
-            "position": 1,
-            "patient_name": "Zainab Ahmed",
-            "patient_id": "PAT-002",
-            "arrival_time": "09:10",
-            "wait_time": "5 min"
-        },
+
+        for scope in {ALL_HOSPITALS} | set(filter(None, entry["hospitals"])):
+            message = dict(delta, scope=scope, seq=_log_delta(scope, delta))
+            if scope == ALL_HOSPITALS:
+                frappe.publish_realtime(DELTA_EVENT, message, doctype="Patient Appointment")
+                for practitioner in filter(None, entry["practitioners"]):
+                    frappe.publish_realtime(
+                        DELTA_EVENT,
+                        message,
+                        doctype="Healthcare Practitioner",
+                        docname=practitioner,
+                    )
+            else:
+                frappe.publish_realtime(DELTA_EVENT, message, doctype="Hospital", docname=scope)
+
+
+def _log_delta(scope, delta):
+    """Assign the next sequence number of a scope and keep the delta for catch-up."""
+    cache = frappe.cache()
+    seq = cache.incr(cache.make_key(f"{DELTA_SEQUENCE_KEY}:{scope}"))
+    log_key = f"{DELTA_LOG_KEY}:{scope}"
+    cache.lpush(log_key, json.dumps(dict(delta, scope=scope, seq=seq), default=str))
+    cache.ltrim(log_key, 0, DELTA_LOG_SIZE - 1)
+    cache.expire(cache.make_key(log_key), DELTA_LOG_TTL)
+    return seq
+
+
+def _get_sequence(scope):
+    cache = frappe.cache()
+    return cint(cache.get(cache.make_key(f"{DELTA_SEQUENCE_KEY}:{scope}")))
+
+
+def _get_cached(key, builder):
+    cache = frappe.cache()
+    key = f"mofeed_his:reception_console:{key}"
+    value = cache.get_value(key)
+    if value is None:
+        value = builder()
+        cache.set_value(key, value, expires_in_sec=PAYLOAD_TTL)
+    return value
+
+
+def _build_board(date, hospital=None):
+    """Load today's appointments and derive the waiting queues in one query."""
+    appointments = _load_appointments(date=date, hospital=hospital)
+    return {"appointments": appointments, "queues": group_queues(appointments)}
+
+
+def _load_appointments(date=None, hospital=None, names=None, clinic=None):
+    """Load console rows for the appointments of a day, given names, or both."""
+    values = {"hidden": HIDDEN_STATUSES}
+    conditions = ["a.status NOT IN %(hidden)s"]
+    encounter_conditions = ["docstatus < 2"]
+    if date:
+        values["date"] = date
+        conditions.append("a.appointment_date = %(date)s")
+        encounter_conditions.append("encounter_date = %(date)s")
+    if names is not None:
+        values["names"] = tuple(names)
+        conditions.append("a.name IN %(names)s")
+        encounter_conditions.append("appointment IN %(names)s")
+    if hospital:
+        values["hospital"] = hospital
+        conditions.append("p.custom_hospital = %(hospital)s")
+    if clinic:
+        values["clinic"] = clinic
+        conditions.append("a.custom_clinic = %(clinic)s")
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT a.name, a.appointment_date, a.appointment_time, a.patient, a.patient_name,
+            a.practitioner, a.practitioner_name, a.department, a.appointment_type, a.status,
+            a.custom_clinic AS clinic, a.modified AS status_changed, p.custom_mrn AS mrn,
+            p.custom_hospital AS hospital, enc.docstatus AS encounter_docstatus
+        FROM `tabPatient Appointment` a
+        LEFT JOIN `tabPatient` p ON p.name = a.patient
+        LEFT JOIN (
+            SELECT appointment, MAX(docstatus) AS docstatus
+            FROM `tabPatient Encounter`
+            WHERE {" AND ".join(encounter_conditions)}
+            GROUP BY appointment
+        ) enc ON enc.appointment = a.name
+        WHERE {" AND ".join(conditions)}
+        ORDER BY a.appointment_time, a.name
+        """,
+        values,
+        as_dict=True,
+    )
+
+    appointments = [
         {
-            "position": 2,
-            "patient_name": "Ali Hassan",
-            "patient_id": "PAT-001",
-            "arrival_time": "09:05",
-            "wait_time": "10 min"
+            "name": row.name,
+            "date": str(row.appointment_date),
+            "time": _format_time(row.appointment_time),
+            "appointment_time": str(row.appointment_time or ""),
+            "patient": row.patient,
+            "patient_name": row.patient_name,
+            "mrn": row.mrn,
+            "hospital": row.hospital,
+            "clinic": row.clinic,
+            "practitioner": row.practitioner,
+            "practitioner_name": row.practitioner_name,
+            "department": row.department,
+            "appointment_type": row.appointment_type,
+            "status": row.status,
+            "state": appointment_state(row.status, row.encounter_docstatus),
+            # Patient Appointment keeps no check-in time; the last status
+            # change is when the patient was checked in
+            "arrival_time": str(row.status_changed) if row.status == "Checked In" else None,
         }
+        for row in rows
     ]
-    
-    # Placeholder data for selected patient
-    context.selected_patient = {
-        "name": "Zainab Ahmed",
-        "mrn": "2025-KRB-00123",
-        "insurance": "Al-Waha",
-        "coverage": "90%",
-        "outstanding": 0,
-        "phone": "0770 XXX XXX",
-        "visit_type": "Follow-up"
-    }
-    
-    return context
+
+    positions = get_queue_positions(appointments)
+    for appointment in appointments:
+        entry = positions.get(appointment["name"])
+        if entry:
+            appointment["queue_position"] = entry["position"]
+            appointment["priority"] = entry.get("priority")
+            appointment["wait_minutes"] = entry["wait_minutes"]
+    return appointments
+
+
+def _build_patient_summary(patient, appointments, hospital=None):
+    """Load the Selected Patient panel, outstanding balance included, in one query."""
+    # A patient outside the desk's hospital is not shown
+    hospital_condition = "AND p.custom_hospital = %(hospital)s" if hospital else ""
+    summary = frappe.db.sql(
+        f"""
+        SELECT p.name, p.patient_name, p.custom_mrn AS mrn, p.sex, p.dob, p.mobile,
+            e.primary_phone, e.national_id, e.has_insurance, e.insurance_company,
+            e.insurance_plan, e.coverage_percentage, e.insurance_expiry,
+            (
+                SELECT COALESCE(SUM(si.outstanding_amount), 0)
+                FROM `tabSales Invoice` si
+                WHERE si.patient = p.name AND si.docstatus = 1 AND si.outstanding_amount > 0
+            ) AS outstanding
+        FROM `tabPatient` p
+        LEFT JOIN `tabPatient Extension` e ON e.patient_link = p.name
+        WHERE p.name = %(patient)s {hospital_condition}
+        """,
+        {"patient": patient, "hospital": hospital},
+        as_dict=True,
+    )
+    if not summary:
+        return None
+
+    summary = summary[0]
+    summary.outstanding = flt(summary.outstanding)
+    summary.phone = summary.primary_phone or summary.mobile
+
+    todays = [row for row in appointments if row["patient"] == patient]
+    summary.appointment = todays[0]["name"] if todays else None
+    summary.visit_type = todays[0]["appointment_type"] if todays else None
+    return summary
+
+
+def _format_time(value):
+    if not value:
+        return ""
+    return get_time(value).strftime("%H:%M")
@@ -0,0 +1 @@
+"""Report package for Mofeed HIS."""
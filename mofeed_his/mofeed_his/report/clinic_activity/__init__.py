@@ -0,0 +1 @@
+"""Clinic Activity report package."""
@@ -0,0 +1,46 @@
+// Clinic Activity: visits and revenue from Daily Visit Summary
+
+frappe.query_reports['Clinic Activity'] = {
+    filters: [
+        {
+            fieldname: 'from_date',
+            label: __('From Date'),
+            fieldtype: 'Date',
+            default: frappe.datetime.add_months(frappe.datetime.get_today(), -1),
+            reqd: 1
+        },
+        {
+            fieldname: 'to_date',
+            label: __('To Date'),
+            fieldtype: 'Date',
+            default: frappe.datetime.get_today(),
+            reqd: 1
+        },
+        {
+            fieldname: 'group_by',
+            label: __('Group By'),
+            fieldtype: 'Select',
+            options: ['Date', 'Hospital', 'Clinic', 'Practitioner'],
+            default: 'Date',
+            reqd: 1
+        },
+        {
+            fieldname: 'hospital',
+            label: __('Hospital'),
+            fieldtype: 'Link',
+            options: 'Hospital'
+        },
+        {
+            fieldname: 'clinic',
+            label: __('Clinic'),
+            fieldtype: 'Link',
+            options: 'Clinic'
+        },
+        {
+            fieldname: 'practitioner',
+            label: __('Practitioner'),
+            fieldtype: 'Link',
+            options: 'Healthcare Practitioner'
+        }
+    ]
+};
@@ -0,0 +1,48 @@
+"""Clinic Activity report.
+
+Visits, revenue and the insurance share per day, hospital, clinic or
+practitioner, read from Daily Visit Summary (`utils.visit_summary`)
+rather than from raw encounters and invoices.
+"""
+
+import frappe
+from frappe import _
+
+GROUP_BY = {
+    "Date": ("date", _("Date"), "Date", None),
+    "Hospital": ("hospital", _("Hospital"), "Link", "Hospital"),
+    "Clinic": ("clinic", _("Clinic"), "Link", "Clinic"),
+    "Practitioner": ("practitioner", _("Practitioner"), "Link", "Healthcare Practitioner"),
+}
+FILTER_FIELDS = ("hospital", "clinic", "practitioner")
+
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    field, label, fieldtype, options = GROUP_BY[filters.group_by or "Date"]
+
+    conditions = ["date BETWEEN %(from_date)s AND %(to_date)s"]
+    conditions += [f"{name} = %({name})s" for name in FILTER_FIELDS if filters.get(name)]
+    data = frappe.db.sql(
+        f"""
+        SELECT {field} AS dimension, SUM(visits) AS visits, SUM(invoices) AS invoices,
+            SUM(revenue) AS revenue, SUM(insurance_amount) AS insurance_amount,
+            SUM(patient_amount) AS patient_amount
+        FROM `tabDaily Visit Summary`
+        WHERE {" AND ".join(conditions)}
+        GROUP BY {field}
+        ORDER BY {field}
+        """,
+        filters,
+        as_dict=True,
+    )
+
+    columns = [
+        {"fieldname": "dimension", "label": label, "fieldtype": fieldtype, "options": options},
+        {"fieldname": "visits", "label": _("Visits"), "fieldtype": "Int"},
+        {"fieldname": "invoices", "label": _("Invoices"), "fieldtype": "Int"},
+        {"fieldname": "revenue", "label": _("Revenue"), "fieldtype": "Currency"},
+        {"fieldname": "insurance_amount", "label": _("Insurance Amount"), "fieldtype": "Currency"},
+        {"fieldname": "patient_amount", "label": _("Patient Amount"), "fieldtype": "Currency"},
+    ]
+    return columns, data
@@ -0,0 +1,116 @@
+"""In-memory Redis stand-in for the queue and slot engine tests."""
+
+import bisect
+
+
+class MemoryBackend:
+    """In-process stand-in for the Redis commands used by
+    `queue_engine.QueueEngine` and `slot_engine.SlotEngine`.
+
+    Sorted sets keep a sorted list next to the member scores, so lookups
+    are binary searches as in Redis; inserts are O(n), which is fine for
+    tests.
+    """
+
+    def __init__(self):
+        self._sorted = {}
+        self._scores = {}
+        self._hashes = {}
+        self._strings = {}
+
+    def zadd(self, key, mapping):
+        scores = self._scores.setdefault(key, {})
+        items = self._sorted.setdefault(key, [])
+        added = 0
+        for member, score in mapping.items():
+            if member in scores:
+                items.remove((scores[member], member))
+            else:
+                added += 1
+            scores[member] = score
+            bisect.insort(items, (score, member))
+        return added
+
+    def zrem(self, key, *members):
+        removed = 0
+        for member in members:
+            score = self._scores.get(key, {}).pop(member, None)
+            if score is not None:
+                self._sorted[key].remove((score, member))
+                removed += 1
+        return removed
+
+    def zscore(self, key, member):
+        return self._scores.get(key, {}).get(member)
+
+    def zrank(self, key, member):
+        score = self.zscore(key, member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._sorted[key], (score, member))
+
+    def zcard(self, key):
+        return len(self._sorted.get(key, []))
+
+    def zrange(self, key, start, end, withscores=False):
+        items = self._sorted.get(key, [])
+        end = len(items) if end == -1 else end + 1
+        selected = items[start:end]
+        if withscores:
+            return [(member, score) for score, member in selected]
+        return [member for _, member in selected]
+
+    def zpopmin(self, key):
+        items = self._sorted.get(key)
+        if not items:
+            return []
+        score, member = items.pop(0)
+        del self._scores[key][member]
+        return [(member, score)]
+
+    def hset(self, key, field, value):
+        self._hashes.setdefault(key, {})[field] = str(value)
+
+    def hget(self, key, field):
+        return self._hashes.get(key, {}).get(field)
+
+    def hincrby(self, key, field, amount=1):
+        values = self._hashes.setdefault(key, {})
+        values[field] = str(int(values.get(field, 0)) + amount)
+        return int(values[field])
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self._hashes.get(key, {}).pop(field, None)
+
+    def hgetall(self, key):
+        return dict(self._hashes.get(key, {}))
+
+    def get(self, key):
+        return self._strings.get(key)
+
+    def set(self, key, value):
+        self._strings[key] = str(value)
+
+    def exists(self, key):
+        found = key in self._strings or self._sorted.get(key) or self._hashes.get(key)
+        return int(bool(found))
+
+    def renamenx(self, source, target):
+        if self.exists(target):
+            return False
+        for store in (self._sorted, self._scores, self._hashes, self._strings):
+            if source in store:
+                store[target] = store.pop(source)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self._sorted.pop(key, None)
+            self._scores.pop(key, None)
+            self._hashes.pop(key, None)
+            self._strings.pop(key, None)
+
+    def expire(self, key, seconds):
+        # Keys never expire in memory
+        return True
@@ -0,0 +1,67 @@
+"""Unit tests for MRN benchmark statistics."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.benchmark_stats import (
+    audit_mrns,
+    latency_summary,
+    percentile,
+    throughput,
+)
+
+
+class TestLatency(unittest.TestCase):
+    """Test percentiles and throughput."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_latency_summary(self):
+        """Test a summary in milliseconds from unsorted seconds."""
+        summary = latency_summary([0.003, 0.001, 0.002, 0.010])
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual((summary["p50"], summary["p99"], summary["max"]), (2.0, 10.0, 10.0))
+        self.assertEqual(summary["mean"], 4.0)
+        self.assertIsNone(latency_summary([])["p95"])
+
+    def test_throughput(self):
+        """Test operations per second."""
+        self.assertEqual(throughput(500, 4), 125.0)
+        self.assertIsNone(throughput(10, 0))
+
+
+class TestAuditMrns(unittest.TestCase):
+    """Test the MRN audit."""
+
+    def test_clean_run(self):
+        """Test consecutive numbers across two sequences."""
+        mrns = ["KRB-2025-000001", "KRB-2025-000002", "BGD-2025-000007", "KRB-2025-000003"]
+        audit = audit_mrns(mrns, gap_free=True)
+        self.assertEqual((audit["gaps"], audit["duplicate_count"], audit["ok"]), (0, 0, True))
+
+    def test_duplicates(self):
+        """Test that a duplicate always fails the audit."""
+        audit = audit_mrns(["KRB-2025-000001", "KRB-2025-000001"])
+        self.assertEqual(audit["duplicates"], ["KRB-2025-000001"])
+        self.assertFalse(audit["ok"])
+
+    def test_gaps(self):
+        """Test that skipped numbers fail only when allocation is gap-free."""
+        mrns = ["KRB-2025-000001", "KRB-2025-000004", "KRB-2025-000021"]
+        self.assertEqual(audit_mrns(mrns)["gaps"], 18)
+        self.assertTrue(audit_mrns(mrns)["ok"])
+        self.assertFalse(audit_mrns(mrns, gap_free=True)["ok"])
+
+    def test_unparsed(self):
+        """Test MRNs without a running number."""
+        audit = audit_mrns(["KRB-2025-000001", None, "LEGACY"])
+        self.assertEqual(audit["unparsed"], [None, "LEGACY"])
+        self.assertFalse(audit["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
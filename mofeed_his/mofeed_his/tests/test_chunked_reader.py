@@ -0,0 +1,82 @@
+"""Unit tests for the streaming CSV/XLSX reader used by patient import."""
+
+import os
+import tempfile
+import unittest
+
+from mofeed_his.mofeed_his.utils.chunked_reader import (
+    count_rows,
+    iter_chunks,
+    iter_rows,
+    normalize_header,
+)
+
+
+class TestChunkedReader(unittest.TestCase):
+    """Test chunking and resume offsets on CSV input."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", encoding="utf-8-sig", newline="") as f:
+            f.write("First Name,Sex, National ID \n")
+            for i in range(1, 8):
+                f.write(f"Patient {i},M,{1000 + i}\n")
+            f.write(",,\n")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_normalize_header(self):
+        """Test that headers are lowercased and snake_cased."""
+        self.assertEqual(normalize_header(" National ID "), "national_id")
+        self.assertEqual(normalize_header("first_name"), "first_name")
+        self.assertEqual(normalize_header(None), "")
+
+    def test_rows_are_dicts_and_blank_rows_skipped(self):
+        """Test row shape, BOM handling and skipping of empty rows."""
+        rows = list(iter_rows(self.path))
+
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(
+            rows[0], {"first_name": "Patient 1", "sex": "M", "national_id": "1001"}
+        )
+        self.assertEqual(count_rows(self.path), 7)
+
+    def test_chunks_cover_every_row_once(self):
+        """Test chunk boundaries and first-row offsets."""
+        chunks = list(iter_chunks(self.path, 3))
+
+        self.assertEqual([first for first, _ in chunks], [0, 3, 6])
+        self.assertEqual([len(rows) for _, rows in chunks], [3, 3, 1])
+
+    def test_resume_skips_processed_rows(self):
+        """Test that `skip` resumes after a checkpoint."""
+        chunks = list(iter_chunks(self.path, 3, skip=5))
+
+        self.assertEqual(chunks[0][0], 5)
+        self.assertEqual(
+            [row["first_name"] for _, rows in chunks for row in rows],
+            ["Patient 6", "Patient 7"],
+        )
+
+    def test_line_numbers_point_at_the_source(self):
+        """Test that line numbers survive blank rows and multi-line cells."""
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write('First Name,Address\nAli,Karbala\n\n,\n"Sara","Line 1\nLine 2"\nOmar,\n')
+
+        chunks = list(iter_chunks(self.path, 2, line_numbers=True))
+
+        self.assertEqual(
+            [(line, row["first_name"]) for _, rows in chunks for line, row in rows],
+            [(2, "Ali"), (5, "Sara"), (7, "Omar")],
+        )
+        self.assertEqual([first for first, _ in chunks], [0, 2])
+
+    def test_invalid_chunk_size(self):
+        """Test that a zero chunk size is rejected."""
+        with self.assertRaises(ValueError):
+            list(iter_chunks(self.path, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""Unit tests for resumable chunked uploads."""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from mofeed_his.mofeed_his.utils.chunked_upload import (
+    UploadError,
+    blob_path,
+    file_sha256,
+    received_bytes,
+    sniff_content_type,
+    store_blob,
+    write_chunk,
+)
+
+CONTENT = b"%PDF-1.7\n" + bytes(range(256)) * 40
+
+
+class UploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.part = os.path.join(self.directory, "upload.part")
+        self.root = os.path.join(self.directory, "blobs")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def upload(self, content, chunk_size=1000):
+        for offset in range(0, len(content), chunk_size):
+            chunk = io.BytesIO(content[offset : offset + chunk_size])
+            write_chunk(self.part, offset, chunk, len(content), max_chunk_size=chunk_size)
+
+
+class TestWriteChunk(UploadTestCase):
+    """Test receiving chunks."""
+
+    def test_chunks_reassemble(self):
+        """Test that ordered chunks rebuild the file."""
+        self.upload(CONTENT)
+        with open(self.part, "rb") as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_resume_after_interruption(self):
+        """Test resuming from the received size, rejecting a replayed chunk."""
+        write_chunk(self.part, 0, io.BytesIO(CONTENT[:1000]), len(CONTENT), 1000)
+        self.assertEqual(received_bytes(self.part), 1000)
+        self.assertRaises(
+            UploadError, write_chunk, self.part, 0, io.BytesIO(CONTENT[:1000]), len(CONTENT), 1000
+        )
+
+        resumed = received_bytes(self.part)
+        write_chunk(self.part, resumed, io.BytesIO(CONTENT[resumed:]), len(CONTENT), len(CONTENT))
+        self.assertEqual(file_sha256(self.part), hashlib.sha256(CONTENT).hexdigest())
+
+    def test_oversized_chunk_rejected(self):
+        """Test that a chunk over the limit or past the file size leaves no bytes."""
+        write_chunk(self.part, 0, io.BytesIO(b"a" * 10), 30, 10)
+        self.assertRaises(UploadError, write_chunk, self.part, 10, io.BytesIO(b"b" * 11), 30, 10)
+        self.assertRaises(UploadError, write_chunk, self.part, 10, io.BytesIO(b"b" * 25), 20, 50)
+        self.assertEqual(received_bytes(self.part), 10)
+
+    def test_concurrent_copy_rejected(self):
+        """Test that a retry sent while the first copy is being written is not appended."""
+        started, resume = threading.Event(), threading.Event()
+        chunk = CONTENT[:1000]
+
+        class SlowStream(io.BytesIO):
+            def read(self, size=-1):
+                started.set()
+                resume.wait(5)
+                return super().read(size)
+
+        errors = []
+
+        def retry():
+            try:
+                write_chunk(self.part, 0, io.BytesIO(chunk), len(CONTENT), 1000)
+            except UploadError as error:
+                errors.append(error)
+
+        first = threading.Thread(
+            target=write_chunk, args=(self.part, 0, SlowStream(chunk), len(CONTENT), 1000)
+        )
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=retry)
+        second.start()
+        second.join(0.2)
+        self.assertTrue(second.is_alive())
+
+        resume.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(errors), 1)
+        with open(self.part, "rb") as f:
+            self.assertEqual(f.read(), chunk)
+
+    def test_nothing_received(self):
+        """Test the resume position of a new upload."""
+        self.assertEqual(received_bytes(self.part), 0)
+
+
+class TestBlobStore(UploadTestCase):
+    """Test content addressing."""
+
+    def test_duplicate_stored_once(self):
+        """Test that a second identical upload is dropped."""
+        self.upload(CONTENT)
+        digest = file_sha256(self.part)
+        self.assertTrue(store_blob(self.part, self.root, digest))
+
+        self.upload(CONTENT)
+        self.assertFalse(store_blob(self.part, self.root, digest))
+        self.assertFalse(os.path.exists(self.part))
+        with open(blob_path(self.root, digest), "rb") as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_blob_path_fans_out(self):
+        """Test the two-level directory layout."""
+        self.assertEqual(blob_path("/b", "abcdef"), os.path.join("/b", "ab", "cd", "abcdef"))
+
+
+class TestSniffContentType(UploadTestCase):
+    """Test file type detection."""
+
+    def sniff(self, content):
+        with open(self.part, "wb") as f:
+            f.write(content)
+        return sniff_content_type(self.part)
+
+    def test_known_types(self):
+        """Test PDF, images and DICOM."""
+        self.assertEqual(self.sniff(CONTENT), "application/pdf")
+        self.assertEqual(self.sniff(b"\x89PNG\r\n\x1a\n...."), "image/png")
+        self.assertEqual(self.sniff(b"\xff\xd8\xff\xe0...."), "image/jpeg")
+        self.assertEqual(self.sniff(b"\x00" * 128 + b"DICM...."), "application/dicom")
+
+    def test_unknown_type(self):
+        """Test that other files are refused, whatever their name."""
+        self.assertIsNone(self.sniff(b"MZ\x90\x00 executable"))
+        self.assertIsNone(self.sniff(b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Unit tests for claim assembly and streaming claim files."""
+
+import csv
+import io
+import json
+import unittest
+import xml.etree.ElementTree as ET
+
+from mofeed_his.mofeed_his.utils.claim_writers import WRITERS, build_claims
+
+BATCH = {"name": "CLM-2025-00001", "insurer": "Iraqi Insurance Co.", "from_date": "2025-03-01"}
+
+
+def invoice(name, coverage=80):
+    return {
+        "invoice": name,
+        "posting_date": "2025-03-02",
+        "patient": f"PAT-{name}",
+        "patient_name": "Ali & Sons <Test>",
+        "mrn": "KRB-2025-000001",
+        "insurance_plan": "Gold",
+        "insurance_id": "IQ-77",
+        "coverage_percentage": coverage,
+    }
+
+
+def line(parent, item, amount, qty=1):
+    return {
+        "parent": parent,
+        "item_code": item,
+        "item_name": item.title(),
+        "qty": qty,
+        "rate": amount / qty,
+        "amount": amount,
+    }
+
+
+PAGES = [
+    (
+        [invoice("SINV-1"), invoice("SINV-2", coverage=50)],
+        [
+            line("SINV-1", "ECG", 15000),
+            line("SINV-1", "CBC", 16000, 2),
+            line("SINV-2", "XRAY", 30000),
+        ],
+        [("SINV-1", "E11.9"), ("SINV-1", "I10"), ("SINV-1", "E11.9")],
+    ),
+    ([invoice("SINV-3")], [line("SINV-3", "ECG", 15000)], []),
+]
+
+
+def write_file(fmt, pages, resume_after=None):
+    """Write pages as a claim file; simulate a crash and resume after a page."""
+    f = io.StringIO()
+    writer = WRITERS[fmt](f, BATCH)
+    writer.begin()
+    checkpoint, first = f.tell(), True
+    for number, (invoices, lines, diagnoses) in enumerate(pages):
+        writer.write(build_claims(invoices, lines, diagnoses), first)
+        first = False
+        checkpoint = f.tell()
+        if number == resume_after:
+            # Crash in the middle of the next page, then resume
+            f.write("<partial page>")
+            f.truncate(checkpoint)
+            f.seek(checkpoint)
+    writer.end()
+    return f.getvalue()
+
+
+class TestBuildClaims(unittest.TestCase):
+    """Test grouping rows into claims."""
+
+    def test_grouping_and_coverage(self):
+        """Test lines, distinct diagnoses and claimed amounts per invoice."""
+        first, second = build_claims(*PAGES[0])
+        self.assertEqual(first["diagnoses"], ["E11.9", "I10"])
+        self.assertEqual([line["item_code"] for line in first["lines"]], ["ECG", "CBC"])
+        self.assertEqual((first["total"], first["claimed_amount"]), (31000, 24800))
+        self.assertEqual(second["claimed_amount"], 15000)
+        self.assertEqual(second["diagnoses"], [])
+
+    def test_split_lines(self):
+        """Test that shares split by coverage rules replace the invoice coverage."""
+        split = dict(line("SINV-1", "ECG", 15000), insurer_amount=9000)
+        (claim,) = build_claims([invoice("SINV-1")], [split], [])
+        self.assertEqual(claim["claimed_amount"], 9000)
+
+    def test_invoice_without_lines(self):
+        """Test an invoice whose lines are missing."""
+        (claim,) = build_claims([invoice("SINV-9", coverage=None)], [], [])
+        self.assertEqual((claim["lines"], claim["total"], claim["claimed_amount"]), ([], 0, 0))
+
+
+class TestWriters(unittest.TestCase):
+    """Test the claim file formats."""
+
+    def test_csv(self):
+        """Test one row per invoice line."""
+        rows = list(csv.DictReader(io.StringIO(write_file("CSV", PAGES))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["diagnoses"], "E11.9; I10")
+        self.assertEqual(rows[2]["claimed_amount"], "15000.0")
+
+    def test_json(self):
+        """Test a valid document with the batch header and every claim."""
+        document = json.loads(write_file("JSON", PAGES))
+        self.assertEqual(document["insurer"], "Iraqi Insurance Co.")
+        invoices = [claim["invoice"] for claim in document["claims"]]
+        self.assertEqual(invoices, ["SINV-1", "SINV-2", "SINV-3"])
+
+    def test_empty_json(self):
+        """Test a batch without claims."""
+        self.assertEqual(json.loads(write_file("JSON", []))["claims"], [])
+
+    def test_xml(self):
+        """Test a well-formed document with escaped text."""
+        root = ET.fromstring(write_file("XML", PAGES))
+        self.assertEqual(root.get("insurer"), "Iraqi Insurance Co.")
+        claims = root.findall("Claim")
+        self.assertEqual(len(claims), 3)
+        self.assertEqual(claims[0].findtext("patient_name"), "Ali & Sons <Test>")
+        self.assertEqual([d.text for d in claims[0].findall("Diagnosis")], ["E11.9", "I10"])
+
+    def test_resume_matches_uninterrupted_run(self):
+        """Test that truncating to the checkpoint and resuming changes nothing."""
+        for fmt in WRITERS:
+            self.assertEqual(write_file(fmt, PAGES, resume_after=0), write_file(fmt, PAGES))
+
+
+if __name__ == "__main__":
+    unittest.main()
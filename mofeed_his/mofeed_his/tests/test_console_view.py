@@ -0,0 +1,164 @@
+"""Unit tests for the Reception Console view model."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.console_view import (
+    ARRIVED,
+    BOOKED,
+    COMPLETED,
+    IN_PROGRESS,
+    appointment_state,
+    can_check_in,
+    group_queues,
+    make_cursor,
+    make_etag,
+    missed_deltas,
+    parse_cursor,
+)
+
+
+def appointment(name, practitioner, state, arrival_time=None, appointment_time="09:00:00"):
+    return {
+        "name": name,
+        "patient": f"PAT-{name}",
+        "patient_name": f"Patient {name}",
+        "practitioner": practitioner,
+        "practitioner_name": f"Dr. {practitioner}",
+        "department": "General",
+        "state": state,
+        "arrival_time": arrival_time,
+        "appointment_time": appointment_time,
+    }
+
+
+class TestAppointmentState(unittest.TestCase):
+    """Test mapping appointment status to console state."""
+
+    def test_status_mapping(self):
+        """Test the plain status mapping."""
+        self.assertEqual(appointment_state("Scheduled"), BOOKED)
+        self.assertEqual(appointment_state("Checked In"), ARRIVED)
+        self.assertEqual(appointment_state("Closed"), COMPLETED)
+
+    def test_encounter_overrides_arrival(self):
+        """Test that a draft encounter means in progress, a submitted one completed."""
+        self.assertEqual(appointment_state("Checked In", 0), IN_PROGRESS)
+        self.assertEqual(appointment_state("Checked In", 1), COMPLETED)
+        self.assertEqual(appointment_state("Closed", 0), COMPLETED)
+
+
+class TestGroupQueues(unittest.TestCase):
+    """Test building per-doctor queues."""
+
+    def test_only_arrived_patients_queued_by_arrival(self):
+        """Test queue membership, order and positions."""
+        queues = group_queues(
+            [
+                appointment("A1", "Zaid", ARRIVED, "2025-01-01 09:20:00"),
+                appointment("A2", "Zaid", ARRIVED, "2025-01-01 09:05:00"),
+                appointment("A3", "Zaid", BOOKED),
+                appointment("A4", "Ahmed", ARRIVED, "2025-01-01 09:10:00"),
+                appointment("A5", "Ahmed", IN_PROGRESS, "2025-01-01 09:00:00"),
+            ]
+        )
+
+        self.assertEqual([q["practitioner"] for q in queues], ["Ahmed", "Zaid"])
+        zaid = queues[1]["patients"]
+        self.assertEqual([p["appointment"] for p in zaid], ["A2", "A1"])
+        self.assertEqual([p["position"] for p in zaid], [1, 2])
+        self.assertEqual(len(queues[0]["patients"]), 1)
+
+    def test_engine_order_comes_first(self):
+        """Test that queue engine positions override arrival order."""
+        urgent = appointment("A1", "Zaid", ARRIVED, "2025-01-01 09:20:00")
+        urgent.update(queue_position=1, priority="Urgent")
+        normal = appointment("A2", "Zaid", ARRIVED, "2025-01-01 09:05:00")
+        normal.update(queue_position=2, priority="Normal")
+        untracked = appointment("A3", "Zaid", ARRIVED, "2025-01-01 09:00:00")
+
+        patients = group_queues([normal, untracked, urgent])[0]["patients"]
+        self.assertEqual([p["appointment"] for p in patients], ["A1", "A2", "A3"])
+        self.assertEqual(patients[0]["priority"], "Urgent")
+
+    def test_no_arrivals(self):
+        """Test that no arrived patients give no queues."""
+        self.assertEqual(group_queues([appointment("A1", "Zaid", BOOKED)]), [])
+
+
+class TestMissedDeltas(unittest.TestCase):
+    """Test catch-up selection for reconnecting desks."""
+
+    def setUp(self):
+        # Newest first, as stored in the Redis log
+        self.log = [{"seq": seq} for seq in range(10, 5, -1)]
+
+    def test_returns_missed_deltas_oldest_first(self):
+        """Test a desk that missed seq 8-10."""
+        deltas, resync = missed_deltas(self.log, 7, 10)
+        self.assertFalse(resync)
+        self.assertEqual([d["seq"] for d in deltas], [8, 9, 10])
+
+    def test_up_to_date(self):
+        """Test a desk that missed nothing."""
+        self.assertEqual(missed_deltas(self.log, 10, 10), ([], False))
+
+    def test_gap_beyond_log_forces_resync(self):
+        """Test a desk whose last delta was trimmed from the log."""
+        self.assertEqual(missed_deltas(self.log, 3, 10), ([], True))
+
+    def test_sequence_reset_forces_resync(self):
+        """Test a desk ahead of the server after a cache flush."""
+        self.assertEqual(missed_deltas([], 42, 0), ([], True))
+
+
+class TestCanCheckIn(unittest.TestCase):
+    """Test which appointments an offline check-in may still apply to."""
+
+    def test_booked_and_arrived(self):
+        """Test that booked and already checked-in appointments can be checked in."""
+        self.assertTrue(can_check_in("Scheduled"))
+        self.assertTrue(can_check_in("Checked In"))
+
+    def test_cancelled_or_finished(self):
+        """Test that cancelled and finished appointments are not reopened."""
+        self.assertFalse(can_check_in("Cancelled"))
+        self.assertFalse(can_check_in("Closed"))
+        self.assertFalse(can_check_in("No Show"))
+
+
+class TestSyncCursor(unittest.TestCase):
+    """Test the cursors of desks syncing their offline cache."""
+
+    def test_round_trip(self):
+        """Test reading back a cursor of the same day and scope."""
+        cursor = make_cursor("2025-01-01", "scope", "v1", "2025-01-01 09:00:00.123456")
+        self.assertEqual(
+            parse_cursor(cursor, "2025-01-01", "scope"),
+            {"version": "v1", "since": "2025-01-01 09:00:00.123456"},
+        )
+
+    def test_other_day_or_scope_needs_snapshot(self):
+        """Test that a cursor of another day or scope is not used."""
+        cursor = make_cursor("2025-01-01", "scope", "v1", "2025-01-01 09:00:00")
+        self.assertIsNone(parse_cursor(cursor, "2025-01-02", "scope"))
+        self.assertIsNone(parse_cursor(cursor, "2025-01-01", "other"))
+
+    def test_missing_or_malformed(self):
+        """Test that a missing or garbled cursor needs a snapshot."""
+        self.assertIsNone(parse_cursor(None, "2025-01-01", "scope"))
+        self.assertIsNone(parse_cursor("2025-01-01|scope", "2025-01-01", "scope"))
+        self.assertIsNone(parse_cursor("2025-01-01|scope|v1|", "2025-01-01", "scope"))
+
+
+class TestMakeEtag(unittest.TestCase):
+    """Test ETag generation."""
+
+    def test_stable_and_sensitive(self):
+        """Test that the tag depends on every part."""
+        self.assertEqual(make_etag("v1", "2025-01-01", None), make_etag("v1", "2025-01-01", None))
+        self.assertNotEqual(make_etag("v1", "2025-01-01"), make_etag("v2", "2025-01-01"))
+        self.assertNotEqual(make_etag("v1", "H1", "P1"), make_etag("v1", "H1", "P2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
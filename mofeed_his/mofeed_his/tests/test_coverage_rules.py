@@ -0,0 +1,119 @@
+"""Unit tests for compiled insurance coverage rules."""
+
+import unittest
+from datetime import date
+
+from mofeed_his.mofeed_his.utils.coverage_rules import (
+    ALL_SERVICES,
+    ITEM,
+    ITEM_GROUP,
+    CoveragePlan,
+)
+
+GROUP_PARENTS = {"Radiology": "Services", "Laboratory": "Services", "Services": None}
+
+RULES = [
+    {"name": "R-ALL", "applies_to": ALL_SERVICES, "copay_amount": 1000},
+    {
+        "name": "R-LAB",
+        "applies_to": ITEM_GROUP,
+        "item_group": "Laboratory",
+        "coverage_percentage": 100,
+    },
+    {"name": "R-SVC", "applies_to": ITEM_GROUP, "item_group": "Services", "cap_amount": 20000},
+    {"name": "R-COSMETIC", "applies_to": ITEM, "item_code": "BOTOX", "excluded": 1},
+    {
+        "name": "R-MRI-2024",
+        "applies_to": ITEM,
+        "item_code": "MRI",
+        "coverage_percentage": 50,
+        "valid_upto": date(2024, 12, 31),
+    },
+    {
+        "name": "R-MRI-2025",
+        "applies_to": ITEM,
+        "item_code": "MRI",
+        "coverage_percentage": 70,
+        "valid_from": date(2025, 1, 1),
+    },
+]
+
+MARCH = date(2025, 3, 1)
+
+
+def line(item, group, amount, qty=1):
+    return {"item_code": item, "item_group": group, "qty": qty, "amount": amount}
+
+
+class TestCoveragePlan(unittest.TestCase):
+    """Test rule lookup and line splitting."""
+
+    def setUp(self):
+        self.plan = CoveragePlan("Gold", RULES, GROUP_PARENTS)
+
+    def split(self, *lines, **kwargs):
+        kwargs.setdefault("on_date", MARCH)
+        return self.plan.split(list(lines), 80, **kwargs)
+
+    def test_most_specific_rule(self):
+        """Test item, then group, then parent group, then plan-wide rules."""
+        found = [
+            self.plan.rule_for(item, group, MARCH).name
+            for item, group in [
+                ("MRI", "Radiology"),
+                ("CBC", "Laboratory"),
+                ("XRAY", "Radiology"),
+                ("PHARMA", "Drugs"),
+            ]
+        ]
+        self.assertEqual(found, ["R-MRI-2025", "R-LAB", "R-SVC", "R-ALL"])
+
+    def test_validity_dates(self):
+        """Test that the rule valid on the invoice date applies."""
+        self.assertEqual(self.plan.rule_for("MRI", None, date(2024, 6, 1)).name, "R-MRI-2024")
+
+    def test_split_invoice(self):
+        """Test coverage, caps, exclusions and totals for a whole invoice."""
+        result = self.split(
+            line("CBC", "Laboratory", 8000),
+            line("XRAY", "Radiology", 60000, qty=2),
+            line("BOTOX", "Cosmetics", 50000),
+            line("PHARMA", "Drugs", 11000),
+        )
+        insurer = [row["insurer_amount"] for row in result["lines"]]
+        self.assertEqual(insurer, [8000, 40000, 0, 8000])
+        self.assertEqual(result["insurer_amount"], 56000)
+        self.assertEqual(result["patient_amount"], 129000 - 56000)
+
+    def test_expired_insurance(self):
+        """Test that nothing is covered after the insurance expiry date."""
+        result = self.split(line("CBC", "Laboratory", 8000), insurance_expiry=date(2025, 2, 1))
+        self.assertEqual((result["insurer_amount"], result["patient_amount"]), (0, 8000))
+        self.assertIsNone(result["lines"][0]["rule"])
+
+    def test_plan_without_rules(self):
+        """Test the patient's coverage percentage when the plan has no rules."""
+        result = CoveragePlan("Basic").split([line("CBC", None, 10000)], 80)
+        self.assertEqual(result["insurer_amount"], 8000)
+
+    def test_explain_trace(self):
+        """Test the steps recorded for auditors."""
+        result = self.split(line("PHARMA", "Drugs", 11000), explain=True)
+        self.assertEqual(
+            result["lines"][0]["trace"],
+            [
+                "Rule R-ALL (All Services)",
+                "Coverage 80% (patient)",
+                "Co-pay 1000 paid by the patient",
+            ],
+        )
+        self.assertNotIn("trace", self.split(line("PHARMA", "Drugs", 11000))["lines"][0])
+
+    def test_group_loop(self):
+        """Test that a loop in the item group tree does not hang."""
+        plan = CoveragePlan("Loop", RULES, {"A": "B", "B": "A"})
+        self.assertEqual(plan.rule_for("X", "A", MARCH).name, "R-ALL")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Unit tests for daily visit summary deltas."""
+
+import unittest
+from datetime import date
+
+from mofeed_his.mofeed_his.utils.daily_summary import (
+    MEASURES,
+    SummaryTotals,
+    summary_key,
+    summary_name,
+)
+
+KEY = summary_key(date(2025, 3, 1), "Karbala General", "Cardiology", "HLC-PRAC-0001")
+
+
+class TestSummaryTotals(unittest.TestCase):
+    """Test accumulating and cancelling deltas."""
+
+    def test_key_and_name(self):
+        """Test stable names, with missing dimensions as empty strings."""
+        self.assertEqual(summary_key("2025-03-01"), ("2025-03-01", "", "", ""))
+        self.assertEqual(summary_name(KEY), summary_name(tuple(KEY)))
+        self.assertEqual(len(summary_name(KEY)), 20)
+        self.assertNotEqual(summary_name(KEY), summary_name(summary_key("2025-03-01")))
+
+    def test_invoice_and_visits(self):
+        """Test one row per key with the shares of an invoice."""
+        totals = SummaryTotals()
+        totals.add(KEY, visits=1)
+        totals.add(KEY, visits=1)
+        totals.add_invoice(KEY, 25000, 20000.004)
+        ((name, key, measures),) = totals.rows()
+        self.assertEqual((name, key), (summary_name(KEY), KEY))
+        self.assertEqual(
+            [measures[measure] for measure in MEASURES], [2, 1, 25000, 20000.0, 5000.0]
+        )
+
+    def test_cancel_and_return(self):
+        """Test that a cancel undoes a submit and a return counts no invoice."""
+        totals = SummaryTotals()
+        totals.add_invoice(KEY, 25000, 0.1 + 0.2)
+        totals.add_invoice(KEY, 25000, 0.1 + 0.2, sign=-1)
+        self.assertEqual(totals.rows(), [])
+
+        totals.add_invoice(KEY, -5000, 0, is_return=True)
+        ((_, _, measures),) = totals.rows()
+        self.assertEqual((measures["invoices"], measures["revenue"]), (0, -5000))
+
+
+if __name__ == "__main__":
+    unittest.main()
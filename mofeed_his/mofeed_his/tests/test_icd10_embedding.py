@@ -0,0 +1,59 @@
+"""Unit tests for hashed ICD-10 text embeddings."""
+
+import math
+import unittest
+
+from mofeed_his.mofeed_his.utils.icd10_embedding import DIMENSIONS, embed, note_hash
+
+
+def similarity(first, second):
+    a, b = embed(first), embed(second)
+    return sum(value * b.get(dimension, 0.0) for dimension, value in a.items())
+
+
+class TestEmbed(unittest.TestCase):
+    """Test embedding texts."""
+
+    def test_unit_length_and_bounds(self):
+        """Test that vectors are normalized and stay within the dimensions."""
+        vector = embed("Type 2 diabetes mellitus with hyperglycemia")
+        self.assertAlmostEqual(math.sqrt(sum(v * v for v in vector.values())), 1.0)
+        self.assertTrue(all(0 <= dimension < DIMENSIONS for dimension in vector))
+        self.assertTrue(all(0 <= dimension < 64 for dimension in embed("asthma", 64)))
+
+    def test_empty_text(self):
+        """Test texts without words."""
+        self.assertEqual(embed(""), {})
+        self.assertEqual(embed(None), {})
+        self.assertEqual(embed("of the , ."), {})
+
+    def test_deterministic(self):
+        """Test that embeddings do not depend on the process's hash seed."""
+        self.assertEqual(embed("acute bronchitis"), embed("Acute  bronchitis"))
+
+    def test_related_texts_closer(self):
+        """Test that a note is closer to the matching description."""
+        note = "known diabetic, poorly controlled blood sugar, polyuria"
+        self.assertGreater(
+            similarity(note, "Type 2 diabetes mellitus with hyperglycemia"),
+            similarity(note, "Fracture of shaft of femur"),
+        )
+
+    def test_arabic_variants(self):
+        """Test Arabic spelling variants and the definite article."""
+        self.assertAlmostEqual(similarity("الربو القصبي", "ربو قصبي"), 1.0, places=5)
+        self.assertAlmostEqual(similarity("إلتهاب", "التهاب"), 1.0, places=5)
+
+
+class TestNoteHash(unittest.TestCase):
+    """Test note hashing for the suggestion cache."""
+
+    def test_equivalent_notes(self):
+        """Test that case, spacing and punctuation do not change the hash."""
+        self.assertEqual(note_hash("Chest pain, SOB."), note_hash("chest  pain sob"))
+        self.assertNotEqual(note_hash("chest pain"), note_hash("chest pain fever"))
+        self.assertEqual(len(note_hash("")), 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
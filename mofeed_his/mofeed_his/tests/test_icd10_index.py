@@ -0,0 +1,99 @@
+"""Unit tests for the ICD-10 typeahead index."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.icd10_index import Icd10Index, normalize_code, usage_boost
+
+DAY = 86400
+
+CODES = [
+    ("E11", "Type 2 diabetes mellitus", "داء السكري من النوع الثاني"),
+    (
+        "E11.9",
+        "Type 2 diabetes mellitus without complications",
+        "داء السكري من النوع الثاني بدون مضاعفات",
+    ),
+    ("E10", "Type 1 diabetes mellitus", "داء السكري من النوع الأول"),
+    ("I10", "Essential (primary) hypertension", "فرط ضغط الدم الأساسي"),
+    ("J45.9", "Asthma, unspecified", "الربو، غير محدد"),
+    (
+        "J06.9",
+        "Acute upper respiratory infection, unspecified",
+        "عدوى الجهاز التنفسي العلوي الحادة",
+    ),
+]
+
+
+def codes(results):
+    return [result["code"] for result in results]
+
+
+class TestNormalization(unittest.TestCase):
+    """Test code normalization and usage boosts."""
+
+    def test_normalize_code(self):
+        """Test dots, spaces and case."""
+        self.assertEqual(normalize_code(" e11.9 "), "E119")
+        self.assertEqual(normalize_code(None), "")
+
+    def test_usage_boost(self):
+        """Test that boosts grow with use and decay with age."""
+        now = 1000 * DAY
+        self.assertGreater(usage_boost(10, now, now), usage_boost(2, now, now))
+        self.assertAlmostEqual(
+            usage_boost(3, now - 30 * DAY, now), usage_boost(3, now, now) / 2
+        )
+        self.assertEqual(usage_boost(0, now, now), 0)
+
+
+class TestSearch(unittest.TestCase):
+    """Test searching codes and descriptions."""
+
+    def setUp(self):
+        self.index = Icd10Index(CODES)
+
+    def test_code_prefix(self):
+        """Test that a code prefix, with or without the dot, lists its subcodes."""
+        self.assertEqual(codes(self.index.search("E11")), ["E11", "E11.9"])
+        self.assertEqual(codes(self.index.search("e119")), ["E11.9"])
+        self.assertEqual(codes(self.index.search("J")), [])
+        self.assertEqual(codes(self.index.search("J4")), ["J45.9"])
+
+    def test_words_all_required(self):
+        """Test that every word must match, the last one as a prefix."""
+        self.assertEqual(codes(self.index.search("diabetes type 1")), ["E10"])
+        self.assertEqual(
+            set(codes(self.index.search("diab mell"))), {"E11", "E11.9", "E10"}
+        )
+        self.assertEqual(codes(self.index.search("diabetes asthma")), [])
+
+    def test_exact_words_rank_first(self):
+        """Test exact words above prefixes and categories above subcodes."""
+        results = self.index.search("diabetes type 2")
+        self.assertEqual(codes(results), ["E11", "E11.9"])
+        self.assertGreater(results[0]["score"], results[1]["score"])
+
+    def test_arabic_normalized(self):
+        """Test Arabic spelling variants and the definite article."""
+        self.assertEqual(codes(self.index.search("الاول السكري")), ["E10"])
+        self.assertEqual(codes(self.index.search("ربو")), ["J45.9"])
+        self.assertIn("I10", codes(self.index.search("ضغط")))
+
+    def test_usage_boost_reorders(self):
+        """Test that a doctor's frequent code comes first."""
+        results = self.index.search("diabetes", boosts={"E11.9": 2.0})
+        self.assertEqual(codes(results)[0], "E11.9")
+
+    def test_empty_query_lists_boosted_codes(self):
+        """Test the favourites shown before anything is typed."""
+        boosts = {"I10": 1.0, "J45.9": 3.0, "Z99": 5.0}
+        self.assertEqual(codes(self.index.search("", boosts=boosts)), ["J45.9", "I10"])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_limit(self):
+        """Test the result limit."""
+        self.assertEqual(len(self.index.search("unspecified", limit=1)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Unit tests for lab value extraction and the OCR pipeline policies."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.lab_extraction import (
+    HIGH,
+    LOW,
+    NORMAL,
+    extract_lab_values,
+    parse_line,
+    parse_number,
+)
+from mofeed_his.mofeed_his.utils.ocr_worker import (
+    RETRY_MAX_SECONDS,
+    batch_size,
+    resolve_engine,
+    retry_delay,
+)
+
+REPORT = """
+AL-HAYAT LABORATORY
+Patient: Ali Hassan          Age: 45 Years
+Date: 12/03/2025
+Hemoglobin          13.5   g/dL     12.0 - 16.0
+Glucose (fasting):  110 mg/dL (70-100) H
+Platelets           250,000 /uL     150,000-450,000
+Vitamin B12 350 pg/mL 200 - 900
+Page 1 of 2
+"""
+
+
+class TestExtractLabValues(unittest.TestCase):
+    """Test reading results from report text."""
+
+    def test_report(self):
+        """Test that result lines are read and header lines skipped."""
+        results = extract_lab_values(REPORT)
+        self.assertEqual(
+            [(r["test_name"], r["numeric_value"], r["unit"]) for r in results],
+            [
+                ("Hemoglobin", 13.5, "g/dL"),
+                ("Glucose (fasting)", 110.0, "mg/dL"),
+                ("Platelets", 250000.0, "/uL"),
+                ("Vitamin B12", 350.0, "pg/mL"),
+            ],
+        )
+        self.assertEqual(results[0]["reference_range"], "12.0 - 16.0")
+        self.assertEqual(results[2]["reference_low"], 150000.0)
+        self.assertEqual(results[2]["reference_high"], 450000.0)
+
+    def test_flags(self):
+        """Test printed flags and flags computed from the range."""
+        self.assertEqual(parse_line("Glucose: 110 mg/dL (70-100) H")["flag"], HIGH)
+        self.assertEqual(parse_line("Potassium 3.1 mmol/L 3.5-5.1")["flag"], LOW)
+        self.assertEqual(parse_line("Sodium 140 mmol/L 135-145")["flag"], NORMAL)
+        self.assertEqual(parse_line("Creatinine 1.1 (0.6-1.2) mg/dL")["flag"], NORMAL)
+
+    def test_one_sided_ranges(self):
+        """Test ranges given as a single bound."""
+        tsh = parse_line("TSH 6.2 mIU/L < 4.5")
+        self.assertEqual((tsh["reference_low"], tsh["reference_high"]), (None, 4.5))
+        self.assertEqual(tsh["flag"], HIGH)
+        hdl = parse_line("HDL 35 mg/dL > 40")
+        self.assertEqual((hdl["reference_low"], hdl["flag"]), (40.0, LOW))
+
+    def test_arabic_digits_and_names(self):
+        """Test Arabic-Indic digits, the Arabic decimal mark and Arabic names."""
+        result = extract_lab_values("الهيموغلوبين ١٣٫٥ g/dL ١٢-١٦")[0]
+        self.assertEqual(result["test_name"], "الهيموغلوبين")
+        self.assertEqual((result["numeric_value"], result["reference_high"]), (13.5, 16.0))
+
+    def test_not_results(self):
+        """Test lines that only look like results."""
+        self.assertIsNone(parse_line("Age: 45 Years"))
+        self.assertIsNone(parse_line("Hemoglobin 13.5"))
+        self.assertIsNone(parse_line("Date: 12/03/2025"))
+        self.assertIsNone(parse_line("Comment: sample slightly hemolysed"))
+
+    def test_parse_number(self):
+        """Test decimal commas and thousands separators."""
+        self.assertEqual(parse_number("6,1"), 6.1)
+        self.assertEqual(parse_number("150,000"), 150000.0)
+        self.assertEqual(parse_number("1,234.5"), 1234.5)
+        self.assertEqual(parse_number("1.500"), 1.5)
+
+
+class TestPipelinePolicies(unittest.TestCase):
+    """Test retry and back-pressure policies."""
+
+    def test_retry_delay(self):
+        """Test exponential backoff with a ceiling."""
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(retry_delay(20), RETRY_MAX_SECONDS)
+
+    def test_batch_size_backpressure(self):
+        """Test that batches shrink as interactive jobs wait, then stop."""
+        self.assertEqual(batch_size(0, 16, 20), 16)
+        self.assertEqual(batch_size(10, 16, 20), 8)
+        self.assertEqual(batch_size(19, 16, 20), 1)
+        self.assertEqual(batch_size(20, 16, 20), 0)
+
+    def test_resolve_engine(self):
+        """Test resolving a pluggable engine by dotted path."""
+        self.assertIs(resolve_engine("os.path.join"), __import__("os").path.join)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Unit tests for the metrics buffer and Prometheus rendering."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.metrics import (
+    COUNTER,
+    HISTOGRAM,
+    MetricsBuffer,
+    family_name,
+    render,
+    sample_name,
+)
+
+FAMILIES = {
+    "app_request_seconds": (HISTOGRAM, "Request latency"),
+    "app_queries_total": (COUNTER, "Queries"),
+}
+
+
+class TestMetricsBuffer(unittest.TestCase):
+    """Test recording and draining samples."""
+
+    def test_counter(self):
+        """Test that counters add up per label set."""
+        buffer = MetricsBuffer()
+        buffer.inc("app_queries_total", {"endpoint": "search"}, 3)
+        buffer.inc("app_queries_total", {"endpoint": "search"}, 2)
+        buffer.inc("app_queries_total", {"endpoint": "book"})
+        samples = buffer.drain()
+        self.assertEqual(samples['app_queries_total{endpoint="search"}'], 5)
+        self.assertEqual(samples['app_queries_total{endpoint="book"}'], 1)
+        self.assertEqual(buffer.drain(), {})
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket, sum and count samples of a histogram."""
+        buffer = MetricsBuffer(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            buffer.observe("app_request_seconds", {"endpoint": "search"}, value)
+        samples = buffer.drain()
+        bucket = 'app_request_seconds_bucket{endpoint="search",le="%s"}'
+        self.assertEqual([samples[bucket % le] for le in ("0.1", "1.0", "+Inf")], [1, 2, 3])
+        self.assertEqual(samples['app_request_seconds_count{endpoint="search"}'], 3)
+        self.assertAlmostEqual(samples['app_request_seconds_sum{endpoint="search"}'], 5.55)
+
+
+class TestRender(unittest.TestCase):
+    """Test the Prometheus text format."""
+
+    def test_sample_name(self):
+        """Test sorted, escaped labels."""
+        self.assertEqual(sample_name("m"), "m")
+        self.assertEqual(
+            sample_name("m", {"b": 'say "hi"', "a": "x\\y"}), 'm{a="x\\\\y",b="say \\"hi\\""}'
+        )
+        self.assertEqual(family_name('m_bucket{le="1.0"}'), "m")
+
+    def test_render(self):
+        """Test HELP/TYPE lines, bucket order and unknown families."""
+        buffer = MetricsBuffer(buckets=(2.5, 10.0))
+        buffer.observe("app_request_seconds", {}, 1)
+        buffer.inc("app_queries_total", {}, 4)
+        buffer.inc("other_total")
+        text = render(buffer.drain(), FAMILIES)
+        lines = text.splitlines()
+        self.assertEqual(lines[0], "# HELP app_queries_total Queries")
+        self.assertEqual(lines[1], "# TYPE app_queries_total counter")
+        self.assertIn("app_queries_total 4", lines)
+        buckets = [line for line in lines if "_bucket" in line]
+        self.assertEqual(
+            buckets,
+            [
+                'app_request_seconds_bucket{le="2.5"} 1',
+                'app_request_seconds_bucket{le="10.0"} 1',
+                'app_request_seconds_bucket{le="+Inf"} 1',
+            ],
+        )
+        self.assertNotIn("other_total", text)
+        self.assertEqual(render({}, FAMILIES), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
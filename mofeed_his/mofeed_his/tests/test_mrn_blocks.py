@@ -0,0 +1,136 @@
+"""Unit tests for the hi/lo MRN block pool.
+
+The pool has no Frappe dependency, so these tests exercise it directly
+with a fake reservation function standing in for the MRN Sequence row.
+"""
+
+import threading
+import unittest
+
+from mofeed_his.mofeed_his.utils.mrn_blocks import MRNBlockPool
+
+
+class FakeSequence:
+    """Simulate the MRN Sequence row advanced by block reservations."""
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.current_value = 0
+        self.reservations = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            self.reservations += 1
+            low = self.current_value + 1
+            self.current_value += self.block_size
+            return low, self.current_value
+
+
+class TestMRNBlockPool(unittest.TestCase):
+    """Test block reservation and hand-out."""
+
+    def test_numbers_are_sequential_within_a_block(self):
+        """Test that one reservation serves a whole block in order."""
+        pool = MRNBlockPool()
+        sequence = FakeSequence(block_size=5)
+        key = ("site", "KRBHOSP", 2025)
+
+        values = [pool.take(key, sequence.reserve) for _ in range(5)]
+
+        self.assertEqual(values, [1, 2, 3, 4, 5])
+        self.assertEqual(sequence.reservations, 1)
+        self.assertEqual(pool.remaining(key), 0)
+
+    def test_new_block_reserved_when_exhausted(self):
+        """Test that a new block is reserved once the current one is used up."""
+        pool = MRNBlockPool()
+        sequence = FakeSequence(block_size=3)
+        key = ("site", "KRBHOSP", 2025)
+
+        values = [pool.take(key, sequence.reserve) for _ in range(7)]
+
+        self.assertEqual(values, [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(sequence.reservations, 3)
+        self.assertEqual(pool.remaining(key), 2)
+
+    def test_keys_are_independent(self):
+        """Test that hospitals and years draw from separate blocks."""
+        pool = MRNBlockPool()
+        krb = FakeSequence(block_size=10)
+        bgh = FakeSequence(block_size=10)
+
+        self.assertEqual(pool.take(("site", "KRBHOSP", 2025), krb.reserve), 1)
+        self.assertEqual(pool.take(("site", "BGHHOSP", 2025), bgh.reserve), 1)
+        self.assertEqual(pool.take(("site", "KRBHOSP", 2025), krb.reserve), 2)
+
+    def test_discard_leaves_a_gap(self):
+        """Test that discarding a block skips its unused numbers."""
+        pool = MRNBlockPool()
+        sequence = FakeSequence(block_size=10)
+        key = ("site", "KRBHOSP", 2025)
+
+        pool.take(key, sequence.reserve)
+        pool.discard(key)
+
+        self.assertEqual(pool.take(key, sequence.reserve), 11)
+
+    def test_invalid_block_rejected(self):
+        """Test that an empty reservation range raises."""
+        pool = MRNBlockPool()
+
+        with self.assertRaises(ValueError):
+            pool.take(("site", "KRBHOSP", 2025), lambda: (5, 4))
+
+    def test_reservation_does_not_block_other_keys(self):
+        """Test that a slow reservation only holds up its own key."""
+        pool = MRNBlockPool()
+        reserving, release = threading.Event(), threading.Event()
+
+        def slow_reserve():
+            reserving.set()
+            release.wait(5)
+            return 1, 10
+
+        slow = threading.Thread(target=pool.take, args=(("site", "KRBHOSP", 2025), slow_reserve))
+        other = threading.Thread(
+            target=pool.take, args=(("site", "BGHHOSP", 2025), FakeSequence(10).reserve)
+        )
+        slow.start()
+        try:
+            reserving.wait(5)
+            other.start()
+            other.join(2)
+            self.assertFalse(other.is_alive())
+        finally:
+            release.set()
+            slow.join()
+            other.join()
+
+        self.assertEqual(pool.remaining(("site", "KRBHOSP", 2025)), 9)
+        self.assertEqual(pool.remaining(("site", "BGHHOSP", 2025)), 9)
+
+    def test_concurrent_takes_are_unique_and_gap_free(self):
+        """Test that concurrent threads never receive the same number."""
+        pool = MRNBlockPool()
+        sequence = FakeSequence(block_size=7)
+        key = ("site", "KRBHOSP", 2025)
+        results = []
+        results_lock = threading.Lock()
+
+        def worker():
+            taken = [pool.take(key, sequence.reserve) for _ in range(50)]
+            with results_lock:
+                results.extend(taken)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), list(range(1, 401)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Unit tests for duplicate MRN detection."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.mrn_checks import duplicate_mrn, first_duplicate_mrn
+
+
+class TestFirstDuplicateMRN(unittest.TestCase):
+    """Test the batch check behind `mrn.validate_many`."""
+
+    def test_unique_batch(self):
+        """Test that a batch of new MRNs passes."""
+        self.assertIsNone(first_duplicate_mrn(["H-2025-000001", "H-2025-000002"]))
+
+    def test_repeat_within_batch(self):
+        """Test that the first MRN seen twice is reported."""
+        mrns = ["H-2025-000001", "H-2025-000002", "H-2025-000002", "H-2025-000001"]
+        self.assertEqual(first_duplicate_mrn(mrns), "H-2025-000002")
+
+    def test_repeat_before_existing(self):
+        """Test that a repeat is reported before an MRN already assigned."""
+        mrns = ["H-2025-000003", "H-2025-000002", "H-2025-000002"]
+        self.assertEqual(first_duplicate_mrn(mrns, {"H-2025-000003"}), "H-2025-000002")
+
+    def test_existing(self):
+        """Test that the lowest MRN already assigned is reported."""
+        mrns = ["H-2025-000009", "H-2025-000004", "H-2025-000005"]
+        existing = {"H-2025-000009", "H-2025-000005"}
+        self.assertEqual(first_duplicate_mrn(mrns, existing), "H-2025-000005")
+
+    def test_empty_values_ignored(self):
+        """Test that rows without an MRN are not duplicates of each other."""
+        self.assertIsNone(first_duplicate_mrn([None, "", None, "H-2025-000001"]))
+
+
+class TestDuplicateMRN(unittest.TestCase):
+    """Test reading the MRN out of duplicate-key errors, as `mrn.mrn_unique_guard` does."""
+
+    def test_mrn_column(self):
+        """Test a duplicate on a unique MRN column."""
+        message = "(1062, \"Duplicate entry 'H-2025-000001' for key 'custom_mrn'\")"
+        self.assertEqual(duplicate_mrn(message), "H-2025-000001")
+
+    def test_key_with_table_prefix(self):
+        """Test the MySQL 8 form of the key name."""
+        message = "Duplicate entry 'H-2025-000001' for key 'tabPatient.custom_mrn'"
+        self.assertEqual(duplicate_mrn(message), "H-2025-000001")
+
+    def test_patient_extension_primary_key(self):
+        """Test that a primary key duplicate on an MRN being written is an MRN duplicate."""
+        message = "(1062, \"Duplicate entry 'H-2025-000001' for key 'PRIMARY'\")"
+        self.assertEqual(duplicate_mrn(message, ["H-2025-000001"]), "H-2025-000001")
+
+    def test_other_primary_key(self):
+        """Test that a primary key duplicate on another value is not an MRN duplicate."""
+        message = "(1062, \"Duplicate entry 'PAT-00001' for key 'PRIMARY'\")"
+        self.assertIsNone(duplicate_mrn(message, ["H-2025-000001"]))
+        self.assertIsNone(duplicate_mrn(message))
+
+    def test_other_unique_key(self):
+        """Test that other unique keys are left alone."""
+        message = "(1062, \"Duplicate entry '19901234567' for key 'national_id'\")"
+        self.assertIsNone(duplicate_mrn(message))
+        self.assertIsNone(duplicate_mrn("Lock wait timeout exceeded"))
+
+    def test_postgres(self):
+        """Test the PostgreSQL forms of both kinds of duplicates."""
+        column = (
+            'duplicate key value violates unique constraint "tabPatient_custom_mrn_key"\n'
+            "DETAIL:  Key (custom_mrn)=(H-2025-000001) already exists."
+        )
+        self.assertEqual(duplicate_mrn(column), "H-2025-000001")
+        primary = (
+            'duplicate key value violates unique constraint "tabPatient Extension_pkey"\n'
+            "DETAIL:  Key (name)=(H-2025-000002) already exists."
+        )
+        self.assertEqual(duplicate_mrn(primary, ["H-2025-000002"]), "H-2025-000002")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Unit tests for hospital scoping and visit archival rules."""
+
+import datetime
+import re
+import sqlite3
+import unittest
+
+from mofeed_his.mofeed_his.utils.partitioning import (
+    OutOfScope,
+    archive_condition,
+    archive_cutoff,
+    history_table,
+    needs_history,
+    resolve_hospital,
+    visit_source,
+)
+
+
+class TestResolveHospital(unittest.TestCase):
+    """Test which hospital a request is scoped to."""
+
+    def test_unrestricted_user(self):
+        """Test that an unrestricted user gets what they ask for, else the default, else all."""
+        self.assertEqual(resolve_hospital("H2", "H1"), "H2")
+        self.assertEqual(resolve_hospital(None, "H1"), "H1")
+        self.assertIsNone(resolve_hospital())
+
+    def test_restricted_user_default(self):
+        """Test that a restricted user asking for nothing gets their default."""
+        self.assertEqual(resolve_hospital(None, "H2", ["H1", "H2"]), "H2")
+
+    def test_single_allowed_hospital(self):
+        """Test that a user restricted to one hospital needs no default."""
+        self.assertEqual(resolve_hospital(None, None, ["H1"]), "H1")
+
+    def test_hospital_outside_scope(self):
+        """Test that asking for a hospital outside the user's is refused."""
+        with self.assertRaises(OutOfScope):
+            resolve_hospital("H3", "H1", ["H1", "H2"])
+
+    def test_no_choice_among_several(self):
+        """Test that several allowed hospitals and no default is refused, not widened."""
+        with self.assertRaises(OutOfScope):
+            resolve_hospital(None, "H9", ["H1", "H2"])
+
+
+class TestArchiveCutoff(unittest.TestCase):
+    """Test the last archived day."""
+
+    def test_keeps_closed_years(self):
+        """Test that N closed years are kept besides the current one."""
+        today = datetime.date(2026, 10, 17)
+        self.assertEqual(archive_cutoff(today, 2), datetime.date(2023, 12, 31))
+        self.assertEqual(archive_cutoff(today, 0), datetime.date(2025, 12, 31))
+
+    def test_disabled(self):
+        """Test that no setting archives nothing."""
+        self.assertIsNone(archive_cutoff(datetime.date(2026, 1, 1), None))
+
+
+class TestNeedsHistory(unittest.TestCase):
+    """Test when a read has to include the history table."""
+
+    def test_nothing_archived(self):
+        """Test that nothing archived never reads history."""
+        self.assertFalse(needs_history(None, None))
+
+    def test_by_start_date(self):
+        """Test reads starting before, on and after the last archived day."""
+        through = datetime.date(2023, 12, 31)
+        self.assertTrue(needs_history(None, through))
+        self.assertTrue(needs_history("2023-12-31", through))
+        self.assertFalse(needs_history(datetime.datetime(2024, 1, 1, 8, 0), through))
+
+    def test_history_table(self):
+        """Test the history table name."""
+        self.assertEqual(history_table("Patient Appointment"), "tabPatient Appointment History")
+
+
+
+class TestArchivedReads(unittest.TestCase):
+    """Test archiving appointments and reading them back, on SQLite."""
+
+    CLOSED = ("Closed", "Checked Out", "Cancelled", "No Show")
+    LINKS = [
+        ("Patient Encounter", "appointment", None),
+        ("Sales Invoice Item", "reference_dn", "reference_dt"),
+    ]
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        for table in ("tabPatient Appointment", history_table("Patient Appointment")):
+            self.db.execute(
+                f"CREATE TABLE `{table}` (name TEXT PRIMARY KEY, appointment_date TEXT, "
+                "status TEXT, custom_clinic TEXT)"
+            )
+        self.db.execute("CREATE TABLE `tabPatient Encounter` (name TEXT, appointment TEXT)")
+        self.db.execute(
+            "CREATE TABLE `tabSales Invoice Item` (name TEXT, reference_dt TEXT, reference_dn TEXT)"
+        )
+        self.db.executemany(
+            "INSERT INTO `tabPatient Appointment` VALUES (?, ?, ?, ?)",
+            [
+                ("APT-1", "2022-03-01", "Closed", "Cardiology"),
+                ("APT-2", "2022-03-01", "Closed", "Dental"),
+                ("APT-3", "2022-03-02", "Closed", "Dental"),
+                ("APT-4", "2022-03-02", "Scheduled", "Dental"),
+                ("APT-5", "2025-03-02", "Closed", "Dental"),
+            ],
+        )
+        self.db.execute("INSERT INTO `tabPatient Encounter` VALUES ('ENC-1', 'APT-2')")
+        self.db.execute(
+            "INSERT INTO `tabSales Invoice Item` VALUES ('SII-1', 'Patient Appointment', 'APT-3')"
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def _sql(self, query, values):
+        """Run a pyformat query of the app, with its values inlined."""
+
+        def literal(match):
+            value = values[match.group(1)]
+            if isinstance(value, tuple):
+                return "(" + ", ".join(f"'{item}'" for item in value) + ")"
+            return f"'{value}'"
+
+        return self.db.execute(re.sub(r"%\((\w+)\)s", literal, query)).fetchall()
+
+    def _archive(self, through):
+        condition = archive_condition(
+            "Patient Appointment", "appointment_date", self.CLOSED, self.LINKS
+        )
+        values = {"through": through, "statuses": self.CLOSED, "doctype": "Patient Appointment"}
+        rows = self._sql(f"SELECT name FROM `tabPatient Appointment` WHERE {condition}", values)
+        names = [row[0] for row in rows]
+        batch = {"names": tuple(names)}
+        self._sql(
+            f"REPLACE INTO `{history_table('Patient Appointment')}` "
+            "SELECT * FROM `tabPatient Appointment` WHERE name IN %(names)s",
+            batch,
+        )
+        self._sql("DELETE FROM `tabPatient Appointment` WHERE name IN %(names)s", batch)
+        return sorted(names)
+
+    def _read_clinic(self, name, with_history):
+        table = visit_source("Patient Appointment", ["name", "custom_clinic"], with_history)
+        rows = self._sql(
+            f"SELECT a.custom_clinic FROM {table} a WHERE a.name = %(name)s", {"name": name}
+        )
+        return rows[0][0] if rows else None
+
+    def test_only_unlinked_closed_rows_move(self):
+        """Test that linked, open and recent appointments stay in the working table."""
+        self.assertEqual(self._archive("2023-12-31"), ["APT-1"])
+        rows = self.db.execute("SELECT name FROM `tabPatient Appointment` ORDER BY name")
+        remaining = [row[0] for row in rows]
+        self.assertEqual(remaining, ["APT-2", "APT-3", "APT-4", "APT-5"])
+
+    def test_reads_archived_appointment(self):
+        """Test that an archived appointment is read back through the history table."""
+        self._archive("2023-12-31")
+        self.assertIsNone(self._read_clinic("APT-1", with_history=False))
+        self.assertEqual(self._read_clinic("APT-1", with_history=True), "Cardiology")
+        self.assertEqual(self._read_clinic("APT-2", with_history=True), "Dental")
+
+    def test_archiving_again_is_harmless(self):
+        """Test that a second run moves nothing and leaves one copy of each row."""
+        self._archive("2023-12-31")
+        self.assertEqual(self._archive("2023-12-31"), [])
+        table = visit_source("Patient Appointment", ["name", "custom_clinic"], True)
+        self.assertEqual(self.db.execute(f"SELECT COUNT(*) FROM {table} a").fetchone()[0], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
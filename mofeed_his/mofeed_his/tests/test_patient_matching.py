@@ -0,0 +1,148 @@
+"""Unit tests for duplicate-patient blocking keys and scoring."""
+
+import datetime
+import unittest
+
+from mofeed_his.mofeed_his.utils.patient_matching import (
+    KEY_MOTHER,
+    KEY_NAME_YEAR,
+    KEY_NATIONAL_ID,
+    KEY_PHONE,
+    LIKELY_THRESHOLD,
+    POSSIBLE_THRESHOLD,
+    birth_year,
+    blocking_keys,
+    cluster_pairs,
+    phonetic_key,
+    score_pair,
+)
+
+
+class TestPhoneticKey(unittest.TestCase):
+    """Test the phonetic name key."""
+
+    def test_confusable_arabic_letters_share_key(self):
+        """Test that ص/س, ط/ت and a dropped long vowel give the same key."""
+        self.assertEqual(phonetic_key("مصطفى"), phonetic_key("مسطفا"))
+        self.assertEqual(phonetic_key("حسين"), phonetic_key("هسين"))
+
+    def test_definite_article_ignored(self):
+        """Test that 'الحسن' and 'حسن' share a key."""
+        self.assertEqual(phonetic_key("زينب الحسن"), phonetic_key("زينب حسن"))
+
+    def test_latin_transliterations_share_key(self):
+        """Test common transliteration variants."""
+        self.assertEqual(phonetic_key("Mohammed Kadhim"), phonetic_key("Muhammad Kazim"))
+
+    def test_only_first_words_used(self):
+        """Test that the key covers given and father's names only."""
+        self.assertEqual(phonetic_key("علي حسن كاظم"), phonetic_key("علي حسن جبار"))
+
+    def test_birth_year(self):
+        """Test birth year from dates and strings."""
+        self.assertEqual(birth_year(datetime.date(1990, 3, 1)), 1990)
+        self.assertEqual(birth_year("1990-03-01"), 1990)
+        self.assertIsNone(birth_year(None))
+
+
+class TestBlockingKeys(unittest.TestCase):
+    """Test blocking key generation."""
+
+    def test_all_key_types(self):
+        """Test that a complete record gets one key of each type."""
+        keys = dict(
+            blocking_keys(
+                {
+                    "patient_name": "زينب الحسن",
+                    "dob": "1990-03-01",
+                    "mobile": "+964 770 123 4567",
+                    "national_id": "١٩٩٠-١٢٣٤٥",
+                    "mother_name": "فاطمة",
+                }
+            )
+        )
+        self.assertEqual(keys[KEY_NATIONAL_ID], "199012345")
+        self.assertEqual(keys[KEY_PHONE], "1234567")
+        self.assertTrue(keys[KEY_NAME_YEAR].endswith("|1990"))
+        self.assertIn(KEY_MOTHER, keys)
+
+    def test_spelling_variants_share_keys(self):
+        """Test that two spellings of the same registration meet in a block."""
+        a = blocking_keys({"patient_name": "مصطفى كاظم", "dob": "1985-01-01", "mobile": "07701234567"})
+        b = blocking_keys({"patient_name": "مسطفا كاظم", "dob": "1985-06-30", "phone": "009647701234567"})
+        self.assertEqual(set(a), set(b))
+
+    def test_short_values_skipped(self):
+        """Test that partial phones and national IDs produce no key."""
+        self.assertEqual(blocking_keys({"mobile": "0770", "national_id": "12"}), [])
+
+    def test_name_without_year_has_no_name_key(self):
+        """Test that a name alone is too broad to block on."""
+        self.assertEqual(blocking_keys({"patient_name": "علي حسين"}), [])
+
+
+class TestScorePair(unittest.TestCase):
+    """Test pair scoring."""
+
+    def test_same_national_id_is_certain(self):
+        """Test that an identical national ID decides the match."""
+        score, reasons = score_pair({"national_id": "199012345"}, {"national_id": "1990-12345"})
+        self.assertEqual(score, 1.0)
+        self.assertEqual(reasons, ["national_id"])
+
+    def test_spelling_variant_is_likely(self):
+        """Test that a re-registration with variant spelling scores as likely."""
+        a = {
+            "patient_name": "زينب الحسن",
+            "dob": "1990-03-01",
+            "mobile": "07701234567",
+            "mother_name": "فاطمة",
+            "sex": "Female",
+        }
+        b = {
+            "patient_name": "زينب حسن",
+            "dob": "1990-03-01",
+            "primary_phone": "+9647701234567",
+            "mother_name": "فاطمه",
+            "sex": "Female",
+        }
+        score, reasons = score_pair(a, b)
+        self.assertGreaterEqual(score, LIKELY_THRESHOLD)
+        self.assertEqual(set(reasons), {"name", "dob", "phone", "mother_name"})
+
+    def test_different_people_sharing_phone(self):
+        """Test that family members sharing a phone are not likely matches."""
+        a = {"patient_name": "علي حسين", "dob": "1980-01-01", "mobile": "07701234567", "sex": "Male"}
+        b = {"patient_name": "زهراء حسين", "dob": "2010-05-05", "mobile": "07701234567", "sex": "Female"}
+        score, _ = score_pair(a, b)
+        self.assertLess(score, POSSIBLE_THRESHOLD)
+
+    def test_different_national_ids_cap_score(self):
+        """Test that conflicting national IDs keep the pair below possible."""
+        a = {"patient_name": "علي حسين", "dob": "1980-01-01", "national_id": "11111111"}
+        b = {"patient_name": "علي حسين", "dob": "1980-01-01", "national_id": "22222222"}
+        score, _ = score_pair(a, b)
+        self.assertLess(score, POSSIBLE_THRESHOLD)
+
+    def test_score_is_symmetric(self):
+        """Test that score_pair(a, b) == score_pair(b, a)."""
+        a = {"patient_name": "Mohammed Kadhim", "dob": "1975-02-02", "sex": "Male"}
+        b = {"patient_name": "Muhammad Kazim", "dob": "1975-02-02", "sex": "Male"}
+        self.assertEqual(score_pair(a, b)[0], score_pair(b, a)[0])
+
+
+class TestClusterPairs(unittest.TestCase):
+    """Test union-find clustering."""
+
+    def test_transitive_pairs_form_one_cluster(self):
+        """Test that a-b and b-c put a, b and c in one cluster."""
+        clusters = cluster_pairs([("PAT-3", "PAT-2"), ("PAT-2", "PAT-1"), ("PAT-9", "PAT-8")])
+        self.assertEqual(clusters, [["PAT-1", "PAT-2", "PAT-3"], ["PAT-8", "PAT-9"]])
+
+    def test_empty(self):
+        """Test that no pairs give no clusters."""
+        self.assertEqual(cluster_pairs([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Unit tests for visit invoice price resolution."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.price_resolution import (
+    SOURCE_CASH_PRICE_LIST,
+    SOURCE_CLINIC,
+    SOURCE_INSURANCE_PRICE_LIST,
+    SOURCE_VISIT_FEE,
+    is_follow_up,
+    is_insured,
+    normalize_lines,
+    resolve_lines,
+)
+
+CLINIC = {
+    "consultation_fee": 25000.0,
+    "followup_fee": 10000.0,
+    "services": {"ECG": 15000.0, "X-RAY": 30000.0},
+}
+CASH_RATES = {"ECG": 20000.0, "CBC": 8000.0}
+INSURANCE_RATES = {"X-RAY": 40000.0}
+
+
+class TestPayerAndVisitType(unittest.TestCase):
+    """Test payer and visit type helpers."""
+
+    def test_is_insured(self):
+        """Test that only a named insurer is insured."""
+        self.assertFalse(is_insured(None))
+        self.assertFalse(is_insured("Cash"))
+        self.assertTrue(is_insured("Iraqi Insurance Co."))
+
+    def test_is_follow_up(self):
+        """Test follow-up detection across naming styles."""
+        self.assertTrue(is_follow_up("Follow-up"))
+        self.assertTrue(is_follow_up("Follow Up Visit"))
+        self.assertFalse(is_follow_up("New Visit"))
+        self.assertFalse(is_follow_up(None))
+
+    def test_normalize_lines(self):
+        """Test codes and dicts, with empty items dropped."""
+        self.assertEqual(
+            normalize_lines(["ECG", {"item_code": "CBC", "qty": 2}, {"item": ""}]),
+            [{"item": "ECG", "qty": 1.0}, {"item": "CBC", "qty": 2.0}],
+        )
+
+
+class TestResolveLines(unittest.TestCase):
+    """Test pricing whole invoices."""
+
+    def resolve(self, items, **kwargs):
+        return resolve_lines(
+            CLINIC, items, cash_rates=CASH_RATES, insurance_rates=INSURANCE_RATES, **kwargs
+        )
+
+    def test_cash_prefers_clinic_rate(self):
+        """Test clinic rate, then cash price list, for a cash patient."""
+        result = self.resolve(["ECG", {"item": "CBC", "qty": 2}, "X-RAY"])
+        rates = [(line["rate"], line["source"]) for line in result["lines"]]
+        self.assertEqual(
+            rates,
+            [
+                (15000.0, SOURCE_CLINIC),
+                (8000.0, SOURCE_CASH_PRICE_LIST),
+                (30000.0, SOURCE_CLINIC),
+            ],
+        )
+        self.assertEqual(result["total"], 61000.0)
+
+    def test_insurance_price_list_first(self):
+        """Test that an insured patient gets insurance prices, else cash ones."""
+        result = self.resolve(["X-RAY", "ECG"], insured=True)
+        self.assertEqual(result["lines"][0]["source"], SOURCE_INSURANCE_PRICE_LIST)
+        self.assertEqual(result["lines"][0]["rate"], 40000.0)
+        self.assertEqual(result["lines"][1]["source"], SOURCE_CLINIC)
+
+    def test_visit_fee_line(self):
+        """Test consultation and follow-up fees as the first line."""
+        new_visit = self.resolve([], visit_type="New Visit")
+        self.assertEqual(new_visit["lines"][0]["rate"], 25000.0)
+        self.assertEqual(new_visit["lines"][0]["source"], SOURCE_VISIT_FEE)
+
+        follow_up = self.resolve(["ECG"], visit_type="Follow-up")
+        self.assertEqual(follow_up["lines"][0]["rate"], 10000.0)
+        self.assertEqual(follow_up["total"], 25000.0)
+
+    def test_follow_up_without_fee_uses_consultation_fee(self):
+        """Test a clinic with no follow-up fee."""
+        clinic = dict(CLINIC, followup_fee=0)
+        result = resolve_lines(clinic, [], visit_type="Follow-up")
+        self.assertEqual(result["total"], 25000.0)
+
+    def test_unpriced_items_reported(self):
+        """Test that items without any price are flagged, not priced at zero."""
+        result = self.resolve(["MRI"])
+        self.assertIsNone(result["lines"][0]["rate"])
+        self.assertEqual(result["unpriced"], ["MRI"])
+        self.assertEqual(result["total"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
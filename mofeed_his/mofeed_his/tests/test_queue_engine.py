@@ -0,0 +1,159 @@
+"""Unit tests for the waiting queue engine."""
+
+import unittest
+
+from mofeed_his.mofeed_his.tests.memory_backend import MemoryBackend
+from mofeed_his.mofeed_his.utils.queue_engine import (
+    EMERGENCY,
+    NORMAL,
+    URGENT,
+    QueueEngine,
+    queue_name,
+)
+
+QUEUE = queue_name("2025-01-01", "Dr. Zaid")
+
+
+class Clock:
+    """Settable clock, in seconds."""
+
+    def __init__(self, now=1735722000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += minutes * 60
+
+
+class TestQueueEngine(unittest.TestCase):
+    """Test queue operations on the in-memory backend."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.engine = QueueEngine(MemoryBackend(), clock=self.clock)
+
+    def check_in(self, *members, priority=NORMAL):
+        for member in members:
+            self.engine.check_in(QUEUE, member, priority, data={"patient": f"PAT-{member}"})
+            self.clock.advance(1)
+
+    def order(self):
+        return [entry["member"] for entry in self.engine.snapshot(QUEUE)]
+
+    def test_arrival_order_and_positions(self):
+        """Test that patients of one band keep arrival order."""
+        self.check_in("A1", "A2", "A3")
+        self.assertEqual(self.order(), ["A1", "A2", "A3"])
+        self.assertEqual(self.engine.position(QUEUE, "A3"), 3)
+        self.assertEqual(self.engine.length(QUEUE), 3)
+
+    def test_check_in_is_idempotent(self):
+        """Test that checking in twice keeps the original place."""
+        self.check_in("A1", "A2")
+        entry = self.engine.check_in(QUEUE, "A1")
+        self.assertEqual(entry["position"], 1)
+        self.assertEqual(self.order(), ["A1", "A2"])
+
+    def test_priority_bands(self):
+        """Test that more urgent bands go first, each in arrival order."""
+        self.check_in("N1", "N2")
+        self.check_in("U1", priority=URGENT)
+        self.check_in("E1", priority=EMERGENCY)
+        self.check_in("U2", priority=URGENT)
+        self.assertEqual(self.order(), ["E1", "U1", "U2", "N1", "N2"])
+
+    def test_call_next(self):
+        """Test that calling pops the head and reports an empty queue."""
+        self.check_in("A1", "A2")
+        self.assertEqual(self.engine.call_next(QUEUE)["member"], "A1")
+        self.assertEqual(self.engine.call_next(QUEUE)["patient"], "PAT-A2")
+        self.assertIsNone(self.engine.call_next(QUEUE))
+        self.assertIsNone(self.engine.get_entry(QUEUE, "A1"))
+
+    def test_skip_moves_back_within_band(self):
+        """Test skipping behind the next members without leaving the band."""
+        self.check_in("U1", "U2", priority=URGENT)
+        self.check_in("N1", "N2", "N3", "N4")
+
+        self.assertEqual(self.engine.skip(QUEUE, "N1", places=2), 5)
+        self.assertEqual(self.order(), ["U1", "U2", "N2", "N3", "N1", "N4"])
+
+        # Past the end of the urgent band the patient stays last urgent
+        self.assertEqual(self.engine.skip(QUEUE, "U1", places=5), 2)
+        self.assertEqual(self.order()[:3], ["U2", "U1", "N2"])
+        self.assertIsNone(self.engine.skip(QUEUE, "missing"))
+
+    def test_reprioritize_keeps_arrival(self):
+        """Test moving between bands by original arrival."""
+        self.check_in("N1", "N2")
+        self.check_in("U1", priority=URGENT)
+        self.assertEqual(self.engine.reprioritize(QUEUE, "N2", URGENT), 1)
+        self.assertEqual(self.order(), ["N2", "U1", "N1"])
+        self.assertEqual(self.engine.get_entry(QUEUE, "N2")["priority"], URGENT)
+
+    def test_remove(self):
+        """Test that a patient who left is removed once."""
+        self.check_in("A1", "A2")
+        self.assertTrue(self.engine.remove(QUEUE, "A1"))
+        self.assertFalse(self.engine.remove(QUEUE, "A1"))
+        self.assertEqual(self.order(), ["A2"])
+
+    def test_wait_estimate_learns_service_time(self):
+        """Test the moving average of time between calls."""
+        self.check_in("A1", "A2", "A3")
+        self.assertEqual(self.engine.estimate(QUEUE, "A3")["wait_minutes"], 20)
+
+        self.engine.call_next(QUEUE)
+        self.clock.advance(20)
+        self.engine.call_next(QUEUE)
+        # 10 + 0.2 * (20 - 10) = 12 minutes, one patient with the doctor
+        self.assertEqual(self.engine.service_minutes(QUEUE), 12)
+        self.assertEqual(
+            self.engine.estimate(QUEUE, "A3"),
+            {"position": 1, "ahead": 1, "wait_minutes": 12},
+        )
+
+        # A gap longer than any consultation is ignored
+        self.clock.advance(300)
+        self.engine.call_next(QUEUE)
+        self.assertEqual(self.engine.service_minutes(QUEUE), 12)
+
+    def test_load_replaces_queue(self):
+        """Test rebuilding a queue from persisted entries."""
+        self.check_in("stale")
+        self.assertFalse(self.engine.is_loaded(QUEUE))
+
+        self.engine.load(
+            QUEUE,
+            [
+                {"member": "A2", "priority": NORMAL, "offset": 2000},
+                {"member": "A1", "priority": NORMAL, "offset": 1000},
+                {"member": "E1", "priority": EMERGENCY, "offset": 3000},
+            ],
+        )
+        self.assertTrue(self.engine.is_loaded(QUEUE))
+        self.assertEqual(self.order(), ["E1", "A1", "A2"])
+
+    def test_second_load_is_dropped(self):
+        """Test that a concurrent rebuild keeps check-ins made since the first."""
+        persisted = [{"member": "A1", "priority": NORMAL, "offset": 1000}]
+        self.assertTrue(self.engine.load(QUEUE, persisted))
+        self.check_in("A2")
+
+        self.assertFalse(self.engine.load(QUEUE, persisted))
+        self.assertEqual(self.order(), ["A1", "A2"])
+        self.assertEqual(self.engine.get_entry(QUEUE, "A2")["member"], "A2")
+
+    def test_queues_are_separate(self):
+        """Test that doctors' queues do not share members."""
+        other = queue_name("2025-01-01", "Dr. Ahmed")
+        self.check_in("A1")
+        self.engine.check_in(other, "B1")
+        self.assertEqual(self.engine.length(other), 1)
+        self.assertIsNone(self.engine.position(other, "A1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
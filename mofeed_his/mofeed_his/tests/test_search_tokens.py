@@ -0,0 +1,143 @@
+"""Unit tests for Arabic normalization and patient search tokens."""
+
+import unittest
+
+from mofeed_his.mofeed_his.utils.arabic import (
+    compact,
+    ngrams,
+    normalize_arabic,
+    normalize_digits,
+    normalize_phone,
+    strip_definite_article,
+    tokenize,
+)
+from mofeed_his.mofeed_his.utils.search_tokens import (
+    MRN,
+    NAME,
+    NATIONAL_ID,
+    NGRAM,
+    PHONE,
+    patient_tokens,
+    query_terms,
+)
+
+
+class TestArabicNormalization(unittest.TestCase):
+    """Test folding of Arabic spelling variants."""
+
+    def test_alef_hamza_forms_fold_to_alef(self):
+        """Test that أ إ آ ٱ all fold to ا."""
+        self.assertEqual(normalize_arabic("أحمد"), "احمد")
+        self.assertEqual(normalize_arabic("إبراهيم"), "ابراهيم")
+        self.assertEqual(normalize_arabic("آمنة"), "امنه")
+
+    def test_taa_marbuta_and_yaa_fold(self):
+        """Test that ة folds to ه and ى/ئ fold to ي."""
+        self.assertEqual(normalize_arabic("فاطمة"), normalize_arabic("فاطمه"))
+        self.assertEqual(normalize_arabic("مصطفى"), "مصطفي")
+        self.assertEqual(normalize_arabic("هانئ"), "هاني")
+
+    def test_diacritics_and_tatweel_stripped(self):
+        """Test that harakat, shadda and tatweel are removed."""
+        self.assertEqual(normalize_arabic("مُحَمَّد"), "محمد")
+        self.assertEqual(normalize_arabic("محـــمد"), "محمد")
+
+    def test_persian_letter_forms_fold(self):
+        """Test that Kurdish/Persian yaa and kaf fold to Arabic forms."""
+        self.assertEqual(normalize_arabic("کریم"), "كريم")
+
+    def test_eastern_arabic_digits(self):
+        """Test that Eastern-Arabic and Persian digits become ASCII."""
+        self.assertEqual(normalize_digits("٠٧٧٠١٢٣"), "0770123")
+        self.assertEqual(normalize_digits("۰۷۵۰"), "0750")
+
+    def test_latin_is_casefolded(self):
+        """Test that Latin text is lowercased."""
+        self.assertEqual(normalize_arabic("Ali HASSAN"), "ali hassan")
+
+    def test_tokenize_and_article(self):
+        """Test word splitting and definite-article stripping."""
+        self.assertEqual(tokenize("زينب، الحسن"), ["زينب", "الحسن"])
+        self.assertEqual(strip_definite_article("الحسن"), "حسن")
+        self.assertIsNone(strip_definite_article("الي"))
+        self.assertIsNone(strip_definite_article("علي"))
+
+    def test_ngrams(self):
+        """Test trigram generation."""
+        self.assertEqual(ngrams("حسين"), ["حسي", "سين"])
+        self.assertEqual(ngrams("ab"), [])
+
+
+class TestPhoneNormalization(unittest.TestCase):
+    """Test Iraqi phone number folding."""
+
+    def test_local_and_international_forms_match(self):
+        """Test that 0770…, +964770… and 00964770… give the same number."""
+        expected = "7701234567"
+        self.assertEqual(normalize_phone("0770 123 4567"), expected)
+        self.assertEqual(normalize_phone("+964 770 123 4567"), expected)
+        self.assertEqual(normalize_phone("009647701234567"), expected)
+        self.assertEqual(normalize_phone("9647701234567"), expected)
+        self.assertEqual(normalize_phone("٠٧٧٠١٢٣٤٥٦٧"), expected)
+
+    def test_partial_international_prefix(self):
+        """Test that a partially typed +964 number drops the country code."""
+        self.assertEqual(normalize_phone("+964 77"), "77")
+
+    def test_empty(self):
+        """Test that empty input gives an empty string."""
+        self.assertEqual(normalize_phone(None), "")
+        self.assertEqual(normalize_phone("n/a"), "")
+
+
+class TestSearchTokens(unittest.TestCase):
+    """Test index tokens and query terms meet after normalization."""
+
+    def setUp(self):
+        self.tokens = patient_tokens(
+            {
+                "mrn": "KRBHOSP-2025-000123",
+                "patient_name": "زينب الحسن",
+                "mobile": "+964 770 123 4567",
+                "national_id": "١٩٩٠١٢٣",
+            }
+        )
+        self.by_kind = {}
+        for token, kind, _ in self.tokens:
+            self.by_kind.setdefault(kind, set()).add(token)
+
+    def test_identifier_tokens(self):
+        """Test MRN, national ID and phone tokens."""
+        self.assertEqual(compact("KRBHOSP-2025-000123"), "krbhosp2025000123")
+        self.assertEqual(self.by_kind[MRN], {"krbhosp2025000123"})
+        self.assertEqual(self.by_kind[NATIONAL_ID], {"1990123"})
+        self.assertEqual(self.by_kind[PHONE], {"7701234567"})
+
+    def test_name_tokens_include_article_variant_and_ngrams(self):
+        """Test name words, article-stripped variant and trigrams."""
+        self.assertEqual(self.by_kind[NAME], {"زينب", "الحسن", "حسن"})
+        self.assertIn("ينب", self.by_kind[NGRAM])
+
+    def test_tokens_are_distinct(self):
+        """Test that each (token, kind) appears once."""
+        keys = [(token, kind) for token, kind, _ in self.tokens]
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def test_phone_query_with_spaces_is_one_term(self):
+        """Test that a spaced phone number is searched as one term."""
+        self.assertEqual(query_terms("0770 123"), [["0770123", "770123"]])
+        self.assertEqual(query_terms("٠٧٧٠"), [["0770", "770"]])
+
+    def test_mrn_query_is_one_term(self):
+        """Test that a typed MRN is searched as one compact term."""
+        self.assertEqual(query_terms("krbhosp-2025-000123"), [["krbhosp2025000123"]])
+
+    def test_name_query_terms(self):
+        """Test that name queries fold spelling and add article variants."""
+        self.assertEqual(query_terms("فاطمة"), [["فاطمه"]])
+        self.assertEqual(query_terms("الحسن زينب"), [["الحسن", "حسن"], ["زينب"]])
+        self.assertEqual(query_terms("   "), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
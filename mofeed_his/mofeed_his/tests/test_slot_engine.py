@@ -0,0 +1,141 @@
+"""Unit tests for the slot availability engine."""
+
+import datetime
+import unittest
+
+from mofeed_his.mofeed_his.tests.memory_backend import MemoryBackend
+from mofeed_his.mofeed_his.utils.slot_engine import (
+    SlotEngine,
+    clinic_slots,
+    free_slots,
+    layout_tag,
+    pick_walk_in_slot,
+    schedule_slots,
+    slot_index,
+    to_minutes,
+)
+
+SUNDAY, FRIDAY = 6, 4
+
+
+class TestLayouts(unittest.TestCase):
+    """Test deriving slot layouts from schedules."""
+
+    def test_clinic_slots(self):
+        """Test slots of a working day and none on a day off."""
+        slots = clinic_slots(SUNDAY, "Sunday to Thursday", "09:00:00", "10:00:00", 20, 2)
+        self.assertEqual(slots, [(540, 560, 2), (560, 580, 2), (580, 600, 2)])
+        self.assertEqual(clinic_slots(FRIDAY, "Sunday to Thursday", "09:00", "10:00", 20, 2), [])
+        self.assertEqual(clinic_slots(SUNDAY, "All Week", None, "10:00", 20, 2), [])
+
+    def test_partial_last_slot_dropped(self):
+        """Test that a slot running past closing time is not offered."""
+        slots = clinic_slots(SUNDAY, "", datetime.timedelta(hours=9), "09:50", 20, 1)
+        self.assertEqual([slot[0] for slot in slots], [540, 560])
+
+    def test_schedule_slots(self):
+        """Test practitioner slots of one weekday, deduplicated and sorted."""
+        time_slots = [
+            ("Sunday", "10:00:00", "10:30:00"),
+            ("Sunday", "09:00:00", "09:30:00"),
+            ("Monday", "09:00:00", "09:30:00"),
+            ("Sunday", "09:00:00", "09:30:00"),
+        ]
+        self.assertEqual(schedule_slots(SUNDAY, time_slots), [(540, 570, 1), (600, 630, 1)])
+
+    def test_slot_index(self):
+        """Test locating the slot of a time, including gaps."""
+        slots = [(540, 570, 1), (600, 630, 1)]
+        self.assertEqual(slot_index(slots, to_minutes("09:10:00")), 0)
+        self.assertEqual(slot_index(slots, to_minutes("10:00:00")), 1)
+        self.assertIsNone(slot_index(slots, to_minutes("09:45:00")))
+        self.assertIsNone(slot_index(slots, to_minutes("08:00:00")))
+
+    def test_layout_tag_changes_with_schedule(self):
+        """Test that a different layout gets a different tag."""
+        one = clinic_slots(SUNDAY, "", "09:00", "10:00", 15, 1)
+        two = clinic_slots(SUNDAY, "", "09:00", "10:00", 20, 1)
+        self.assertEqual(layout_tag(one), layout_tag(list(one)))
+        self.assertNotEqual(layout_tag(one), layout_tag(two))
+
+
+class TestFreeSlots(unittest.TestCase):
+    """Test free slot search and walk-in placement."""
+
+    def setUp(self):
+        self.slots = clinic_slots(SUNDAY, "", "09:00", "11:00", 20, 2)
+
+    def test_free_slots_after_now(self):
+        """Test skipping past and full slots, with a limit."""
+        counts = {1: 2, 2: 1}
+        result = free_slots(self.slots, counts, after=to_minutes("09:25"), limit=2)
+        self.assertEqual(result, [(2, 580, 1), (3, 600, 2)])
+
+    def test_walk_in_takes_regular_place_nearby(self):
+        """Test a free place in the next slots is used before overbooking."""
+        self.assertEqual(pick_walk_in_slot(self.slots, {0: 2, 1: 2}, 545, 1), (2, 2))
+
+    def test_walk_in_overbooks_current_slot(self):
+        """Test overbooking the earliest nearby slot when they are all full."""
+        counts = {0: 2, 1: 2, 2: 2}
+        self.assertEqual(pick_walk_in_slot(self.slots, counts, 545, 1), (0, 3))
+
+        counts[0] = 3
+        self.assertEqual(pick_walk_in_slot(self.slots, counts, 545, 1), (1, 3))
+
+    def test_walk_in_without_overbooking_waits(self):
+        """Test a later regular place when overbooking is not allowed."""
+        counts = {0: 2, 1: 2, 2: 2}
+        self.assertEqual(pick_walk_in_slot(self.slots, counts, 545, 0), (3, 2))
+        full = {index: 2 for index in range(len(self.slots))}
+        self.assertIsNone(pick_walk_in_slot(self.slots, full, 545, 0))
+
+
+class TestSlotEngine(unittest.TestCase):
+    """Test booking counts on the in-memory backend."""
+
+    def setUp(self):
+        self.store = MemoryBackend()
+        self.engine = SlotEngine(self.store)
+
+    def test_book_until_full(self):
+        """Test that a slot takes exactly its limit."""
+        self.engine.load("clinic:A", "2025-01-05", {})
+        self.assertTrue(self.engine.book("clinic:A", "2025-01-05", 0, 2))
+        self.assertTrue(self.engine.book("clinic:A", "2025-01-05", 0, 2))
+        self.assertFalse(self.engine.book("clinic:A", "2025-01-05", 0, 2))
+        self.assertEqual(self.engine.counts("clinic:A", "2025-01-05"), {0: 2})
+
+        self.engine.release("clinic:A", "2025-01-05", 0)
+        self.assertTrue(self.engine.book("clinic:A", "2025-01-05", 0, 2))
+
+    def test_unlimited_booking_counts(self):
+        """Test counting without a limit."""
+        self.engine.load("practitioner:Z", "2025-01-05", {3: 1})
+        self.assertTrue(self.engine.book("practitioner:Z", "2025-01-05", 3))
+        self.assertEqual(self.engine.counts("practitioner:Z", "2025-01-05"), {3: 2})
+
+    def test_load_keeps_existing_counts(self):
+        """Test that a second load does not overwrite bookings."""
+        self.assertTrue(self.engine.load("clinic:A", "2025-01-05", {0: 1}))
+        self.engine.book("clinic:A", "2025-01-05", 0, 5)
+        self.assertFalse(self.engine.load("clinic:A", "2025-01-05", {0: 1}))
+        self.assertEqual(self.engine.counts("clinic:A", "2025-01-05"), {0: 2})
+
+    def test_book_on_expired_day_asks_for_reload(self):
+        """Test that booking a day that is not loaded leaves nothing behind."""
+        self.assertIsNone(self.engine.book("clinic:A", "2025-01-05", 0, 2))
+        self.assertFalse(self.engine.is_loaded("clinic:A", "2025-01-05"))
+
+    def test_release_never_goes_negative(self):
+        """Test releasing an empty slot, and a day that is not loaded."""
+        self.engine.load("clinic:A", "2025-01-05", {})
+        self.engine.release("clinic:A", "2025-01-05", 1)
+        self.assertEqual(self.engine.counts("clinic:A", "2025-01-05"), {1: 0})
+
+        self.engine.release("clinic:A", "2025-01-06", 1)
+        self.assertFalse(self.engine.is_loaded("clinic:A", "2025-01-06"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Unit tests for medical record timeline pagination."""
+
+import datetime
+import unittest
+
+from mofeed_his.mofeed_his.utils.timeline import (
+    MAX_PAGE_SIZE,
+    clamp_page_size,
+    decode_cursor,
+    encode_cursor,
+    format_time,
+    keyset_condition,
+    merge_page,
+    sort_key,
+)
+
+
+def event(source, name, date, time="09:00:00"):
+    return {"source": source, "name": name, "date": date, "time": time}
+
+
+def after(events, cursor):
+    """Events of a source list that come after a decoded cursor, newest first."""
+    if not cursor:
+        return events
+    key = (cursor["date"], cursor["time"], cursor["source"], cursor["name"])
+    return [e for e in events if sort_key(e) < key]
+
+
+class TestCursor(unittest.TestCase):
+    """Test cursor encoding."""
+
+    def test_round_trip(self):
+        """Test that a cursor decodes to the event's key."""
+        token = encode_cursor(event("lab_test", "LT-0001", "2025-03-01", "10:30:00"))
+        self.assertNotIn("=", token)
+        self.assertEqual(
+            decode_cursor(token),
+            {"date": "2025-03-01", "time": "10:30:00", "source": "lab_test", "name": "LT-0001"},
+        )
+
+    def test_empty_and_invalid(self):
+        """Test the first page and tampered tokens."""
+        self.assertIsNone(decode_cursor(None))
+        self.assertRaises(ValueError, decode_cursor, "not-a-cursor")
+        self.assertRaises(ValueError, decode_cursor, "WzIsIngiXQ")
+
+
+class TestFormatTime(unittest.TestCase):
+    """Test time normalization."""
+
+    def test_formats(self):
+        """Test timedelta, time, string and missing values."""
+        self.assertEqual(format_time(datetime.timedelta(hours=9, minutes=5)), "09:05:00")
+        self.assertEqual(format_time(datetime.time(14, 0, 7)), "14:00:07")
+        self.assertEqual(format_time("9:05:00.000000"), "09:05:00")
+        self.assertEqual(format_time(None), "00:00:00")
+
+
+class TestKeysetCondition(unittest.TestCase):
+    """Test keyset SQL generation."""
+
+    cursor = {"date": "2025-03-01", "time": "10:00:00", "source": "lab_test", "name": "LT-2"}
+
+    def test_first_page(self):
+        """Test no condition without a cursor."""
+        self.assertEqual(keyset_condition("lab_test", None, "d", "t", "n"), ("1=1", {}))
+
+    def test_tie_breaking_by_source(self):
+        """Test the condition at the cursor's own date and time per source."""
+        earlier, _ = keyset_condition("encounter", self.cursor, "d", "t", "n")
+        same, values = keyset_condition("lab_test", self.cursor, "d", "t", "n")
+        later, _ = keyset_condition("procedure", self.cursor, "d", "t", "n")
+
+        self.assertIn("t <= %(cursor_time)s", earlier)
+        self.assertIn("n < %(cursor_name)s", same)
+        self.assertNotIn("cursor_name", later)
+        self.assertEqual(values["cursor_date"], "2025-03-01")
+
+
+class TestMergePage(unittest.TestCase):
+    """Test merging sources into pages."""
+
+    def setUp(self):
+        self.sources = {
+            "encounter": [
+                event("encounter", "E3", "2025-03-02"),
+                event("encounter", "E2", "2025-03-01", "10:00:00"),
+                event("encounter", "E1", "2025-01-01"),
+            ],
+            "lab_test": [
+                event("lab_test", "L2", "2025-03-01", "10:00:00"),
+                event("lab_test", "L1", "2025-02-01"),
+            ],
+        }
+
+    def paginate(self, page_size):
+        pages, cursor = [], None
+        while True:
+            decoded = decode_cursor(cursor)
+            streams = [after(events, decoded)[: page_size + 1] for events in self.sources.values()]
+            events, cursor = merge_page(streams, page_size)
+            pages.append([e["name"] for e in events])
+            if not cursor:
+                return pages
+
+    def test_newest_first_with_stable_ties(self):
+        """Test global order, ties at the same time broken by source."""
+        self.assertEqual(self.paginate(10), [["E3", "L2", "E2", "L1", "E1"]])
+
+    def test_pages_cover_everything_once(self):
+        """Test that small pages neither skip nor repeat events."""
+        self.assertEqual(self.paginate(2), [["E3", "L2"], ["E2", "L1"], ["E1"]])
+        self.assertEqual(sum(self.paginate(1), []), ["E3", "L2", "E2", "L1", "E1"])
+
+    def test_clamp_page_size(self):
+        """Test page size bounds."""
+        self.assertEqual(clamp_page_size("5"), 5)
+        self.assertEqual(clamp_page_size(10**6), MAX_PAGE_SIZE)
+        self.assertEqual(clamp_page_size(0), 20)
+        self.assertEqual(clamp_page_size(-3), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Arabic text and Iraqi phone number normalization.
+
+Reception staff type names with or without hamza, diacritics or
+Eastern-Arabic digits, and phone numbers as 0770..., +964770... or
+00964770.... These helpers fold all of those spellings to one canonical
+form so they can be matched with plain index lookups.
+"""
+
+import re
+
+# Harakat, tanween, shadda, sukun, superscript alef and Quranic marks
+_DIACRITICS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+
+_LETTER_MAP = str.maketrans(
+    {
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        "ئ": "ي",
+        "ى": "ي",
+        "ة": "ه",
+        # Persian/Kurdish letter forms
+        "ی": "ي",
+        "ې": "ي",
+        "ک": "ك",
+        "ە": "ه",
+        "ھ": "ه",
+    }
+)
+
+# Eastern-Arabic (U+0660) and Persian (U+06F0) digits to ASCII
+_DIGIT_MAP = str.maketrans(
+    {chr(0x0660 + i): str(i) for i in range(10)} | {chr(0x06F0 + i): str(i) for i in range(10)}
+)
+
+_WORD_SPLIT = re.compile(r"[^\w]+", re.UNICODE)
+
+IRAQ_COUNTRY_CODE = "964"
+
+
+def normalize_digits(text):
+    """Convert Eastern-Arabic and Persian digits to ASCII digits."""
+    return (text or "").translate(_DIGIT_MAP)
+
+
+def normalize_arabic(text):
+    """Fold a string to its canonical search form.
+
+    - Strips diacritics and tatweel
+    - Folds alef/hamza forms to ا, ؤ to و, ئ and ى to ي, ة to ه
+    - Folds Persian/Kurdish letter forms to their Arabic equivalents
+    - Converts digits to ASCII and lowercases Latin text
+
+    Example:
+        >>> normalize_arabic("فاطِمَة")
+        'فاطمه'
+    """
+    text = normalize_digits(text)
+    text = _DIACRITICS.sub("", text).replace(_TATWEEL, "")
+    return text.translate(_LETTER_MAP).casefold().strip()
+
+
+def tokenize(text):
+    """Split normalized text into word tokens."""
+    return [token for token in _WORD_SPLIT.split(normalize_arabic(text)) if token and token != "_"]
+
+
+def strip_definite_article(token):
+    """Return the token without a leading 'ال', or None if it has none.
+
+    'الحسن' and 'حسن' are the same name to a receptionist.
+    """
+    if token.startswith("ال") and len(token) > 3:
+        return token[2:]
+    return None
+
+
+def normalize_phone(text):
+    """Reduce an Iraqi phone number to its national significant number.
+
+    Example:
+        >>> normalize_phone("0770 123 4567")
+        '7701234567'
+        >>> normalize_phone("+964 770 123 4567")
+        '7701234567'
+
+    Returns:
+        str: Digits without country code or trunk prefix, or '' if none
+    """
+    text = normalize_digits(text).strip()
+    digits = re.sub(r"\D", "", text)
+    international = text.startswith("+") or digits.startswith("00")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    # Also accept a partially typed international number such as '+964 77'
+    if digits.startswith(IRAQ_COUNTRY_CODE) and (international or len(digits) > 10):
+        digits = digits[len(IRAQ_COUNTRY_CODE) :]
+    return digits.lstrip("0")
+
+
+def compact(text):
+    """Normalize and drop every non-alphanumeric character.
+
+    Used for identifiers such as MRNs and national IDs:
+        >>> compact("KRBHOSP-2025-000123")
+        'krbhosp2025000123'
+    """
+    return "".join(ch for ch in normalize_arabic(text) if ch.isalnum())
+
+
+def ngrams(token, size=3):
+    """Return the distinct character n-grams of a token."""
+    if len(token) < size:
+        return []
+    return sorted({token[i : i + size] for i in range(len(token) - size + 1)})
@@ -0,0 +1,86 @@
+"""Statistics for the MRN allocation benchmark.
+
+Latency percentiles, throughput and the MRN audit of a benchmark run
+(`utils.mrn_benchmark`): every MRN handed out must be unique, and under
+Strict allocation the running numbers must also be gap-free. Block
+allocation leaves gaps by design (numbers still in a worker's pool when
+it exits), so its gaps are reported but not counted as a failure.
+"""
+
+import math
+import re
+
+PERCENTILES = (50, 95, 99)
+# An MRN's running number is its trailing digits; the rest is its sequence
+_MRN_NUMBER = re.compile(r"^(.*?)(\d+)$")
+MAX_REPORTED = 20
+
+
+def percentile(sorted_values, p):
+    """Return the `p`th percentile (nearest rank) of sorted values, or None."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(seconds):
+    """Summarize latencies given in seconds, in milliseconds.
+
+    Returns:
+        dict: count, mean, max and p50/p95/p99
+    """
+    values = sorted(seconds)
+    summary = {"count": len(values)}
+    summary["mean"] = _ms(sum(values) / len(values)) if values else None
+    for p in PERCENTILES:
+        value = percentile(values, p)
+        summary[f"p{p}"] = None if value is None else _ms(value)
+    summary["max"] = _ms(values[-1]) if values else None
+    return summary
+
+
+def throughput(count, elapsed_seconds):
+    """Return operations per second."""
+    return round(count / elapsed_seconds, 2) if elapsed_seconds > 0 else None
+
+
+def audit_mrns(mrns, gap_free=False):
+    """Check the MRNs of a run for duplicates and skipped numbers.
+
+    Args:
+        mrns: Every MRN handed out during the run
+        gap_free: Whether skipped numbers are a failure (Strict allocation)
+
+    Returns:
+        dict: {"count", "duplicate_count", "duplicates", "gaps", "unparsed",
+        "ok"}; `gaps` counts numbers missing between the lowest and highest
+        number of each sequence, `duplicates` and `unparsed` list up to
+        MAX_REPORTED examples each
+    """
+    seen, duplicates, unparsed = set(), set(), []
+    numbers = {}
+    for mrn in mrns:
+        if mrn in seen:
+            duplicates.add(mrn)
+            continue
+        seen.add(mrn)
+        match = _MRN_NUMBER.match(mrn or "")
+        if not match:
+            unparsed.append(mrn)
+            continue
+        numbers.setdefault(match.group(1), []).append(int(match.group(2)))
+
+    gaps = sum(max(found) - min(found) + 1 - len(found) for found in numbers.values())
+    return {
+        "count": len(mrns),
+        "duplicate_count": len(duplicates),
+        "duplicates": sorted(duplicates)[:MAX_REPORTED],
+        "gaps": gaps,
+        "unparsed": unparsed[:MAX_REPORTED],
+        "ok": not duplicates and not unparsed and not (gap_free and gaps),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
@@ -0,0 +1,112 @@
+"""Streaming readers for large CSV and XLSX files.
+
+Rows are yielded as dictionaries keyed by normalized header names
+(lowercase, spaces replaced with underscores) in fixed-size chunks, so
+a file with hundreds of thousands of rows is never loaded into memory at
+once. XLSX support requires `openpyxl`, which ships with Frappe.
+"""
+
+import csv
+import os
+
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def normalize_header(value):
+    """Normalize a column header, e.g. ' National ID ' -> 'national_id'."""
+    return "_".join(str(value or "").strip().lower().split())
+
+
+def iter_rows(path, line_numbers=False):
+    """Yield each data row of a CSV or XLSX file as a dict.
+
+    Empty cells become None and surrounding whitespace is stripped.
+    Completely empty rows are skipped.
+
+    Args:
+        path: CSV or XLSX file path
+        line_numbers: Yield ``(line_number, row)`` pairs instead, where
+            `line_number` is the row's 1-based line in the CSV file or row
+            in the sheet, for error messages that point back at the source
+    """
+    if path.lower().endswith(XLSX_EXTENSIONS):
+        records = _iter_xlsx_records(path)
+    else:
+        records = _iter_csv_records(path)
+
+    header = None
+    for line_number, record in records:
+        if header is None:
+            header = [normalize_header(cell) for cell in record]
+            continue
+
+        row = {}
+        for column, cell in zip(header, record):
+            if not column:
+                continue
+            if isinstance(cell, str):
+                cell = cell.strip() or None
+            row[column] = cell
+
+        if any(value not in (None, "") for value in row.values()):
+            yield (line_number, row) if line_numbers else row
+
+
+def iter_chunks(path, chunk_size, skip=0, line_numbers=False):
+    """Yield ``(first_row, rows)`` chunks of at most `chunk_size` rows.
+
+    Args:
+        path: CSV or XLSX file path
+        chunk_size: Maximum rows per chunk
+        skip: Number of leading data rows to skip (already processed)
+        line_numbers: Chunk ``(line_number, row)`` pairs, as `iter_rows`
+
+    `first_row` is the zero-based index of the chunk's first data row, so
+    callers can checkpoint ``first_row + len(rows)`` and resume with `skip`.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    chunk = []
+    first_row = skip
+    for index, row in enumerate(iter_rows(path, line_numbers=line_numbers)):
+        if index < skip:
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield first_row, chunk
+            first_row += len(chunk)
+            chunk = []
+
+    if chunk:
+        yield first_row, chunk
+
+
+def count_rows(path):
+    """Count data rows without keeping them in memory."""
+    return sum(1 for _ in iter_rows(path))
+
+
+def _iter_csv_records(path):
+    # utf-8-sig drops the BOM Excel adds to exported CSV files
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        line_number = 1
+        for record in reader:
+            yield line_number, record
+            # A quoted cell may span several lines
+            line_number = reader.line_num + 1
+
+
+def _iter_xlsx_records(path):
+    from openpyxl import load_workbook
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # iter_rows starts at row 1 and fills gaps with empty rows
+        yield from enumerate(workbook.active.iter_rows(values_only=True), start=1)
+    finally:
+        workbook.close()
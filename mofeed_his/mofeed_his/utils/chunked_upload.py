@@ -0,0 +1,129 @@
+"""Resumable chunked uploads into a content-addressed blob store.
+
+A large file arrives as a sequence of chunks, each its own short request.
+Every chunk is streamed to a partial file on disk at its offset, so no
+request holds more than one copy buffer in memory, and the size of the
+partial file tells a reconnecting client where to resume.
+
+A completed file is hashed with SHA-256, read from disk block by block,
+and moved to a path derived from its hash. A file already in the store
+is not stored twice: the new upload is discarded and refers to the
+existing blob.
+"""
+
+import fcntl
+import hashlib
+import os
+
+COPY_BLOCK_SIZE = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+
+# Leading bytes -> content type of the files accepted as medical documents
+SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+# DICOM files carry their signature after a 128-byte preamble
+DICOM_OFFSET = 128
+DICOM_SIGNATURE = b"DICM"
+
+
+class UploadError(ValueError):
+    """Raised when a chunk or a completed upload is rejected."""
+
+
+def received_bytes(part_path):
+    """Return how many bytes of an upload are on disk (0 before the first chunk)."""
+    try:
+        return os.path.getsize(part_path)
+    except FileNotFoundError:
+        return 0
+
+
+def write_chunk(part_path, offset, stream, file_size, max_chunk_size=DEFAULT_CHUNK_SIZE):
+    """Append one chunk to a partial upload.
+
+    Chunks must arrive in order: `offset` must equal the bytes already
+    received. A chunk sent again after a lost response is rejected, and
+    the client resumes from `received_bytes`. The partial file is locked
+    from the offset check to the end of the write, so a copy of a chunk
+    sent while the first is still being written waits and is rejected.
+
+    Args:
+        part_path: Partial file of the upload
+        offset: Position of the chunk in the file
+        stream: Readable binary stream of the chunk
+        file_size: Declared size of the whole file
+        max_chunk_size: Largest accepted chunk
+
+    Returns:
+        int: Bytes received so far
+
+    Raises:
+        UploadError: If the offset is not the resume position, or the chunk
+            is too large or runs past the declared size
+    """
+    with open(part_path, "ab") as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        received = os.fstat(part.fileno()).st_size
+        if offset != received:
+            raise UploadError(f"Expected a chunk at offset {received}, got {offset}")
+
+        limit = min(max_chunk_size, file_size - offset)
+        written = 0
+        while True:
+            block = stream.read(min(COPY_BLOCK_SIZE, limit - written + 1))
+            if not block:
+                break
+            written += len(block)
+            if written > limit:
+                part.truncate(offset)
+                raise UploadError("The chunk is larger than allowed")
+            part.write(block)
+    return offset + written
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file, read block by block."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sniff_content_type(path):
+    """Return the content type of a file from its leading bytes, or None."""
+    with open(path, "rb") as f:
+        head = f.read(DICOM_OFFSET + len(DICOM_SIGNATURE))
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[DICOM_OFFSET:] == DICOM_SIGNATURE:
+        return "application/dicom"
+    return None
+
+
+def blob_path(root, digest):
+    """Return the store path of a blob: <root>/ab/cd/abcd... for digest abcd..."""
+    return os.path.join(root, digest[:2], digest[2:4], digest)
+
+
+def store_blob(part_path, root, digest):
+    """Move a completed upload into the store, or drop it if already stored.
+
+    Returns:
+        bool: True if the blob is new, False if it was a duplicate
+    """
+    path = blob_path(root, digest)
+    if os.path.exists(path):
+        os.remove(part_path)
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Same file system, so the move is atomic: readers never see half a blob
+    os.replace(part_path, path)
+    return True
@@ -0,0 +1,259 @@
+"""Insurance claim batch generation.
+
+Writes the claim file of an `Insurance Claim Batch` in a background job,
+with a fixed number of set-based queries per page of invoices and no
+per-invoice `get_doc`:
+
+1. A page of submitted invoices for the insurer and period is read by
+   keyset (`name > last_invoice`), joined with the Patient Extension
+   insurance fields in the same query.
+2. The page's invoice lines are read in one query and split between
+   patient and insurer by the plans' coverage rules
+   (`utils.insurance_coverage`), and the diagnoses of the encounters the
+   lines bill (directly, or through their appointment) are read in
+   another.
+3. The page is grouped into claims and appended to the output file
+   (`utils.claim_writers`), then the file offset, the last invoice and
+   the running totals are committed as the checkpoint.
+
+Only one page is held in memory, however large the batch. A resumed
+batch truncates the file to the committed offset and carries on after
+the last committed invoice, so a crash mid-page writes nothing twice.
+"""
+
+import os
+import traceback
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from mofeed_his.mofeed_his.utils.claim_writers import WRITERS, build_claims
+from mofeed_his.mofeed_his.utils.insurance_coverage import apply_coverage
+
+PAGE_SIZE = 500
+JOB_TIMEOUT_SECONDS = 4 * 60 * 60
+
+
+@frappe.whitelist(methods=["POST"])
+def enqueue_claim_batch(batch):
+    """Generate, or resume, a claim batch in the background.
+
+    Args:
+        batch: Insurance Claim Batch name
+    """
+    frappe.has_permission("Insurance Claim Batch", "write", batch, throw=True)
+    if frappe.db.get_value("Insurance Claim Batch", batch, "status") == "Completed":
+        frappe.throw(
+            _("Claim batch {0} is already completed.").format(batch), frappe.ValidationError
+        )
+
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.claim_batch.generate_claim_batch",
+        queue="long",
+        timeout=JOB_TIMEOUT_SECONDS,
+        job_id=f"mofeed_his:claim_batch:{batch}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        batch=batch,
+    )
+
+
+def generate_claim_batch(batch, page_size=PAGE_SIZE):
+    """Job: write the claim file of a batch, resuming from its checkpoint.
+
+    Args:
+        batch: Insurance Claim Batch name
+        page_size: Invoices per page (one checkpoint per page)
+    """
+    state = frappe.db.get_value(
+        "Insurance Claim Batch",
+        batch,
+        [
+            "name",
+            "insurer",
+            "from_date",
+            "to_date",
+            "file_format",
+            "status",
+            "last_invoice",
+            "file_offset",
+            "invoices_written",
+            "lines_written",
+            "total_amount",
+            "claimed_amount",
+        ],
+        as_dict=True,
+    )
+    if not state or state.status == "Completed":
+        return
+
+    writer_class = WRITERS[state.file_format]
+    file_name = f"{batch}.{writer_class.extension}"
+    path = frappe.get_site_path("private", "files", file_name)
+    frappe.db.set_value("Insurance Claim Batch", batch, {"status": "Running", "error_log": None})
+    frappe.db.commit()
+
+    try:
+        resuming = bool(state.last_invoice) and os.path.exists(path)
+        if resuming:
+            # Drop whatever was written after the last committed page
+            os.truncate(path, cint(state.file_offset))
+
+        with open(path, "a" if resuming else "w", encoding="utf-8", newline="") as f:
+            writer = writer_class(
+                f,
+                {
+                    "name": batch,
+                    "insurer": state.insurer,
+                    "from_date": state.from_date,
+                    "to_date": state.to_date,
+                },
+            )
+            if not resuming:
+                writer.begin()
+                state.update(
+                    last_invoice="",
+                    invoices_written=0,
+                    lines_written=0,
+                    total_amount=0,
+                    claimed_amount=0,
+                )
+
+            while True:
+                invoices = _invoice_page(state, page_size)
+                if not invoices:
+                    break
+                names = tuple(invoice["invoice"] for invoice in invoices)
+                lines = _invoice_lines(names)
+                apply_coverage(invoices, lines)
+                claims = build_claims(invoices, lines, _diagnoses(names))
+                writer.write(claims, first=not state.invoices_written)
+                f.flush()
+                _save_checkpoint(state, claims, names[-1], os.path.getsize(path))
+                frappe.db.commit()
+
+            writer.end()
+
+        _attach_file(batch, file_name)
+        frappe.db.set_value("Insurance Claim Batch", batch, "status", "Completed")
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.db.set_value(
+            "Insurance Claim Batch",
+            batch,
+            {"status": "Failed", "error_log": traceback.format_exc()},
+        )
+        frappe.db.commit()
+        raise
+
+
+def _invoice_page(state, page_size):
+    """Read the next page of the batch's invoices with their insurance fields."""
+    return frappe.db.sql(
+        """
+        SELECT si.name AS invoice, si.posting_date, si.patient, si.patient_name,
+            e.mrn, e.insurance_plan, e.insurance_id, e.coverage_percentage, e.insurance_expiry
+        FROM `tabSales Invoice` si
+        INNER JOIN `tabPatient Extension` e ON e.patient_link = si.patient
+        WHERE si.docstatus = 1
+            AND si.is_return = 0
+            AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s
+            AND si.name > %(after)s
+            AND e.has_insurance = 1
+            AND e.insurance_company = %(insurer)s
+        ORDER BY si.name
+        LIMIT %(limit)s
+        """,
+        {
+            "from_date": state.from_date,
+            "to_date": state.to_date,
+            "after": state.last_invoice or "",
+            "insurer": state.insurer,
+            "limit": page_size,
+        },
+        as_dict=True,
+    )
+
+
+def _invoice_lines(names):
+    return frappe.db.sql(
+        """
+        SELECT parent, item_code, item_name, item_group, qty, rate, amount
+        FROM `tabSales Invoice Item`
+        WHERE parent IN %(names)s AND parenttype = 'Sales Invoice'
+        ORDER BY parent, idx
+        """,
+        {"names": names},
+        as_dict=True,
+    )
+
+
+def _diagnoses(names):
+    """Return (invoice, diagnosis) pairs of the encounters the invoices bill."""
+    return frappe.db.sql(
+        """
+        SELECT invoice, diagnosis
+        FROM (
+            SELECT sii.parent AS invoice, t.name AS encounter, d.idx, d.diagnosis
+            FROM `tabSales Invoice Item` sii
+            INNER JOIN `tabPatient Encounter` t ON t.name = sii.reference_dn
+            INNER JOIN `tabPatient Encounter Diagnosis` d
+                ON d.parent = t.name AND d.parenttype = 'Patient Encounter'
+            WHERE sii.parent IN %(names)s
+                AND sii.reference_dt = 'Patient Encounter'
+                AND t.docstatus = 1
+            UNION ALL
+            SELECT sii.parent AS invoice, t.name AS encounter, d.idx, d.diagnosis
+            FROM `tabSales Invoice Item` sii
+            INNER JOIN `tabPatient Encounter` t ON t.appointment = sii.reference_dn
+            INNER JOIN `tabPatient Encounter Diagnosis` d
+                ON d.parent = t.name AND d.parenttype = 'Patient Encounter'
+            WHERE sii.parent IN %(names)s
+                AND sii.reference_dt = 'Patient Appointment'
+                AND t.docstatus = 1
+        ) billed
+        ORDER BY invoice, encounter, idx
+        """,
+        {"names": names},
+    )
+
+
+def _save_checkpoint(state, claims, last_invoice, file_offset):
+    """Record a written page; committed by the caller with nothing else."""
+    state.last_invoice = last_invoice
+    state.invoices_written = cint(state.invoices_written) + len(claims)
+    state.lines_written = cint(state.lines_written) + sum(len(c["lines"]) for c in claims)
+    state.total_amount = flt(state.total_amount) + sum(c["total"] for c in claims)
+    state.claimed_amount = flt(state.claimed_amount) + sum(c["claimed_amount"] for c in claims)
+    frappe.db.set_value(
+        "Insurance Claim Batch",
+        state.name,
+        {
+            "last_invoice": last_invoice,
+            "file_offset": file_offset,
+            "invoices_written": state.invoices_written,
+            "lines_written": state.lines_written,
+            "total_amount": state.total_amount,
+            "claimed_amount": state.claimed_amount,
+        },
+    )
+
+
+def _attach_file(batch, file_name):
+    """Register the written file as the batch's private attachment."""
+    file_url = f"/private/files/{file_name}"
+    if not frappe.db.exists("File", {"file_url": file_url, "attached_to_name": batch}):
+        frappe.get_doc(
+            {
+                "doctype": "File",
+                "file_name": file_name,
+                "file_url": file_url,
+                "is_private": 1,
+                "attached_to_doctype": "Insurance Claim Batch",
+                "attached_to_name": batch,
+                "attached_to_field": "output_file",
+            }
+        ).insert(ignore_permissions=True)
+    frappe.db.set_value("Insurance Claim Batch", batch, "output_file", file_url)
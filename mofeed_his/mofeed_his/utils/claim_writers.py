@@ -0,0 +1,185 @@
+"""Insurance claim assembly and streaming claim file writers.
+
+A claim batch is written page by page: `build_claims` groups one page of
+invoice, line and diagnosis rows into claims, and a writer appends them
+to the open file. Nothing but the current page is held in memory.
+
+Writers are resumable: after each page the caller records the file
+offset, and a resumed run truncates the file to it and carries on, so a
+crash mid-page leaves no partial claim behind. CSV has one row per
+invoice line; JSON is one array of claims; XML one <Claim> element per
+invoice.
+"""
+
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from xml.sax.saxutils import escape, quoteattr
+
+CSV_COLUMNS = (
+    "invoice",
+    "posting_date",
+    "patient",
+    "patient_name",
+    "mrn",
+    "insurance_plan",
+    "insurance_id",
+    "coverage_percentage",
+    "diagnoses",
+    "item_code",
+    "item_name",
+    "qty",
+    "rate",
+    "amount",
+    "claimed_amount",
+)
+CLAIM_FIELDS = CSV_COLUMNS[:8]
+
+
+def build_claims(invoices, lines, diagnoses):
+    """Group one page of rows into claims.
+
+    Args:
+        invoices: Invoice dicts with CLAIM_FIELDS, in output order
+        lines: Invoice line dicts with `parent`, item_code, item_name, qty,
+            rate and amount, in line order; `insurer_amount` when coverage
+            rules have split the line, else the invoice's coverage applies
+        diagnoses: (invoice, diagnosis) pairs
+
+    Returns:
+        list: Claim dicts with the invoice fields, `diagnoses`, `lines`
+        (each with its `claimed_amount`), `total` and `claimed_amount`
+    """
+    lines_by_invoice = {}
+    for line in lines:
+        lines_by_invoice.setdefault(line["parent"], []).append(line)
+    diagnoses_by_invoice = {}
+    for invoice, diagnosis in diagnoses:
+        found = diagnoses_by_invoice.setdefault(invoice, [])
+        if diagnosis not in found:
+            found.append(diagnosis)
+
+    claims = []
+    for invoice in invoices:
+        coverage = float(invoice.get("coverage_percentage") or 0) / 100
+        claim = {field: invoice.get(field) for field in CLAIM_FIELDS}
+        claim["posting_date"] = str(claim["posting_date"])
+        claim["diagnoses"] = diagnoses_by_invoice.get(invoice["invoice"], [])
+        claim["lines"] = [
+            {
+                "item_code": line["item_code"],
+                "item_name": line["item_name"],
+                "qty": float(line["qty"] or 0),
+                "rate": float(line["rate"] or 0),
+                "amount": float(line["amount"] or 0),
+                "claimed_amount": _claimed_amount(line, coverage),
+            }
+            for line in lines_by_invoice.get(invoice["invoice"], [])
+        ]
+        claim["total"] = round(sum(line["amount"] for line in claim["lines"]), 2)
+        claim["claimed_amount"] = round(sum(line["claimed_amount"] for line in claim["lines"]), 2)
+        claims.append(claim)
+    return claims
+
+
+class ClaimWriter(ABC):
+    """Writes a claim file in pieces.
+
+    Args:
+        f: Text file open for appending
+        batch: Batch header fields (name, insurer, from_date, to_date)
+    """
+
+    extension = None
+
+    def __init__(self, f, batch):
+        self.f = f
+        self.batch = batch
+
+    def begin(self):
+        """Write the file header."""
+
+    @abstractmethod
+    def write(self, claims, first):
+        """Write claims; `first` is set for the first claims of the file."""
+
+    def end(self):
+        """Write the file footer."""
+
+
+class CsvClaimWriter(ClaimWriter):
+    extension = "csv"
+
+    def begin(self):
+        self._write_rows([CSV_COLUMNS])
+
+    def write(self, claims, first):
+        rows = []
+        for claim in claims:
+            head = [claim[field] for field in CLAIM_FIELDS] + ["; ".join(claim["diagnoses"])]
+            for line in claim["lines"]:
+                rows.append(head + [line[field] for field in CSV_COLUMNS[9:]])
+        self._write_rows(rows)
+
+    def _write_rows(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        self.f.write(buffer.getvalue())
+
+
+class JsonClaimWriter(ClaimWriter):
+    extension = "json"
+
+    def begin(self):
+        header = json.dumps({key: str(value) for key, value in self.batch.items()})
+        # The batch header, then the claims array left open for appending
+        self.f.write(header[:-1] + ', "claims": [')
+
+    def write(self, claims, first):
+        for index, claim in enumerate(claims):
+            separator = "\n" if first and index == 0 else ",\n"
+            self.f.write(separator + json.dumps(claim, ensure_ascii=False))
+
+    def end(self):
+        self.f.write("\n]}\n")
+
+
+class XmlClaimWriter(ClaimWriter):
+    extension = "xml"
+
+    def begin(self):
+        attributes = " ".join(f"{key}={quoteattr(str(value))}" for key, value in self.batch.items())
+        self.f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<ClaimBatch {attributes}>\n')
+
+    def write(self, claims, first):
+        for claim in claims:
+            parts = [f"<Claim invoice={quoteattr(claim['invoice'])}>"]
+            parts += [_element(field, claim[field]) for field in CLAIM_FIELDS[1:]]
+            parts += [_element("Diagnosis", diagnosis) for diagnosis in claim["diagnoses"]]
+            for line in claim["lines"]:
+                fields = "".join(_element(field, value) for field, value in line.items())
+                parts.append(f"<Line>{fields}</Line>")
+            parts.append(_element("total", claim["total"]))
+            parts.append(_element("claimed_amount", claim["claimed_amount"]))
+            self.f.write("  " + "".join(parts) + "</Claim>\n")
+
+    def end(self):
+        self.f.write("</ClaimBatch>\n")
+
+
+WRITERS = {
+    "CSV": CsvClaimWriter,
+    "JSON": JsonClaimWriter,
+    "XML": XmlClaimWriter,
+}
+
+
+def _element(tag, value):
+    return f"<{tag}>{escape('' if value is None else str(value))}</{tag}>"
+
+
+def _claimed_amount(line, coverage):
+    if line.get("insurer_amount") is not None:
+        return float(line["insurer_amount"])
+    return round(float(line["amount"] or 0) * coverage, 2)
@@ -0,0 +1,176 @@
+"""View model of the Reception Console.
+
+Shapes the appointment rows loaded by the console endpoint into the
+appointment list and per-doctor waiting queues, computes the ETag a
+polling desk sends back to skip unchanged refreshes, selects the
+realtime deltas a reconnecting desk missed, and reads the cursors of
+desks that sync their offline cache.
+"""
+
+import hashlib
+
+# Console states, in the order a visit moves through them
+BOOKED = "booked"
+ARRIVED = "arrived"
+IN_PROGRESS = "in-progress"
+COMPLETED = "completed"
+
+# Patient Appointment status -> console state
+APPOINTMENT_STATES = {
+    "Scheduled": BOOKED,
+    "Open": BOOKED,
+    "Confirmed": BOOKED,
+    "Checked In": ARRIVED,
+    "Checked Out": COMPLETED,
+    "Closed": COMPLETED,
+    "No Show": COMPLETED,
+}
+
+# Appointment statuses never shown on the console
+HIDDEN_STATUSES = ("Cancelled",)
+
+
+def appointment_state(status, encounter_docstatus=None):
+    """Return the console state of an appointment.
+
+    An arrived patient whose encounter has been started is in progress,
+    and one whose encounter is submitted is completed, whatever the
+    appointment status says.
+
+    Args:
+        status: Patient Appointment status
+        encounter_docstatus: docstatus of the appointment's encounter, if any
+
+    Returns:
+        str: One of BOOKED, ARRIVED, IN_PROGRESS, COMPLETED
+    """
+    state = APPOINTMENT_STATES.get(status, BOOKED)
+    if encounter_docstatus is None or state == COMPLETED:
+        return state
+    return COMPLETED if int(encounter_docstatus) == 1 else IN_PROGRESS
+
+
+def group_queues(appointments):
+    """Build the per-doctor waiting queues from today's appointments.
+
+    Args:
+        appointments: Appointment dicts with state, practitioner,
+            practitioner_name, department, arrival_time and appointment_time,
+            and queue_position, priority and wait_minutes for appointments
+            held by the waiting queue engine
+
+    Returns:
+        list: One dict per practitioner (practitioner, practitioner_name,
+        department, patients), ordered by practitioner name. Patients are
+        the arrived appointments in queue order, then any the engine does
+        not hold by arrival, with a 1-based position.
+    """
+    queues = {}
+    for row in appointments:
+        if row["state"] != ARRIVED:
+            continue
+        practitioner = row.get("practitioner") or ""
+        queue = queues.setdefault(
+            practitioner,
+            {
+                "practitioner": practitioner,
+                "practitioner_name": row.get("practitioner_name") or practitioner,
+                "department": row.get("department"),
+                "patients": [],
+            },
+        )
+        queue["patients"].append(row)
+
+    result = []
+    for queue in sorted(queues.values(), key=lambda q: q["practitioner_name"]):
+        arrived = sorted(queue["patients"], key=_queue_order)
+        queue["patients"] = [
+            {
+                "position": position,
+                "appointment": row["name"],
+                "patient": row.get("patient"),
+                "patient_name": row.get("patient_name"),
+                "arrival_time": row.get("arrival_time"),
+                "priority": row.get("priority"),
+                "wait_minutes": row.get("wait_minutes"),
+            }
+            for position, row in enumerate(arrived, start=1)
+        ]
+        result.append(queue)
+    return result
+
+
+def _queue_order(row):
+    queue_position = row.get("queue_position")
+    return (
+        queue_position is None,
+        queue_position or 0,
+        str(row.get("arrival_time") or ""),
+        str(row.get("appointment_time") or ""),
+    )
+
+
+def missed_deltas(log, since, seq):
+    """Select the deltas a reconnecting desk has not applied.
+
+    Args:
+        log: Logged deltas of the desk's scope, newest first, each with a
+            ``seq`` key
+        since: Sequence number of the last delta the desk applied
+        seq: Current sequence number of the scope
+
+    Returns:
+        tuple: ``(deltas, resync)``. Deltas are oldest first. `resync` is
+        True when the log no longer holds every missed delta, or the
+        sequence was reset, and the desk must reload instead.
+    """
+    if since == seq:
+        return [], False
+
+    deltas = [delta for delta in reversed(log) if delta["seq"] > since]
+    if since > seq or not deltas or deltas[0]["seq"] != since + 1:
+        return [], True
+    return deltas, False
+
+
+def can_check_in(status):
+    """Return whether an appointment with this status can still be checked in.
+
+    Offline check-ins are replayed later, by which time the appointment may
+    have been cancelled or closed; those are rejected rather than reopened.
+    """
+    if status in HIDDEN_STATUSES:
+        return False
+    return APPOINTMENT_STATES.get(status, BOOKED) in (BOOKED, ARRIVED)
+
+
+def make_cursor(date, scope, version, since):
+    """Return the cursor a desk sends back on its next sync.
+
+    Args:
+        date: Day the desk's cache holds
+        scope: Tag of the desk's hospital and clinic filters
+        version: Console data version the desk is up to date with
+        since: Timestamp from which rows must be sent again
+    """
+    return "|".join(str(part) for part in (date, scope, version, since))
+
+
+def parse_cursor(cursor, date, scope):
+    """Read a sync cursor.
+
+    Returns:
+        dict: {"version", "since"}, or None when the cursor is missing,
+        malformed, or of another day or scope, and the desk must take a
+        full snapshot
+    """
+    parts = (cursor or "").split("|")
+    if len(parts) != 4 or parts[0] != str(date) or parts[1] != scope or not parts[3]:
+        return None
+    return {"version": parts[2], "since": parts[3]}
+
+
+def make_etag(*parts):
+    """Return a short, stable tag for the given version parts."""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
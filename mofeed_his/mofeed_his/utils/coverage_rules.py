@@ -0,0 +1,213 @@
+"""Insurance coverage rules for splitting invoice lines.
+
+An insurance plan's Insurance Coverage Rules are compiled once into a
+`CoveragePlan`: rules indexed by item, by item group and plan-wide,
+newest first. Splitting a line is then a few dictionary lookups, and the
+rules that can apply to an item are resolved once per item and memoized,
+so a whole invoice, or every invoice of a claim batch, is split in one
+pass with no query per line.
+
+The most specific rule valid on the invoice date applies: a rule for the
+item, else for its item group or the nearest parent group, else a
+plan-wide rule. A line then splits as:
+
+1. Nothing is covered if the patient's insurance has expired or the rule
+   excludes the service.
+2. The patient pays the rule's co-pay (per unit) first.
+3. The insurer pays the coverage percentage of the rest: the rule's, or
+   the patient's `coverage_percentage` when the rule sets none.
+4. The insurer's share is capped at the rule's cap (per unit).
+
+With `explain` each line carries the steps taken, for auditors.
+"""
+
+ALL_SERVICES = "All Services"
+ITEM_GROUP = "Item Group"
+ITEM = "Item"
+
+# Parent group levels followed before giving up on a loop in the tree
+MAX_GROUP_DEPTH = 20
+
+
+class CoverageRule:
+    """One compiled coverage rule.
+
+    Args:
+        rule: Rule dict with name, applies_to, item_code, item_group,
+            excluded, coverage_percentage, copay_amount, cap_amount,
+            valid_from and valid_upto
+    """
+
+    __slots__ = (
+        "name",
+        "target",
+        "excluded",
+        "coverage",
+        "copay",
+        "cap",
+        "valid_from",
+        "valid_upto",
+    )
+
+    def __init__(self, rule):
+        self.name = rule.get("name")
+        applies_to = rule.get("applies_to") or ALL_SERVICES
+        if applies_to == ITEM:
+            self.target = f"{ITEM} {rule.get('item_code')}"
+        elif applies_to == ITEM_GROUP:
+            self.target = f"{ITEM_GROUP} {rule.get('item_group')}"
+        else:
+            self.target = ALL_SERVICES
+        self.excluded = bool(rule.get("excluded"))
+        self.coverage = float(rule.get("coverage_percentage") or 0) or None
+        self.copay = float(rule.get("copay_amount") or 0)
+        self.cap = float(rule.get("cap_amount") or 0) or None
+        self.valid_from = rule.get("valid_from")
+        self.valid_upto = rule.get("valid_upto")
+
+    def is_valid(self, on_date):
+        """Return whether the rule applies on a date (None: any date)."""
+        if on_date is None:
+            return True
+        if self.valid_from and on_date < self.valid_from:
+            return False
+        return not (self.valid_upto and on_date > self.valid_upto)
+
+
+class CoveragePlan:
+    """The compiled coverage rules of one insurance plan.
+
+    Args:
+        name: Insurance plan
+        rules: Rule dicts, see `CoverageRule`; disabled rules are left out
+            by the caller
+        group_parents: Item group -> parent item group
+    """
+
+    def __init__(self, name, rules=(), group_parents=None):
+        self.name = name
+        self._group_parents = dict(group_parents or {})
+        self._by_item, self._by_group, plan_wide = {}, {}, []
+
+        # Newest first, so the first valid rule of a level is the one to apply
+        ordered = sorted(rules, key=lambda rule: str(rule.get("valid_from") or ""), reverse=True)
+        for rule in ordered:
+            applies_to = rule.get("applies_to") or ALL_SERVICES
+            if applies_to == ITEM and rule.get("item_code"):
+                self._by_item.setdefault(rule["item_code"], []).append(CoverageRule(rule))
+            elif applies_to == ITEM_GROUP and rule.get("item_group"):
+                self._by_group.setdefault(rule["item_group"], []).append(CoverageRule(rule))
+            elif applies_to == ALL_SERVICES:
+                plan_wide.append(CoverageRule(rule))
+        self._plan_wide = tuple(plan_wide)
+        self._candidates = {}
+
+    def candidates(self, item, item_group):
+        """Return the rules that can apply to an item, most specific first."""
+        key = (item, item_group)
+        found = self._candidates.get(key)
+        if found is None:
+            found = list(self._by_item.get(item, ()))
+            group, depth = item_group, 0
+            while group and depth < MAX_GROUP_DEPTH:
+                found += self._by_group.get(group, ())
+                group, depth = self._group_parents.get(group), depth + 1
+            found = self._candidates[key] = tuple(found) + self._plan_wide
+        return found
+
+    def rule_for(self, item, item_group, on_date):
+        """Return the rule that applies to an item on a date, or None."""
+        for rule in self.candidates(item, item_group):
+            if rule.is_valid(on_date):
+                return rule
+        return None
+
+    def split(
+        self, lines, coverage_percentage, on_date=None, insurance_expiry=None, explain=False
+    ):
+        """Split invoice lines between the patient and the insurer.
+
+        Args:
+            lines: Dicts with item_code, item_group, qty and amount
+            coverage_percentage: The patient's coverage, used where a rule
+                sets none
+            on_date: Invoice date, compared with rule validity and expiry
+            insurance_expiry: Last date the patient's insurance is valid
+            explain: Add each line's `trace`
+
+        Returns:
+            dict: {"lines", "insurer_amount", "patient_amount"}. Each line
+            has item_code, amount, insurer_amount, patient_amount and
+            rule (name, or None), plus `trace` with `explain`.
+        """
+        expired = bool(insurance_expiry and on_date and on_date > insurance_expiry)
+        default_coverage = float(coverage_percentage or 0)
+
+        results = []
+        insurer_total = patient_total = 0.0
+        for line in lines:
+            qty = float(line.get("qty") or 1)
+            amount = float(line.get("amount") or 0)
+            trace = [] if explain else None
+
+            if expired:
+                rule, insurer = None, 0.0
+                if explain:
+                    trace.append(f"Insurance expired on {insurance_expiry}: not covered")
+            else:
+                rule = self.rule_for(line.get("item_code"), line.get("item_group"), on_date)
+                insurer = _insurer_share(rule, amount, qty, default_coverage, trace)
+
+            insurer = round(insurer, 2)
+            patient = round(amount - insurer, 2)
+            result = {
+                "item_code": line.get("item_code"),
+                "amount": amount,
+                "insurer_amount": insurer,
+                "patient_amount": patient,
+                "rule": rule.name if rule else None,
+            }
+            if explain:
+                result["trace"] = trace
+            results.append(result)
+            insurer_total += insurer
+            patient_total += patient
+
+        return {
+            "lines": results,
+            "insurer_amount": round(insurer_total, 2),
+            "patient_amount": round(patient_total, 2),
+        }
+
+
+def _insurer_share(rule, amount, qty, default_coverage, trace):
+    """Return the insurer's share of one line, noting each step in `trace`."""
+    if rule is None:
+        coverage = default_coverage
+        if trace is not None:
+            trace.append(f"No plan rule: patient coverage {coverage:g}%")
+    else:
+        if trace is not None:
+            trace.append(f"Rule {rule.name} ({rule.target})")
+        if rule.excluded:
+            if trace is not None:
+                trace.append("Excluded: not covered")
+            return 0.0
+        coverage = default_coverage if rule.coverage is None else rule.coverage
+        if trace is not None:
+            source = "patient" if rule.coverage is None else "rule"
+            trace.append(f"Coverage {coverage:g}% ({source})")
+
+    covered = amount
+    if rule and rule.copay:
+        copay = min(rule.copay * qty, amount)
+        covered -= copay
+        if trace is not None:
+            trace.append(f"Co-pay {copay:g} paid by the patient")
+
+    insurer = covered * coverage / 100
+    if rule and rule.cap is not None and insurer > rule.cap * qty:
+        insurer = rule.cap * qty
+        if trace is not None:
+            trace.append(f"Capped at {insurer:g}")
+    return insurer
@@ -0,0 +1,65 @@
+"""Daily visit summary rows and their deltas.
+
+Management reports read Daily Visit Summary rows, one per day, hospital,
+clinic and practitioner, instead of grouping raw encounters and invoices.
+Rows are kept up to date by adding deltas: +1 visit when an encounter is
+submitted, -1 when it is cancelled, and likewise an invoice's amounts.
+
+A row's name is derived from its key, so a delta is applied with one
+insert-or-increment statement and concurrent submits never race to
+create the same row.
+"""
+
+import hashlib
+
+MEASURES = ("visits", "invoices", "revenue", "insurance_amount", "patient_amount")
+KEY_FIELDS = ("date", "hospital", "clinic", "practitioner")
+
+
+def summary_key(date, hospital=None, clinic=None, practitioner=None):
+    """Return the key of a summary row; missing dimensions are empty strings."""
+    return (str(date), hospital or "", clinic or "", practitioner or "")
+
+
+def summary_name(key):
+    """Return the row name for a key, the same on every worker."""
+    return hashlib.sha1("\x1f".join(key).encode()).hexdigest()[:20]
+
+
+class SummaryTotals:
+    """Measures accumulated per summary key."""
+
+    def __init__(self):
+        self._totals = {}
+
+    def add(self, key, **measures):
+        """Add measures (see MEASURES) to a key's totals."""
+        totals = self._totals.get(key)
+        if totals is None:
+            totals = self._totals[key] = dict.fromkeys(MEASURES, 0)
+        for measure, value in measures.items():
+            totals[measure] += value or 0
+
+    def add_invoice(self, key, grand_total, insurance_amount, sign=1, is_return=False):
+        """Add a submitted (sign 1) or cancelled (sign -1) invoice."""
+        grand_total = float(grand_total or 0)
+        insurance_amount = float(insurance_amount or 0)
+        self.add(
+            key,
+            invoices=0 if is_return else sign,
+            revenue=sign * grand_total,
+            insurance_amount=sign * insurance_amount,
+            patient_amount=sign * round(grand_total - insurance_amount, 2),
+        )
+
+    def rows(self):
+        """Return (name, key, measures) of every key with a non-zero measure."""
+        rows = []
+        for key, totals in self._totals.items():
+            totals = {measure: round(value, 2) for measure, value in totals.items()}
+            if any(totals.values()):
+                rows.append((summary_name(key), key, totals))
+        return rows
+
+    def __len__(self):
+        return len(self._totals)
@@ -0,0 +1,286 @@
+"""Background OCR of lab reports into Lab Result rows (PDR §13).
+
+Uploaded lab reports are marked OCR Pending and read by one background
+job on the long queue, never in a web request:
+
+1. Claim a batch of due Pending documents (Processing).
+2. Rasterize and OCR them in a process pool sized to the CPU count
+   (`utils.ocr_worker`); the engine is set by the site config key
+   `ocr_engine` (default: local Tesseract).
+3. Extract name/value/range triples (`utils.lab_extraction`) and
+   bulk-insert them as Lab Result rows, replacing any rows of an
+   earlier run.
+4. Mark the batch Done with the seconds spent per stage, or schedule a
+   retry with exponential backoff; after `MAX_ATTEMPTS` it is Failed.
+
+Before each batch the job measures the jobs waiting on the interactive
+queues and shrinks the batch, or stops, so a historical backfill
+(`queue_ocr_backfill`) never starves them. The scheduler restarts the
+job while documents are pending.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import frappe
+from frappe.utils import add_to_date, now, now_datetime
+from frappe.utils.background_jobs import get_queue
+
+from mofeed_his.mofeed_his.utils.lab_extraction import extract_lab_values
+from mofeed_his.mofeed_his.utils.ocr_worker import (
+    DEFAULT_ENGINE,
+    DEFAULT_LANGUAGES,
+    MAX_ATTEMPTS,
+    OCR_CONTENT_TYPES,
+    batch_size,
+    ocr_document,
+    retry_delay,
+)
+
+OCR_JOB_ID = "mofeed_his:document_ocr"
+# Queues whose waiting jobs pause OCR
+INTERACTIVE_QUEUES = ("short", "default")
+BACKPRESSURE_JOBS = 20
+# Batches are started until this budget runs out; the scheduler resumes
+JOB_BUDGET_SECONDS = 10 * 60
+# Processing documents untouched for this long were lost with their job
+STALE_PROCESSING_MINUTES = 60
+
+RESULT_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "medical_document",
+    "patient",
+    "result_date",
+    "idx",
+    "test_name",
+    "result_value",
+    "numeric_value",
+    "unit",
+    "reference_range",
+    "reference_low",
+    "reference_high",
+    "flag",
+    "source_line",
+)
+
+
+def needs_ocr(document_type, content_type):
+    """Return True if an uploaded document should be read by OCR."""
+    return document_type == "Lab Result" and content_type in OCR_CONTENT_TYPES
+
+
+def enqueue_ocr():
+    """Start the OCR job unless it is already queued or running."""
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.document_ocr.process_ocr_queue",
+        queue="long",
+        timeout=JOB_BUDGET_SECONDS + 30 * 60,
+        job_id=OCR_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+def enqueue_pending_ocr():
+    """Scheduler: requeue lost documents and start the job if any are due."""
+    frappe.db.sql(
+        """
+        UPDATE `tabMedical Document`
+        SET ocr_status = 'Pending'
+        WHERE ocr_status = 'Processing' AND modified < %s
+        """,
+        add_to_date(now_datetime(), minutes=-STALE_PROCESSING_MINUTES),
+    )
+    if _due_documents(1):
+        enqueue_ocr()
+
+
+@frappe.whitelist(methods=["POST"])
+def queue_ocr_backfill():
+    """Queue OCR of every lab report not read yet, or that failed.
+
+    Returns:
+        int: Documents queued
+    """
+    frappe.only_for("System Manager")
+    filters = {
+        "document_type": "Lab Result",
+        "ocr_status": ["in", ["Not Required", "Failed"]],
+        "content_type": ["in", list(OCR_CONTENT_TYPES)],
+    }
+    queued = frappe.db.count("Medical Document", filters)
+    frappe.db.sql(
+        """
+        UPDATE `tabMedical Document`
+        SET ocr_status = 'Pending', ocr_attempts = 0, ocr_retry_after = NULL
+        WHERE document_type = 'Lab Result'
+            AND ocr_status IN ('Not Required', 'Failed')
+            AND content_type IN %(types)s
+        """,
+        {"types": tuple(OCR_CONTENT_TYPES)},
+    )
+    enqueue_ocr()
+    return queued
+
+
+def process_ocr_queue():
+    """Job: OCR due documents batch by batch, yielding to interactive work."""
+    deadline = time.monotonic() + JOB_BUDGET_SECONDS
+    max_batch = _pool_size() * 2
+    pool = None
+    try:
+        while time.monotonic() < deadline:
+            size = batch_size(_interactive_backlog(), max_batch, BACKPRESSURE_JOBS)
+            if not size:
+                break
+            batch = _claim(size)
+            if not batch:
+                break
+            if pool is None:
+                pool = ProcessPoolExecutor(_pool_size(), mp_context=get_context("spawn"))
+            _process_batch(pool, batch)
+            frappe.db.commit()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def _process_batch(pool, batch):
+    from mofeed_his.mofeed_his.utils.medical_documents import document_path
+
+    engine = frappe.conf.get("ocr_engine") or DEFAULT_ENGINE
+    languages = frappe.conf.get("ocr_languages") or DEFAULT_LANGUAGES
+    futures = {
+        pool.submit(
+            ocr_document, document_path(doc.content_hash), doc.content_type, engine, languages
+        ): doc
+        for doc in batch
+    }
+
+    read = []
+    for future in as_completed(futures):
+        doc = futures[future]
+        try:
+            text, timings = future.result()
+        except Exception as e:
+            _retry_later(doc, e)
+            continue
+        started = time.monotonic()
+        results = extract_lab_values(text)
+        timings["extract"] = time.monotonic() - started
+        read.append((doc, results, timings))
+
+    if not read:
+        return
+    started = time.monotonic()
+    # Keep the retries recorded above if the insert fails
+    frappe.db.savepoint("ocr_results")
+    try:
+        _replace_lab_results(read)
+    except Exception as e:
+        frappe.db.rollback(save_point="ocr_results")
+        for doc, _results, _timings in read:
+            _retry_later(doc, e)
+        return
+    elapsed = time.monotonic() - started
+    for doc, results, timings in read:
+        timings["insert"] = elapsed
+        timings["results"] = len(results)
+        _set_ocr_state(
+            doc.name, ocr_status="Done", ocr_timings=json.dumps(timings), ocr_error=None
+        )
+
+
+def _replace_lab_results(read):
+    """Replace the Lab Result rows of a batch with one delete and one insert."""
+    frappe.db.sql(
+        "DELETE FROM `tabLab Result` WHERE medical_document IN %(documents)s",
+        {"documents": tuple(doc.name for doc, _, _ in read)},
+    )
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for doc, results, _ in read:
+        for idx, result in enumerate(results, 1):
+            name = hashlib.sha1(f"{doc.name}|{idx}".encode()).hexdigest()[:20]
+            record = (name, timestamp, timestamp, user, user, doc.name, doc.patient)
+            record += (doc.document_date, idx)
+            values.append(record + tuple(result[field] for field in RESULT_FIELDS[9:]))
+    if not values:
+        return
+
+    row = "({})".format(", ".join(["%s"] * len(RESULT_FIELDS)))
+    frappe.db.sql(
+        "INSERT INTO `tabLab Result` ({fields}) VALUES {rows}".format(
+            fields=", ".join(f"`{field}`" for field in RESULT_FIELDS),
+            rows=", ".join([row] * len(values)),
+        ),
+        [value for entry in values for value in entry],
+    )
+
+
+def _retry_later(doc, error):
+    attempts = doc.ocr_attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        frappe.log_error(title=f"OCR failed for {doc.name}", message=repr(error))
+        _set_ocr_state(doc.name, ocr_status="Failed", ocr_attempts=attempts, ocr_error=str(error))
+        return
+    _set_ocr_state(
+        doc.name,
+        ocr_status="Pending",
+        ocr_attempts=attempts,
+        ocr_retry_after=add_to_date(now_datetime(), seconds=retry_delay(attempts)),
+        ocr_error=str(error),
+    )
+
+
+def _claim(limit):
+    """Mark up to `limit` due documents Processing and return them."""
+    batch = _due_documents(limit)
+    if batch:
+        frappe.db.sql(
+            """
+            UPDATE `tabMedical Document`
+            SET ocr_status = 'Processing', modified = %(now)s
+            WHERE name IN %(names)s
+            """,
+            {"now": now(), "names": tuple(doc.name for doc in batch)},
+        )
+        frappe.db.commit()
+    return batch
+
+
+def _due_documents(limit):
+    return frappe.db.sql(
+        """
+        SELECT name, patient, document_date, content_hash, content_type, ocr_attempts
+        FROM `tabMedical Document`
+        WHERE ocr_status = 'Pending'
+            AND (ocr_retry_after IS NULL OR ocr_retry_after <= %(now)s)
+        ORDER BY creation
+        LIMIT %(limit)s
+        """,
+        {"now": now(), "limit": limit},
+        as_dict=True,
+    )
+
+
+def _set_ocr_state(name, **values):
+    frappe.db.set_value("Medical Document", name, values, update_modified=False)
+
+
+def _interactive_backlog():
+    return sum(get_queue(queue).count for queue in INTERACTIVE_QUEUES)
+
+
+def _pool_size():
+    return frappe.conf.get("ocr_workers") or os.cpu_count() or 1
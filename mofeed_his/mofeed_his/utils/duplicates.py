@@ -0,0 +1,456 @@
+"""Duplicate-patient detection.
+
+Each patient is indexed under a few blocking keys in `Patient Blocking
+Key` (see `utils.patient_matching`). A new registration is compared only
+with the patients sharing one of its keys, so the cost of the check does
+not grow with the size of the Patient table.
+
+- `warn_possible_duplicates` runs on Patient validate and warns the
+  receptionist about likely duplicates without blocking the save.
+- `get_duplicate_candidates` serves the Reception Console before a new
+  patient is created.
+- `enqueue_duplicate_scan` scans the whole database for duplicate clusters
+  in parallel background jobs, one per partition of the key space, and
+  records the pairs found as `Patient Duplicate Candidate` rows.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now
+
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.patient_matching import (
+    LIKELY_THRESHOLD,
+    POSSIBLE_THRESHOLD,
+    blocking_keys,
+    cluster_pairs,
+    score_pair,
+)
+
+MAX_CANDIDATES = 200
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+REBUILD_CHUNK_SIZE = 2000
+
+DEFAULT_PARTITIONS = 4
+SCAN_CHUNK_SIZE = 500
+# Keys shared by more patients than this (a clinic phone, a common name
+# born in a common year) say nothing about identity and are skipped
+MAX_BLOCK_SIZE = 50
+SCAN_COUNTER_KEY = "mofeed_his:duplicate_scan"
+
+IDENTITY_FIELDS = ("patient_name", "dob", "sex", "mobile", "phone")
+
+KEY_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "patient",
+    "hospital",
+    "key_type",
+    "block_key",
+]
+
+CANDIDATE_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "patient",
+    "patient_name",
+    "duplicate_of",
+    "duplicate_of_name",
+    "status",
+    "score",
+    "reasons",
+]
+
+
+def index_blocking_keys(patient_names):
+    """Rebuild the blocking keys of the given patients.
+
+    Costs one read, one delete and one multi-row insert however many
+    patients are passed.
+    """
+    names = list({name for name in patient_names if name})
+    if not names:
+        return
+
+    records = _load_records(names)
+    frappe.db.delete("Patient Blocking Key", {"patient": ("in", names)})
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for record in records.values():
+        for key_type, key in blocking_keys(record):
+            values.append(
+                (
+                    frappe.generate_hash(length=12),
+                    timestamp,
+                    timestamp,
+                    user,
+                    user,
+                    record.name,
+                    record.hospital,
+                    key_type,
+                    key,
+                )
+            )
+
+    if values:
+        frappe.db.bulk_insert("Patient Blocking Key", KEY_FIELDS, values)
+
+
+def update_patient_keys(doc, method=None):
+    """Hook: re-key a Patient after insert or update."""
+    index_blocking_keys([doc.name])
+
+
+def remove_patient_keys(doc, method=None):
+    """Hook: drop the keys and candidate pairs of a deleted Patient."""
+    frappe.db.delete("Patient Blocking Key", {"patient": doc.name})
+    frappe.db.delete("Patient Duplicate Candidate", {"patient": doc.name})
+    frappe.db.delete("Patient Duplicate Candidate", {"duplicate_of": doc.name})
+
+
+def update_extension_keys(doc, method=None):
+    """Hook: re-key the patient of a changed or deleted Patient Extension."""
+    if doc.patient_link:
+        index_blocking_keys([doc.patient_link])
+
+
+def rebuild_blocking_keys():
+    """Rebuild the keys of every patient, committing per chunk.
+
+    Run from the install patch or with
+    `bench --site mysite execute mofeed_his.mofeed_his.utils.duplicates.rebuild_blocking_keys`.
+    """
+    last_name = ""
+    while True:
+        names = frappe.get_all(
+            "Patient",
+            filters={"name": (">", last_name)},
+            order_by="name asc",
+            limit=REBUILD_CHUNK_SIZE,
+            pluck="name",
+        )
+        if not names:
+            break
+
+        index_blocking_keys(names)
+        frappe.db.commit()
+        last_name = names[-1]
+
+
+def find_duplicate_candidates(record, exclude=None, limit=DEFAULT_LIMIT, hospital=None):
+    """Score the patients sharing a blocking key with a record.
+
+    Args:
+        record: Patient record mapping (see `patient_matching.blocking_keys`)
+        exclude: Patient name to leave out, usually the record itself
+        limit: Maximum number of candidates returned
+        hospital: Only consider patients of this hospital
+
+    Returns:
+        list: Candidate dicts (name, patient_name, mrn, dob, mobile,
+        national_id, score, reasons) with score >= POSSIBLE_THRESHOLD,
+        best first
+    """
+    keys = [key for key_type, key in blocking_keys(record)]
+    if not keys:
+        return []
+
+    hospital_condition = "AND hospital = %(hospital)s" if hospital else ""
+    names = frappe.db.sql_list(
+        f"""
+        SELECT DISTINCT patient
+        FROM `tabPatient Blocking Key`
+        WHERE block_key IN %(keys)s AND patient != %(exclude)s {hospital_condition}
+        LIMIT %(max_candidates)s
+        """,
+        {
+            "keys": tuple(keys),
+            "exclude": exclude or "",
+            "hospital": hospital,
+            "max_candidates": MAX_CANDIDATES,
+        },
+    )
+
+    candidates = []
+    for candidate in _load_records(names).values():
+        score, reasons = score_pair(record, candidate)
+        if score >= POSSIBLE_THRESHOLD:
+            candidate.score = score
+            candidate.reasons = reasons
+            candidates.append(candidate)
+
+    candidates.sort(key=lambda candidate: candidate.score, reverse=True)
+    return candidates[:limit]
+
+
+@frappe.whitelist()
+@hospital_scoped
+def get_duplicate_candidates(
+    patient_name=None,
+    dob=None,
+    sex=None,
+    mobile=None,
+    national_id=None,
+    mother_name=None,
+    patient=None,
+    hospital=None,
+    limit=DEFAULT_LIMIT,
+):
+    """Return likely existing patients for registration details.
+
+    Called by the Reception Console before a new patient is created.
+
+    Args:
+        patient_name: Full name as typed
+        dob: Date of birth (YYYY-MM-DD)
+        sex: Sex
+        mobile: Any phone number of the patient
+        national_id: National ID
+        mother_name: Mother's name
+        patient: Existing patient to exclude when editing
+        hospital: Restrict candidates to one hospital; the user's default
+            hospital if not given (see `hospital_scope`)
+        limit: Maximum number of candidates
+
+    Returns:
+        list: See `find_duplicate_candidates`
+    """
+    frappe.has_permission("Patient", "read", throw=True)
+
+    record = frappe._dict(
+        patient_name=patient_name,
+        dob=dob,
+        sex=sex,
+        mobile=mobile,
+        national_id=national_id,
+        mother_name=mother_name,
+    )
+    limit = min(cint(limit) or DEFAULT_LIMIT, MAX_LIMIT)
+    return find_duplicate_candidates(record, exclude=patient, limit=limit, hospital=hospital)
+
+
+def warn_possible_duplicates(doc, method=None):
+    """Hook: warn when a Patient being saved looks like an existing one.
+
+    Runs for new patients and when identity fields change. It never blocks
+    the save: a family sharing a phone, or twins, are legitimate.
+    """
+    if doc.flags.ignore_duplicate_check or frappe.flags.in_import or frappe.flags.in_patch:
+        return
+    if not doc.is_new() and not any(doc.has_value_changed(field) for field in IDENTITY_FIELDS):
+        return
+
+    record = frappe._dict({field: doc.get(field) for field in IDENTITY_FIELDS})
+    candidates = [
+        candidate
+        for candidate in find_duplicate_candidates(record, exclude=doc.name)
+        if candidate.score >= LIKELY_THRESHOLD
+    ]
+    if not candidates:
+        return
+
+    rows = "".join(
+        "<li>{0} ({1}){2}</li>".format(
+            frappe.utils.get_link_to_form(
+                "Patient", candidate.name, frappe.utils.escape_html(candidate.patient_name)
+            ),
+            frappe.utils.escape_html(candidate.mrn or candidate.name),
+            f" - {frappe.utils.escape_html(candidate.mobile)}" if candidate.mobile else "",
+        )
+        for candidate in candidates
+    )
+    frappe.msgprint(
+        _("This patient may already be registered:") + f"<ul>{rows}</ul>",
+        title=_("Possible Duplicate Patient"),
+        indicator="orange",
+    )
+
+
+@frappe.whitelist()
+def enqueue_duplicate_scan(partitions=DEFAULT_PARTITIONS):
+    """Scan all patients for duplicates in parallel background jobs.
+
+    The blocking keys are split into `partitions` disjoint sets by
+    ``CRC32(block_key)``, and each set is scanned by its own job on the
+    long queue. The job that finishes last groups the pairs into clusters.
+
+    Args:
+        partitions: Number of parallel jobs
+
+    Returns:
+        str: Scan id
+    """
+    frappe.only_for("System Manager")
+
+    partitions = max(cint(partitions), 1)
+    scan_id = frappe.generate_hash(length=10)
+    cache = frappe.cache()
+    cache.set(cache.make_key(f"{SCAN_COUNTER_KEY}:{scan_id}"), 0, ex=24 * 60 * 60)
+
+    for partition in range(partitions):
+        frappe.enqueue(
+            "mofeed_his.mofeed_his.utils.duplicates.scan_partition",
+            queue="long",
+            timeout=6 * 60 * 60,
+            job_id=f"mofeed_his:duplicate_scan:{scan_id}:{partition}",
+            scan_id=scan_id,
+            partition=partition,
+            partitions=partitions,
+        )
+
+    return scan_id
+
+
+def scan_partition(scan_id, partition, partitions):
+    """Score every block of one key partition and record the pairs found.
+
+    Pairs are named after their two patients, so a pair found through
+    several keys, in several partitions or by an earlier scan is stored
+    once, and a reviewed status is never overwritten.
+    """
+    last_key = ""
+    while True:
+        keys = frappe.db.sql_list(
+            """
+            SELECT block_key
+            FROM `tabPatient Blocking Key`
+            WHERE CRC32(block_key) %% %(partitions)s = %(partition)s AND block_key > %(last_key)s
+            GROUP BY block_key
+            HAVING COUNT(*) BETWEEN 2 AND %(max_block_size)s
+            ORDER BY block_key
+            LIMIT %(limit)s
+            """,
+            {
+                "partitions": partitions,
+                "partition": partition,
+                "last_key": last_key,
+                "max_block_size": MAX_BLOCK_SIZE,
+                "limit": SCAN_CHUNK_SIZE,
+            },
+        )
+        if not keys:
+            break
+
+        _score_blocks(keys)
+        frappe.db.commit()
+        last_key = keys[-1]
+
+    cache = frappe.cache()
+    finished = cache.incr(cache.make_key(f"{SCAN_COUNTER_KEY}:{scan_id}"))
+    if finished == partitions:
+        assign_clusters()
+
+
+def assign_clusters():
+    """Group the open candidate pairs into clusters of the same person.
+
+    The cluster id is the smallest patient name in the cluster.
+    """
+    pairs = frappe.get_all(
+        "Patient Duplicate Candidate",
+        filters={"status": ("!=", "Dismissed")},
+        fields=["name", "patient", "duplicate_of"],
+    )
+
+    cluster_of = {}
+    for members in cluster_pairs((pair.patient, pair.duplicate_of) for pair in pairs):
+        for member in members:
+            cluster_of[member] = members[0]
+
+    by_cluster = {}
+    for pair in pairs:
+        by_cluster.setdefault(cluster_of[pair.patient], []).append(pair.name)
+
+    for cluster, names in by_cluster.items():
+        frappe.db.sql(
+            """
+            UPDATE `tabPatient Duplicate Candidate`
+            SET cluster = %(cluster)s
+            WHERE name IN %(names)s
+            """,
+            {"cluster": cluster, "names": tuple(names)},
+        )
+    frappe.db.commit()
+
+
+def _score_blocks(keys):
+    """Score all pairs within the given blocks and insert the matches."""
+    members = frappe.db.sql(
+        """
+        SELECT block_key, patient
+        FROM `tabPatient Blocking Key`
+        WHERE block_key IN %(keys)s
+        """,
+        {"keys": tuple(keys)},
+    )
+
+    blocks = {}
+    for key, patient in members:
+        blocks.setdefault(key, set()).add(patient)
+
+    records = _load_records({patient for _, patient in members})
+
+    scored = set()
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for patients in blocks.values():
+        patients = sorted(patients)
+        for i, a in enumerate(patients):
+            for b in patients[i + 1 :]:
+                if (a, b) in scored or a not in records or b not in records:
+                    continue
+                scored.add((a, b))
+
+                score, reasons = score_pair(records[a], records[b])
+                if score >= POSSIBLE_THRESHOLD:
+                    values.append(
+                        (
+                            f"{a}::{b}"[:140],
+                            timestamp,
+                            timestamp,
+                            user,
+                            user,
+                            a,
+                            records[a].patient_name,
+                            b,
+                            records[b].patient_name,
+                            "Open",
+                            score,
+                            ", ".join(reasons),
+                        )
+                    )
+
+    if values:
+        frappe.db.bulk_insert(
+            "Patient Duplicate Candidate", CANDIDATE_FIELDS, values, ignore_duplicates=True
+        )
+
+
+def _load_records(names):
+    """Load the matching fields of patients, keyed by name."""
+    if not names:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT p.name, p.patient_name, p.custom_mrn AS mrn, p.dob, p.sex, p.mobile, p.phone,
+            COALESCE(p.custom_hospital, e.hospital) AS hospital,
+            e.national_id, e.primary_phone, e.secondary_phone, e.mother_name
+        FROM `tabPatient` p
+        LEFT JOIN `tabPatient Extension` e ON e.patient_link = p.name
+        WHERE p.name IN %(names)s
+        """,
+        {"names": tuple(names)},
+        as_dict=True,
+    )
+    return {row.name: row for row in rows}
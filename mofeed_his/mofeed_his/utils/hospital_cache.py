@@ -0,0 +1,111 @@
+"""Site-level cache of Hospital data used on every registration.
+
+Patient registration needs the default hospital and, for a hospital,
+its code, MRN prefix, active flag and MRN allocation settings. These
+almost never change, so they are kept in the site's Redis cache, which
+Frappe also mirrors per request in `frappe.local.cache`. Looking them up
+costs no database round trips once the cache is warm.
+
+The cache is cleared by doc events on Hospital and Mofeed HIS Settings
+(see `hooks.py`).
+"""
+
+import frappe
+
+from mofeed_his.mofeed_his.utils.instrumentation import counted
+
+HOSPITAL_CACHE_KEY = "mofeed_his:hospital"
+HOSPITAL_BY_CODE_CACHE_KEY = "mofeed_his:hospital_by_code"
+DEFAULT_HOSPITAL_CACHE_KEY = "mofeed_his:default_hospital"
+
+# Optional Hospital fields, cached when the doctype has them
+OPTIONAL_FIELDS = ("mrn_prefix", "is_active", "mrn_allocation", "mrn_block_size")
+
+
+def get_hospital(hospital):
+    """Return cached data for a Hospital.
+
+    Args:
+        hospital: Hospital document name
+
+    Returns:
+        frappe._dict: name, code and the optional MRN fields,
+        or None if the hospital does not exist
+    """
+    if not hospital:
+        return None
+
+    data = frappe.cache().hget(
+        HOSPITAL_CACHE_KEY,
+        hospital,
+        generator=counted("hospital", lambda: _load_hospital(hospital)),
+    )
+    return frappe._dict(data) if data else None
+
+
+def get_hospital_by_code(hospital_code):
+    """Return cached data for the Hospital with the given code.
+
+    Args:
+        hospital_code: Hospital code (case-insensitive)
+
+    Returns:
+        frappe._dict: Same as `get_hospital`, or None if no hospital has the code
+    """
+    if not hospital_code:
+        return None
+
+    hospital_code = hospital_code.upper()
+    hospital = frappe.cache().hget(
+        HOSPITAL_BY_CODE_CACHE_KEY,
+        hospital_code,
+        generator=counted(
+            "hospital_by_code",
+            lambda: frappe.db.get_value("Hospital", {"code": hospital_code}, "name"),
+        ),
+    )
+    return get_hospital(hospital)
+
+
+def get_default_hospital():
+    """Return the default Hospital name, resolved once per site.
+
+    Uses `default_hospital` from Mofeed HIS Settings when that doctype
+    exists, otherwise the first hospital created.
+
+    Returns:
+        str: Hospital name, or None if no hospital is configured
+    """
+    return frappe.cache().get_value(
+        DEFAULT_HOSPITAL_CACHE_KEY,
+        generator=counted("default_hospital", _resolve_default_hospital),
+    )
+
+
+def clear_hospital_cache(doc=None, method=None, *args, **kwargs):
+    """Clear cached hospital data.
+
+    Hooked to Hospital and Mofeed HIS Settings `on_update`, `on_trash` and
+    `after_rename`. Everything is cleared because a rename or code change
+    also affects the code lookup and the default hospital.
+    """
+    cache = frappe.cache()
+    cache.delete_value(HOSPITAL_CACHE_KEY)
+    cache.delete_value(HOSPITAL_BY_CODE_CACHE_KEY)
+    cache.delete_value(DEFAULT_HOSPITAL_CACHE_KEY)
+
+
+def _load_hospital(hospital):
+    meta = frappe.get_meta("Hospital")
+    fields = ["name", "code"] + [field for field in OPTIONAL_FIELDS if meta.has_field(field)]
+    return frappe.db.get_value("Hospital", hospital, fields, as_dict=True)
+
+
+def _resolve_default_hospital():
+    if frappe.db.exists("DocType", "Mofeed HIS Settings"):
+        default_hospital = frappe.db.get_single_value("Mofeed HIS Settings", "default_hospital")
+        if default_hospital:
+            return default_hospital
+
+    # Fallback: the first hospital
+    return frappe.db.get_value("Hospital", filters={}, fieldname="name", order_by="creation asc")
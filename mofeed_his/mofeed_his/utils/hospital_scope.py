@@ -0,0 +1,162 @@
+"""Hospital scoping of this app's whitelisted methods.
+
+Several facilities share one site, and almost every hot query filters by
+hospital first. Methods decorated with `hospital_scoped` get their
+`hospital` argument resolved for the session user (`utils.partitioning`):
+
+- a user restricted to hospitals by User Permissions only sees those; a
+  hospital outside them is refused
+- a request naming no hospital gets the user's default hospital
+- unrestricted users without a default still see every hospital
+- a method that works on one patient, clinic or appointment rather than
+  on a hospital names those arguments, and a record of a hospital out of
+  scope is refused
+
+Frappe's own list views are scoped by the same User Permissions. The
+composite indexes behind hospital-first queries are listed in
+HOSPITAL_INDEXES and added after every install and migrate (`install`).
+"""
+
+import functools
+import inspect
+
+import frappe
+from frappe import _
+from frappe.core.doctype.user_permission.user_permission import get_user_permissions
+
+from mofeed_his.mofeed_his.utils.partitioning import OutOfScope, resolve_hospital
+
+# Composite indexes of hospital-first and date-first queries, by doctype
+HOSPITAL_INDEXES = {
+    "Patient": {
+        "hospital_mrn_index": ["custom_hospital", "custom_mrn"],
+        "hospital_creation_index": ["custom_hospital", "creation"],
+    },
+    "Patient Extension": {
+        "hospital_mrn_index": ["hospital", "mrn"],
+    },
+    "Clinic": {
+        "hospital_active_index": ["hospital", "is_active"],
+    },
+    "Patient Appointment": {
+        "date_status_index": ["appointment_date", "status"],
+        "clinic_date_status_index": ["custom_clinic", "appointment_date", "status"],
+    },
+    "Daily Visit Summary": {
+        "hospital_date_index": ["hospital", "date"],
+    },
+}
+
+# Roles that are never restricted to a hospital
+UNRESTRICTED_ROLES = ("System Manager",)
+
+# Doctype -> field holding its hospital, and the doctype that field links
+# to when the hospital is found through it
+RECORD_HOSPITAL = {
+    "Patient": ("custom_hospital", None),
+    "Clinic": ("hospital", None),
+    "Patient Appointment": ("patient", "Patient"),
+}
+
+
+def hospital_scoped(method=None, **records):
+    """Decorator: limit a method to the hospitals of the session user.
+
+    Place it under `@frappe.whitelist()`. A `hospital` argument of the method
+    is resolved by `get_scoped_hospital`. Arguments named in `records`, as
+    argument -> doctype of `RECORD_HOSPITAL`, must name a record of that
+    hospital, or of a hospital the user may see if the method takes none:
+
+        @frappe.whitelist()
+        @hospital_scoped(patient="Patient", clinic="Clinic")
+        def book_walk_in(patient, clinic, practitioner=None): ...
+
+    Raises:
+        frappe.PermissionError: If the user may not see the hospital asked
+            for, or the hospital of a record
+    """
+    if method is None:
+        return functools.partial(hospital_scoped, **records)
+
+    signature = inspect.signature(method)
+    takes_hospital = "hospital" in signature.parameters
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        hospital = None
+        if takes_hospital:
+            hospital = arguments["hospital"] = get_scoped_hospital(arguments.get("hospital"))
+        for argument, doctype in records.items():
+            if arguments.get(argument):
+                check_record_hospital(doctype, arguments[argument], hospital)
+        return method(**arguments)
+
+    # Frappe passes request arguments by the names the method declares
+    wrapper.fnargs = list(signature.parameters)
+    return wrapper
+
+
+def get_scoped_hospital(hospital=None, user=None):
+    """Return the hospital a request of `user` is limited to; None for all."""
+    user = user or frappe.session.user
+    try:
+        return resolve_hospital(
+            hospital,
+            frappe.defaults.get_user_default("Hospital", user=user),
+            get_allowed_hospitals(user),
+        )
+    except OutOfScope:
+        if hospital:
+            frappe.throw(
+                _("You are not permitted to access hospital {0}").format(hospital),
+                frappe.PermissionError,
+            )
+        frappe.throw(_("Select a hospital"), frappe.PermissionError)
+
+
+def check_record_hospital(doctype, name, hospital=None, user=None):
+    """Refuse a record of a hospital out of the request's scope.
+
+    Args:
+        doctype: A doctype of `RECORD_HOSPITAL`
+        name: The record
+        hospital: Scoped hospital of the request; if None, any hospital
+            the user may see
+        user: Defaults to the session user
+
+    Raises:
+        frappe.PermissionError: If the record belongs to another hospital
+    """
+    record_hospital = get_record_hospital(doctype, name)
+    if not record_hospital:
+        # Records of no hospital are shared by all
+        return
+    allowed = [hospital] if hospital else get_allowed_hospitals(user)
+    if allowed is not None and record_hospital not in allowed:
+        frappe.throw(
+            _("{0} {1} belongs to another hospital").format(_(doctype), name),
+            frappe.PermissionError,
+        )
+
+
+def get_record_hospital(doctype, name):
+    """Return the hospital of a record of `RECORD_HOSPITAL`, or None."""
+    while name:
+        fieldname, linked_doctype = RECORD_HOSPITAL[doctype]
+        name = frappe.db.get_value(doctype, name, fieldname, cache=True)
+        if not linked_doctype:
+            return name
+        doctype = linked_doctype
+    return None
+
+
+def get_allowed_hospitals(user=None):
+    """Return the hospitals a user is restricted to, or None if unrestricted."""
+    user = user or frappe.session.user
+    if user == "Administrator" or set(UNRESTRICTED_ROLES) & set(frappe.get_roles(user)):
+        return None
+    permissions = get_user_permissions(user).get("Hospital")
+    if not permissions:
+        return None
+    return sorted({permission["doc"] for permission in permissions})
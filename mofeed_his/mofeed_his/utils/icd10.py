@@ -0,0 +1,210 @@
+"""ICD-10 diagnosis search for the doctor workbench.
+
+Each worker builds one `Icd10Index` per site from the ICD10 Code table
+and keeps it in memory, so a keystroke costs a few dictionary and binary
+search lookups instead of a LIKE scan over 70k rows. A version stamp in
+the site cache tells workers to rebuild: it changes whenever a code is
+saved or deleted, or a bulk import finishes.
+
+Each doctor's picks are counted in the cache (`record_icd10_use`) and
+boost their frequent and recent codes in `search_icd10`.
+"""
+
+import time
+
+import frappe
+from frappe.utils import cint, now
+
+from mofeed_his.mofeed_his.utils.chunked_reader import iter_chunks
+from mofeed_his.mofeed_his.utils.icd10_index import (
+    DEFAULT_LIMIT,
+    Icd10Index,
+    usage_boost,
+)
+
+VERSION_KEY = "mofeed_his:icd10_version"
+USAGE_KEY = "mofeed_his:icd10_usage"
+DEFAULT_CHUNK_SIZE = 2000
+MAX_LIMIT = 50
+# Codes remembered per doctor; the weakest are forgotten first
+MAX_USAGE_ENTRIES = 200
+IMPORT_JOB_ID = "mofeed_his:import_icd10_codes"
+
+# site -> (version, Icd10Index), per worker process
+_indexes = {}
+
+
+@frappe.whitelist()
+def search_icd10(txt=None, limit=DEFAULT_LIMIT):
+    """Return ICD-10 codes matching typed text, best first.
+
+    Args:
+        txt: A code prefix ("E11", "e119") or words of the English or
+            Arabic description; the last word may be incomplete.
+            Empty returns the user's frequent codes.
+        limit: Maximum results, at most `MAX_LIMIT`
+
+    Returns:
+        list: {"code", "description", "description_ar", "score"} dicts
+    """
+    frappe.has_permission("ICD10 Code", "read", throw=True)
+
+    limit = min(max(cint(limit) or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    return get_index().search(txt, limit=limit, boosts=_get_boosts(frappe.session.user))
+
+
+@frappe.whitelist(methods=["POST"])
+def record_icd10_use(code):
+    """Count a code the user picked, to rank it higher in their searches."""
+    frappe.has_permission("ICD10 Code", "read", throw=True)
+    if not code:
+        return
+
+    cache = frappe.cache()
+    key = f"{USAGE_KEY}:{frappe.session.user}"
+    usage = cache.get_value(key) or {}
+    count, _last_used = usage.get(code, (0, 0))
+    usage[code] = (count + 1, time.time())
+
+    if len(usage) > MAX_USAGE_ENTRIES:
+        current = time.time()
+        kept = sorted(usage, key=lambda c: usage_boost(*usage[c], current), reverse=True)
+        usage = {c: usage[c] for c in kept[:MAX_USAGE_ENTRIES]}
+    cache.set_value(key, usage)
+
+
+def get_index():
+    """Return this worker's index of enabled codes, rebuilt if out of date."""
+    site = frappe.local.site
+    version = get_icd10_version()
+    cached = _indexes.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    rows = frappe.db.sql(
+        """
+        SELECT code, description, description_ar
+        FROM `tabICD10 Code`
+        WHERE disabled = 0
+        """
+    )
+    index = Icd10Index(rows)
+    _indexes[site] = (version, index)
+    return index
+
+
+def get_icd10_version():
+    """Return the stamp that changes whenever the code table changes."""
+    cache = frappe.cache()
+    version = cache.get_value(VERSION_KEY)
+    if not version:
+        version = _set_new_version()
+    return version
+
+
+def bump_icd10_version(doc=None, method=None, *args, **kwargs):
+    """Hook: make workers rebuild their index after the transaction commits."""
+    frappe.db.after_commit.add(_set_new_version)
+
+
+@frappe.whitelist(methods=["POST"])
+def enqueue_icd10_import(file_url):
+    """Import an uploaded CSV/XLSX file of codes in the background.
+
+    Args:
+        file_url: URL of a File, as returned by the uploader
+    """
+    frappe.only_for("System Manager")
+    file_path = frappe.get_doc("File", {"file_url": file_url}).get_full_path()
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.icd10.import_icd10_codes",
+        queue="long",
+        timeout=3600,
+        job_id=IMPORT_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=True,
+        file_path=file_path,
+    )
+
+
+def import_icd10_codes(file_path, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Load or update ICD10 Code rows from a CSV/XLSX file.
+
+    Rows are upserted with one multi-row statement per chunk, bypassing
+    per-document hooks; the index version is bumped once at the end. The
+    file may be re-run: existing codes are updated in place.
+
+    Recognized columns: code, description, description_ar (or arabic),
+    disabled.
+
+    Args:
+        file_path: CSV or XLSX file path
+        chunk_size: Rows per statement and commit
+        progress: Optional callback(rows_done)
+
+    Returns:
+        int: Rows written
+    """
+    written = 0
+    for _first_row, rows in iter_chunks(file_path, chunk_size):
+        values = _code_values(rows)
+        if values:
+            _upsert_codes(values)
+            frappe.db.commit()
+        written += len(values)
+        if progress:
+            progress(written)
+
+    _set_new_version()
+    return written
+
+
+def _code_values(rows):
+    """Return upsert values of the rows that have a code, last row winning."""
+    timestamp = now()
+    user = frappe.session.user
+    codes = {}
+    for row in rows:
+        code = (row.get("code") or "").strip().upper()
+        if not code:
+            continue
+        description = row.get("description") or code
+        description_ar = row.get("description_ar") or row.get("arabic")
+        disabled = cint(row.get("disabled"))
+        codes[code] = (
+            code, timestamp, timestamp, user, user, code, description, description_ar, disabled
+        )
+    return list(codes.values())
+
+
+def _upsert_codes(values):
+    row = "(%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    frappe.db.sql(
+        """
+        INSERT INTO `tabICD10 Code`
+            (name, creation, modified, owner, modified_by,
+            code, description, description_ar, disabled)
+        VALUES {rows}
+        ON DUPLICATE KEY UPDATE
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by),
+            description = VALUES(description),
+            description_ar = VALUES(description_ar),
+            disabled = VALUES(disabled)
+        """.format(rows=", ".join([row] * len(values))),
+        [value for entry in values for value in entry],
+    )
+
+
+def _get_boosts(user):
+    usage = frappe.cache().get_value(f"{USAGE_KEY}:{user}") or {}
+    current = time.time()
+    return {
+        code: usage_boost(count, last_used, current) for code, (count, last_used) in usage.items()
+    }
+
+
+def _set_new_version():
+    version = frappe.generate_hash(length=10)
+    frappe.cache().set_value(VERSION_KEY, version)
+    return version
@@ -0,0 +1,78 @@
+"""Hashed text embeddings for ICD-10 suggestion.
+
+Clinical notes and ICD-10 descriptions are turned into fixed-size sparse
+vectors without a model download or a remote call: each feature of the
+normalized text is hashed to one of `DIMENSIONS` dimensions with a sign,
+so similar texts end up with a high dot product. Features are:
+
+- words, and Arabic words without their definite article
+- pairs of adjacent words, for terms such as "heart failure"
+- character trigrams of each word, so "diabetic" still meets "diabetes"
+  and Arabic prefixes and suffixes do not hide the stem
+
+Repeated features count logarithmically and vectors are L2-normalized.
+The Frappe side (`utils.icd10_suggest`) stacks the description vectors
+into a memory-mapped matrix and weighs dimensions by inverse document
+frequency.
+"""
+
+import hashlib
+import math
+import zlib
+
+from mofeed_his.mofeed_his.utils.arabic import ngrams, strip_definite_article, tokenize
+from mofeed_his.mofeed_his.utils.icd10_index import STOP_WORDS
+
+DIMENSIONS = 512
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+TRIGRAM_WEIGHT = 0.3
+
+
+def embed(text, dimensions=DIMENSIONS):
+    """Return the embedding of a text as a sparse {dimension: value} dict.
+
+    The vector has unit length, or is empty for a text without words.
+    """
+    counts = {}
+    for feature, weight in _features(text):
+        counts[feature] = (weight, counts.get(feature, (weight, 0))[1] + 1)
+
+    vector = {}
+    for feature, (weight, count) in counts.items():
+        checksum = zlib.crc32(feature.encode())
+        sign = 1.0 if checksum & 0x80000000 else -1.0
+        dimension = checksum % dimensions
+        # Sublinear count: a word repeated through a long note weighs
+        # little more than a word that appears once
+        vector[dimension] = vector.get(dimension, 0.0) + sign * weight * (1 + math.log(count))
+
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {dimension: value / norm for dimension, value in vector.items() if value}
+
+
+def note_hash(text):
+    """Return a stable hash of a note.
+
+    Notes that differ only in spelling variants, case, spacing or
+    punctuation hash the same, so they share cached suggestions.
+    """
+    words = " ".join(tokenize(text))
+    return hashlib.sha256(words.encode()).hexdigest()
+
+
+def _features(text):
+    """Yield (feature, weight) pairs of a text."""
+    words = [word for word in tokenize(text) if word not in STOP_WORDS]
+    for word in words:
+        stem = strip_definite_article(word) or word
+        yield "w:" + stem, WORD_WEIGHT
+        for trigram in ngrams(f"<{stem}>"):
+            yield "c:" + trigram, TRIGRAM_WEIGHT
+
+    for first, second in zip(words, words[1:]):
+        first = strip_definite_article(first) or first
+        second = strip_definite_article(second) or second
+        yield f"b:{first} {second}", BIGRAM_WEIGHT
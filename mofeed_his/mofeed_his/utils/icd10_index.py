@@ -0,0 +1,225 @@
+"""In-memory ICD-10 typeahead index.
+
+Built once per worker from the ICD10 Code table (about 70k codes) and
+searched on every keystroke of the doctor workbench:
+
+- Codes are kept sorted by their normalized form ("E11.9" -> "E119"),
+  so a code prefix is one binary search and a slice, like a trie walk
+  but without a node per character.
+- English and Arabic descriptions feed an inverted index: normalized
+  token -> array of code ids. The vocabulary is sorted, so each typed
+  word matches every token it is a prefix of.
+- Results are ranked by how well the words matched, then by the doctor's
+  own usage of the code (see `usage_boost`).
+"""
+
+import bisect
+import heapq
+import math
+import re
+from array import array
+from operator import itemgetter
+
+from mofeed_his.mofeed_his.utils.arabic import strip_definite_article, tokenize
+
+DEFAULT_LIMIT = 20
+# Words too common to narrow a search
+STOP_WORDS = frozenset(
+    ["of", "and", "the", "in", "to", "or", "by", "for", "a", "an", "with"]
+    + ["في", "من", "مع", "او"]
+)
+# Vocabulary words a typed prefix may expand to
+MAX_PREFIX_EXPANSION = 400
+# Shortest prefix expanded to longer words; shorter ones must match exactly
+MIN_PREFIX_LENGTH = 2
+
+EXACT_WORD_SCORE = 2.0
+PREFIX_WORD_SCORE = 1.0
+CODE_EXACT_SCORE = 10.0
+CODE_PREFIX_SCORE = 5.0
+# Three-character categories rank above their subcodes on equal matches
+CATEGORY_SCORE = 0.25
+BOOST_WEIGHT = 2.0
+USAGE_HALF_LIFE_DAYS = 30
+
+_CODE_QUERY = re.compile(r"^[A-Za-z]\d[0-9A-Za-z.]*$")
+
+
+def normalize_code(code):
+    """Return the search form of a code: uppercase, without dots or spaces."""
+    return re.sub(r"[\s.]", "", code or "").upper()
+
+
+def usage_boost(count, last_used, now, half_life_days=USAGE_HALF_LIFE_DAYS):
+    """Return the ranking boost of a code a doctor has used.
+
+    Grows with the log of the use count and halves every `half_life_days`
+    since the last use, so both frequent and recent codes come first.
+
+    Args:
+        count: Times the doctor picked the code
+        last_used: Timestamp of the last pick, in seconds
+        now: Current timestamp, in seconds
+    """
+    age_days = max(now - last_used, 0) / 86400
+    return math.log1p(count) * 0.5 ** (age_days / half_life_days)
+
+
+def _index_tokens(*texts):
+    """Return the distinct tokens a code is found by, with and without 'ال'."""
+    tokens = set()
+    for text in texts:
+        for token in tokenize(text):
+            tokens.add(token)
+            tokens.add(strip_definite_article(token))
+    tokens.discard(None)
+    return tokens - STOP_WORDS
+
+
+class Icd10Index:
+    """Code prefix and description token index over ICD-10 codes.
+
+    Args:
+        records: (code, description, arabic description) tuples
+    """
+
+    def __init__(self, records):
+        self.codes = []
+        self.descriptions = []
+        self.descriptions_ar = []
+        code_keys = []
+        postings = {}
+
+        for code_id, (code, description, description_ar) in enumerate(records):
+            self.codes.append(code)
+            self.descriptions.append(description or "")
+            self.descriptions_ar.append(description_ar or "")
+            code_keys.append((normalize_code(code), code_id))
+
+            for token in _index_tokens(description, description_ar):
+                postings.setdefault(token, array("I")).append(code_id)
+
+        code_keys.sort()
+        self._code_keys = [key for key, _ in code_keys]
+        self._code_ids = array("I", [code_id for _, code_id in code_keys])
+        self._vocabulary = sorted(postings)
+        self._postings = postings
+        self._ids = {code: code_id for code_id, code in enumerate(self.codes)}
+        self._categories = frozenset(
+            code_id for key, code_id in code_keys if len(key) <= 3
+        )
+        # Equal scores rank in code order ("E11" before "E11.9"); the
+        # offset is far below any score step
+        self._tiebreak = array("d", [0.0]) * len(self.codes)
+        for position, code_id in enumerate(self._code_ids):
+            self._tiebreak[code_id] = position * 1e-9
+
+    def __len__(self):
+        return len(self.codes)
+
+    def search(self, query, limit=DEFAULT_LIMIT, boosts=None):
+        """Return the best matching codes.
+
+        Args:
+            query: Typed text: a code prefix or words of the description,
+                the last one possibly incomplete
+            limit: Maximum results
+            boosts: code -> boost of the searching doctor, see `usage_boost`
+
+        Returns:
+            list: {"code", "description", "description_ar", "score"} dicts,
+            best first. An empty query returns the doctor's boosted codes.
+        """
+        boosts = boosts or {}
+        query = (query or "").strip()
+        if not query:
+            return self._boosted(boosts, limit)
+
+        scores = self._match_words(query)
+        if _CODE_QUERY.match(query):
+            for code_id, score in self._match_code(normalize_code(query)):
+                scores[code_id] = max(scores.get(code_id, 0), score)
+
+        tiebreak = self._tiebreak
+        for code_id in self._categories.intersection(scores):
+            scores[code_id] += CATEGORY_SCORE
+        for code, boost in boosts.items():
+            code_id = self._ids.get(code)
+            if code_id in scores:
+                scores[code_id] += BOOST_WEIGHT * boost
+
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [self._result(code_id, score + tiebreak[code_id]) for code_id, score in best]
+
+    def _match_code(self, prefix):
+        start = bisect.bisect_left(self._code_keys, prefix)
+        end = bisect.bisect_left(self._code_keys, prefix + "\uffff")
+        tiebreak = self._tiebreak
+        for position in range(start, end):
+            code_id = self._code_ids[position]
+            exact = self._code_keys[position] == prefix
+            score = CODE_EXACT_SCORE if exact else CODE_PREFIX_SCORE
+            yield code_id, score - tiebreak[code_id]
+
+    def _match_words(self, query):
+        """Score codes whose descriptions match every word of the query.
+
+        Scores carry the code order tie-break, removed in `search`.
+        """
+        words = [word for word in tokenize(query) if word not in STOP_WORDS]
+        if not words:
+            return {}
+
+        exact_matches = []
+        all_matches = []
+        for word in words:
+            exact = set(self._postings.get(word, ()))
+            found = set(exact)
+            if len(word) >= MIN_PREFIX_LENGTH:
+                for token in self._expand(word):
+                    found.update(self._postings[token])
+            if not found:
+                return {}
+            exact_matches.append(exact)
+            all_matches.append(found)
+
+        # Intersect starting from the rarest word
+        all_matches.sort(key=len)
+        candidates = all_matches[0].intersection(*all_matches[1:])
+
+        base = PREFIX_WORD_SCORE * len(words)
+        partial = []
+        for exact in exact_matches:
+            hits = exact.intersection(candidates)
+            if len(hits) == len(candidates):
+                base += EXACT_WORD_SCORE - PREFIX_WORD_SCORE
+            elif hits:
+                partial.append(hits)
+
+        tiebreak = self._tiebreak
+        scores = {code_id: base - tiebreak[code_id] for code_id in candidates}
+        for hits in partial:
+            for code_id in hits:
+                scores[code_id] += EXACT_WORD_SCORE - PREFIX_WORD_SCORE
+        return scores
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = min(
+            bisect.bisect_left(self._vocabulary, prefix + "\uffff"),
+            start + MAX_PREFIX_EXPANSION,
+        )
+        return self._vocabulary[start:end]
+
+    def _boosted(self, boosts, limit):
+        known = [code for code in boosts if code in self._ids]
+        best = heapq.nlargest(limit, known, key=boosts.get)
+        return [self._result(self._ids[code], BOOST_WEIGHT * boosts[code]) for code in best]
+
+    def _result(self, code_id, score):
+        return {
+            "code": self.codes[code_id],
+            "description": self.descriptions[code_id],
+            "description_ar": self.descriptions_ar[code_id],
+            "score": round(score, 3),
+        }
@@ -0,0 +1,248 @@
+"""Offline ICD-10 suggestions from clinical notes (PDR §12).
+
+Suggests diagnosis codes for the note a doctor is writing without
+sending patient data anywhere: every enabled code's description is
+embedded once (`utils.icd10_embedding`) into a float32 matrix saved under
+the site's private folder, and each worker memory-maps it, so the
+operating system shares one copy between workers. A request embeds the
+note and scores all codes with a single matrix-vector product.
+
+The matrix is rebuilt in a background job when the ICD-10 version stamp
+(`utils.icd10.get_icd10_version`) moves; the previous matrix keeps
+serving until the new one is ready.
+
+Suggestions are cached by the note's hash, never its text, so identical
+notes (a re-opened encounter, a repeated request) skip the search.
+"""
+
+import json
+import os
+
+import frappe
+import numpy as np
+from frappe.utils import cint
+
+from mofeed_his.mofeed_his.utils.icd10 import get_icd10_version
+from mofeed_his.mofeed_his.utils.icd10_embedding import DIMENSIONS, embed, note_hash
+
+EMBEDDING_VERSION_KEY = "mofeed_his:icd10_embedding_version"
+SUGGESTION_CACHE_KEY = "mofeed_his:icd10_suggestions"
+SUGGESTION_CACHE_SECONDS = 24 * 60 * 60
+BUILD_JOB_ID = "mofeed_his:build_icd10_embeddings"
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Cosine similarity below which a code is not worth suggesting
+MIN_SCORE = 0.05
+# Rows normalized at a time while building, to bound memory
+BUILD_CHUNK_ROWS = 10000
+
+# site -> Icd10Embeddings, per worker process
+_embeddings = {}
+
+
+@frappe.whitelist(methods=["POST"])
+def suggest_icd10(note, limit=DEFAULT_LIMIT):
+    """Return ICD-10 codes whose descriptions best match a clinical note.
+
+    Suggestions are advisory; the doctor picks the diagnosis.
+
+    Args:
+        note: Note text, in English and/or Arabic
+        limit: Maximum suggestions, at most `MAX_LIMIT`
+
+    Returns:
+        list: {"code", "description", "description_ar", "score"} dicts,
+        best first. Empty while the first matrix is being built.
+    """
+    frappe.has_permission("ICD10 Code", "read", throw=True)
+
+    limit = min(max(cint(limit) or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    embeddings = get_embeddings()
+    if not embeddings or not (note or "").strip():
+        return []
+
+    cache = frappe.cache()
+    key = f"{SUGGESTION_CACHE_KEY}:{embeddings.version}:{limit}:{note_hash(note)}"
+    suggestions = cache.get_value(key)
+    if suggestions is None:
+        suggestions = _describe(embeddings.search(note, limit))
+        cache.set_value(key, suggestions, expires_in_sec=SUGGESTION_CACHE_SECONDS)
+    return suggestions
+
+
+class Icd10Embeddings:
+    """Memory-mapped description embeddings of one ICD-10 version.
+
+    Attributes:
+        version: ICD-10 version stamp the matrix was built from
+        codes: Code of each matrix row
+        idf: Inverse document frequency of each dimension
+        matrix: (codes x DIMENSIONS) float32 rows of unit length
+    """
+
+    def __init__(self, version, codes, idf, matrix):
+        self.version = version
+        self.codes = codes
+        self.idf = idf
+        self.matrix = matrix
+
+    @classmethod
+    def load(cls, version):
+        """Map the files of a built version.
+
+        Raises:
+            FileNotFoundError: If the version was not built on this site
+        """
+        with open(_path(version, "json")) as f:
+            codes = json.load(f)
+        idf = np.load(_path(version, "idf.npy"))
+        matrix = np.load(_path(version, "npy"), mmap_mode="r")
+        return cls(version, codes, idf, matrix)
+
+    def search(self, text, limit):
+        """Return up to `limit` (code, cosine similarity) pairs, best first."""
+        query = self._vector(embed(text))
+        if query is None or not len(self.codes):
+            return []
+
+        scores = self.matrix @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(scores, -limit)[-limit:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.codes[row], float(scores[row])) for row in top if scores[row] >= MIN_SCORE]
+
+    def _vector(self, sparse):
+        """Return a sparse embedding as a weighted unit vector, or None."""
+        if not sparse:
+            return None
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[list(sparse)] = list(sparse.values())
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+
+def get_embeddings():
+    """Return this worker's embeddings, or None before the first build.
+
+    Schedules a rebuild when the codes changed since the last build.
+    """
+    site = frappe.local.site
+    version = frappe.cache().get_value(EMBEDDING_VERSION_KEY)
+    if version != get_icd10_version():
+        enqueue_embedding_build()
+    if not version:
+        return None
+
+    cached = _embeddings.get(site)
+    if cached and cached.version == version:
+        return cached
+
+    try:
+        embeddings = Icd10Embeddings.load(version)
+    except FileNotFoundError:
+        # Files lost (restored backup, new server): build them again
+        frappe.cache().delete_value(EMBEDDING_VERSION_KEY)
+        enqueue_embedding_build()
+        return None
+
+    _embeddings[site] = embeddings
+    return embeddings
+
+
+def enqueue_embedding_build():
+    """Schedule `build_icd10_embeddings` once, however many requests ask."""
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.icd10_suggest.build_icd10_embeddings",
+        queue="long",
+        timeout=3600,
+        job_id=BUILD_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def build_icd10_embeddings():
+    """Embed every enabled code and publish the matrix for the workers.
+
+    Writes `icd10-<version>.npy` (rows), `.idf.npy` and `.json` (codes)
+    under the site's private/icd10 folder, then removes older versions.
+    """
+    version = get_icd10_version()
+    rows = frappe.db.sql(
+        """
+        SELECT code, description, description_ar
+        FROM `tabICD10 Code`
+        WHERE disabled = 0
+        ORDER BY code
+        """
+    )
+    os.makedirs(_directory(), exist_ok=True)
+
+    temp_path = _path(version, "tmp.npy")
+    matrix = np.lib.format.open_memmap(
+        temp_path, mode="w+", dtype=np.float32, shape=(len(rows), DIMENSIONS)
+    )
+    frequency = np.zeros(DIMENSIONS)
+    for row, (_code, description, description_ar) in enumerate(rows):
+        sparse = embed(f"{description or ''} {description_ar or ''}")
+        if sparse:
+            dimensions = list(sparse)
+            matrix[row, dimensions] = list(sparse.values())
+            frequency[dimensions] += 1
+
+    # Dimensions shared by most descriptions ("unspecified", "disease")
+    # say little about a note
+    idf = (np.log((1 + len(rows)) / (1 + frequency)) + 1).astype(np.float32)
+    for start in range(0, len(rows), BUILD_CHUNK_ROWS):
+        chunk = matrix[start : start + BUILD_CHUNK_ROWS] * idf
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix[start : start + BUILD_CHUNK_ROWS] = chunk / norms
+    matrix.flush()
+    del matrix
+
+    np.save(_path(version, "idf.npy"), idf)
+    with open(_path(version, "json"), "w") as f:
+        json.dump([row[0] for row in rows], f)
+    os.replace(temp_path, _path(version, "npy"))
+
+    frappe.cache().set_value(EMBEDDING_VERSION_KEY, version)
+    _remove_old_versions(version)
+
+
+def _describe(matches):
+    if not matches:
+        return []
+    descriptions = {
+        row.name: row
+        for row in frappe.get_all(
+            "ICD10 Code",
+            filters={"name": ["in", [code for code, _ in matches]]},
+            fields=["name", "description", "description_ar"],
+        )
+    }
+    return [
+        {
+            "code": code,
+            "description": descriptions[code].description,
+            "description_ar": descriptions[code].description_ar,
+            "score": round(score, 3),
+        }
+        for code, score in matches
+        if code in descriptions
+    ]
+
+
+def _directory():
+    return frappe.get_site_path("private", "icd10")
+
+
+def _path(version, extension):
+    return os.path.join(_directory(), f"icd10-{version}.{extension}")
+
+
+def _remove_old_versions(version):
+    # Workers still mapping an old file keep reading it until they reload
+    for filename in os.listdir(_directory()):
+        if not filename.startswith(f"icd10-{version}."):
+            os.remove(os.path.join(_directory(), filename))
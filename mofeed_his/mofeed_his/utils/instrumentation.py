@@ -0,0 +1,292 @@
+"""Request, hook and job instrumentation with a Prometheus endpoint.
+
+Records, for this app's code paths only:
+
+- latency histograms of whitelisted `mofeed_his.*` methods, of the doc
+  event handlers registered in `hooks.py` and of `mofeed_his.*`
+  background jobs, each with its database query count and query time;
+  requests to other `mofeed_his.*` paths share the label `other`, so
+  clients cannot add series
+- lookups and misses of the app's Redis caches (`counted`)
+- slow queries, logged to the `mofeed_his.slow_query` logger with the app
+  frame that ran them (threshold `slow_query_ms` in site config,
+  default 200)
+
+Samples are kept in a per-process buffer (`utils.metrics`) and added to
+one Redis hash at most every `FLUSH_INTERVAL_SECONDS`, so a request
+costs a few dictionary updates plus two timer reads per query.
+`metrics()` serves the totals in the Prometheus text format, to System
+Managers or to a scraper sending the site config's `metrics_token` as a
+bearer token. Set `mofeed_his_metrics` to 0 in site config to turn the
+instrumentation off.
+"""
+
+import functools
+import hmac
+import json
+import os
+import sys
+import time
+
+import frappe
+from werkzeug.wrappers import Response
+
+from mofeed_his.mofeed_his.utils.metrics import COUNTER, HISTOGRAM, MetricsBuffer, render
+
+METRICS_CACHE_KEY = "mofeed_his:metrics"
+FLUSH_INTERVAL_SECONDS = 10
+DEFAULT_SLOW_QUERY_MS = 200
+APP_PREFIX = "mofeed_his."
+MAX_LOGGED_QUERY_LENGTH = 2000
+# Label of requests to paths that are not whitelisted methods
+OTHER_ENDPOINT = "other"
+
+FAMILIES = {
+    "mofeed_his_request_seconds": (HISTOGRAM, "Latency of mofeed_his whitelisted methods"),
+    "mofeed_his_request_queries_total": (COUNTER, "Database queries of mofeed_his methods"),
+    "mofeed_his_request_query_seconds_total": (
+        COUNTER,
+        "Seconds spent in database queries by mofeed_his methods",
+    ),
+    "mofeed_his_hook_seconds": (HISTOGRAM, "Latency of mofeed_his doc handlers"),
+    "mofeed_his_hook_queries_total": (COUNTER, "Database queries of mofeed_his doc handlers"),
+    "mofeed_his_hook_query_seconds_total": (
+        COUNTER,
+        "Seconds spent in database queries by mofeed_his doc handlers",
+    ),
+    "mofeed_his_job_seconds": (HISTOGRAM, "Duration of mofeed_his background jobs"),
+    "mofeed_his_job_queries_total": (COUNTER, "Database queries of mofeed_his background jobs"),
+    "mofeed_his_job_query_seconds_total": (
+        COUNTER,
+        "Seconds spent in database queries by mofeed_his background jobs",
+    ),
+    "mofeed_his_cache_lookups_total": (COUNTER, "Lookups in mofeed_his caches"),
+    "mofeed_his_cache_misses_total": (COUNTER, "Cache lookups that had to load the value"),
+    "mofeed_his_slow_queries_total": (COUNTER, "Queries slower than slow_query_ms, by caller"),
+}
+
+# Per-process buffer, drained into Redis by `flush_metrics`
+_buffer = MetricsBuffer()
+_last_flush = time.monotonic()
+_hooks_instrumented = False
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def before_request():
+    """Hook: start timing the request and counting its queries."""
+    if _enabled():
+        _start()
+
+
+def after_request(response=None, request=None):
+    """Hook: record a mofeed_his method's latency and queries."""
+    state = getattr(frappe.local, "mofeed_his_metrics", None)
+    if not state:
+        return
+    request = getattr(frappe.local, "request", None)
+    path = request.path if request else ""
+    method = path[len("/api/method/") :] if path.startswith("/api/method/") else None
+    if method and method.startswith(APP_PREFIX):
+        _record("request", {"endpoint": _endpoint(method)}, state)
+    flush_metrics()
+
+
+def before_job(method=None, kwargs=None, transaction_type=None, **ignored):
+    """Hook: start timing a background job and counting its queries."""
+    if _enabled():
+        _start()
+
+
+def after_job(method=None, kwargs=None, result=None, **ignored):
+    """Hook: record a mofeed_his job's duration and queries."""
+    state = getattr(frappe.local, "mofeed_his_metrics", None)
+    if not state:
+        return
+    if isinstance(method, str) and method.startswith(APP_PREFIX):
+        _record("job", {"job": method}, state)
+    flush_metrics(force=True)
+
+
+def counted(cache, generator):
+    """Count a cache lookup; the returned generator counts a miss when called.
+
+    Usage:
+        frappe.cache().hget(KEY, name, generator=counted("hospital", load))
+    """
+    _buffer.inc("mofeed_his_cache_lookups_total", {"cache": cache})
+
+    def load():
+        _buffer.inc("mofeed_his_cache_misses_total", {"cache": cache})
+        return generator()
+
+    return load
+
+
+def flush_metrics(force=False):
+    """Add the samples buffered in this process to the site's totals."""
+    global _last_flush
+
+    if not force and time.monotonic() - _last_flush < FLUSH_INTERVAL_SECONDS:
+        return
+    _last_flush = time.monotonic()
+    samples = _buffer.drain()
+    if not samples:
+        return
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(METRICS_CACHE_KEY)
+        pipeline = cache.pipeline()
+        for sample, value in samples.items():
+            pipeline.hincrbyfloat(key, sample, value)
+        pipeline.execute()
+    except Exception:
+        # Metrics must never fail the request they were recorded in
+        frappe.logger("mofeed_his.metrics").exception("Could not flush metrics")
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def metrics():
+    """Serve the site's metrics in the Prometheus text exposition format."""
+    token = frappe.conf.get("metrics_token")
+    header = frappe.get_request_header("Authorization") or ""
+    if not (token and hmac.compare_digest(header, f"Bearer {token}")):
+        frappe.only_for("System Manager")
+
+    flush_metrics(force=True)
+    cache = frappe.cache()
+    raw = cache.hgetall(cache.make_key(METRICS_CACHE_KEY)) or {}
+    samples = {
+        (sample.decode() if isinstance(sample, bytes) else sample): float(value)
+        for sample, value in raw.items()
+    }
+    return Response(render(samples, FAMILIES), mimetype="text/plain; version=0.0.4")
+
+
+def instrument_hook(handler, name):
+    """Wrap a doc event handler to record its latency and queries."""
+    if getattr(handler, "_mofeed_his_instrumented", False):
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(doc, method=None, *args, **kwargs):
+        state = getattr(frappe.local, "mofeed_his_metrics", None)
+        if not state:
+            return handler(doc, method, *args, **kwargs)
+        queries, query_seconds = state["queries"], state["query_seconds"]
+        started = time.perf_counter()
+        try:
+            return handler(doc, method, *args, **kwargs)
+        finally:
+            labels = {"handler": name, "event": method or ""}
+            _buffer.observe("mofeed_his_hook_seconds", labels, time.perf_counter() - started)
+            _buffer.inc("mofeed_his_hook_queries_total", labels, state["queries"] - queries)
+            _buffer.inc(
+                "mofeed_his_hook_query_seconds_total",
+                labels,
+                state["query_seconds"] - query_seconds,
+            )
+
+    wrapper._mofeed_his_instrumented = True
+    return wrapper
+
+
+def _start():
+    _instrument_hooks()
+    frappe.local.mofeed_his_metrics = {
+        "started": time.perf_counter(),
+        "queries": 0,
+        "query_seconds": 0.0,
+    }
+    _wrap_sql(frappe.db)
+
+
+def _record(kind, labels, state):
+    _buffer.observe(f"mofeed_his_{kind}_seconds", labels, time.perf_counter() - state["started"])
+    _buffer.inc(f"mofeed_his_{kind}_queries_total", labels, state["queries"])
+    _buffer.inc(f"mofeed_his_{kind}_query_seconds_total", labels, state["query_seconds"])
+
+
+def _endpoint(method):
+    """Return the label of a method; paths that are not whitelisted methods share one."""
+    module_name, _, function = method.rpartition(".")
+    # A method that resolved was imported while handling the request
+    module = sys.modules.get(module_name)
+    handler = getattr(module, function, None) if module else None
+    return method if handler is not None and handler in frappe.whitelisted else OTHER_ENDPOINT
+
+
+def _wrap_sql(db):
+    """Time every query of this connection; a no-op if already wrapped."""
+    if db is None or "sql" in vars(db):
+        return
+    sql = db.sql
+    slow_seconds = (frappe.conf.get("slow_query_ms") or DEFAULT_SLOW_QUERY_MS) / 1000
+
+    def timed_sql(query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return sql(query, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            state = getattr(frappe.local, "mofeed_his_metrics", None)
+            if state:
+                state["queries"] += 1
+                state["query_seconds"] += elapsed
+            if elapsed >= slow_seconds:
+                _log_slow_query(query, elapsed)
+
+    db.sql = timed_sql
+
+
+def _log_slow_query(query, elapsed):
+    caller = _caller()
+    _buffer.inc("mofeed_his_slow_queries_total", {"caller": caller})
+    frappe.logger("mofeed_his.slow_query").warning(
+        json.dumps(
+            {
+                "seconds": round(elapsed, 3),
+                "caller": caller,
+                "query": str(query)[:MAX_LOGGED_QUERY_LENGTH],
+            }
+        )
+    )
+
+
+def _caller():
+    """Return `module:function:line` of the innermost app frame, outside this module."""
+    frame = sys._getframe(2)
+    while frame:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_ROOT) and filename != __file__:
+            module = os.path.relpath(filename, _APP_ROOT)[: -len(".py")].replace(os.sep, ".")
+            return f"{module}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "other"
+
+
+def _instrument_hooks():
+    """Wrap this app's doc event handlers in place, once per process."""
+    global _hooks_instrumented
+
+    if _hooks_instrumented:
+        return
+    _hooks_instrumented = True
+    handlers = set()
+    for events in frappe.get_hooks("doc_events", app_name="mofeed_his").values():
+        for paths in events.values():
+            handlers.update([paths] if isinstance(paths, str) else paths)
+
+    for path in handlers:
+        module_name, _, function = path.rpartition(".")
+        try:
+            module = frappe.get_module(module_name)
+        except ImportError:
+            continue
+        handler = getattr(module, function, None)
+        if callable(handler):
+            short_name = f"{module_name.rpartition('.')[2]}.{function}"
+            setattr(module, function, instrument_hook(handler, short_name))
+
+
+def _enabled():
+    return bool(frappe.conf.get("mofeed_his_metrics", 1))
@@ -0,0 +1,161 @@
+"""Splitting invoices between patient and insurer.
+
+Each insurance plan's enabled Insurance Coverage Rules are compiled into
+a `coverage_rules.CoveragePlan` once and kept in the site's Redis cache,
+mirrored per request in `frappe.local.cache`, with the item group tree
+it needs. Splitting a batch of invoices then costs two queries (headers
+with the patients' Patient Extension, and lines) plus one cache read per
+plan, however many lines there are.
+
+The cache is cleared by doc events on Insurance Coverage Rule and Item
+Group (see `hooks.py`).
+"""
+
+import frappe
+from frappe.utils import cint, sbool
+
+from mofeed_his.mofeed_his.utils.coverage_rules import CoveragePlan
+from mofeed_his.mofeed_his.utils.instrumentation import counted
+
+COVERAGE_PLAN_CACHE_KEY = "mofeed_his:coverage_plans"
+
+
+@frappe.whitelist()
+def split_invoice(invoice, explain=False):
+    """Split a Sales Invoice between the patient and the insurer.
+
+    Args:
+        invoice: Sales Invoice
+        explain: Add each line's trace of the rules applied
+
+    Returns:
+        dict: {"lines", "insurer_amount", "patient_amount", "insurance_plan"},
+        see `CoveragePlan.split`
+    """
+    frappe.has_permission("Sales Invoice", "read", invoice, throw=True)
+    return split_invoices([invoice], explain=sbool(explain)).get(invoice)
+
+
+def split_invoices(invoices, explain=False):
+    """Split many Sales Invoices, e.g. a claim batch, in one pass.
+
+    Args:
+        invoices: Sales Invoice names
+        explain: Add each line's trace
+
+    Returns:
+        dict: invoice -> split, see `split_invoice`
+    """
+    if not invoices:
+        return {}
+    headers = frappe.db.sql(
+        """
+        SELECT si.name AS invoice, si.posting_date, e.has_insurance, e.insurance_plan,
+            e.coverage_percentage, e.insurance_expiry
+        FROM `tabSales Invoice` si
+        LEFT JOIN `tabPatient Extension` e ON e.patient_link = si.patient
+        WHERE si.name IN %(invoices)s
+        """,
+        {"invoices": tuple(invoices)},
+        as_dict=True,
+    )
+    lines = frappe.db.sql(
+        """
+        SELECT parent, item_code, item_group, qty, amount
+        FROM `tabSales Invoice Item`
+        WHERE parent IN %(invoices)s AND parenttype = 'Sales Invoice'
+        ORDER BY parent, idx
+        """,
+        {"invoices": tuple(invoices)},
+        as_dict=True,
+    )
+    return apply_coverage(headers, lines, explain=explain)
+
+
+def apply_coverage(invoices, lines, explain=False):
+    """Split invoice lines already loaded, setting their shares in place.
+
+    Args:
+        invoices: Dicts with invoice, posting_date, insurance_plan,
+            coverage_percentage and insurance_expiry; `has_insurance`
+            when present
+        lines: Dicts with parent, item_code, item_group, qty and amount;
+            each gets `insurer_amount`, `patient_amount` and `coverage_rule`
+        explain: Add each line's trace to the result
+
+    Returns:
+        dict: invoice -> split, see `split_invoice`
+    """
+    lines_by_invoice = {}
+    for line in lines:
+        lines_by_invoice.setdefault(line["parent"], []).append(line)
+
+    splits = {}
+    for invoice in invoices:
+        insured = cint(invoice.get("has_insurance", 1))
+        plan = get_coverage_plan(invoice.get("insurance_plan") if insured else None)
+        invoice_lines = lines_by_invoice.get(invoice["invoice"], [])
+        split = plan.split(
+            invoice_lines,
+            invoice.get("coverage_percentage") if insured else 0,
+            on_date=invoice.get("posting_date"),
+            insurance_expiry=invoice.get("insurance_expiry"),
+            explain=explain,
+        )
+        for line, result in zip(invoice_lines, split["lines"]):
+            line["insurer_amount"] = result["insurer_amount"]
+            line["patient_amount"] = result["patient_amount"]
+            line["coverage_rule"] = result["rule"]
+        split["insurance_plan"] = plan.name
+        splits[invoice["invoice"]] = split
+    return splits
+
+
+def get_coverage_plan(insurance_plan):
+    """Return the compiled rules of a plan; a plan without rules if None."""
+    if not insurance_plan:
+        return CoveragePlan(None)
+    return frappe.cache().hget(
+        COVERAGE_PLAN_CACHE_KEY,
+        insurance_plan,
+        generator=counted("coverage_plan", lambda: _compile_plan(insurance_plan)),
+    )
+
+
+def clear_coverage_plan(doc=None, method=None, *args, **kwargs):
+    """Hook: drop the compiled plan of a saved or deleted coverage rule."""
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    cache = frappe.cache()
+    for plan in {doc.insurance_plan, before.insurance_plan if before else None}:
+        if plan:
+            cache.hdel(COVERAGE_PLAN_CACHE_KEY, plan)
+
+
+def clear_coverage_plans(doc=None, method=None, *args, **kwargs):
+    """Hook: drop every compiled plan when the item group tree changes."""
+    frappe.cache().delete_value(COVERAGE_PLAN_CACHE_KEY)
+
+
+def _compile_plan(insurance_plan):
+    rules = frappe.get_all(
+        "Insurance Coverage Rule",
+        filters={"insurance_plan": insurance_plan, "enabled": 1},
+        fields=[
+            "name",
+            "applies_to",
+            "item_code",
+            "item_group",
+            "excluded",
+            "coverage_percentage",
+            "copay_amount",
+            "cap_amount",
+            "valid_from",
+            "valid_upto",
+        ],
+    )
+    group_parents = {}
+    if any(rule.applies_to == "Item Group" for rule in rules):
+        group_parents = dict(
+            frappe.db.sql("SELECT name, parent_item_group FROM `tabItem Group`")
+        )
+    return CoveragePlan(insurance_plan, rules, group_parents)
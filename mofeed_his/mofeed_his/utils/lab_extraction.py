@@ -0,0 +1,157 @@
+"""Lab value extraction from OCR text.
+
+Lab reports print one test per line: a name, a value, and usually a unit
+and a reference range, in varying order and punctuation:
+
+    Hemoglobin          13.5   g/dL     12.0 - 16.0
+    Glucose (fasting):  110 mg/dL (70-100) H
+    Platelets           250,000 /uL     150,000-450,000
+    TSH                 6.2    mIU/L    < 4.5
+
+`extract_lab_values` matches each line against one precompiled pattern
+and returns the name/value/reference-range triples, with the value and
+bounds parsed as numbers and a Low/High flag when the range allows it.
+Lines with neither a unit nor a range (dates, ages, page numbers) are
+not taken for results.
+"""
+
+import re
+
+from mofeed_his.mofeed_his.utils.arabic import normalize_digits
+
+NORMAL = "Normal"
+LOW = "Low"
+HIGH = "High"
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_UNIT = r"(?:[a-zA-Zµμ%/][\w/^%.*µμ]*|x?10\^\d+/[a-zA-Zµμ]+)"
+_LINE = re.compile(
+    rf"""
+    ^\s*
+    (?P<name>[^\W\d_][\w().,'/+\- ]*?)
+    (?:\s*[:=]\s*|\s+)
+    (?P<comparator>[<>]=?)?\s*(?P<value>-?{_NUMBER})
+    (?:\s*(?P<unit>{_UNIT}))?
+    (?:\s+[(\[]?
+        (?P<range>
+            (?P<low>{_NUMBER})\s*(?:-|–|—|to)\s*(?P<high>{_NUMBER})
+            | (?P<bound_op>[<>≤≥]=?|up\ to)\s*(?P<bound>{_NUMBER})
+        )
+    [)\]]?)?
+    (?:\s+(?P<unit_after>{_UNIT}))?
+    (?:\s+(?P<flag>HH|LL|H|L|high|low|\*))?
+    \s*$
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+# Labelled lines of a report header that look like results
+NON_TEST_NAMES = frozenset(
+    [
+        "age",
+        "date",
+        "time",
+        "page",
+        "patient",
+        "name",
+        "sex",
+        "gender",
+        "mrn",
+        "id",
+        "no",
+        "tel",
+        "phone",
+        "doctor",
+        "ref",
+        "sample",
+        "specimen",
+        "العمر",
+        "التاريخ",
+        "الاسم",
+        "الجنس",
+    ]
+)
+# Arabic decimal and thousands separators
+_SEPARATORS = str.maketrans({"٫": ".", "٬": ","})
+_FLAGS = {"h": HIGH, "hh": HIGH, "high": HIGH, "l": LOW, "ll": LOW, "low": LOW}
+
+
+def parse_number(text):
+    """Parse a printed number; a comma before exactly three digits groups thousands."""
+    if text is None:
+        return None
+    whole, _, fraction = text.replace(".", ",").rpartition(",")
+    if not whole:
+        return float(fraction)
+    if len(fraction) == 3 and "." not in text:
+        return float(whole.replace(",", "") + fraction)
+    return float(whole.replace(",", "") + "." + fraction)
+
+
+def extract_lab_values(text):
+    """Return the lab results found in OCR text, in reading order.
+
+    Returns:
+        list: dicts with test_name, result_value (as printed), numeric_value,
+        unit, reference_range, reference_low, reference_high, flag and
+        source_line
+    """
+    results = []
+    for line in normalize_digits(text or "").translate(_SEPARATORS).splitlines():
+        result = parse_line(line)
+        if result:
+            results.append(result)
+    return results
+
+
+def parse_line(line):
+    """Return the lab result printed on one line, or None."""
+    match = _LINE.match(line)
+    if not match:
+        return None
+
+    name = match.group("name").strip(" .-:")
+    unit = match.group("unit") or match.group("unit_after")
+    if not match.group("range") and not unit:
+        return None
+    if name.casefold() in NON_TEST_NAMES:
+        return None
+
+    value = parse_number(match.group("value"))
+    comparator = match.group("comparator") or ""
+    low, high = _bounds(match)
+    return {
+        "test_name": name,
+        "result_value": comparator + match.group("value"),
+        "numeric_value": value,
+        "unit": unit,
+        "reference_range": match.group("range"),
+        "reference_low": low,
+        "reference_high": high,
+        "flag": _flag(match.group("flag"), value, low, high),
+        "source_line": line.strip(),
+    }
+
+
+def _bounds(match):
+    if match.group("low") is not None:
+        return parse_number(match.group("low")), parse_number(match.group("high"))
+    if match.group("bound") is not None:
+        bound = parse_number(match.group("bound"))
+        if match.group("bound_op").startswith((">", "≥")):
+            return bound, None
+        return None, bound
+    return None, None
+
+
+def _flag(printed, value, low, high):
+    """Return the printed flag, else one computed from the range, else None."""
+    if printed and printed != "*":
+        return _FLAGS[printed.casefold()]
+    if low is None and high is None:
+        return None
+    if low is not None and value < low:
+        return LOW
+    if high is not None and value > high:
+        return HIGH
+    return NORMAL
@@ -0,0 +1,354 @@
+"""Medical document uploads, storage and previews (PDR §13).
+
+Large lab and radiology files are uploaded in chunks so that no request
+runs long or buffers the whole file:
+
+1. `start_upload` registers the upload and returns its id and chunk size.
+2. `upload_chunk` streams each chunk (multipart field `chunk`) to a
+   partial file on disk. After a dropped connection, `get_upload_status`
+   returns the bytes received and the client continues from there.
+3. `complete_upload` hashes the file, stores it once per content (see
+   `utils.chunked_upload`) and creates the Medical Document. The same
+   file uploaded again for the same patient, document type and encounter
+   returns the existing document, and a matching document not yet linked
+   to an encounter is linked to the new one. Any other upload of the file
+   gets its own document over the same stored blob.
+
+Previews are rendered by `generate_preview` in a background job, once
+per blob, and lab reports are queued for OCR (see `utils.document_ocr`).
+`download_document` streams a document to a user allowed to read it.
+"""
+
+import os
+import shutil
+import subprocess
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import cint, nowtime
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+from mofeed_his.mofeed_his.utils.chunked_upload import (
+    DEFAULT_CHUNK_SIZE,
+    UploadError,
+    blob_path,
+    file_sha256,
+    received_bytes,
+    sniff_content_type,
+    store_blob,
+    write_chunk,
+)
+from mofeed_his.mofeed_his.utils.document_ocr import enqueue_ocr, needs_ocr
+
+UPLOAD_CACHE_KEY = "mofeed_his:medical_document_upload"
+UPLOAD_EXPIRY_SECONDS = 24 * 60 * 60
+MAX_FILE_SIZE = 200 * 1024 * 1024
+PREVIEW_WIDTH = 480
+# Content types previews can be rendered for
+PREVIEW_TYPES = {"image/png", "image/jpeg", "image/tiff", "application/pdf"}
+
+
+@frappe.whitelist(methods=["POST"])
+def start_upload(patient, file_name, file_size, document_type, encounter=None, title=None):
+    """Register a chunked upload.
+
+    Args:
+        patient: Patient the document belongs to
+        file_name: Name of the file being uploaded
+        file_size: Size of the whole file in bytes
+        document_type: Medical Document type
+        encounter: Optional encounter to attach the document to
+        title: Optional title; defaults to the file name
+
+    Returns:
+        dict: {"upload_id", "chunk_size", "received"}
+    """
+    frappe.has_permission("Medical Document", "create", throw=True)
+    frappe.has_permission("Patient", "read", doc=patient, throw=True)
+
+    file_size = cint(file_size)
+    if not 0 < file_size <= MAX_FILE_SIZE:
+        frappe.throw(_("Files must be between 1 byte and {0} MB").format(MAX_FILE_SIZE >> 20))
+
+    upload_id = frappe.generate_hash(length=20)
+    _set_upload(
+        upload_id,
+        {
+            "owner": frappe.session.user,
+            "patient": patient,
+            "encounter": encounter,
+            "document_type": document_type,
+            "title": title or file_name,
+            "file_name": file_name,
+            "file_size": file_size,
+        },
+    )
+    os.makedirs(_uploads_directory(), exist_ok=True)
+    return {"upload_id": upload_id, "chunk_size": DEFAULT_CHUNK_SIZE, "received": 0}
+
+
+@frappe.whitelist(methods=["POST"])
+def upload_chunk(upload_id, offset):
+    """Append a chunk, sent as the multipart file field `chunk`.
+
+    Returns:
+        dict: {"received"}, the bytes received so far
+    """
+    upload = _get_upload(upload_id)
+    chunk = frappe.request.files.get("chunk")
+    if not chunk:
+        frappe.throw(_("The request has no chunk"))
+
+    try:
+        received = write_chunk(
+            _part_path(upload_id), cint(offset), chunk.stream, upload["file_size"]
+        )
+    except UploadError as e:
+        frappe.throw(str(e), title=_("Upload Out of Order"))
+
+    # Keep the upload alive as long as chunks keep coming
+    _set_upload(upload_id, upload)
+    return {"received": received}
+
+
+@frappe.whitelist()
+def get_upload_status(upload_id):
+    """Return {"received", "file_size"} of an upload, to resume it."""
+    upload = _get_upload(upload_id)
+    return {"received": received_bytes(_part_path(upload_id)), "file_size": upload["file_size"]}
+
+
+@frappe.whitelist(methods=["POST"])
+def complete_upload(upload_id):
+    """Store a fully received upload and create its Medical Document.
+
+    Returns:
+        dict: {"name", "duplicate"}. `duplicate` is set when the patient
+        already had a document with the same content, type and encounter.
+    """
+    upload = _get_upload(upload_id)
+    part_path = _part_path(upload_id)
+    if received_bytes(part_path) != upload["file_size"]:
+        frappe.throw(_("The upload is not complete yet"))
+
+    content_type = sniff_content_type(part_path)
+    if not content_type:
+        os.remove(part_path)
+        frappe.cache().delete_value(_upload_key(upload_id))
+        frappe.throw(_("Only PDF, JPEG, PNG, TIFF and DICOM files can be uploaded"))
+
+    digest = file_sha256(part_path)
+    ocr = needs_ocr(upload["document_type"], content_type)
+    existing = _find_duplicate(upload, digest)
+    store_blob(part_path, _blob_root(), digest)
+    frappe.cache().delete_value(_upload_key(upload_id))
+    if existing:
+        return {"name": existing, "duplicate": True}
+
+    doc = frappe.get_doc(
+        {
+            "doctype": "Medical Document",
+            "patient": upload["patient"],
+            "encounter": upload["encounter"],
+            "document_type": upload["document_type"],
+            "title": upload["title"],
+            "document_time": nowtime(),
+            "file_name": upload["file_name"],
+            "content_type": content_type,
+            "file_size": upload["file_size"],
+            "content_hash": digest,
+            "preview_status": _preview_status(digest, content_type),
+            "ocr_status": "Pending" if ocr else "Not Required",
+        }
+    ).insert()
+
+    if ocr:
+        enqueue_ocr()
+
+    if doc.preview_status == "Pending":
+        frappe.enqueue(
+            "mofeed_his.mofeed_his.utils.medical_documents.generate_preview",
+            queue="short",
+            job_id=f"mofeed_his:document_preview:{digest}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            content_hash=digest,
+        )
+    return {"name": doc.name, "duplicate": False}
+
+
+@frappe.whitelist()
+def download_document(name, preview=False):
+    """Stream a document's file, or its preview image, to the browser."""
+    doc = frappe.get_doc("Medical Document", name)
+    doc.check_permission("read")
+
+    if cint(preview):
+        path, content_type = _preview_path(doc.content_hash), "image/jpeg"
+    else:
+        path, content_type = document_path(doc.content_hash), doc.content_type
+    if not os.path.exists(path):
+        raise frappe.DoesNotExistError(_("The file of {0} is missing").format(name))
+
+    response = Response(
+        wrap_file(frappe.local.request.environ, open(path, "rb")),
+        mimetype=content_type,
+        direct_passthrough=True,
+    )
+    response.headers["Content-Length"] = os.path.getsize(path)
+    # Werkzeug encodes non-ASCII names (Arabic reports) as RFC 2231 `filename*`
+    response.headers.set("Content-Disposition", "inline", filename=doc.file_name or name)
+    return response
+
+
+def generate_preview(content_hash):
+    """Job: render the preview of a blob and mark its documents.
+
+    Images are scaled down with Pillow; PDFs have their first page
+    rendered by poppler's `pdftoppm` when it is installed.
+    """
+    content_type = frappe.db.get_value(
+        "Medical Document", {"content_hash": content_hash}, "content_type"
+    )
+    source = document_path(content_hash)
+    target = _preview_path(content_hash)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    try:
+        if content_type == "application/pdf":
+            rendered = _render_pdf_page(source, target)
+        else:
+            rendered = _render_image(source, target)
+        status = "Ready" if rendered else "Not Supported"
+    except Exception:
+        frappe.log_error(title=f"Medical document preview failed for {content_hash}")
+        status = "Failed"
+
+    frappe.db.sql(
+        """
+        UPDATE `tabMedical Document`
+        SET preview_status = %s
+        WHERE content_hash = %s AND preview_status != %s
+        """,
+        (status, content_hash, status),
+    )
+
+
+def document_path(content_hash):
+    """Return the path of the stored file with this SHA-256."""
+    return blob_path(_blob_root(), content_hash)
+
+
+def remove_stale_uploads():
+    """Scheduler: delete partial uploads abandoned for a day."""
+    directory = _uploads_directory()
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+def _preview_status(digest, content_type):
+    if content_type not in PREVIEW_TYPES:
+        return "Not Supported"
+    if os.path.exists(_preview_path(digest)):
+        return "Ready"
+    return "Pending"
+
+
+def _render_image(source, target):
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.thumbnail((PREVIEW_WIDTH, PREVIEW_WIDTH * 2))
+        image.convert("RGB").save(target + ".tmp", "JPEG", quality=80)
+    os.replace(target + ".tmp", target)
+    return True
+
+
+def _render_pdf_page(source, target):
+    pdftoppm = shutil.which("pdftoppm")
+    if not pdftoppm:
+        return False
+
+    prefix = target + ".page"
+    subprocess.run(
+        [pdftoppm, "-jpeg", "-singlefile", "-f", "1", "-l", "1", "-scale-to", str(PREVIEW_WIDTH)]
+        + [source, prefix],
+        check=True,
+        timeout=120,
+    )
+    os.replace(prefix + ".jpg", target)
+    return True
+
+
+def _find_duplicate(upload, digest):
+    """Return the patient's document with this content for the upload, or None.
+
+    A document matches on document type and encounter. One with no
+    encounter yet is linked to the upload's encounter instead of creating
+    a second document for the same file.
+    """
+    candidates = frappe.get_all(
+        "Medical Document",
+        filters={
+            "patient": upload["patient"],
+            "content_hash": digest,
+            "document_type": upload["document_type"],
+        },
+        fields=["name", "encounter"],
+        order_by="creation asc",
+    )
+    encounter = upload["encounter"] or None
+    for candidate in candidates:
+        if (candidate.encounter or None) == encounter:
+            return candidate.name
+
+    for candidate in candidates:
+        if not candidate.encounter:
+            doc = frappe.get_doc("Medical Document", candidate.name)
+            doc.encounter = encounter
+            doc.save()
+            return doc.name
+
+    return None
+
+
+def _get_upload(upload_id):
+    upload = frappe.cache().get_value(_upload_key(upload_id))
+    if not upload or upload["owner"] != frappe.session.user:
+        frappe.throw(_("Upload {0} was not found or has expired").format(upload_id))
+    return upload
+
+
+def _set_upload(upload_id, upload):
+    frappe.cache().set_value(_upload_key(upload_id), upload, expires_in_sec=UPLOAD_EXPIRY_SECONDS)
+
+
+def _upload_key(upload_id):
+    return f"{UPLOAD_CACHE_KEY}:{upload_id}"
+
+
+def _documents_directory():
+    return frappe.get_site_path("private", "medical_documents")
+
+
+def _uploads_directory():
+    return os.path.join(_documents_directory(), "uploads")
+
+
+def _blob_root():
+    return os.path.join(_documents_directory(), "blobs")
+
+
+def _part_path(upload_id):
+    return os.path.join(_uploads_directory(), f"{upload_id}.part")
+
+
+def _preview_path(digest):
+    return os.path.join(_documents_directory(), "previews", f"{digest}.jpg")
@@ -0,0 +1,242 @@
+"""Unified medical record timeline (PDR §14).
+
+Merges a patient's encounters, diagnoses, lab tests, vital signs,
+clinical procedures and medical documents into one newest-first
+timeline. Each page runs one
+keyset query per source, fetching only the summary columns shown in the
+list, and merges them with `utils.timeline.merge_page`; the composite
+(patient, date) indexes of `TIMELINE_INDEXES` keep every query a short
+range read, however deep the page.
+
+Detail panels are loaded separately, one event at a time, with
+`get_timeline_detail`.
+
+Sources are declared in `SOURCES`. A source whose doctype is not
+installed, or that the user may not read, is left out.
+"""
+
+import frappe
+from frappe import _
+
+from mofeed_his.mofeed_his.utils.hospital_scope import check_record_hospital, hospital_scoped
+from mofeed_his.mofeed_his.utils.timeline import (
+    clamp_page_size,
+    decode_cursor,
+    format_time,
+    keyset_condition,
+    merge_page,
+)
+
+# Source -> how to read its events. `date`, `time` and `name` build the
+# order key; `reference` is the document opened by the detail panel;
+# `fields` are the projected summary columns.
+SOURCES = {
+    "encounter": {
+        "doctype": "Patient Encounter",
+        "from": "`tabPatient Encounter` t",
+        "patient": "t.patient",
+        "date": "t.encounter_date",
+        "time": "t.encounter_time",
+        "name": "t.name",
+        "reference": "t.name",
+        "conditions": ["t.docstatus < 2"],
+        "fields": {
+            "title": "t.practitioner_name",
+            "subtitle": "t.medical_department",
+            "status": "t.status",
+        },
+    },
+    "diagnosis": {
+        "doctype": "Patient Encounter",
+        "from": (
+            "`tabPatient Encounter Diagnosis` d"
+            " INNER JOIN `tabPatient Encounter` t"
+            " ON t.name = d.parent AND d.parenttype = 'Patient Encounter'"
+        ),
+        "patient": "t.patient",
+        "date": "t.encounter_date",
+        "time": "t.encounter_time",
+        "name": "d.name",
+        "reference": "t.name",
+        "conditions": ["t.docstatus < 2"],
+        "fields": {
+            "title": "d.diagnosis",
+            "subtitle": "t.practitioner_name",
+            "status": "t.status",
+        },
+    },
+    "lab_test": {
+        "doctype": "Lab Test",
+        "from": "`tabLab Test` t",
+        "patient": "t.patient",
+        "date": "t.date",
+        "time": "t.time",
+        "name": "t.name",
+        "reference": "t.name",
+        "conditions": ["t.docstatus < 2"],
+        "fields": {
+            "title": "t.lab_test_name",
+            "subtitle": "t.practitioner_name",
+            "status": "t.status",
+        },
+    },
+    "vital_signs": {
+        "doctype": "Vital Signs",
+        "from": "`tabVital Signs` t",
+        "patient": "t.patient",
+        "date": "t.signs_date",
+        "time": "t.signs_time",
+        "name": "t.name",
+        "reference": "t.name",
+        "conditions": ["t.docstatus < 2"],
+        "fields": {
+            "title": "t.bp",
+            "subtitle": "t.temperature",
+            "status": "t.vital_signs_note",
+        },
+    },
+    "procedure": {
+        "doctype": "Clinical Procedure",
+        "from": "`tabClinical Procedure` t",
+        "patient": "t.patient",
+        "date": "t.start_date",
+        "time": "t.start_time",
+        "name": "t.name",
+        "reference": "t.name",
+        "conditions": ["t.docstatus < 2"],
+        "fields": {
+            "title": "t.procedure_template",
+            "subtitle": "t.practitioner_name",
+            "status": "t.status",
+        },
+    },
+    "document": {
+        "doctype": "Medical Document",
+        "from": "`tabMedical Document` t",
+        "patient": "t.patient",
+        "date": "t.document_date",
+        "time": "t.document_time",
+        "name": "t.name",
+        "reference": "t.name",
+        "conditions": [],
+        "fields": {
+            "title": "t.title",
+            "subtitle": "t.document_type",
+            "status": "t.preview_status",
+        },
+    },
+}
+
+# Composite indexes backing the keyset queries of the Healthcare sources,
+# added after every install and migrate (`install`). Medical Document adds
+# its own in `on_doctype_update`.
+TIMELINE_INDEXES = {
+    "Patient Encounter": ["patient", "encounter_date", "encounter_time"],
+    "Lab Test": ["patient", "date", "time"],
+    "Vital Signs": ["patient", "signs_date", "signs_time"],
+    "Clinical Procedure": ["patient", "start_date", "start_time"],
+}
+
+
+@frappe.whitelist()
+@hospital_scoped(patient="Patient")
+def get_timeline(patient, cursor=None, page_size=None, sources=None):
+    """Return one page of a patient's medical record timeline.
+
+    Args:
+        patient: Patient
+        cursor: `next_cursor` of the previous page; empty for the newest page
+        page_size: Events per page, at most `timeline.MAX_PAGE_SIZE`
+        sources: Source names to include (list or JSON); default all
+
+    Returns:
+        dict: {"events", "next_cursor"}. Events are newest first, each with
+        source, doctype, name, reference, date, time, title, subtitle and
+        status. `next_cursor` is None on the last page.
+    """
+    frappe.has_permission("Patient", "read", doc=patient, throw=True)
+
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        frappe.throw(_("The timeline cursor is invalid. Reload the timeline."))
+
+    page_size = clamp_page_size(page_size)
+    if isinstance(sources, str):
+        sources = frappe.parse_json(sources)
+
+    streams = [
+        _read_source(source, patient, after, page_size + 1)
+        for source in _readable_sources(sources)
+    ]
+    events, next_cursor = merge_page(streams, page_size)
+    return {"events": events, "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+def get_timeline_detail(source, name):
+    """Return the document behind a timeline event, for its detail panel.
+
+    Args:
+        source: Event source
+        name: Event `reference`
+    """
+    if source not in SOURCES:
+        frappe.throw(_("Unknown timeline source {0}").format(source))
+
+    doc = frappe.get_doc(SOURCES[source]["doctype"], name)
+    doc.check_permission("read")
+    if doc.get("patient"):
+        check_record_hospital("Patient", doc.patient)
+    return doc.as_dict()
+
+
+def _readable_sources(selected=None):
+    return [
+        source
+        for source, config in SOURCES.items()
+        if (not selected or source in selected)
+        and _is_installed(config["doctype"])
+        and frappe.has_permission(config["doctype"], "read")
+    ]
+
+
+def _is_installed(doctype):
+    installed = frappe.local.cache.setdefault("mofeed_his:timeline_doctypes", {})
+    if doctype not in installed:
+        installed[doctype] = bool(frappe.db.exists("DocType", doctype))
+    return installed[doctype]
+
+
+def _read_source(source, patient, after, limit):
+    """Read up to `limit` events of one source after the cursor, newest first."""
+    config = SOURCES[source]
+    # Ordering by the bare columns lets the (patient, date, time) index,
+    # which ends in the primary key, deliver rows in key order; a missing
+    # time compares as midnight
+    time_column = f"IFNULL({config['time']}, '00:00:00')"
+    keyset, values = keyset_condition(source, after, config["date"], time_column, config["name"])
+
+    conditions = [f"{config['patient']} = %(patient)s", keyset] + config["conditions"]
+    fields = ", ".join(
+        f"{expression} AS `{alias}`" for alias, expression in config["fields"].items()
+    )
+    rows = frappe.db.sql(
+        f"""
+        SELECT {config['date']} AS `date`, {time_column} AS `time`, {config['name']} AS `name`,
+            {config['reference']} AS `reference`, {fields}
+        FROM {config['from']}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {config['date']} DESC, {config['time']} DESC, {config['name']} DESC
+        LIMIT %(limit)s
+        """,
+        dict(values, patient=patient, limit=limit),
+        as_dict=True,
+    )
+
+    for row in rows:
+        row["source"] = source
+        row["doctype"] = config["doctype"]
+        row["date"] = str(row["date"])
+        row["time"] = format_time(row["time"])
+    return rows
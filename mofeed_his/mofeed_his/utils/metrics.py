@@ -0,0 +1,142 @@
+"""In-process metrics and their Prometheus text rendering.
+
+A `MetricsBuffer` collects counters and latency histograms in the worker
+process that records them, with one dictionary update per sample.
+Workers periodically drain the buffer into a shared store as deltas
+(`utils.instrumentation`), and `render` turns the summed samples into
+the Prometheus text exposition format.
+
+Samples are keyed by their exposition name, e.g.
+`mofeed_his_request_seconds_bucket{endpoint="search",le="0.1"}`, so the
+shared store needs no schema: deltas add up field by field, and
+histogram buckets stay cumulative because every sample adds to each
+bucket it falls under.
+"""
+
+import re
+import threading
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+
+# Upper bounds in seconds, from a cache read to a slow report
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LE = re.compile(r'le="([^"]+)"')
+_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+class MetricsBuffer:
+    """Counters and histograms recorded since the last drain.
+
+    Args:
+        buckets: Histogram bucket upper bounds, ascending
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._bucket_labels = [_format_le(bound) for bound in self.buckets] + ["+Inf"]
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=None, value=1):
+        """Add `value` to a counter."""
+        key = sample_name(name, labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record one observation (e.g. seconds) in a histogram."""
+        labels = dict(labels or {})
+        keys = [sample_name(f"{name}_sum", labels), sample_name(f"{name}_count", labels)]
+        first = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                first = index
+                break
+        for le in self._bucket_labels[first:]:
+            keys.append(sample_name(f"{name}_bucket", labels, le=le))
+
+        samples = self._samples
+        with self._lock:
+            samples[keys[0]] = samples.get(keys[0], 0) + value
+            for key in keys[1:]:
+                samples[key] = samples.get(key, 0) + 1
+
+    def drain(self):
+        """Return the samples recorded so far and start again from zero."""
+        with self._lock:
+            samples, self._samples = self._samples, {}
+        return samples
+
+    def __len__(self):
+        return len(self._samples)
+
+
+def sample_name(name, labels=None, le=None):
+    """Return the exposition name of a sample, labels in sorted order."""
+    pairs = sorted((labels or {}).items())
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return name
+    rendered = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return f"{name}{{{rendered}}}"
+
+
+def render(samples, families):
+    """Render samples in the Prometheus text exposition format.
+
+    Args:
+        samples: Sample name -> value, see `sample_name`
+        families: Metric family -> (type, help text); samples of unknown
+            families are left out
+
+    Returns:
+        str: The exposition text, families and samples in a stable order
+    """
+    by_family = {}
+    for sample, value in samples.items():
+        family = family_name(sample)
+        if family in families:
+            by_family.setdefault(family, []).append((_sort_key(sample), sample, value))
+
+    lines = []
+    for family in sorted(by_family):
+        kind, help_text = families[family]
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for _, sample, value in sorted(by_family[family]):
+            lines.append(f"{sample} {_format_value(value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def family_name(sample):
+    """Return the metric family of a sample name."""
+    name = sample.split("{", 1)[0]
+    for suffix in _SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _sort_key(sample):
+    """Order samples by series, then buckets by their bound rather than as text."""
+    match = _LE.search(sample)
+    if not match:
+        return (sample, 0.0)
+    le = match.group(1)
+    return (_LE.sub("", sample), float("inf") if le == "+Inf" else float(le))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_le(bound):
+    return repr(float(bound))
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
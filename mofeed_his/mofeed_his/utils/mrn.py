@@ -13,24 +13,55 @@ Design Choices:
    - Year component for chronological grouping
    - 6-digit running number for unique identification within year
 
-3. Thread-safe sequence generation using database-level locking
-   via SELECT ... FOR UPDATE to prevent duplicate MRNs in concurrent scenarios.
+3. Two allocation modes, configured per Hospital:
+   - Block (default): each worker reserves a block of numbers from the
+     MRN Sequence row in a short, separate transaction and hands them out
+     from memory (hi/lo). Registrations no longer hold the sequence row
+     lock for the whole Patient insert. Numbers may have gaps and are not
+     strictly ordered across workers.
+   - Strict: SELECT ... FOR UPDATE inside the Patient insert transaction,
+     which is gap-free but serializes concurrent registrations.
 
 4. The MRN Sequence doctype tracks running numbers per hospital per year,
    allowing for automatic reset at year boundaries.
 
 5. A before_insert hook on Patient ensures MRN is generated before first save.
+
+6. Patient and Patient Extension share this allocator, so both records carry
+   the same number. The format is pluggable through the `mrn_format` hook.
 """
 
+from contextlib import contextmanager
+
 import frappe
-from frappe.utils import nowdate
+from frappe import _
+from frappe.utils import cint, nowdate
+
+from mofeed_his.mofeed_his.utils.hospital_cache import (
+    get_default_hospital,
+    get_hospital,
+    get_hospital_by_code,
+)
+from mofeed_his.mofeed_his.utils.mrn_blocks import MRNBlockPool
+from mofeed_his.mofeed_his.utils.mrn_checks import duplicate_mrn, first_duplicate_mrn
+
+BLOCK_ALLOCATION = "Block"
+STRICT_ALLOCATION = "Strict"
+DEFAULT_BLOCK_SIZE = 20
+
+# Override with an `mrn_format` hook; fields: code, prefix, year, number
+DEFAULT_MRN_FORMAT = "{code}-{year}-{number:06d}"
+
+# Per-process pool of reserved MRN blocks, keyed by (site, hospital_code, year)
+_block_pool = MRNBlockPool()
 
 
 def get_default_hospital_code():
     """Get the default hospital code for MRN generation.
 
-    Returns the code of the first hospital in the system,
-    or raises an error if no hospital is configured.
+    Returns the code of the default hospital from Mofeed HIS Settings or,
+    failing that, of the first hospital in the system. Raises an error if no
+    hospital is configured. The lookup is served from the hospital cache.
 
     Returns:
         str: Hospital code (e.g., 'KRBHOSP')
@@ -38,17 +69,8 @@ def get_default_hospital_code():
     Raises:
         frappe.ValidationError: If no hospital is configured
     """
-    # Try to get default hospital from Mofeed HIS Settings if it exists
-    default_hospital = frappe.db.get_single_value(
-        "Mofeed HIS Settings", "default_hospital"
-    )
-    if default_hospital:
-        return frappe.db.get_value("Hospital", default_hospital, "code")
-
-    # Fallback: get the first hospital
-    hospital_code = frappe.db.get_value(
-        "Hospital", filters={}, fieldname="code", order_by="creation asc"
-    )
+    hospital = get_hospital(get_default_hospital())
+    hospital_code = hospital.code if hospital else None
 
     if not hospital_code:
         frappe.throw(
@@ -62,7 +84,8 @@ def get_default_hospital_code():
 def get_next_mrn(hospital_code=None):
     """Generate the next MRN for a given hospital.
 
-    Uses database-level locking to ensure thread-safe sequence generation.
+    The running number comes from the hospital's block pool, or from a
+    locked sequence increment when the hospital uses strict allocation.
     Format: {HOSPITAL_CODE}-{YEAR}-{RUNNING_NUMBER:06d}
 
     Args:
@@ -71,6 +94,73 @@ def get_next_mrn(hospital_code=None):
     Returns:
         str: Generated MRN (e.g., 'KRBHOSP-2025-000123')
 
+    Raises:
+        frappe.ValidationError: If hospital code is invalid
+    """
+    hospital_code, hospital = _get_mrn_hospital(hospital_code)
+
+    # Get current year
+    current_year = int(nowdate()[:4])
+
+    # Generate sequence key
+    sequence_name = f"{hospital_code}-{current_year}"
+
+    block_size = cint(hospital.mrn_block_size) or DEFAULT_BLOCK_SIZE
+    if hospital.mrn_allocation == STRICT_ALLOCATION or block_size <= 1:
+        # Gap-free: lock the sequence row until the Patient insert commits
+        next_value = _get_next_sequence_value(hospital_code, current_year, sequence_name)
+    else:
+        next_value = _block_pool.take(
+            (frappe.local.site, hospital_code, current_year),
+            lambda: _reserve_block(hospital_code, current_year, sequence_name, block_size),
+        )
+
+    return format_mrn(hospital_code, current_year, next_value, prefix=hospital.get("mrn_prefix"))
+
+
+def reserve_mrns(hospital_code, count):
+    """Reserve `count` consecutive MRNs for a hospital in one sequence update.
+
+    Used by bulk flows such as patient import. In Block mode the range is
+    reserved in a separate short transaction; in Strict mode it is taken
+    inside the caller's transaction so a rollback leaves no gap.
+
+    Args:
+        hospital_code: Hospital code prefix. If None, uses default hospital.
+        count: Number of MRNs to reserve
+
+    Returns:
+        list: Formatted MRNs in ascending order
+    """
+    if count <= 0:
+        return []
+
+    hospital_code, hospital = _get_mrn_hospital(hospital_code)
+    current_year = int(nowdate()[:4])
+    sequence_name = f"{hospital_code}-{current_year}"
+
+    if hospital.mrn_allocation == STRICT_ALLOCATION:
+        high = _get_next_sequence_value(
+            hospital_code, current_year, sequence_name, increment=count
+        )
+        low = high - count + 1
+    else:
+        low, high = _reserve_block(hospital_code, current_year, sequence_name, count)
+
+    prefix = hospital.get("mrn_prefix")
+    return [
+        format_mrn(hospital_code, current_year, number, prefix=prefix)
+        for number in range(low, high + 1)
+    ]
+
+
+def _get_mrn_hospital(hospital_code=None):
+    """Resolve the hospital code and its MRN settings.
+
+    Returns:
+        tuple: ``(hospital_code, hospital)`` where `hospital` holds name,
+        mrn_allocation, mrn_block_size and, if the field exists, mrn_prefix
+
     Raises:
         frappe.ValidationError: If hospital code is invalid
     """
@@ -80,89 +170,178 @@ def get_next_mrn(hospital_code=None):
     # Ensure hospital code is uppercase
     hospital_code = hospital_code.upper()
 
-    # Validate hospital exists
-    if not frappe.db.exists("Hospital", {"code": hospital_code}):
+    # Validate hospital exists and read its allocation settings from the cache
+    hospital = get_hospital_by_code(hospital_code)
+    if not hospital:
         frappe.throw(
             f"Hospital with code '{hospital_code}' not found.",
             frappe.ValidationError,
         )
 
-    # Get current year
-    current_year = int(nowdate()[:4])
+    return hospital_code, hospital
 
-    # Generate sequence key
-    sequence_name = f"{hospital_code}-{current_year}"
 
-    # Use database-level locking for thread safety
-    # This ensures concurrent inserts don't get duplicate MRNs
-    next_value = _get_next_sequence_value(hospital_code, current_year, sequence_name)
+def get_mrn_for_hospital(hospital=None):
+    """Generate the next MRN for a Hospital document.
+
+    Args:
+        hospital: Hospital document name. If None, uses default hospital.
+
+    Returns:
+        str: Generated MRN
+    """
+    hospital_code = None
+    if hospital:
+        hospital_data = get_hospital(hospital)
+        if not hospital_data:
+            frappe.throw(_("Hospital '{0}' not found.").format(hospital), frappe.ValidationError)
+        hospital_code = hospital_data.code
+
+    return get_next_mrn(hospital_code)
+
+
+def format_mrn(hospital_code, year, number, prefix=None):
+    """Render an MRN from its parts.
+
+    The template is taken from the last `mrn_format` hook, falling back to
+    DEFAULT_MRN_FORMAT (e.g. 'KRBHOSP-2025-000123').
+
+    Args:
+        hospital_code: Hospital code
+        year: Registration year
+        number: Running number within the hospital and year
+        prefix: Hospital MRN prefix, defaults to the hospital code
+
+    Returns:
+        str: Formatted MRN
+    """
+    template = (frappe.get_hooks("mrn_format") or [DEFAULT_MRN_FORMAT])[-1]
+    return template.format(
+        code=hospital_code,
+        prefix=prefix or hospital_code,
+        year=year,
+        number=number,
+    )
+
+
+def _reserve_block(hospital_code, year, sequence_name, block_size):
+    """Reserve a block of running numbers in a separate, short transaction.
+
+    The sequence row is advanced by `block_size` on a dedicated connection
+    that commits immediately, so the row lock is released before the
+    Patient insert continues.
 
-    # Format MRN: HOSPITAL_CODE-YEAR-RUNNING_NUMBER (6 digits, zero-padded)
-    mrn = f"{hospital_code}-{current_year}-{next_value:06d}"
+    Returns:
+        tuple: Inclusive ``(low, high)`` range of reserved numbers
+    """
+    db = get_sequence_connection()
+    try:
+        high = _get_next_sequence_value(
+            hospital_code, year, sequence_name, increment=block_size, db=db
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-    return mrn
+    return high - block_size + 1, high
 
 
-def _get_next_sequence_value(hospital_code, year, sequence_name):
-    """Get the next sequence value with database-level locking.
+def get_sequence_connection():
+    """Open a new database connection for sequence reservations.
+
+    A separate connection is needed so the reservation can commit without
+    committing the caller's transaction.
+    """
+    from frappe.database import get_db
+
+    conf = frappe.conf
+    db = get_db(
+        socket=conf.db_socket,
+        host=conf.db_host,
+        port=conf.db_port,
+        user=conf.db_user or conf.db_name,
+        password=conf.db_password,
+        cur_db_name=conf.db_name,
+    )
+    db.connect()
+    return db
+
+
+def _get_next_sequence_value(hospital_code, year, sequence_name, increment=1, db=None):
+    """Advance the sequence with database-level locking.
 
     This function uses SELECT ... FOR UPDATE to lock the row
-    and prevent race conditions in concurrent environments.
+    and prevent race conditions in concurrent environments. The row is
+    looked up by its primary key (`{HOSPITAL_CODE}-{YEAR}`), so the cost
+    does not depend on how many sequences or patients exist.
 
     Args:
         hospital_code: Hospital code prefix
         year: Current year
         sequence_name: Sequence document name
+        increment: How many numbers to consume (block size for block allocation)
+        db: Database connection to use, defaults to `frappe.db`
 
     Returns:
-        int: Next sequence value
+        int: New current value, i.e. the last number consumed
     """
+    db = db or frappe.db
+
     # Try to get existing sequence with row lock
-    existing = frappe.db.sql(
-        """
-        SELECT name, current_value
-        FROM `tabMRN Sequence`
-        WHERE hospital_code = %s AND year = %s
-        FOR UPDATE
-        """,
-        (hospital_code, year),
-        as_dict=True,
-    )
+    existing = _lock_sequence(db, sequence_name)
 
-    if existing:
-        # Increment existing sequence
-        next_value = existing[0]["current_value"] + 1
-        frappe.db.sql(
-            """
-            UPDATE `tabMRN Sequence`
-            SET current_value = %s, modified = NOW()
-            WHERE name = %s
-            """,
-            (next_value, existing[0]["name"]),
-        )
-    else:
-        # Create new sequence for this hospital/year combination
-        next_value = 1
+    if not existing:
+        # Create new sequence for this hospital/year combination.
+        # INSERT IGNORE lets concurrent first registrations of a year both
+        # succeed; whoever loses the race simply locks the winner's row.
         # Use db.sql for direct insert to avoid document lifecycle overhead
-        frappe.db.sql(
+        db.sql(
             """
-            INSERT INTO `tabMRN Sequence`
+            INSERT IGNORE INTO `tabMRN Sequence`
             (name, hospital_code, year, current_value, creation, modified, owner, modified_by)
-            VALUES (%s, %s, %s, %s, NOW(), NOW(), %s, %s)
+            VALUES (%s, %s, %s, 0, NOW(), NOW(), %s, %s)
             """,
             (
                 sequence_name,
                 hospital_code,
                 year,
-                next_value,
                 frappe.session.user,
                 frappe.session.user,
             ),
         )
+        existing = _lock_sequence(db, sequence_name)
+
+    # Increment sequence
+    next_value = existing[0]["current_value"] + increment
+    db.sql(
+        """
+        UPDATE `tabMRN Sequence`
+        SET current_value = %s, modified = NOW()
+        WHERE name = %s
+        """,
+        (next_value, sequence_name),
+    )
 
     return next_value
 
 
+def _lock_sequence(db, sequence_name):
+    """Select the sequence row by primary key and lock it."""
+    return db.sql(
+        """
+        SELECT name, current_value
+        FROM `tabMRN Sequence`
+        WHERE name = %s
+        FOR UPDATE
+        """,
+        (sequence_name,),
+        as_dict=True,
+    )
+
+
 def generate_patient_mrn(doc, method=None):
     """Hook function to generate MRN for new patients.
 
@@ -177,22 +356,19 @@ def generate_patient_mrn(doc, method=None):
     if getattr(doc, "custom_mrn", None):
         return
 
-    # Get hospital code from patient's hospital if set, otherwise use default
-    hospital_code = None
-    if hasattr(doc, "custom_hospital") and doc.custom_hospital:
-        hospital_code = frappe.db.get_value("Hospital", doc.custom_hospital, "code")
-
-    # Generate MRN
-    mrn = get_next_mrn(hospital_code)
+    # Generate MRN from patient's hospital if set, otherwise use default
+    doc.custom_mrn = get_mrn_for_hospital(getattr(doc, "custom_hospital", None))
 
-    # Set MRN on patient document
-    doc.custom_mrn = mrn
+    # Allocator-issued numbers are unique by construction
+    doc.flags.mrn_allocated = True
 
 
 def validate_mrn_unique(doc, method=None):
     """Validate that MRN is unique across all patients.
 
-    This is called as a validate hook to ensure no duplicate MRNs exist.
+    This is called as a validate hook. The query only runs when the MRN is
+    new or has changed and was not issued by the allocator. Ordinary edits
+    skip it; the unique index on `custom_mrn` remains the backstop.
 
     Args:
         doc: Patient document
@@ -204,15 +380,87 @@ def validate_mrn_unique(doc, method=None):
     if not getattr(doc, "custom_mrn", None):
         return
 
+    if doc.flags.mrn_allocated:
+        return
+
+    if not doc.is_new() and not doc.has_value_changed("custom_mrn"):
+        return
+
     # Check for existing patient with same MRN (excluding current doc)
-    existing = frappe.db.get_value(
-        "Patient",
-        {"custom_mrn": doc.custom_mrn, "name": ("!=", doc.name)},
-        "name",
+    validate_many([doc.custom_mrn], exclude=[doc.name])
+
+
+def validate_many(mrns, exclude=None):
+    """Validate a batch of MRNs with a single query.
+
+    Intended for bulk flows. Duplicates within `mrns` and MRNs already
+    assigned to other patients are both rejected.
+
+    Args:
+        mrns: MRNs to validate
+        exclude: Patient names to ignore (the patients being saved)
+
+    Raises:
+        frappe.DuplicateEntryError: For the first duplicate MRN found
+    """
+    mrns = list(mrns)
+    # Repeats within the batch need no query
+    duplicate = first_duplicate_mrn(mrns) or first_duplicate_mrn(
+        mrns, get_existing_mrns(mrns, exclude=exclude)
     )
+    if duplicate:
+        throw_duplicate_mrn(duplicate)
 
-    if existing:
-        frappe.throw(
-            f"MRN '{doc.custom_mrn}' is already assigned to another patient.",
-            frappe.DuplicateEntryError,
-        )
+
+def get_existing_mrns(mrns, exclude=None):
+    """Return the subset of `mrns` already assigned to a patient.
+
+    Args:
+        mrns: MRNs to look up (one indexed IN query)
+        exclude: Patient names to ignore
+
+    Returns:
+        set: MRNs that already exist
+    """
+    mrns = [mrn for mrn in mrns if mrn]
+    if not mrns:
+        return set()
+
+    filters = {"custom_mrn": ("in", mrns)}
+    exclude = [name for name in (exclude or []) if name]
+    if exclude:
+        filters["name"] = ("not in", exclude)
+
+    return set(frappe.get_all("Patient", filters=filters, pluck="custom_mrn"))
+
+
+def throw_duplicate_mrn(mrn):
+    """Raise the standard duplicate MRN error."""
+    frappe.throw(
+        f"MRN '{mrn}' is already assigned to another patient.",
+        frappe.DuplicateEntryError,
+    )
+
+
+@contextmanager
+def mrn_unique_guard(mrns=()):
+    """Turn unique-key violations on MRN columns into DuplicateEntryError.
+
+    Wrap direct writes (bulk inserts, `db.set_value`) that rely on the
+    database unique index instead of a prior SELECT. Errors that are not
+    about an MRN are re-raised unchanged.
+
+    Args:
+        mrns: MRNs written by a bulk insert of Patient Extensions, whose
+            primary key is the MRN
+    """
+    try:
+        yield
+    except Exception as e:
+        if not frappe.db.is_unique_key_violation(e):
+            raise
+
+        mrn = duplicate_mrn(str(e), mrns)
+        if mrn is None:
+            raise
+        throw_duplicate_mrn(mrn)
@@ -0,0 +1,205 @@
+"""Concurrency benchmark for MRN allocation and Patient registration.
+
+Registers patients from N concurrent workers, threads or processes each
+with their own database connection, against a test site, and reports:
+
+- throughput and p50/p95/p99 registration latency
+- InnoDB row lock waits, lock wait time and deadlocks during the run
+  (deltas of the server's global status counters)
+- deadlocks and lock wait timeouts seen by the workers, which retry
+- an audit of the MRNs handed out: no duplicates, and no skipped
+  numbers under Strict allocation (`utils.benchmark_stats`)
+
+The hospital's allocation mode and block size can be overridden for the
+run, so strategies can be compared on the same site; the report is
+written as JSON. Run it on a test site only: it creates real patients.
+
+Usage:
+    bench --site test_site benchmark-mrn --hospital "Test Hospital" --workers 16 \\
+        --patients 50 --allocation Strict --output strict.json
+"""
+
+import json
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import frappe
+from frappe import _
+from frappe.utils import now
+
+from mofeed_his.mofeed_his.utils.benchmark_stats import audit_mrns, latency_summary, throughput
+from mofeed_his.mofeed_his.utils.hospital_cache import clear_hospital_cache
+from mofeed_his.mofeed_his.utils.mrn import STRICT_ALLOCATION
+
+PROCESSES = "process"
+THREADS = "thread"
+MAX_RETRIES = 3
+INNODB_COUNTERS = ("Innodb_row_lock_waits", "Innodb_row_lock_time", "Innodb_deadlocks")
+
+
+def run_benchmark(
+    site,
+    hospital,
+    workers=8,
+    patients_per_worker=50,
+    mode=PROCESSES,
+    allocation=None,
+    block_size=None,
+    output=None,
+):
+    """Register patients concurrently and report how allocation behaved.
+
+    Must be called with the site connected; workers open their own
+    connections.
+
+    Args:
+        site: Site to benchmark
+        hospital: Hospital the patients are registered under
+        workers: Concurrent workers
+        patients_per_worker: Patients registered by each worker
+        mode: "process" or "thread"
+        allocation: "Block" or "Strict" for the run; the hospital's setting if None
+        block_size: MRN block size for the run; the hospital's setting if None
+        output: Path of the JSON report, if any
+
+    Returns:
+        dict: The report
+    """
+    settings = frappe.db.get_value(
+        "Hospital", hospital, ["mrn_allocation", "mrn_block_size"], as_dict=True
+    )
+    if not settings:
+        frappe.throw(_("Hospital '{0}' not found.").format(hospital), frappe.ValidationError)
+
+    run_id = uuid.uuid4().hex[:8]
+    overrides = {}
+    if allocation:
+        overrides["mrn_allocation"] = allocation
+    if block_size:
+        overrides["mrn_block_size"] = block_size
+    _configure_hospital(hospital, overrides)
+
+    try:
+        before = _innodb_counters()
+        executor = (
+            ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+            if mode == PROCESSES
+            else ThreadPoolExecutor(workers)
+        )
+        started = time.monotonic()
+        with executor:
+            results = list(
+                executor.map(
+                    register_patients,
+                    [site] * workers,
+                    [hospital] * workers,
+                    [patients_per_worker] * workers,
+                    [f"{run_id}-{worker}" for worker in range(workers)],
+                )
+            )
+        elapsed = time.monotonic() - started
+        after = _innodb_counters()
+    finally:
+        _configure_hospital(hospital, {field: settings[field] for field in overrides})
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    mrns = [mrn for result in results for mrn in result["mrns"]]
+    effective_allocation = allocation or settings.mrn_allocation
+    report = {
+        "run_id": run_id,
+        "started": now(),
+        "site": site,
+        "hospital": hospital,
+        "allocation": effective_allocation,
+        "block_size": block_size or settings.mrn_block_size,
+        "mode": mode,
+        "workers": workers,
+        "patients_per_worker": patients_per_worker,
+        "registered": len(mrns),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": throughput(len(mrns), elapsed),
+        "latency_ms": latency_summary(latencies),
+        "innodb": {
+            "row_lock_waits": after["Innodb_row_lock_waits"] - before["Innodb_row_lock_waits"],
+            "row_lock_time_ms": after["Innodb_row_lock_time"] - before["Innodb_row_lock_time"],
+            "deadlocks": after["Innodb_deadlocks"] - before["Innodb_deadlocks"],
+        },
+        "worker_errors": {
+            kind: sum(result["errors"][kind] for result in results)
+            for kind in ("deadlock", "lock_timeout", "other", "failed")
+        },
+        "mrn_audit": audit_mrns(mrns, gap_free=effective_allocation == STRICT_ALLOCATION),
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return report
+
+
+def register_patients(site, hospital, count, label):
+    """Worker: register `count` patients, one transaction each.
+
+    A registration that deadlocks or times out waiting for a lock is rolled
+    back and retried, up to MAX_RETRIES times, as a client would.
+
+    Returns:
+        dict: {"latencies", "mrns", "errors"}; latencies in seconds,
+        including retries
+    """
+    frappe.init(site=site)
+    frappe.connect()
+    frappe.set_user("Administrator")
+    latencies, mrns = [], []
+    errors = dict.fromkeys(("deadlock", "lock_timeout", "other", "failed"), 0)
+    try:
+        for number in range(count):
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    patient = frappe.get_doc(
+                        {
+                            "doctype": "Patient",
+                            "first_name": "MRN Benchmark",
+                            "last_name": f"{label}-{number}",
+                            "sex": "Male",
+                            "custom_hospital": hospital,
+                        }
+                    ).insert(ignore_permissions=True)
+                    frappe.db.commit()
+                except Exception as e:
+                    frappe.db.rollback()
+                    if frappe.db.is_deadlocked(e):
+                        errors["deadlock"] += 1
+                    elif frappe.db.is_timedout(e):
+                        errors["lock_timeout"] += 1
+                    else:
+                        errors["other"] += 1
+                    if attempt == MAX_RETRIES:
+                        errors["failed"] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                mrns.append(patient.custom_mrn)
+                break
+    finally:
+        frappe.destroy()
+    return {"latencies": latencies, "mrns": mrns, "errors": errors}
+
+
+def _configure_hospital(hospital, values):
+    if values:
+        frappe.db.set_value("Hospital", hospital, values)
+        frappe.db.commit()
+        clear_hospital_cache()
+
+
+def _innodb_counters():
+    rows = frappe.db.sql(
+        "SHOW GLOBAL STATUS WHERE Variable_name IN %(names)s",
+        {"names": INNODB_COUNTERS},
+    )
+    counters = dict.fromkeys(INNODB_COUNTERS, 0)
+    counters.update({name: int(value) for name, value in rows})
+    return counters
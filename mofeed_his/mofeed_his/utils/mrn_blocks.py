@@ -0,0 +1,72 @@
+"""In-memory hi/lo block pool for MRN running numbers.
+
+A worker reserves a contiguous block of numbers from the `MRN Sequence`
+row in one short transaction and then hands them out from memory, so
+concurrent registrations no longer wait on the sequence row lock.
+
+The reservation itself is supplied by the caller.
+"""
+
+import threading
+
+
+class MRNBlockPool:
+    """Thread-safe pool of reserved MRN number ranges.
+
+    Blocks are keyed by an arbitrary hashable key, normally
+    ``(site, hospital_code, year)``, so one worker process can serve
+    several sites and hospitals. Each key has its own lock, so a slow
+    reservation for one hospital does not hold up the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._blocks = {}
+
+    def take(self, key, reserve):
+        """Return the next number for `key`, reserving a new block if needed.
+
+        Args:
+            key: Pool key, e.g. ``(site, hospital_code, year)``
+            reserve: Callable returning a ``(low, high)`` inclusive range.
+                It is only called when the current block is exhausted.
+
+        Returns:
+            int: Next running number
+        """
+        with self._key_lock(key):
+            block = self._blocks.get(key)
+            if not block or block[0] > block[1]:
+                low, high = reserve()
+                if low > high:
+                    raise ValueError(f"Invalid MRN block reserved: {low}-{high}")
+                block = self._blocks[key] = [low, high]
+
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def remaining(self, key):
+        """Return how many numbers are left in the current block for `key`."""
+        with self._key_lock(key):
+            block = self._blocks.get(key)
+            return max(block[1] - block[0] + 1, 0) if block else 0
+
+    def discard(self, key=None):
+        """Drop the block for `key`, or every block when `key` is None.
+
+        Unused numbers in a discarded block are never handed out, which
+        leaves a gap in the sequence.
+        """
+        if key is None:
+            with self._lock:
+                self._blocks.clear()
+            return
+
+        with self._key_lock(key):
+            self._blocks.pop(key, None)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
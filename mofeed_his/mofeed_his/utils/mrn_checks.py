@@ -0,0 +1,70 @@
+"""Duplicate MRN detection for validation and unique-key errors.
+
+`validate_many` rejects a batch of MRNs that repeats one, or that holds
+one already assigned, and `mrn_unique_guard` turns the database's
+duplicate-key errors on MRN columns into the standard duplicate MRN
+error (see `utils.mrn`). Patient Extension is named by its MRN, so a
+duplicate on its primary key is an MRN duplicate too.
+"""
+
+import re
+
+# MariaDB: Duplicate entry 'KRBHOSP-2025-000001' for key 'custom_mrn'
+# (MySQL 8 prefixes the key with its table)
+MARIADB_DUPLICATE = re.compile(r"Duplicate entry '(.*)' for key '([^']*)'", re.DOTALL)
+# PostgreSQL: duplicate key value violates unique constraint "<key>"
+# DETAIL: Key (custom_mrn)=(KRBHOSP-2025-000001) already exists.
+POSTGRES_DUPLICATE = re.compile(
+    r'unique constraint "([^"]*)".*Key \([^)]*\)=\((.*)\) already exists', re.DOTALL
+)
+
+
+def first_duplicate_mrn(mrns, existing=()):
+    """Return the first MRN of a batch that is repeated or already assigned.
+
+    Args:
+        mrns: MRNs of the batch, in order; empty values are ignored
+        existing: MRNs of the batch already assigned to other patients
+
+    Returns:
+        str: The first repeated MRN, else the lowest existing one, else None
+    """
+    seen = set()
+    for mrn in mrns:
+        if not mrn:
+            continue
+        if mrn in seen:
+            return mrn
+        seen.add(mrn)
+
+    existing = seen & set(existing)
+    return min(existing) if existing else None
+
+
+def duplicate_mrn(message, mrns=()):
+    """Return the MRN a duplicate-key error is about, or None for other keys.
+
+    Args:
+        message: Text of the database error
+        mrns: MRNs being written; a primary key duplicate is about an MRN
+            when its value is one of them (Patient Extension is named by
+            its MRN)
+
+    Returns:
+        str: The duplicated MRN, or None if the error is about another key
+    """
+    match = MARIADB_DUPLICATE.search(message)
+    if match:
+        value, key = match.groups()
+        key = key.rpartition(".")[2]
+        is_primary = key == "PRIMARY"
+    else:
+        match = POSTGRES_DUPLICATE.search(message)
+        if not match:
+            return None
+        key, value = match.groups()
+        is_primary = key.endswith("_pkey")
+
+    if "mrn" in key.lower() or (is_primary and value in set(mrns)):
+        return value
+    return None
@@ -0,0 +1,108 @@
+"""OCR of medical documents, run in pool processes.
+
+`ocr_document` rasterizes a document's pages and reads them with an OCR
+engine. It runs in the process pool of `utils.document_ocr`, which
+spawns fresh interpreters: this module therefore has no Frappe
+dependency and takes everything it needs as arguments.
+
+The engine is a dotted path to a callable (image path, languages) ->
+text, so a site can swap local Tesseract for another engine. The
+scheduling policies of the pipeline (retry delays, back-pressure) live
+here too, next to the work they schedule.
+"""
+
+import glob
+import importlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+DEFAULT_ENGINE = "mofeed_his.mofeed_his.utils.ocr_worker.tesseract"
+DEFAULT_LANGUAGES = "eng+ara"
+RASTER_DPI = 300
+PAGE_TIMEOUT_SECONDS = 300
+# Content types the pipeline can read; DICOM is left to the viewers
+OCR_CONTENT_TYPES = frozenset(["application/pdf", "image/png", "image/jpeg", "image/tiff"])
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+
+
+class OcrUnavailable(RuntimeError):
+    """Raised when a program the pipeline needs is not installed."""
+
+
+def ocr_document(path, content_type, engine=DEFAULT_ENGINE, languages=DEFAULT_LANGUAGES):
+    """Return the text of a document and the seconds spent per stage.
+
+    Returns:
+        tuple: (text, {"rasterize": seconds, "ocr": seconds})
+    """
+    read_page = resolve_engine(engine)
+    with tempfile.TemporaryDirectory(prefix="mofeed_ocr_") as directory:
+        started = time.monotonic()
+        pages = rasterize(path, content_type, directory)
+        rasterized = time.monotonic()
+        text = "\n".join(read_page(page, languages) for page in pages)
+        finished = time.monotonic()
+
+    return text, {"rasterize": rasterized - started, "ocr": finished - rasterized}
+
+
+def rasterize(path, content_type, directory):
+    """Return image paths of a document's pages, rendering PDFs into `directory`."""
+    if content_type != "application/pdf":
+        return [path]
+
+    pdftoppm = _require("pdftoppm")
+    subprocess.run(
+        [pdftoppm, "-r", str(RASTER_DPI), "-gray", "-png", path, os.path.join(directory, "page")],
+        check=True,
+        capture_output=True,
+        timeout=PAGE_TIMEOUT_SECONDS,
+    )
+    return sorted(glob.glob(os.path.join(directory, "page-*.png")))
+
+
+def tesseract(image_path, languages=DEFAULT_LANGUAGES):
+    """Read one page image with the local Tesseract binary."""
+    result = subprocess.run(
+        [_require("tesseract"), image_path, "stdout", "-l", languages, "--psm", "6"],
+        check=True,
+        capture_output=True,
+        timeout=PAGE_TIMEOUT_SECONDS,
+    )
+    return result.stdout.decode("utf-8", "replace")
+
+
+def resolve_engine(engine):
+    """Return the callable named by a dotted path."""
+    module, _, name = engine.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def retry_delay(attempt):
+    """Return the seconds to wait before retry number `attempt` (1-based)."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+
+
+def batch_size(interactive_backlog, max_batch, threshold):
+    """Return how many documents to take next, given interactive jobs waiting.
+
+    A full batch when the interactive queues are idle, shrinking as their
+    backlog grows, and none at `threshold`: OCR then pauses until the
+    interactive jobs have drained.
+    """
+    if interactive_backlog >= threshold:
+        return 0
+    return max(1, max_batch * (threshold - interactive_backlog) // threshold)
+
+
+def _require(program):
+    path = shutil.which(program)
+    if not path:
+        raise OcrUnavailable(f"{program} is not installed")
+    return path
@@ -0,0 +1,143 @@
+"""Rules of hospital scoping and visit archival on multi-facility sites.
+
+Scoping decides which hospital a request is limited to, from the hospital
+it asked for, the user's default hospital and the hospitals the user is
+restricted to. Archival decides which days of visits are old enough to
+move to history tables, which rows may move, and whether a read has to
+look at them.
+"""
+
+import datetime
+
+HISTORY_SUFFIX = " History"
+
+
+class OutOfScope(Exception):
+    """A request asked for a hospital the user may not see, or for none."""
+
+
+def resolve_hospital(requested=None, default=None, allowed=None):
+    """Return the hospital a request is scoped to.
+
+    Args:
+        requested: Hospital the request asked for, if any
+        default: The user's default hospital, if any
+        allowed: Hospitals the user is restricted to; None if unrestricted
+
+    Returns:
+        str: The hospital, or None for every hospital (unrestricted users only)
+
+    Raises:
+        OutOfScope: If the requested hospital is not allowed, or a user
+            restricted to several hospitals asked for none and has no
+            default among them
+    """
+    if allowed is None:
+        return requested or default or None
+
+    allowed = set(allowed)
+    if requested:
+        if requested not in allowed:
+            raise OutOfScope(requested)
+        return requested
+    if default in allowed:
+        return default
+    if len(allowed) == 1:
+        return next(iter(allowed))
+    raise OutOfScope(None)
+
+
+def archive_cutoff(today, keep_years):
+    """Return the last day whose visits are archived.
+
+    Args:
+        today: Current date
+        keep_years: Closed years kept in the working tables besides the
+            current one
+
+    Returns:
+        datetime.date: 31 December of the newest archived year, or None
+        when `keep_years` turns archival off (negative or None)
+    """
+    if keep_years is None or keep_years < 0:
+        return None
+    return datetime.date(_to_date(today).year - keep_years - 1, 12, 31)
+
+
+def needs_history(from_date, archived_through):
+    """Return whether a read starting at `from_date` reaches archived days.
+
+    Args:
+        from_date: First date the read covers; None if unbounded
+        archived_through: Last archived day; None if nothing is archived
+    """
+    if archived_through is None:
+        return False
+    if from_date is None:
+        return True
+    return _to_date(from_date) <= _to_date(archived_through)
+
+
+def history_table(doctype):
+    """Return the name of a doctype's history table."""
+    return f"tab{doctype}{HISTORY_SUFFIX}"
+
+
+def visit_source(doctype, columns, with_history):
+    """Return the table a query reads a visit doctype from.
+
+    Args:
+        doctype: An archived doctype
+        columns: Columns the query reads
+        with_history: Whether to add the rows of the history table
+
+    Returns:
+        str: The doctype's table, or a derived table of the given columns
+        from it and its history table
+    """
+    if not with_history:
+        return f"`tab{doctype}`"
+    selected = ", ".join(f"`{column}`" for column in columns)
+    return (
+        f"(SELECT {selected} FROM `tab{doctype}` "
+        f"UNION ALL SELECT {selected} FROM `{history_table(doctype)}`)"
+    )
+
+
+def archive_condition(doctype, date_field, statuses=None, links=()):
+    """Return the SQL condition of the rows of a doctype that may be archived.
+
+    A row may move when it is dated up to `%(through)s`, is in one of
+    `%(statuses)s` if statuses are given, and no row of a linking table
+    points at it, so Link fields and the forms behind them keep working.
+
+    Args:
+        doctype: The archived doctype
+        date_field: Field holding the row's date
+        statuses: Statuses that may be archived; None for any
+        links: (linking doctype, link field, doctype field) of every field
+            that may point at the doctype; the doctype field names the
+            column holding the target doctype of a Dynamic Link, else None
+
+    Returns:
+        str: Condition on `tab<doctype>`, using `%(through)s`,
+        `%(statuses)s` and `%(doctype)s`
+    """
+    table = f"`tab{doctype}`"
+    conditions = [f"{table}.`{date_field}` <= %(through)s"]
+    if statuses:
+        conditions.append(f"{table}.status IN %(statuses)s")
+    for linking_doctype, fieldname, doctype_field in links:
+        match = f"link.`{fieldname}` = {table}.name"
+        if doctype_field:
+            match += f" AND link.`{doctype_field}` = %(doctype)s"
+        conditions.append(f"NOT EXISTS (SELECT 1 FROM `tab{linking_doctype}` link WHERE {match})")
+    return " AND ".join(conditions)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
@@ -0,0 +1,421 @@
+"""Bulk patient import pipeline.
+
+Loads large legacy patient files (CSV/XLSX) without going through the
+per-document Patient hooks (`generate_patient_mrn`, `validate_mrn_unique`),
+which cost several queries and a sequence lock per row:
+
+1. The file is streamed in chunks of `chunk_size` rows.
+2. Each chunk is validated and de-duplicated set-wise: one query for MRNs
+   and one for national IDs that already exist.
+3. MRNs for the chunk are reserved as one contiguous range, and Patient
+   names are taken from the naming series in one update on a separate
+   transaction that commits immediately.
+4. Patient and Patient Extension rows are written with multi-row inserts,
+   and the chunk is added to the patient search index and the duplicate
+   blocking keys in one pass each.
+5. The chunk and the `Patient Import` checkpoint commit together, so a
+   crashed import resumes after the last committed chunk.
+
+Usage:
+    bench --site mysite import-patients /path/to/patients.csv --hospital "Karbala General Hospital"
+
+Recognized columns (header names are case-insensitive):
+    Patient: first_name, middle_name, last_name, sex, dob, mobile, phone, email, mrn
+    Patient Extension: national_id, national_id_type, nationality,
+        preferred_language, mother_name, tribe, primary_phone,
+        secondary_phone, governorate, district, neighborhood, full_address
+
+A non-empty `mrn` column is kept as the patient's MRN (migrated data);
+other rows receive new MRNs from the hospital's sequence.
+"""
+
+import hashlib
+import traceback
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate, now, nowdate
+
+from mofeed_his.mofeed_his.utils.chunked_reader import count_rows, iter_chunks
+from mofeed_his.mofeed_his.utils.duplicates import index_blocking_keys
+from mofeed_his.mofeed_his.utils.mrn import (
+    get_existing_mrns,
+    get_sequence_connection,
+    mrn_unique_guard,
+    reserve_mrns,
+)
+from mofeed_his.mofeed_his.utils.patient_search import index_patients
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_LOGGED_ERRORS = 1000
+
+PATIENT_FIELDS = (
+    "first_name",
+    "middle_name",
+    "last_name",
+    "sex",
+    "dob",
+    "mobile",
+    "phone",
+    "email",
+)
+
+EXTENSION_FIELDS = (
+    "national_id",
+    "national_id_type",
+    "nationality",
+    "preferred_language",
+    "mother_name",
+    "tribe",
+    "primary_phone",
+    "secondary_phone",
+    "governorate",
+    "district",
+    "neighborhood",
+    "full_address",
+)
+
+SEX_ALIASES = {
+    "m": "Male",
+    "male": "Male",
+    "ذكر": "Male",
+    "f": "Female",
+    "female": "Female",
+    "أنثى": "Female",
+    "انثى": "Female",
+}
+
+
+def run_import(file_path, hospital=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Import patients from a CSV/XLSX file, resuming if it was interrupted.
+
+    Args:
+        file_path: Absolute path to the CSV/XLSX file
+        hospital: Hospital name for the new patients. Required on the first
+            run; a resumed run keeps the hospital it started with.
+        chunk_size: Rows per chunk (one transaction per chunk)
+        progress: Optional callable ``progress(done, total)``
+
+    Returns:
+        frappe._dict: Import summary (name, status, total, imported, skipped)
+    """
+    import_log = _get_or_create_import(file_path, hospital)
+    if import_log.status == "Completed":
+        return _summary(import_log.name)
+
+    hospital = import_log.hospital
+    hospital_code = frappe.db.get_value("Hospital", hospital, "code")
+    if not hospital_code:
+        frappe.throw(_("Hospital '{0}' not found.").format(hospital), frappe.ValidationError)
+
+    total = count_rows(file_path)
+    frappe.db.set_value(
+        "Patient Import", import_log.name, {"status": "Running", "total_rows": total}
+    )
+    frappe.db.commit()
+
+    try:
+        chunks = iter_chunks(
+            file_path, chunk_size, skip=cint(import_log.last_row), line_numbers=True
+        )
+        for first_row, rows in chunks:
+            imported, errors = _import_chunk(rows, hospital, hospital_code)
+            _save_checkpoint(import_log.name, first_row + len(rows), imported, errors)
+            frappe.db.commit()
+
+            if progress:
+                progress(first_row + len(rows), total)
+    except Exception:
+        frappe.db.rollback()
+        _append_errors(import_log.name, [traceback.format_exc()])
+        frappe.db.set_value("Patient Import", import_log.name, "status", "Failed")
+        frappe.db.commit()
+        raise
+
+    frappe.db.set_value("Patient Import", import_log.name, "status", "Completed")
+    frappe.db.commit()
+
+    return _summary(import_log.name)
+
+
+@frappe.whitelist()
+def enqueue_patient_import(file_path, hospital, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run a patient import as a background job with realtime progress."""
+    frappe.only_for("System Manager")
+
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.patient_import.run_import",
+        queue="long",
+        timeout=6 * 60 * 60,
+        job_id=f"mofeed_his:patient_import:{file_path}",
+        deduplicate=True,
+        file_path=file_path,
+        hospital=hospital,
+        chunk_size=cint(chunk_size) or DEFAULT_CHUNK_SIZE,
+        progress=_publish_progress,
+    )
+
+
+def _import_chunk(rows, hospital, hospital_code):
+    """Validate, de-duplicate and insert one chunk of rows.
+
+    Args:
+        rows: ``(line_number, row)`` pairs from `iter_chunks`
+        hospital: Hospital name for the new patients
+        hospital_code: The hospital's MRN code
+
+    Returns:
+        tuple: ``(imported_count, errors)``
+    """
+    candidates, errors = [], []
+    seen_mrns, seen_national_ids = set(), set()
+
+    for row_number, raw in rows:
+        row, error = _clean_row(raw)
+        if not error and row["mrn"] and row["mrn"] in seen_mrns:
+            error = f"duplicate MRN {row['mrn']} in file"
+        if not error and row["national_id"] and row["national_id"] in seen_national_ids:
+            error = f"duplicate national ID {row['national_id']} in file"
+
+        if error:
+            errors.append(f"Row {row_number}: {error}")
+            continue
+
+        seen_mrns.add(row["mrn"])
+        seen_national_ids.add(row["national_id"])
+        row["row_number"] = row_number
+        candidates.append(row)
+
+    existing_mrns = get_existing_mrns(seen_mrns)
+    existing_national_ids = _existing_values("Patient Extension", "national_id", seen_national_ids)
+
+    valid = []
+    for row in candidates:
+        if row["mrn"] in existing_mrns:
+            errors.append(f"Row {row['row_number']}: MRN {row['mrn']} already exists")
+        elif row["national_id"] in existing_national_ids:
+            errors.append(
+                f"Row {row['row_number']}: national ID {row['national_id']} already registered"
+            )
+        else:
+            valid.append(row)
+
+    if not valid:
+        return 0, errors
+
+    new_mrns = iter(reserve_mrns(hospital_code, sum(1 for row in valid if not row["mrn"])))
+    for row in valid:
+        row["mrn"] = row["mrn"] or next(new_mrns)
+
+    names = _reserve_patient_names(len(valid))
+    with mrn_unique_guard(mrns=[row["mrn"] for row in valid]):
+        _insert_rows(valid, names, hospital)
+
+    # Bulk inserts bypass doc events, so index the chunk for search and
+    # duplicate detection here
+    index_patients(names)
+    index_blocking_keys(names)
+
+    return len(valid), errors
+
+
+def _clean_row(raw):
+    """Normalize one input row.
+
+    Returns:
+        tuple: ``(row, error)`` where `error` is None for a valid row
+    """
+    row = {field: raw.get(field) for field in PATIENT_FIELDS + EXTENSION_FIELDS}
+    row["mrn"] = (str(raw.get("mrn") or "").strip().upper()) or None
+    row["national_id"] = str(row["national_id"]).strip() if row["national_id"] else None
+
+    if not row["first_name"]:
+        return row, "first_name is required"
+
+    sex = SEX_ALIASES.get(str(row["sex"] or "").strip().lower())
+    if not sex:
+        return row, f"invalid sex '{row['sex']}'"
+    row["sex"] = sex
+
+    if row["dob"]:
+        try:
+            row["dob"] = getdate(row["dob"])
+        except Exception:
+            return row, f"invalid date of birth '{row['dob']}'"
+
+    return row, None
+
+
+def _existing_values(doctype, fieldname, values):
+    """Return the subset of `values` already stored in `doctype.fieldname`."""
+    values = [value for value in values if value]
+    if not values:
+        return set()
+
+    return set(frappe.get_all(doctype, filters={fieldname: ("in", values)}, pluck=fieldname))
+
+
+def _reserve_patient_names(count):
+    """Take `count` Patient names from the naming series in one update.
+
+    Like MRN blocks, the names are reserved on a separate connection that
+    commits immediately, so the `tabSeries` row lock is not held while the
+    chunk is inserted and indexed. A failed chunk leaves a gap in the
+    series.
+
+    Imported patients are always named by series, regardless of the
+    Healthcare Settings `patient_name_by` option.
+    """
+    from frappe.model.naming import parse_naming_series
+
+    naming_series = frappe.get_meta("Patient").get_field("naming_series")
+    series = ((naming_series and naming_series.options) or "HLC-PAT-.YYYY.-").split("\n")[0]
+    digits = series.count("#") or 5
+    prefix = parse_naming_series(series.split("#")[0].rstrip("."))
+
+    db = get_sequence_connection()
+    try:
+        db.sql("INSERT IGNORE INTO `tabSeries` (`name`, `current`) VALUES (%s, 0)", (prefix,))
+        db.sql(
+            "UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s", (count, prefix)
+        )
+        high = cint(db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s", (prefix,))[0][0])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return [f"{prefix}{number:0{digits}d}" for number in range(high - count + 1, high + 1)]
+
+
+def _insert_rows(rows, names, hospital):
+    """Write Patient and Patient Extension rows with multi-row inserts."""
+    timestamp = now()
+    today = nowdate()
+    user = frappe.session.user
+    standard_fields = ["name", "creation", "modified", "owner", "modified_by"]
+
+    patient_values, extension_values = [], []
+    for row, name in zip(rows, names):
+        patient_name = " ".join(
+            filter(None, (row["first_name"], row["middle_name"], row["last_name"]))
+        )
+        patient_values.append(
+            [name, timestamp, timestamp, user, user, patient_name, "Active", row["mrn"], hospital]
+            + [row[field] for field in PATIENT_FIELDS]
+        )
+        extension_values.append(
+            [row["mrn"], timestamp, timestamp, user, user, name, row["mrn"], hospital, today, 1]
+            + [
+                row[field] or ("Iraqi" if field == "nationality" else None)
+                for field in EXTENSION_FIELDS
+            ]
+        )
+
+    frappe.db.bulk_insert(
+        "Patient",
+        standard_fields
+        + ["patient_name", "status", "custom_mrn", "custom_hospital"]
+        + list(PATIENT_FIELDS),
+        patient_values,
+    )
+    frappe.db.bulk_insert(
+        "Patient Extension",
+        standard_fields
+        + ["patient_link", "mrn", "hospital", "registration_date", "is_active"]
+        + list(EXTENSION_FIELDS),
+        extension_values,
+    )
+
+
+def _get_or_create_import(file_path, hospital):
+    """Find the import run for this file, or start a new one."""
+    file_hash = _hash_file(file_path)
+    name = frappe.db.get_value("Patient Import", {"file_hash": file_hash}, "name")
+    if name:
+        return frappe.db.get_value(
+            "Patient Import", name, ["name", "hospital", "status", "last_row"], as_dict=True
+        )
+
+    if not hospital:
+        frappe.throw("Hospital is required to start a patient import.", frappe.ValidationError)
+
+    import_log = frappe.get_doc(
+        {
+            "doctype": "Patient Import",
+            "file_path": file_path,
+            "file_hash": file_hash,
+            "hospital": hospital,
+        }
+    ).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    return frappe._dict(
+        name=import_log.name, hospital=hospital, status=import_log.status, last_row=0
+    )
+
+
+def _save_checkpoint(import_name, last_row, imported, errors):
+    """Advance the checkpoint inside the chunk's transaction."""
+    frappe.db.sql(
+        """
+        UPDATE `tabPatient Import`
+        SET last_row = %s,
+            imported_rows = imported_rows + %s,
+            skipped_rows = skipped_rows + %s,
+            modified = NOW()
+        WHERE name = %s
+        """,
+        (last_row, imported, len(errors), import_name),
+    )
+    _append_errors(import_name, errors)
+
+
+def _append_errors(import_name, errors):
+    """Append errors to the import log, keeping at most MAX_LOGGED_ERRORS lines."""
+    if not errors:
+        return
+
+    existing = frappe.db.get_value("Patient Import", import_name, "error_log") or ""
+    lines = existing.splitlines() if existing else []
+    if len(lines) >= MAX_LOGGED_ERRORS:
+        return
+
+    lines.extend(errors[: MAX_LOGGED_ERRORS - len(lines)])
+    frappe.db.set_value(
+        "Patient Import", import_name, "error_log", "\n".join(lines), update_modified=False
+    )
+
+
+def _summary(import_name):
+    data = frappe.db.get_value(
+        "Patient Import",
+        import_name,
+        ["name", "status", "total_rows", "imported_rows", "skipped_rows"],
+        as_dict=True,
+    )
+    return frappe._dict(
+        name=data.name,
+        status=data.status,
+        total=data.total_rows,
+        imported=data.imported_rows,
+        skipped=data.skipped_rows,
+    )
+
+
+def _hash_file(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _publish_progress(done, total):
+    frappe.publish_progress(
+        done * 100 / (total or 1),
+        title="Patient Import",
+        description=f"{done} of {total} rows",
+    )
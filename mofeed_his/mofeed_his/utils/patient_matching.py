@@ -0,0 +1,275 @@
+"""Blocking keys and fuzzy scoring for duplicate-patient detection.
+
+Comparing a new registration against every patient does not scale, so
+each patient is indexed under a few blocking keys. Only patients sharing
+at least one key with the new record are scored:
+
+- ``national_id``: the normalized national ID
+- ``phone``: the last digits of each normalized phone number
+- ``name_year``: a phonetic key of the given and father's names plus birth year
+- ``mother``: a phonetic key of the mother's name plus the given name
+
+The phonetic key folds letters that are commonly confused when a name is
+spoken at the desk or transliterated (س/ص/ث, ز/ذ/ظ/ض, ت/ط, ك/ق, ه/ح) and
+drops long vowels, so 'مصطفى' and 'مسطفا', or 'Mohammed' and 'Muhammad',
+share a key.
+"""
+
+import datetime
+from difflib import SequenceMatcher
+
+from mofeed_his.mofeed_his.utils.arabic import (
+    compact,
+    normalize_phone,
+    strip_definite_article,
+    tokenize,
+)
+
+# Blocking key types
+KEY_NATIONAL_ID = "national_id"
+KEY_PHONE = "phone"
+KEY_NAME_YEAR = "name_year"
+KEY_MOTHER = "mother"
+
+# Score thresholds
+LIKELY_THRESHOLD = 0.85
+POSSIBLE_THRESHOLD = 0.7
+
+# Weights of the compared fields; a field missing on either side earns
+# half its weight, so absent data neither confirms nor rules out a match
+NAME_WEIGHT = 0.45
+DOB_WEIGHT = 0.2
+PHONE_WEIGHT = 0.2
+MOTHER_WEIGHT = 0.15
+
+SEX_MISMATCH_FACTOR = 0.7
+NATIONAL_ID_MISMATCH_CAP = 0.5
+
+PHONE_SUFFIX_LENGTH = 7
+MIN_NATIONAL_ID_LENGTH = 5
+PHONE_FIELDS = ("mobile", "phone", "primary_phone", "secondary_phone")
+
+_ARABIC_PHONETIC = str.maketrans(
+    {
+        "ص": "س",
+        "ث": "س",
+        "ذ": "ز",
+        "ظ": "ز",
+        "ض": "ز",
+        "ط": "ت",
+        "ق": "ك",
+        "ح": "ه",
+        "غ": "ع",
+    }
+)
+_ARABIC_VOWELS = set("اوي")
+
+_LATIN_PHONETIC = str.maketrans(
+    {
+        "q": "k",
+        "c": "k",
+        "v": "f",
+        "p": "b",
+        "j": "g",
+    }
+)
+_LATIN_VOWELS = set("aeiouyw")
+
+
+def phonetic_word(word):
+    """Return the phonetic key of one normalized word.
+
+    The first letter is kept as is; later vowels are dropped and repeated
+    letters collapsed.
+
+    Example:
+        >>> phonetic_word("mohammed") == phonetic_word("muhammad")
+        True
+    """
+    if not word:
+        return ""
+
+    word = word.translate(_ARABIC_PHONETIC).translate(_LATIN_PHONETIC)
+    # Digraphs fold the same way as the Arabic letters they transliterate
+    word = word.replace("dh", "z").replace("th", "s").replace("kh", "h").replace("sh", "s")
+    vowels = _ARABIC_VOWELS | _LATIN_VOWELS
+
+    key = word[0]
+    for ch in word[1:]:
+        if ch in vowels or ch == key[-1]:
+            continue
+        key += ch
+    return key
+
+
+def phonetic_key(name, words=2):
+    """Return the phonetic key of the first ``words`` words of a name.
+
+    A leading 'ال' is ignored, so 'الحسن' and 'حسن' share a key.
+    """
+    return " ".join(
+        phonetic_word(strip_definite_article(word) or word) for word in tokenize(name)[:words]
+    )
+
+
+def birth_year(dob):
+    """Return the birth year of a date or ``YYYY-MM-DD`` string, or None."""
+    if isinstance(dob, (datetime.date, datetime.datetime)):
+        return dob.year
+    if dob and len(str(dob)) >= 4 and str(dob)[:4].isdigit():
+        return int(str(dob)[:4])
+    return None
+
+
+def record_phones(record):
+    """Return the distinct normalized phone numbers of a record."""
+    phones = {normalize_phone(record.get(field)) for field in PHONE_FIELDS}
+    return {phone for phone in phones if len(phone) >= PHONE_SUFFIX_LENGTH}
+
+
+def blocking_keys(record):
+    """Build the blocking keys of a patient record.
+
+    Args:
+        record: Mapping with any of patient_name, dob, national_id,
+            mobile, phone, primary_phone, secondary_phone, mother_name
+
+    Returns:
+        list: Distinct ``(key_type, key)`` tuples
+    """
+    keys = set()
+
+    national_id = compact(record.get("national_id"))
+    if len(national_id) >= MIN_NATIONAL_ID_LENGTH:
+        keys.add((KEY_NATIONAL_ID, national_id))
+
+    for phone in record_phones(record):
+        keys.add((KEY_PHONE, phone[-PHONE_SUFFIX_LENGTH:]))
+
+    name_key = phonetic_key(record.get("patient_name"))
+    year = birth_year(record.get("dob"))
+    if name_key and year:
+        keys.add((KEY_NAME_YEAR, f"{name_key}|{year}"))
+
+    given_name = phonetic_key(record.get("patient_name"), words=1)
+    mother_key = phonetic_key(record.get("mother_name"), words=1)
+    if given_name and mother_key:
+        keys.add((KEY_MOTHER, f"{mother_key}|{given_name}"))
+
+    return sorted(keys)
+
+
+def name_similarity(a, b):
+    """Return the similarity of two names between 0 and 1.
+
+    The better of the spelling similarity and the phonetic-key similarity,
+    the latter discounted slightly.
+    """
+    words_a, words_b = tokenize(a), tokenize(b)
+    if not words_a or not words_b:
+        return 0.0
+
+    spelling = SequenceMatcher(None, " ".join(words_a), " ".join(words_b)).ratio()
+    phonetic = SequenceMatcher(
+        None,
+        " ".join(phonetic_word(word) for word in words_a),
+        " ".join(phonetic_word(word) for word in words_b),
+    ).ratio()
+    return max(spelling, phonetic * 0.95)
+
+
+def score_pair(a, b):
+    """Score how likely two patient records are the same person.
+
+    Args:
+        a: Patient record mapping (see `blocking_keys`)
+        b: Patient record mapping
+
+    Returns:
+        tuple: ``(score, reasons)`` with a score between 0 and 1 and the
+        list of fields that matched
+    """
+    national_a = compact(a.get("national_id"))
+    national_b = compact(b.get("national_id"))
+    if national_a and national_a == national_b:
+        return 1.0, ["national_id"]
+
+    reasons = []
+    score = 0.0
+
+    name_score = name_similarity(a.get("patient_name"), b.get("patient_name"))
+    score += NAME_WEIGHT * name_score
+    if name_score >= 0.85:
+        reasons.append("name")
+
+    score += DOB_WEIGHT * _dob_score(a.get("dob"), b.get("dob"), reasons)
+
+    phones_a, phones_b = record_phones(a), record_phones(b)
+    if phones_a and phones_b:
+        if phones_a & phones_b:
+            score += PHONE_WEIGHT
+            reasons.append("phone")
+    else:
+        score += PHONE_WEIGHT / 2
+
+    if a.get("mother_name") and b.get("mother_name"):
+        mother_score = name_similarity(a.get("mother_name"), b.get("mother_name"))
+        score += MOTHER_WEIGHT * mother_score
+        if mother_score >= 0.85:
+            reasons.append("mother_name")
+    else:
+        score += MOTHER_WEIGHT / 2
+
+    if a.get("sex") and b.get("sex") and a.get("sex") != b.get("sex"):
+        score *= SEX_MISMATCH_FACTOR
+
+    if national_a and national_b:
+        score = min(score, NATIONAL_ID_MISMATCH_CAP)
+
+    return round(score, 4), reasons
+
+
+def _dob_score(dob_a, dob_b, reasons):
+    if not dob_a or not dob_b:
+        return 0.5
+    if str(dob_a)[:10] == str(dob_b)[:10]:
+        reasons.append("dob")
+        return 1.0
+    if birth_year(dob_a) == birth_year(dob_b):
+        reasons.append("birth_year")
+        return 0.5
+    return 0.0
+
+
+def cluster_pairs(pairs):
+    """Group matched pairs into clusters of the same person.
+
+    Args:
+        pairs: Iterable of ``(patient_a, patient_b)`` tuples
+
+    Returns:
+        list: Sorted lists of patient names, one per cluster, ordered by
+        their first member
+    """
+    parent = {}
+
+    def find(item):
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # Keep the smallest name as root so cluster ids are stable
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+
+    clusters = {}
+    for item in parent:
+        clusters.setdefault(find(item), []).append(item)
+
+    return sorted(sorted(members) for members in clusters.values())
@@ -0,0 +1,256 @@
+"""Patient search projection for the Reception Console.
+
+A `LIKE '%...%'` over Patient and Patient Extension cannot use an index and
+gets slower with every registration. Instead, each patient is projected
+into `Patient Search Token` rows holding normalized tokens (see
+`utils.search_tokens`): MRN, national ID, phones, name words, name
+trigrams, mother's name and tribe. The rows are kept current by doc
+events on Patient and Patient Extension.
+
+A search runs in two stages:
+
+1. Prefix: every query term must prefix-match a token, served by the
+   (token, hospital) index.
+2. Infix: if the prefix stage returns fewer than `limit` patients, name
+   terms of three or more letters are matched by their trigrams instead.
+
+Patients are ranked by the summed weight of their matching tokens, with
+exact matches counting double.
+"""
+
+import frappe
+from frappe.utils import cint, now
+
+from mofeed_his.mofeed_his.utils.arabic import ngrams
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.search_tokens import NGRAM, WEIGHTS, patient_tokens, query_terms
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MIN_QUERY_LENGTH = 2
+REBUILD_CHUNK_SIZE = 2000
+
+TOKEN_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "patient",
+    "hospital",
+    "token",
+    "kind",
+    "weight",
+]
+
+
+@frappe.whitelist()
+@hospital_scoped
+def search_patients(txt, hospital=None, limit=DEFAULT_LIMIT):
+    """Ranked typeahead search by MRN, name, phone or national ID.
+
+    Args:
+        txt: Search text in Arabic or English. Digits may be Eastern-Arabic.
+        hospital: Restrict results to one hospital; the user's default
+            hospital if not given (see `hospital_scope`)
+        limit: Maximum number of results (capped at MAX_LIMIT)
+
+    Returns:
+        list: Patient dicts (name, patient_name, mrn, sex, dob, mobile,
+        national_id, primary_phone, score) ordered by score
+    """
+    frappe.has_permission("Patient", "read", throw=True)
+
+    limit = min(cint(limit) or DEFAULT_LIMIT, MAX_LIMIT)
+    terms = query_terms(txt)
+    if not terms or sum(len(variants[0]) for variants in terms) < MIN_QUERY_LENGTH:
+        return []
+
+    scores = _match(terms, hospital, limit, infix=False)
+    if len(scores) < limit and any(_is_infix_term(variants) for variants in terms):
+        for patient, score in _match(terms, hospital, limit, infix=True).items():
+            scores.setdefault(patient, score)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return _load_results(ranked)
+
+
+def index_patients(patient_names):
+    """Rebuild the search tokens of the given patients.
+
+    Costs one read, one delete and one multi-row insert however many
+    patients are passed.
+    """
+    names = list({name for name in patient_names if name})
+    if not names:
+        return
+
+    records = frappe.db.sql(
+        """
+        SELECT p.name, p.patient_name, p.custom_mrn AS mrn, p.custom_hospital AS hospital,
+            p.mobile, p.phone, e.national_id, e.primary_phone, e.secondary_phone,
+            e.mother_name, e.tribe, e.hospital AS extension_hospital
+        FROM `tabPatient` p
+        LEFT JOIN `tabPatient Extension` e ON e.patient_link = p.name
+        WHERE p.name IN %(names)s
+        """,
+        {"names": tuple(names)},
+        as_dict=True,
+    )
+
+    frappe.db.delete("Patient Search Token", {"patient": ("in", names)})
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for record in records:
+        hospital = record.hospital or record.extension_hospital
+        for token, kind, weight in patient_tokens(record):
+            values.append(
+                (
+                    frappe.generate_hash(length=12),
+                    timestamp,
+                    timestamp,
+                    user,
+                    user,
+                    record.name,
+                    hospital,
+                    token,
+                    kind,
+                    weight,
+                )
+            )
+
+    if values:
+        frappe.db.bulk_insert("Patient Search Token", TOKEN_FIELDS, values)
+
+
+def update_patient_index(doc, method=None):
+    """Hook: reindex a Patient after insert or update."""
+    index_patients([doc.name])
+
+
+def remove_patient_index(doc, method=None):
+    """Hook: drop the tokens of a deleted Patient."""
+    frappe.db.delete("Patient Search Token", {"patient": doc.name})
+
+
+def update_extension_index(doc, method=None):
+    """Hook: reindex the patient of a changed or deleted Patient Extension."""
+    if doc.patient_link:
+        index_patients([doc.patient_link])
+
+
+def rebuild_search_index():
+    """Rebuild the tokens of every patient, committing per chunk.
+
+    Run from the install patch or with
+    `bench --site mysite execute mofeed_his.mofeed_his.utils.patient_search.rebuild_search_index`.
+    """
+    last_name = ""
+    while True:
+        names = frappe.get_all(
+            "Patient",
+            filters={"name": (">", last_name)},
+            order_by="name asc",
+            limit=REBUILD_CHUNK_SIZE,
+            pluck="name",
+        )
+        if not names:
+            break
+
+        index_patients(names)
+        frappe.db.commit()
+        last_name = names[-1]
+
+
+def _is_infix_term(variants):
+    word = variants[0]
+    return len(word) >= 3 and not word.isdigit()
+
+
+def _match(terms, hospital, limit, infix):
+    """Return ``{patient: score}`` for patients matching every term."""
+    values = {"limit": limit, "term_count": len(terms), "ngram": NGRAM}
+    hospital_condition = ""
+    if hospital:
+        values["hospital"] = hospital
+        hospital_condition = "AND hospital = %(hospital)s"
+
+    subqueries = []
+    for i, variants in enumerate(terms):
+        if infix and _is_infix_term(variants):
+            grams = ngrams(variants[0])
+            values[f"grams_{i}"] = tuple(grams)
+            values[f"gram_count_{i}"] = len(grams)
+            values[f"gram_weight_{i}"] = WEIGHTS[NGRAM] * len(grams)
+            subqueries.append(
+                f"""
+                SELECT patient, %(gram_weight_{i})s AS score
+                FROM `tabPatient Search Token`
+                WHERE kind = %(ngram)s AND token IN %(grams_{i})s {hospital_condition}
+                GROUP BY patient
+                HAVING COUNT(DISTINCT token) = %(gram_count_{i})s
+                """
+            )
+            continue
+
+        values[f"exact_{i}"] = tuple(variants)
+        prefix_conditions = []
+        for j, variant in enumerate(variants):
+            values[f"prefix_{i}_{j}"] = _like_prefix(variant)
+            prefix_conditions.append(f"token LIKE %(prefix_{i}_{j})s")
+
+        subqueries.append(
+            f"""
+            SELECT patient,
+                MAX(CASE WHEN token IN %(exact_{i})s THEN weight * 2 ELSE weight END) AS score
+            FROM `tabPatient Search Token`
+            WHERE ({" OR ".join(prefix_conditions)}) AND kind != %(ngram)s {hospital_condition}
+            GROUP BY patient
+            """
+        )
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT patient, SUM(score) AS score
+        FROM ({" UNION ALL ".join(subqueries)}) matches
+        GROUP BY patient
+        HAVING COUNT(*) = %(term_count)s
+        ORDER BY score DESC
+        LIMIT %(limit)s
+        """,
+        values,
+    )
+    return {patient: score for patient, score in rows}
+
+
+def _like_prefix(value):
+    """Escape LIKE wildcards and append '%'."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _load_results(ranked):
+    if not ranked:
+        return []
+
+    rows = frappe.db.sql(
+        """
+        SELECT p.name, p.patient_name, p.custom_mrn AS mrn, p.sex, p.dob, p.mobile,
+            e.national_id, e.primary_phone
+        FROM `tabPatient` p
+        LEFT JOIN `tabPatient Extension` e ON e.patient_link = p.name
+        WHERE p.name IN %(names)s
+        """,
+        {"names": tuple(name for name, _ in ranked)},
+        as_dict=True,
+    )
+    by_name = {row.name: row for row in rows}
+
+    results = []
+    for name, score in ranked:
+        row = by_name.get(name)
+        if row:
+            row.score = score
+            results.append(row)
+    return results
@@ -0,0 +1,103 @@
+"""Price resolution for clinic visit invoices.
+
+Prices an invoice's lines from data loaded once per clinic and price
+list: the clinic's visit fees, its service rates (the Clinic Service
+table) and the item rates of its cash and insurance price lists.
+
+For a cash patient a service costs the clinic's rate, else the cash price
+list rate. For an insured patient the insurance price list comes first,
+then the same cash rules.
+"""
+
+CASH = "Cash"
+INSURANCE = "Insurance"
+
+# Where a line's rate came from
+SOURCE_CLINIC = "Clinic"
+SOURCE_CASH_PRICE_LIST = "Cash Price List"
+SOURCE_INSURANCE_PRICE_LIST = "Insurance Price List"
+SOURCE_VISIT_FEE = "Visit Fee"
+
+
+def is_insured(payer):
+    """Return whether a payer is an insurer rather than the patient."""
+    return bool(payer) and payer != CASH
+
+
+def is_follow_up(visit_type):
+    """Return whether a visit type is a follow-up, e.g. "Follow-up" or "Follow Up Visit"."""
+    return bool(visit_type) and "follow" in visit_type.lower()
+
+
+def normalize_lines(items):
+    """Return invoice lines as {"item", "qty"} dicts.
+
+    Args:
+        items: Item codes, or dicts with `item` (or `item_code`) and `qty`
+    """
+    lines = []
+    for item in items or []:
+        if isinstance(item, dict):
+            code = item.get("item") or item.get("item_code")
+            lines.append({"item": code, "qty": float(item.get("qty") or 1)})
+        else:
+            lines.append({"item": item, "qty": 1.0})
+    return [line for line in lines if line["item"]]
+
+
+def resolve_lines(
+    clinic, items, visit_type=None, insured=False, cash_rates=None, insurance_rates=None
+):
+    """Price invoice lines.
+
+    Args:
+        clinic: Clinic pricing with `services` (item -> rate),
+            `consultation_fee` and `followup_fee`
+        items: Lines, see `normalize_lines`
+        visit_type: Appointment type; adds the consultation or follow-up fee
+            as the first line when given
+        insured: Whether an insurer pays
+        cash_rates: item -> rate of the cash price list
+        insurance_rates: item -> rate of the insurance price list
+
+    Returns:
+        dict: {"lines", "total", "unpriced"}. Each line has item, qty, rate,
+        amount and source; `rate` is None for items no price was found
+        for, which are also listed in `unpriced`.
+    """
+    services = clinic.get("services") or {}
+    sources = []
+    if insured:
+        sources.append((insurance_rates or {}, SOURCE_INSURANCE_PRICE_LIST))
+    sources += [(services, SOURCE_CLINIC), (cash_rates or {}, SOURCE_CASH_PRICE_LIST)]
+
+    lines = []
+    if visit_type:
+        fee = clinic.get("followup_fee") if is_follow_up(visit_type) else None
+        fee = fee or clinic.get("consultation_fee") or 0
+        lines.append(_line(None, 1.0, float(fee), SOURCE_VISIT_FEE, visit_type))
+
+    unpriced = []
+    for line in normalize_lines(items):
+        rate, source = None, None
+        for rates, name in sources:
+            if rates.get(line["item"]) is not None:
+                rate, source = float(rates[line["item"]]), name
+                break
+        if rate is None:
+            unpriced.append(line["item"])
+        lines.append(_line(line["item"], line["qty"], rate, source))
+
+    total = sum(line["amount"] for line in lines if line["amount"] is not None)
+    return {"lines": lines, "total": total, "unpriced": unpriced}
+
+
+def _line(item, qty, rate, source, description=None):
+    return {
+        "item": item,
+        "description": description,
+        "qty": qty,
+        "rate": rate,
+        "amount": None if rate is None else rate * qty,
+        "source": source,
+    }
@@ -0,0 +1,164 @@
+"""Cached clinic pricing for visit invoices.
+
+Pricing an invoice needs a clinic's visit fees, its Clinic Service rates
+and the rates of its cash and insurance price lists. Loading the Clinic
+with its child table and querying Item Price per line is avoided by
+keeping two maps in the site's Redis cache, which Frappe also mirrors per
+request in `frappe.local.cache`:
+
+- clinic -> fees, service rates and price lists
+- price list -> item rates valid today, kept until midnight
+
+`price_lines` then prices a whole invoice from at most three cache reads.
+The maps are cleared by doc events on Clinic and Item Price (see
+`hooks.py`).
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, flt, get_datetime, getdate, now_datetime, today
+
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.instrumentation import counted
+from mofeed_his.mofeed_his.utils.price_resolution import is_insured, resolve_lines
+
+CLINIC_PRICING_CACHE_KEY = "mofeed_his:clinic_pricing"
+PRICE_LIST_CACHE_KEY = "mofeed_his:price_list_rates"
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def price_lines(clinic, items=None, visit_type=None, payer=None):
+    """Price the lines of a visit invoice in one lookup.
+
+    Args:
+        clinic: Clinic
+        items: Item codes, or dicts with item and qty (JSON from the client)
+        visit_type: Appointment type; adds the consultation or follow-up fee
+        payer: "Cash" or empty for cash patients, otherwise the insurer
+
+    Returns:
+        dict: {"lines", "total", "unpriced", "price_list"}, see
+        `price_resolution.resolve_lines`
+    """
+    frappe.has_permission("Sales Invoice", "create", throw=True)
+
+    if isinstance(items, str):
+        items = frappe.parse_json(items)
+
+    pricing = get_clinic_pricing(clinic)
+    if not pricing:
+        frappe.throw(_("Clinic {0} does not exist").format(clinic))
+
+    insured = is_insured(payer)
+    cash_list = pricing["cash_price_list"] or _default_selling_price_list()
+    insurance_list = pricing["insurance_price_list"] if insured else None
+
+    result = resolve_lines(
+        pricing,
+        items,
+        visit_type=visit_type,
+        insured=insured,
+        cash_rates=get_price_list_rates(cash_list),
+        insurance_rates=get_price_list_rates(insurance_list),
+    )
+    result["price_list"] = insurance_list or cash_list
+    return result
+
+
+def get_clinic_pricing(clinic):
+    """Return cached fees, service rates and price lists of a clinic, or None."""
+    if not clinic:
+        return None
+    return frappe.cache().hget(
+        CLINIC_PRICING_CACHE_KEY,
+        clinic,
+        generator=counted("clinic_pricing", lambda: _load_clinic_pricing(clinic)),
+    )
+
+
+def get_price_list_rates(price_list):
+    """Return item -> rate of a selling price list, as valid today."""
+    if not price_list:
+        return {}
+
+    cache = frappe.cache()
+    key = f"{PRICE_LIST_CACHE_KEY}:{price_list}"
+    rates = cache.get_value(key)
+    if rates is None:
+        rates = _load_price_list_rates(price_list)
+        # Validity dates are applied at load, so the map lasts until midnight
+        midnight = get_datetime(add_days(today(), 1))
+        expires = max(int((midnight - now_datetime()).total_seconds()), 60)
+        cache.set_value(key, rates, expires_in_sec=expires)
+    return rates
+
+
+def clear_clinic_pricing(doc=None, method=None, *args, **kwargs):
+    """Hook: drop a clinic's cached pricing on save, rename or delete."""
+    cache = frappe.cache()
+    cache.hdel(CLINIC_PRICING_CACHE_KEY, doc.name)
+    if method == "after_rename" and args:
+        # after_rename(doc, method, old, new, merge)
+        cache.hdel(CLINIC_PRICING_CACHE_KEY, args[0])
+
+
+def clear_price_list_rates(doc=None, method=None, *args, **kwargs):
+    """Hook: drop the cached rates of an Item Price's price lists."""
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    cache = frappe.cache()
+    for price_list in {doc.price_list, before.price_list if before else None}:
+        if price_list:
+            cache.delete_value(f"{PRICE_LIST_CACHE_KEY}:{price_list}")
+
+
+def _load_clinic_pricing(clinic):
+    data = frappe.db.get_value(
+        "Clinic",
+        clinic,
+        [
+            "default_consultation_fee",
+            "default_followup_fee",
+            "cash_price_list",
+            "insurance_price_list",
+        ],
+        as_dict=True,
+    )
+    if not data:
+        return None
+
+    services = frappe.get_all(
+        "Clinic Service",
+        filters={"parent": clinic, "parenttype": "Clinic"},
+        fields=["service", "rate"],
+    )
+    return {
+        "consultation_fee": flt(data.default_consultation_fee),
+        "followup_fee": flt(data.default_followup_fee),
+        "cash_price_list": data.cash_price_list,
+        "insurance_price_list": data.insurance_price_list,
+        "services": {row.service: flt(row.rate) for row in services if row.service},
+    }
+
+
+def _load_price_list_rates(price_list):
+    """Load today's rates of a price list, general (not customer-specific) prices only."""
+    rows = frappe.db.sql(
+        """
+        SELECT item_code, price_list_rate
+        FROM `tabItem Price`
+        WHERE price_list = %(price_list)s
+            AND IFNULL(customer, '') = ''
+            AND (valid_from IS NULL OR valid_from <= %(today)s)
+            AND (valid_upto IS NULL OR valid_upto >= %(today)s)
+        ORDER BY valid_from
+        """,
+        {"price_list": price_list, "today": getdate()},
+        as_dict=True,
+    )
+    # Later valid_from wins when several prices apply
+    return {row.item_code: flt(row.price_list_rate) for row in rows}
+
+
+def _default_selling_price_list():
+    return frappe.db.get_single_value("Selling Settings", "selling_price_list")
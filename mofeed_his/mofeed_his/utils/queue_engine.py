@@ -0,0 +1,307 @@
+"""Per-doctor waiting queue engine on Redis sorted sets.
+
+Each queue (one practitioner or clinic on one day) is a sorted set of
+members (usually appointment names) scored by priority band and arrival:
+
+    score = band * PRIORITY_SPAN + arrival in milliseconds
+
+so an urgent patient sorts ahead of every normal one and patients of the
+same band keep arrival order. Check-in, call-next, skip and reprioritize
+are single sorted-set updates, O(log n); position is ZRANK, also
+O(log n), and the estimated wait is derived from it and a moving average
+of the doctor's service time kept next to the queue.
+
+Keys of a queue:
+    <queue>:current               generation loaded from the database
+    <queue>:<generation>:order    sorted set of members
+    <queue>:<generation>:entries  hash of member -> JSON entry (patient, arrival, ...)
+    <queue>:stats                 hash of service time average, last call and current member
+
+A load builds its order and entries under a new generation and publishes
+it by renaming a temporary marker to `current` with RENAMENX, so when two
+workers load a queue at once the second load is dropped instead of
+replacing the members checked in since the first.
+
+The engine talks to any object with the redis-py command methods it uses.
+"""
+
+import json
+import time
+import uuid
+
+# Priority bands, most urgent first
+EMERGENCY = "Emergency"
+URGENT = "Urgent"
+NORMAL = "Normal"
+PRIORITY_BANDS = {EMERGENCY: 0, URGENT: 1, NORMAL: 2}
+
+# Larger than any millisecond timestamp, so bands never overlap
+PRIORITY_SPAN = 10**13
+
+DEFAULT_SERVICE_MINUTES = 10.0
+SERVICE_AVERAGE_WEIGHT = 0.2
+# Service times outside this range (doctor on a break, a mis-click) are ignored
+MIN_SERVICE_MINUTES = 1
+MAX_SERVICE_MINUTES = 120
+DEFAULT_SKIP_PLACES = 3
+
+
+def queue_name(date, practitioner=None, clinic=None):
+    """Return the name of the queue of a practitioner or clinic on a date."""
+    return f"{date}:{practitioner or '-'}:{clinic or '-'}"
+
+
+class QueueEngine:
+    """Waiting queue operations over a Redis-compatible store.
+
+    Args:
+        store: redis-py client or any object with the same command methods
+        prefix: Key prefix, e.g. the site's cache key prefix
+        clock: Function returning the current time in seconds
+    """
+
+    def __init__(self, store, prefix="queue", clock=time.time):
+        self.store = store
+        self.prefix = prefix
+        self.clock = clock
+
+    def check_in(self, queue, member, priority=NORMAL, data=None, arrival=None):
+        """Add a member to a queue, or keep its place if already queued.
+
+        Args:
+            queue: Queue name (see `queue_name`)
+            member: Unique member id, usually the appointment name
+            priority: One of PRIORITY_BANDS
+            data: Extra fields stored with the entry (patient, patient_name, ...)
+            arrival: Arrival time in seconds; defaults to now
+
+        Returns:
+            dict: The entry, with its 1-based position
+        """
+        order_key, entries_key = self._keys(queue)
+        existing = self._get_entry(entries_key, member)
+        if existing and self.store.zscore(order_key, member) is not None:
+            existing["position"] = self._position(order_key, member)
+            return existing
+
+        arrival = self.clock() if arrival is None else arrival
+        offset = int(arrival * 1000)
+        entry = dict(data or {}, member=member, priority=priority, arrival=arrival, offset=offset)
+
+        self.store.hset(entries_key, member, json.dumps(entry))
+        self.store.zadd(order_key, {member: _score(priority, offset)})
+        entry["position"] = self._position(order_key, member)
+        return entry
+
+    def call_next(self, queue):
+        """Remove and return the first member of a queue.
+
+        Also updates the service time average from the time since the
+        previous call.
+
+        Returns:
+            dict: The called entry, or None if the queue is empty
+        """
+        order_key, entries_key = self._keys(queue)
+        popped = self.store.zpopmin(order_key)
+        if not popped:
+            self.store.hdel(self._key(queue, "stats"), "current")
+            return None
+
+        member = _text(popped[0][0])
+        entry = self._get_entry(entries_key, member) or {"member": member}
+        self.store.hdel(entries_key, member)
+
+        now = self.clock()
+        stats_key = self._key(queue, "stats")
+        last_call = self.store.hget(stats_key, "last_call")
+        if last_call is not None:
+            minutes = (now - float(_text(last_call))) / 60
+            if MIN_SERVICE_MINUTES <= minutes <= MAX_SERVICE_MINUTES:
+                average = self.service_minutes(queue)
+                average += SERVICE_AVERAGE_WEIGHT * (minutes - average)
+                self.store.hset(stats_key, "service_minutes", round(average, 3))
+        self.store.hset(stats_key, "last_call", now)
+        self.store.hset(stats_key, "current", member)
+
+        entry["called"] = now
+        return entry
+
+    def skip(self, queue, member, places=DEFAULT_SKIP_PLACES):
+        """Move a member who did not answer a call behind the next `places` members.
+
+        The member stays within its priority band.
+
+        Returns:
+            int: New 1-based position, or None if the member is not queued
+        """
+        order_key, entries_key = self._keys(queue)
+        rank = self.store.zrank(order_key, member)
+        if rank is None:
+            return None
+
+        entry = self._get_entry(entries_key, member) or {"priority": NORMAL}
+        band = PRIORITY_BANDS.get(entry.get("priority"), PRIORITY_BANDS[NORMAL])
+        band_end = (band + 1) * PRIORITY_SPAN - 1
+
+        target = self.store.zrange(order_key, rank + places, rank + places, withscores=True)
+        if not target:
+            target = self.store.zrange(order_key, -1, -1, withscores=True)
+        score = min(int(target[0][1]) + 1, band_end)
+
+        self._move(order_key, entries_key, member, entry, score)
+        return self._position(order_key, member)
+
+    def reprioritize(self, queue, member, priority):
+        """Move a member to another priority band, keeping its arrival order.
+
+        Returns:
+            int: New 1-based position, or None if the member is not queued
+        """
+        order_key, entries_key = self._keys(queue)
+        if self.store.zscore(order_key, member) is None:
+            return None
+
+        entry = self._get_entry(entries_key, member) or {}
+        entry["priority"] = priority
+        self._move(order_key, entries_key, member, entry, _score(priority, entry.get("offset", 0)))
+        return self._position(order_key, member)
+
+    def remove(self, queue, member):
+        """Remove a member who left without being seen.
+
+        Returns:
+            bool: Whether the member was queued
+        """
+        order_key, entries_key = self._keys(queue)
+        removed = self.store.zrem(order_key, member)
+        self.store.hdel(entries_key, member)
+        return bool(removed)
+
+    def position(self, queue, member):
+        """Return the 1-based position of a member, or None."""
+        return self._position(self._keys(queue)[0], member)
+
+    def length(self, queue):
+        """Return the number of members waiting."""
+        return self.store.zcard(self._keys(queue)[0])
+
+    def service_minutes(self, queue):
+        """Return the moving average of minutes per patient."""
+        value = self.store.hget(self._key(queue, "stats"), "service_minutes")
+        return float(_text(value)) if value is not None else DEFAULT_SERVICE_MINUTES
+
+    def estimate(self, queue, member):
+        """Return a member's position and estimated wait.
+
+        Returns:
+            dict: {"position", "ahead", "wait_minutes"}, or None if the
+            member is not queued
+        """
+        position = self._position(self._keys(queue)[0], member)
+        if position is None:
+            return None
+
+        # The patient with the doctor counts as one more ahead
+        ahead = position - 1
+        if self.store.hget(self._key(queue, "stats"), "current") is not None:
+            ahead += 1
+        return {
+            "position": position,
+            "ahead": ahead,
+            "wait_minutes": round(ahead * self.service_minutes(queue)),
+        }
+
+    def snapshot(self, queue):
+        """Return the waiting entries in order, with positions and waits."""
+        order_key, entries_key = self._keys(queue)
+        members = [_text(member) for member in self.store.zrange(order_key, 0, -1)]
+        if not members:
+            return []
+
+        entries = self.store.hgetall(entries_key)
+        entries = {_text(key): json.loads(_text(value)) for key, value in entries.items()}
+        service = self.service_minutes(queue)
+        busy = self.store.hget(self._key(queue, "stats"), "current") is not None
+
+        result = []
+        for position, member in enumerate(members, start=1):
+            entry = entries.get(member, {"member": member})
+            entry["position"] = position
+            entry["wait_minutes"] = round((position - 1 + busy) * service)
+            result.append(entry)
+        return result
+
+    def get_entry(self, queue, member):
+        """Return the stored entry of a member, or None."""
+        return self._get_entry(self._keys(queue)[1], member)
+
+    def is_loaded(self, queue):
+        """Return whether the queue was loaded from the database."""
+        return bool(self.store.exists(self._key(queue, "current")))
+
+    def load(self, queue, entries, ttl=None):
+        """Replace a queue with entries loaded from the database, unless another worker did.
+
+        Args:
+            queue: Queue name
+            entries: Entry dicts with member, priority and offset
+            ttl: Seconds to keep the queue keys, e.g. until the day ends
+
+        Returns:
+            bool: Whether these entries were stored
+        """
+        generation = uuid.uuid4().hex
+        order_key, entries_key = self._keys(queue, generation)
+        if entries:
+            self.store.zadd(
+                order_key,
+                {entry["member"]: _score(entry["priority"], entry["offset"]) for entry in entries},
+            )
+            for entry in entries:
+                self.store.hset(entries_key, entry["member"], json.dumps(entry))
+
+        current = self._key(queue, "current")
+        temp = f"{current}:loading:{generation}"
+        self.store.set(temp, generation)
+        if ttl:
+            for key in (order_key, entries_key, temp, self._key(queue, "stats")):
+                self.store.expire(key, ttl)
+
+        stored = bool(self.store.renamenx(temp, current))
+        if not stored:
+            self.store.delete(order_key, entries_key, temp)
+        return stored
+
+    def _keys(self, queue, generation=None):
+        """Return the order and entries keys of a generation, by default the current one."""
+        if generation is None:
+            generation = self.store.get(self._key(queue, "current"))
+        base = f"{self.prefix}:{queue}"
+        if generation is not None:
+            base = f"{base}:{_text(generation)}"
+        return f"{base}:order", f"{base}:entries"
+
+    def _get_entry(self, entries_key, member):
+        value = self.store.hget(entries_key, member)
+        return json.loads(_text(value)) if value is not None else None
+
+    def _position(self, order_key, member):
+        rank = self.store.zrank(order_key, member)
+        return None if rank is None else rank + 1
+
+    def _move(self, order_key, entries_key, member, entry, score):
+        entry["offset"] = score % PRIORITY_SPAN
+        self.store.hset(entries_key, member, json.dumps(entry))
+        self.store.zadd(order_key, {member: score})
+
+    def _key(self, queue, part):
+        return f"{self.prefix}:{queue}:{part}"
+
+
+def _score(priority, offset):
+    return PRIORITY_BANDS.get(priority, PRIORITY_BANDS[NORMAL]) * PRIORITY_SPAN + int(offset)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
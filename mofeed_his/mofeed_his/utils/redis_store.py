@@ -0,0 +1,25 @@
+"""Plain Redis client for the app's Redis-native engines.
+
+`frappe.cache()` pickles values and prefixes keys on its own, which suits
+cached documents but not the sorted sets and counters Redis has to compute
+on. The waiting queue and slot engines use a plain client on the same
+server instead, with the site's key prefix added explicitly.
+"""
+
+import frappe
+import redis
+
+_clients = {}
+
+
+def get_redis():
+    """Return a client for the site's Redis cache server."""
+    url = frappe.conf.redis_cache
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def site_key(key):
+    """Return `key` with the site prefix `frappe.cache()` uses."""
+    return frappe.cache().make_key(key)
@@ -0,0 +1,135 @@
+"""Token generation for the patient search projection.
+
+Turns a patient record into weighted search tokens, and a typed query into
+the token prefixes to look up. Both sides go through the same
+normalization in `utils.arabic`, so spelling variants meet in the index.
+"""
+
+import re
+
+from mofeed_his.mofeed_his.utils.arabic import (
+    compact,
+    ngrams,
+    normalize_digits,
+    normalize_phone,
+    strip_definite_article,
+    tokenize,
+)
+
+# Token kinds and their ranking weights
+MRN = "mrn"
+NATIONAL_ID = "national_id"
+PHONE = "phone"
+NAME = "name"
+MOTHER_NAME = "mother_name"
+TRIBE = "tribe"
+NGRAM = "ngram"
+
+WEIGHTS = {
+    MRN: 100,
+    NATIONAL_ID: 90,
+    PHONE: 80,
+    NAME: 50,
+    MOTHER_NAME: 20,
+    TRIBE: 10,
+    NGRAM: 5,
+}
+
+# Matches the `token` column length (Data field)
+MAX_TOKEN_LENGTH = 140
+MIN_PHONE_LENGTH = 4
+
+PHONE_FIELDS = ("mobile", "phone", "primary_phone", "secondary_phone")
+_HAS_DIGIT = re.compile(r"\d")
+
+
+def patient_tokens(record):
+    """Build the search tokens for one patient.
+
+    Args:
+        record: Mapping with any of mrn, patient_name, national_id,
+            mobile, phone, primary_phone, secondary_phone, mother_name, tribe
+
+    Returns:
+        list: ``(token, kind, weight)`` tuples, one per distinct token and kind
+    """
+    tokens = {}
+
+    def add(token, kind, weight=None):
+        token = (token or "")[:MAX_TOKEN_LENGTH]
+        if not token:
+            return
+        weight = weight or WEIGHTS[kind]
+        if tokens.get((token, kind), 0) < weight:
+            tokens[(token, kind)] = weight
+
+    add(compact(record.get("mrn")), MRN)
+    add(compact(record.get("national_id")), NATIONAL_ID)
+
+    for field in PHONE_FIELDS:
+        phone = normalize_phone(record.get(field))
+        if len(phone) >= MIN_PHONE_LENGTH:
+            add(phone, PHONE)
+
+    for word in tokenize(record.get("patient_name")):
+        add(word, NAME)
+        add(strip_definite_article(word), NAME, WEIGHTS[NAME] - 5)
+        for gram in ngrams(word):
+            add(gram, NGRAM)
+
+    for word in tokenize(record.get("mother_name")):
+        add(word, MOTHER_NAME)
+
+    for word in tokenize(record.get("tribe")):
+        add(word, TRIBE)
+        add(strip_definite_article(word), TRIBE)
+
+    return [(token, kind, weight) for (token, kind), weight in tokens.items()]
+
+
+def query_terms(text):
+    """Split a search query into terms, each with its lookup variants.
+
+    A patient matches the query when every term matches one of its tokens.
+    A query with no letters (a phone number typed with spaces) or with
+    digits but no spaces (an MRN or national ID) is one term. Otherwise
+    each word is a term.
+
+    Example:
+        >>> query_terms("0770 123")
+        [['0770123', '770123']]
+        >>> query_terms("KRBHOSP-2025-000123")
+        [['krbhosp2025000123']]
+        >>> query_terms("الحسن علي")
+        [['الحسن', 'حسن'], ['علي']]
+
+    Returns:
+        list: One list of distinct variants per term
+    """
+    text = normalize_digits(text or "").strip()
+    if not text:
+        return []
+
+    has_letters = any(ch.isalpha() for ch in text)
+    if not has_letters or (" " not in text and _HAS_DIGIT.search(text)):
+        # Keep the raw text so a leading '+' still marks a country code
+        words = [(compact(text), text)]
+    else:
+        words = [(word, word) for word in tokenize(text)]
+
+    terms = []
+    for word, raw in words:
+        if not word:
+            continue
+        variants = [word]
+        if word.isdigit():
+            phone = normalize_phone(raw)
+            if phone and phone != word:
+                variants.append(phone)
+        else:
+            stripped = strip_definite_article(word)
+            if stripped:
+                variants.append(stripped)
+        terms.append(variants)
+
+    return terms
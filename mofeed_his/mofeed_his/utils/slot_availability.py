@@ -0,0 +1,280 @@
+"""Slot availability of clinics and practitioners.
+
+Frappe side of `utils.slot_engine`. A clinic's slots come from its
+working days and hours, slot duration and Max Patients Per Slot; a
+practitioner's from the time slots of their Practitioner Schedules.
+Booked counts per slot live in Redis and are loaded lazily, per calendar
+and day, from Patient Appointment.
+
+Appointments take their places in `reserve_slots`, on validate, so a
+full clinic slot is refused before the appointment is saved. Places are
+given back after a rollback, and old places after the commit that moves
+or cancels an appointment. Clinic capacity is enforced here; practitioner
+overlaps are left to Healthcare's own validation and only counted, so
+`get_free_slots` can answer for a doctor too.
+
+Walk-ins go through `book_walk_in`, which may overbook a slot near the
+current time by the clinic's Walk-in Overbooking Per Slot.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, getdate, now_datetime, today
+
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.redis_store import get_redis, site_key
+from mofeed_his.mofeed_his.utils.slot_engine import (
+    SlotEngine,
+    clinic_slots,
+    format_minutes,
+    free_slots,
+    layout_tag,
+    pick_walk_in_slot,
+    schedule_slots,
+    slot_index,
+    to_minutes,
+)
+
+CLINIC = "clinic"
+PRACTITIONER = "practitioner"
+# Patient Appointment field linking each calendar kind
+CALENDAR_FIELDS = {CLINIC: "custom_clinic", PRACTITIONER: "practitioner"}
+
+# Appointment statuses that give their place back
+FREED_STATUSES = ("Cancelled",)
+
+# Days searched ahead for free slots
+SEARCH_DAYS = 14
+COUNTS_TTL = 24 * 60 * 60
+
+
+def get_engine():
+    """Return a slot engine on the site's Redis cache server."""
+    return SlotEngine(get_redis(), prefix=site_key("mofeed_his:slots"))
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def get_free_slots(clinic=None, practitioner=None, date=None, count=5):
+    """Return the next free slots of a clinic or practitioner.
+
+    Args:
+        clinic: Clinic
+        practitioner: Healthcare Practitioner, used when no clinic is given
+        date: First date to search, default today
+        count: Number of slots to return
+
+    Returns:
+        list: {"date", "time", "free"} dicts in time order, searching up
+        to SEARCH_DAYS days ahead
+    """
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+    if not (clinic or practitioner):
+        frappe.throw(_("Select a clinic or a practitioner"))
+
+    kind, name = (CLINIC, clinic) if clinic else (PRACTITIONER, practitioner)
+    count = cint(count) or 5
+    start = getdate(date or today())
+    now = now_datetime()
+
+    engine = get_engine()
+    result = []
+    for offset in range(SEARCH_DAYS):
+        day = add_days(start, offset)
+        slots = get_layout(kind, name, day)
+        if not slots:
+            continue
+
+        counts = _get_counts(engine, kind, name, day, slots)
+        after = now.hour * 60 + now.minute if day == now.date() else None
+        for _index, minute, free in free_slots(slots, counts, after, count - len(result)):
+            result.append({"date": str(day), "time": format_minutes(minute), "free": free})
+        if len(result) >= count:
+            break
+    return result
+
+
+@frappe.whitelist()
+@hospital_scoped(patient="Patient", clinic="Clinic")
+def book_walk_in(patient, clinic, practitioner=None):
+    """Book a walk-in patient into a slot now and check them in.
+
+    Returns:
+        dict: {"appointment", "time", "overbooked"} and the queue estimate
+        (position, ahead, wait_minutes)
+    """
+    from mofeed_his.mofeed_his.utils.waiting_queue import check_in
+
+    frappe.has_permission("Patient Appointment", "create", throw=True)
+
+    date = getdate(today())
+    slots = get_layout(CLINIC, clinic, date)
+    now = now_datetime()
+    counts = _get_counts(get_engine(), CLINIC, clinic, date, slots)
+    overbooking = frappe.get_cached_value("Clinic", clinic, "walk_in_overbooking")
+    picked = pick_walk_in_slot(slots, counts, now.hour * 60 + now.minute, overbooking)
+    if not picked:
+        frappe.throw(_("Clinic {0} has no places left today").format(clinic))
+
+    index, limit = picked
+    start, end, capacity = slots[index]
+    appointment = frappe.get_doc(
+        {
+            "doctype": "Patient Appointment",
+            "patient": patient,
+            "practitioner": practitioner,
+            "custom_clinic": clinic,
+            "appointment_date": date,
+            "appointment_time": format_minutes(start),
+            "duration": end - start,
+        }
+    )
+    appointment.flags.slot_limit = limit
+    appointment.insert()
+
+    estimate = check_in(appointment=appointment.name) or {}
+    return dict(
+        estimate,
+        appointment=appointment.name,
+        time=format_minutes(start),
+        overbooked=counts.get(index, 0) >= capacity,
+    )
+
+
+def get_layout(kind, name, date):
+    """Return the slot layout of a clinic or practitioner on a date."""
+    weekday = getdate(date).weekday()
+
+    if kind == CLINIC:
+        clinic = frappe.get_cached_doc("Clinic", name)
+        if not clinic.is_active:
+            return []
+        return clinic_slots(
+            weekday,
+            clinic.working_days,
+            clinic.working_hours_start,
+            clinic.working_hours_end,
+            clinic.slot_duration,
+            clinic.max_patients_per_slot,
+        )
+
+    time_slots = []
+    practitioner = frappe.get_cached_doc("Healthcare Practitioner", name)
+    for row in practitioner.get("practitioner_schedules") or []:
+        if row.schedule:
+            schedule = frappe.get_cached_doc("Practitioner Schedule", row.schedule)
+            time_slots.extend((s.day, s.from_time, s.to_time) for s in schedule.time_slots)
+    return schedule_slots(weekday, time_slots)
+
+
+def reserve_slots(doc, method=None):
+    """Hook: take the clinic and practitioner places of a Patient Appointment.
+
+    Runs on validate. A move or cancellation gives the old places back
+    once the transaction commits.
+    """
+    before = doc.get_doc_before_save()
+    old = _appointment_slots(before) if before else {}
+    new = _appointment_slots(doc)
+    if old.keys() == new.keys():
+        return
+
+    engine = get_engine()
+    taken = []
+    for key in new.keys() - old.keys():
+        calendar, name, date, index = key
+        limit = None
+        if _kind(calendar) == CLINIC:
+            limit = doc.flags.slot_limit or new[key]
+        if not _book(engine, key, limit):
+            _release(engine, taken)
+            frappe.throw(
+                _("Clinic {0} is fully booked at {1} on {2}").format(
+                    name, format_minutes(to_minutes(doc.appointment_time)), date
+                ),
+                title=_("Slot Full"),
+            )
+        taken.append(key)
+
+    freed = [key for key in old if key not in new]
+    frappe.db.after_rollback.add(lambda: _release(engine, taken))
+    frappe.db.after_commit.add(lambda: _release(engine, freed))
+
+
+def release_slots(doc, method=None):
+    """Hook: give back the places of a deleted Patient Appointment after commit."""
+    engine = get_engine()
+    keys = list(_appointment_slots(doc))
+    frappe.db.after_commit.add(lambda: _release(engine, keys))
+
+
+def _appointment_slots(doc):
+    """Return {(calendar, name, date, slot index): capacity} of an appointment's places."""
+    if doc.status in FREED_STATUSES or not doc.appointment_date:
+        return {}
+
+    minute = to_minutes(doc.appointment_time)
+    result = {}
+    for kind, field in CALENDAR_FIELDS.items():
+        name = doc.get(field)
+        if not name:
+            continue
+        slots = get_layout(kind, name, doc.appointment_date)
+        index = slot_index(slots, minute)
+        if index is not None:
+            calendar = _calendar(kind, name, slots)
+            result[(calendar, name, str(getdate(doc.appointment_date)), index)] = slots[index][2]
+    return result
+
+
+def _book(engine, key, limit):
+    calendar, name, date, index = key
+    for _attempt in range(2):
+        if not engine.is_loaded(calendar, date):
+            _load_counts(engine, calendar, name, date)
+        booked = engine.book(calendar, date, index, limit)
+        if booked is not None:
+            return booked
+    return False
+
+
+def _release(engine, keys):
+    for calendar, _name, date, index in keys:
+        engine.release(calendar, date, index)
+
+
+def _get_counts(engine, kind, name, date, slots):
+    calendar = _calendar(kind, name, slots)
+    if not engine.is_loaded(calendar, str(date)):
+        _load_counts(engine, calendar, name, str(date))
+    return engine.counts(calendar, str(date))
+
+
+def _load_counts(engine, calendar, name, date):
+    """Count a day's booked places from Patient Appointment into Redis."""
+    kind = _kind(calendar)
+    slots = get_layout(kind, name, date)
+    appointments = frappe.get_all(
+        "Patient Appointment",
+        filters={
+            CALENDAR_FIELDS[kind]: name,
+            "appointment_date": date,
+            "status": ["not in", FREED_STATUSES],
+        },
+        pluck="appointment_time",
+    )
+
+    counts = {}
+    for appointment_time in appointments:
+        index = slot_index(slots, to_minutes(appointment_time))
+        if index is not None:
+            counts[index] = counts.get(index, 0) + 1
+    engine.load(calendar, date, counts, ttl=COUNTS_TTL)
+
+
+def _calendar(kind, name, slots):
+    return f"{kind}:{name}:{layout_tag(slots)}"
+
+
+def _kind(calendar):
+    return calendar.split(":", 1)[0]
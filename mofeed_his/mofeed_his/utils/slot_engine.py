@@ -0,0 +1,268 @@
+"""Slot availability engine for clinic and practitioner scheduling.
+
+A calendar (a clinic or a practitioner) has a slot layout per weekday:
+the start and end minute of every slot and how many patients it takes.
+Layouts are derived from the schedule (see `clinic_slots` and
+`schedule_slots`) and never stored; keys carry a tag of the layout, so
+a schedule change starts fresh counts instead of misreading old ones.
+
+What is stored is the booked count of every slot of a day, one Redis
+hash per calendar and date, field = slot index. Booking is one HINCRBY
+that is undone if it went over the limit, so two desks can never both
+take the last place, and "next free slots" is a single HGETALL walked
+against the layout, constant work per slot.
+
+A day's counts are loaded once from the appointments in the database and
+then kept up to date by booking and releasing. The hash is built under a
+temporary key and renamed into place with RENAMENX, so a concurrent load
+never overwrites bookings made in the meantime.
+"""
+
+import bisect
+import datetime
+import hashlib
+import uuid
+
+# Clinic.working_days -> Python weekdays (Monday = 0)
+WORKING_DAYS = {
+    "Sunday to Thursday": (6, 0, 1, 2, 3),
+    "Saturday to Thursday": (5, 6, 0, 1, 2, 3),
+    "Saturday to Wednesday": (5, 6, 0, 1, 2),
+    "All Week": (0, 1, 2, 3, 4, 5, 6),
+}
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+DEFAULT_SLOT_MINUTES = 15
+# Hash field marking a loaded day, so a day without bookings is not reloaded
+LOADED_FIELD = "loaded"
+# Slots after the current one a walk-in may wait for a regular place
+# before being overbooked
+WALK_IN_WINDOW = 2
+
+
+def to_minutes(value):
+    """Return the minute of the day of a time, "HH:MM[:SS]" string or timedelta."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds() // 60)
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return value.hour * 60 + value.minute
+    parts = str(value).split(":")
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def format_minutes(minute):
+    """Return "HH:MM:SS" for a minute of the day."""
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
+
+
+def clinic_slots(weekday, working_days, start, end, slot_minutes, capacity):
+    """Return a clinic's slot layout for a weekday.
+
+    Args:
+        weekday: Python weekday, Monday = 0
+        working_days: Clinic.working_days; empty means every day
+        start: Working hours start (see `to_minutes`)
+        end: Working hours end
+        slot_minutes: Slot duration
+        capacity: Patients per slot
+
+    Returns:
+        list: (start minute, end minute, capacity) tuples in order; empty
+        when the clinic does not work that day or has no hours
+    """
+    days = WORKING_DAYS.get(working_days) if working_days else WORKING_DAYS["All Week"]
+    start, end = to_minutes(start), to_minutes(end)
+    if weekday not in (days or ()) or start is None or end is None:
+        return []
+
+    slot_minutes = max(int(slot_minutes or DEFAULT_SLOT_MINUTES), 1)
+    capacity = max(int(capacity or 1), 1)
+    return [
+        (minute, minute + slot_minutes, capacity)
+        for minute in range(start, end - slot_minutes + 1, slot_minutes)
+    ]
+
+
+def schedule_slots(weekday, time_slots, capacity=1):
+    """Return a practitioner's slot layout for a weekday.
+
+    Args:
+        weekday: Python weekday, Monday = 0
+        time_slots: (day name, from time, to time) of the practitioner's
+            schedules, as in Healthcare Schedule Time Slot
+        capacity: Patients per slot
+
+    Returns:
+        list: (start minute, end minute, capacity) tuples in order
+    """
+    day = WEEKDAYS[weekday]
+    slots = {
+        (to_minutes(from_time), to_minutes(to_time), capacity)
+        for slot_day, from_time, to_time in time_slots
+        if slot_day == day and from_time is not None and to_time is not None
+    }
+    return sorted(slot for slot in slots if slot[1] > slot[0])
+
+
+def layout_tag(slots):
+    """Return a short tag identifying a slot layout."""
+    raw = ",".join(f"{start}-{end}x{capacity}" for start, end, capacity in slots)
+    return hashlib.sha1(raw.encode()).hexdigest()[:8]
+
+
+def slot_index(slots, minute):
+    """Return the index of the slot containing a minute of the day, or None."""
+    if minute is None:
+        return None
+    index = bisect.bisect_right([slot[0] for slot in slots], minute) - 1
+    if index < 0 or minute >= slots[index][1]:
+        return None
+    return index
+
+
+def free_slots(slots, counts, after=None, limit=None):
+    """Return the slots with room left, in order.
+
+    Args:
+        slots: Slot layout
+        counts: Slot index -> booked count
+        after: Skip slots that end at or before this minute (e.g. now)
+        limit: Return at most this many
+
+    Returns:
+        list: (index, start minute, free places) tuples
+    """
+    result = []
+    for index, (start, end, capacity) in enumerate(slots):
+        if after is not None and end <= after:
+            continue
+        free = capacity - counts.get(index, 0)
+        if free > 0:
+            result.append((index, start, free))
+            if limit and len(result) >= limit:
+                break
+    return result
+
+
+def pick_walk_in_slot(slots, counts, now, overbooking=0, window=WALK_IN_WINDOW):
+    """Choose the slot for a walk-in patient arriving now.
+
+    A regular place in the current slot or the next `window` slots is
+    taken first. Otherwise the walk-in is overbooked into the earliest of
+    those slots still within `overbooking` extra places, and failing that
+    takes the first regular place later in the day.
+
+    Returns:
+        tuple: (slot index, limit to book against), or None if the day is full
+    """
+    upcoming = [index for index, slot in enumerate(slots) if slot[1] > now]
+    nearby = upcoming[: window + 1]
+
+    for index in nearby:
+        if counts.get(index, 0) < slots[index][2]:
+            return index, slots[index][2]
+    for index in nearby:
+        limit = slots[index][2] + max(int(overbooking or 0), 0)
+        if counts.get(index, 0) < limit:
+            return index, limit
+    for index in upcoming[window + 1 :]:
+        if counts.get(index, 0) < slots[index][2]:
+            return index, slots[index][2]
+    return None
+
+
+class SlotEngine:
+    """Booked slot counts over a Redis-compatible store.
+
+    Args:
+        store: redis-py client or any object with the same command methods
+        prefix: Key prefix, e.g. the site's cache key prefix
+    """
+
+    def __init__(self, store, prefix="slots"):
+        self.store = store
+        self.prefix = prefix
+
+    def is_loaded(self, calendar, date):
+        """Return whether a day's counts are in the store."""
+        return bool(self.store.exists(self._key(calendar, date)))
+
+    def load(self, calendar, date, counts, ttl=None):
+        """Store a day's counts unless another worker already did.
+
+        Args:
+            calendar: Calendar name, e.g. "clinic:Dental"
+            date: Date string
+            counts: Slot index -> booked count, from the database
+            ttl: Seconds to keep the counts
+
+        Returns:
+            bool: Whether these counts were stored
+        """
+        key = self._key(calendar, date)
+        temp = f"{key}:loading:{uuid.uuid4().hex}"
+        self.store.hset(temp, LOADED_FIELD, 1)
+        for index, count in counts.items():
+            if count:
+                self.store.hset(temp, str(index), int(count))
+        if ttl:
+            self.store.expire(temp, ttl)
+
+        stored = bool(self.store.renamenx(temp, key))
+        if not stored:
+            self.store.delete(temp)
+        return stored
+
+    def counts(self, calendar, date):
+        """Return slot index -> booked count of a day."""
+        values = self.store.hgetall(self._key(calendar, date))
+        return {
+            int(_text(field)): int(_text(value))
+            for field, value in values.items()
+            if _text(field) != LOADED_FIELD
+        }
+
+    def book(self, calendar, date, index, limit=None):
+        """Take a place in a slot if fewer than `limit` are booked.
+
+        Args:
+            calendar: Calendar name
+            date: Date string
+            index: Slot index
+            limit: Places the slot may hold; None counts without limit
+
+        Returns:
+            bool: Whether the place was taken, or None if the day's counts
+            expired since they were loaded and must be loaded again
+        """
+        key = self._key(calendar, date)
+        count = self.store.hincrby(key, str(index), 1)
+        if self.store.hget(key, LOADED_FIELD) is None:
+            self.store.delete(key)
+            return None
+        if limit is not None and count > limit:
+            self.store.hincrby(key, str(index), -1)
+            return False
+        return True
+
+    def release(self, calendar, date, index):
+        """Give back a place in a slot.
+
+        Nothing is done for a day that is not loaded; its next load counts
+        from the database, where the place is already free.
+        """
+        key = self._key(calendar, date)
+        if not self.store.exists(key):
+            return
+        if self.store.hincrby(key, str(index), -1) < 0:
+            self.store.hset(key, str(index), 0)
+
+    def _key(self, calendar, date):
+        return f"{self.prefix}:{calendar}:{date}"
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
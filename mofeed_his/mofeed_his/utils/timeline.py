@@ -0,0 +1,132 @@
+"""Keyset pagination and k-way merge for the unified medical record.
+
+Timeline events come from several doctypes (encounters, diagnoses, lab
+tests, ...). Each source is read newest first with a keyset condition
+instead of an offset, and the sources are merged with a heap, so a page
+costs one indexed range read of `page size + 1` rows per source however
+deep into the history it is.
+
+Events are ordered by the key (date, time, source, name), descending.
+Source and name break ties, so the order is total and stable. The cursor
+of a page is the key of its last event, encoded as an opaque token.
+"""
+
+import base64
+import datetime
+import heapq
+import json
+
+CURSOR_VERSION = 1
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def format_time(value):
+    """Return "HH:MM:SS" for a time, timedelta (as MariaDB returns) or string."""
+    if value is None or value == "":
+        return "00:00:00"
+    if isinstance(value, datetime.timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if isinstance(value, datetime.time):
+        return value.strftime("%H:%M:%S")
+    hours, minutes, seconds = (str(value).split(".")[0].split(":") + ["0", "0"])[:3]
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
+
+
+def sort_key(event):
+    """Return the timeline order key of an event."""
+    return (str(event["date"]), event["time"], event["source"], event["name"])
+
+
+def encode_cursor(event):
+    """Return the opaque cursor pointing after an event."""
+    payload = [CURSOR_VERSION, *sort_key(event)]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the key a cursor points after, or None for the first page.
+
+    Raises:
+        ValueError: If the token is not a cursor of this version
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        version, date, time, source, name = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid timeline cursor") from e
+    if version != CURSOR_VERSION:
+        raise ValueError("Invalid timeline cursor")
+    return {"date": date, "time": time, "source": source, "name": name}
+
+
+def keyset_condition(source, cursor, date_column, time_column, name_column):
+    """Return the SQL condition selecting a source's events after a cursor.
+
+    Args:
+        source: Source name of the rows being read
+        cursor: Decoded cursor, or None
+        date_column: SQL expression of the event date
+        time_column: SQL expression of the event time, never NULL
+        name_column: SQL expression of the event name
+
+    Returns:
+        tuple: (SQL condition, values for its %(...)s placeholders)
+    """
+    if not cursor:
+        return "1=1", {}
+
+    # At the cursor's date and time, rows of sources ordered before the
+    # cursor's come after it in descending order, whatever their name
+    if source < cursor["source"]:
+        same_time = f"{time_column} <= %(cursor_time)s"
+    elif source == cursor["source"]:
+        same_time = (
+            f"({time_column} < %(cursor_time)s"
+            f" OR ({time_column} = %(cursor_time)s AND {name_column} < %(cursor_name)s))"
+        )
+    else:
+        same_time = f"{time_column} < %(cursor_time)s"
+
+    condition = (
+        f"({date_column} < %(cursor_date)s"
+        f" OR ({date_column} = %(cursor_date)s AND {same_time}))"
+    )
+    values = {
+        "cursor_date": cursor["date"],
+        "cursor_time": cursor["time"],
+        "cursor_name": cursor["name"],
+    }
+    return condition, values
+
+
+def merge_page(streams, page_size):
+    """Merge per-source event lists into one page.
+
+    Args:
+        streams: Event lists, each newest first and holding up to
+            `page_size + 1` events after the cursor
+        page_size: Events per page
+
+    Returns:
+        tuple: (events, next cursor or None on the last page)
+    """
+    merged = heapq.merge(*streams, key=sort_key, reverse=True)
+    events = [event for _, event in zip(range(page_size + 1), merged)]
+    if len(events) <= page_size:
+        return events, None
+    events = events[:page_size]
+    return events, encode_cursor(events[-1])
+
+
+def clamp_page_size(page_size):
+    """Return a page size within 1..MAX_PAGE_SIZE."""
+    try:
+        page_size = int(page_size or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
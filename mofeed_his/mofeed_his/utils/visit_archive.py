@@ -0,0 +1,219 @@
+"""Archival of closed years of visits to history tables.
+
+Patient Appointment and Waiting Queue Entry grow with every visit, but
+only recent days are ever worked on. With `archive_visits_after_years`
+set in site config, `archive_closed_years` (monthly) moves the rows of
+older years to `tab<DocType> History` tables with the same columns, so
+the working tables and their indexes stay small:
+
+- with the setting at N, the current year and the N closed years before
+  it stay; 0 archives every closed year (`partitioning.archive_cutoff`)
+- only appointments in a final status are moved; an old appointment still
+  open stays where it can be dealt with
+- a row that any live document links to (a Patient Encounter, an invoice
+  item, a queue entry still in place...) stays, so Link fields, the forms
+  behind them and the joins of claims and queues keep finding it; logs
+  about the row itself (Version, Comment...) do not keep it
+- rows are moved in batches of ARCHIVE_BATCH_SIZE, each copied, deleted
+  and committed together, so an interrupted run resumes on the next one
+- the last archived day of each doctype is kept as a global default,
+  set before the first row moves so readers never miss one
+
+Readers that may reach archived days use `visit_table`, which adds the
+history rows only when the date range needs them, and `get_visit_value`
+for single lookups. Patient Encounters and their child tables are clinical
+records and are not archived.
+"""
+
+import frappe
+from frappe.utils import cint, getdate, today
+
+from mofeed_his.mofeed_his.utils.partitioning import (
+    archive_cutoff,
+    archive_condition,
+    history_table,
+    needs_history,
+    visit_source,
+)
+
+# Doctype -> date field and the statuses that may be archived (None: any).
+# Queue entries go first, so the appointments they link to are free to move.
+ARCHIVED_DOCTYPES = {
+    "Waiting Queue Entry": {
+        "date_field": "queue_date",
+        "statuses": None,
+    },
+    "Patient Appointment": {
+        "date_field": "appointment_date",
+        "statuses": ("Closed", "Checked Out", "Cancelled", "No Show"),
+    },
+}
+
+# Doctypes whose links to a row are records about the row itself
+IGNORED_LINKING_DOCTYPES = {
+    "Access Log",
+    "Activity Log",
+    "Comment",
+    "Deleted Document",
+    "DocShare",
+    "Document Follow",
+    "Energy Point Log",
+    "Error Log",
+    "Notification Log",
+    "Route History",
+    "Tag Link",
+    "ToDo",
+    "Version",
+    "View Log",
+}
+
+ARCHIVED_THROUGH_KEY = "mofeed_his_archived_through"
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def archive_closed_years():
+    """Scheduled: move the visits of closed years to the history tables."""
+    keep_years = frappe.conf.get("archive_visits_after_years")
+    if keep_years is None:
+        return
+    through = archive_cutoff(getdate(today()), cint(keep_years))
+    if not through:
+        return
+
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.visit_archive.archive_visits",
+        queue="long",
+        timeout=6 * 60 * 60,
+        job_id="mofeed_his:archive_visits",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        through=str(through),
+    )
+
+
+def archive_visits(through):
+    """Job: move the archivable rows dated up to `through` to the history tables.
+
+    Args:
+        through: Last day to archive
+
+    Returns:
+        dict: doctype -> rows moved
+    """
+    through = getdate(through)
+    moved = {}
+    for doctype, config in ARCHIVED_DOCTYPES.items():
+        if frappe.db.table_exists(doctype):
+            moved[doctype] = _archive_doctype(doctype, through, **config)
+    return moved
+
+
+def visit_table(doctype, columns, from_date=None):
+    """Return the table to read a visit doctype from, history included when needed.
+
+    Usage:
+        table = visit_table("Patient Appointment", ["name", "custom_clinic"], from_date)
+        frappe.db.sql(f"SELECT a.custom_clinic FROM {table} a WHERE ...")
+
+    Args:
+        doctype: An archived doctype
+        columns: Columns the query reads
+        from_date: First date the query reads; None if unbounded
+
+    Returns:
+        str: The doctype's table, or a derived table of the given columns
+        from it and its history table
+    """
+    return visit_source(doctype, columns, needs_history(from_date, get_archived_through(doctype)))
+
+
+def get_visit_value(doctype, name, fieldname):
+    """Return a field of a visit, looking in the history table if it was archived."""
+    value = frappe.db.get_value(doctype, name, fieldname)
+    if value is not None or not name or not get_archived_through(doctype):
+        return value
+    rows = frappe.db.sql(
+        f"SELECT `{fieldname}` FROM `{history_table(doctype)}` WHERE name = %s", (name,)
+    )
+    return rows[0][0] if rows else None
+
+
+def get_archived_through(doctype):
+    """Return the last archived day of a doctype, or None if nothing is archived."""
+    value = frappe.db.get_global(f"{ARCHIVED_THROUGH_KEY}:{doctype}")
+    return getdate(value) if value else None
+
+
+def _archive_doctype(doctype, through, date_field, statuses):
+    history = _ensure_history_table(doctype)
+    columns = ", ".join(f"`{column}`" for column in frappe.db.get_table_columns(doctype))
+    condition = archive_condition(doctype, date_field, statuses, _get_links(doctype))
+    values = {
+        "through": through,
+        "statuses": statuses,
+        "doctype": doctype,
+        "limit": ARCHIVE_BATCH_SIZE,
+    }
+
+    # Readers must look at the history table before the first row moves there
+    previous = get_archived_through(doctype)
+    if not previous or through > previous:
+        frappe.db.set_global(f"{ARCHIVED_THROUGH_KEY}:{doctype}", str(through))
+        frappe.db.commit()
+
+    moved = 0
+    while True:
+        names = frappe.db.sql_list(
+            f"SELECT name FROM `tab{doctype}` WHERE {condition} ORDER BY name LIMIT %(limit)s",
+            values,
+        )
+        if not names:
+            break
+        batch = {"names": tuple(names)}
+        # A row archived before and since restored replaces its old copy
+        frappe.db.sql(
+            f"REPLACE INTO `{history}` ({columns}) "
+            f"SELECT {columns} FROM `tab{doctype}` WHERE name IN %(names)s",
+            batch,
+        )
+        frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE name IN %(names)s", batch)
+        frappe.db.commit()
+        moved += len(names)
+    return moved
+
+
+def _get_links(doctype):
+    """Return (linking doctype, field, doctype field) of the fields pointing at `doctype`."""
+    fields = frappe.db.sql(
+        """
+        SELECT parent AS linking_doctype, fieldname, fieldtype, options
+        FROM `tabDocField`
+        WHERE (fieldtype = 'Link' AND options = %(doctype)s) OR fieldtype = 'Dynamic Link'
+        UNION ALL
+        SELECT dt AS linking_doctype, fieldname, fieldtype, options
+        FROM `tabCustom Field`
+        WHERE (fieldtype = 'Link' AND options = %(doctype)s) OR fieldtype = 'Dynamic Link'
+        """,
+        {"doctype": doctype},
+        as_dict=True,
+    )
+    links = set()
+    for field in fields:
+        if field.linking_doctype == doctype or field.linking_doctype in IGNORED_LINKING_DOCTYPES:
+            continue
+        if not frappe.db.table_exists(field.linking_doctype):
+            continue
+        doctype_field = field.options if field.fieldtype == "Dynamic Link" else None
+        links.add((field.linking_doctype, field.fieldname, doctype_field))
+    return sorted(links, key=lambda link: (link[0], link[1], link[2] or ""))
+
+
+def _ensure_history_table(doctype):
+    """Create the history table, or add the columns the doctype gained since."""
+    history = history_table(doctype)
+    frappe.db.sql_ddl(f"CREATE TABLE IF NOT EXISTS `{history}` LIKE `tab{doctype}`")
+    existing = set(frappe.db.sql_list(f"SHOW COLUMNS FROM `{history}`"))
+    for column in frappe.db.sql(f"SHOW COLUMNS FROM `tab{doctype}`", as_dict=True):
+        if column.Field not in existing:
+            frappe.db.sql_ddl(f"ALTER TABLE `{history}` ADD COLUMN `{column.Field}` {column.Type}")
+    return history
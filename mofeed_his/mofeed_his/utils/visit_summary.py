@@ -0,0 +1,259 @@
+"""Incrementally maintained Daily Visit Summary rows.
+
+Visits, invoices, revenue and the insurance and patient shares per day,
+hospital, clinic and practitioner are kept in Daily Visit Summary, so
+reports (e.g. Clinic Activity) group a few thousand summary rows instead
+of every encounter and invoice ever made:
+
+- Submitting or cancelling a Patient Encounter or Sales Invoice adds or
+  subtracts its figures in the same transaction, with one
+  insert-or-increment statement (see `hooks.py`)
+- Each night the last `RECONCILE_DAYS` days are recomputed from the raw
+  documents and replaced, correcting backdated documents and anything
+  the doc events missed
+
+The hospital is the patient's, the clinic that of the appointment behind
+the encounter (or the first appointment an invoice bills), and the
+insurance share that of the plan's coverage rules
+(`utils.insurance_coverage`). Appointments of archived years are read
+from their history table (`utils.visit_archive`).
+"""
+
+import frappe
+from frappe.utils import add_days, getdate, now, today
+
+from mofeed_his.mofeed_his.mofeed_his.doctype.patient_extension.patient_extension import (
+    get_patient_extensions,
+)
+from mofeed_his.mofeed_his.utils.daily_summary import (
+    KEY_FIELDS,
+    MEASURES,
+    SummaryTotals,
+    summary_key,
+)
+from mofeed_his.mofeed_his.utils.insurance_coverage import apply_coverage, split_invoices
+from mofeed_his.mofeed_his.utils.visit_archive import get_visit_value, visit_table
+
+RECONCILE_DAYS = 7
+# Days recomputed and replaced per transaction
+REBUILD_CHUNK_DAYS = 31
+INVOICE_PAGE_SIZE = 500
+REBUILD_JOB_ID = "mofeed_his:rebuild_visit_summaries"
+
+SUMMARY_FIELDS = ("name", "creation", "modified", "owner", "modified_by") + KEY_FIELDS + MEASURES
+
+
+def update_encounter_summary(doc, method=None):
+    """Hook: count a submitted encounter as a visit, or uncount a cancelled one."""
+    totals = SummaryTotals()
+    clinic = None
+    if doc.get("appointment"):
+        clinic = get_visit_value("Patient Appointment", doc.appointment, "custom_clinic")
+    key = summary_key(
+        doc.encounter_date, _patient_hospital(doc.patient), clinic, doc.practitioner
+    )
+    totals.add(key, visits=-1 if method == "on_cancel" else 1)
+    _add_to_summaries(totals)
+
+
+def update_invoice_summary(doc, method=None):
+    """Hook: add a submitted patient invoice's amounts, or subtract a cancelled one's."""
+    if not doc.get("patient"):
+        return
+
+    header = get_patient_extensions(
+        [doc.patient],
+        ["has_insurance", "insurance_plan", "coverage_percentage", "insurance_expiry"],
+    ).get(doc.patient) or frappe._dict(has_insurance=0)
+    header.update(invoice=doc.name, posting_date=getdate(doc.posting_date))
+    lines = [
+        {
+            "parent": doc.name,
+            "item_code": item.item_code,
+            "item_group": item.item_group,
+            "qty": item.qty,
+            "amount": item.amount,
+        }
+        for item in doc.items
+    ]
+    split = apply_coverage([header], lines)[doc.name]
+
+    appointments = [
+        item.reference_dn
+        for item in doc.items
+        if item.get("reference_dt") == "Patient Appointment" and item.get("reference_dn")
+    ]
+    clinic = None
+    if appointments:
+        clinic = get_visit_value("Patient Appointment", appointments[0], "custom_clinic")
+
+    totals = SummaryTotals()
+    totals.add_invoice(
+        summary_key(
+            doc.posting_date, _patient_hospital(doc.patient), clinic, doc.get("ref_practitioner")
+        ),
+        doc.grand_total,
+        split["insurer_amount"],
+        sign=-1 if method == "on_cancel" else 1,
+        is_return=doc.get("is_return"),
+    )
+    _add_to_summaries(totals)
+
+
+def reconcile_visit_summaries():
+    """Scheduler: recompute the summaries of the last days in the background."""
+    enqueue_summary_rebuild(add_days(today(), -RECONCILE_DAYS), today())
+
+
+def enqueue_summary_rebuild(from_date, to_date):
+    """Recompute and replace the summaries of a date range in the background."""
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.visit_summary.rebuild_visit_summaries",
+        queue="long",
+        timeout=6 * 60 * 60,
+        job_id=REBUILD_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=True,
+        from_date=from_date,
+        to_date=to_date,
+    )
+
+
+def rebuild_visit_summaries(from_date=None, to_date=None):
+    """Job: recompute the summaries of a date range from the raw documents.
+
+    Each chunk of `REBUILD_CHUNK_DAYS` days is computed, then its rows are
+    deleted and re-inserted in one transaction.
+
+    Args:
+        from_date: First date; the earliest encounter or invoice if None
+        to_date: Last date; today if None
+    """
+    from_date = getdate(from_date or _first_document_date())
+    to_date = getdate(to_date or today())
+    while from_date <= to_date:
+        chunk_end = min(add_days(from_date, REBUILD_CHUNK_DAYS - 1), to_date)
+        totals = SummaryTotals()
+        _count_visits(totals, from_date, chunk_end)
+        _count_invoices(totals, from_date, chunk_end)
+        frappe.db.sql(
+            "DELETE FROM `tabDaily Visit Summary` WHERE date BETWEEN %s AND %s",
+            (from_date, chunk_end),
+        )
+        _insert_summaries(totals)
+        frappe.db.commit()
+        from_date = add_days(chunk_end, 1)
+
+
+def _count_visits(totals, from_date, to_date):
+    appointments = visit_table("Patient Appointment", ["name", "custom_clinic"], from_date)
+    rows = frappe.db.sql(
+        f"""
+        SELECT e.encounter_date, p.custom_hospital, a.custom_clinic, e.practitioner,
+            COUNT(*) AS visits
+        FROM `tabPatient Encounter` e
+        LEFT JOIN `tabPatient` p ON p.name = e.patient
+        LEFT JOIN {appointments} a ON a.name = e.appointment
+        WHERE e.docstatus = 1 AND e.encounter_date BETWEEN %s AND %s
+        GROUP BY e.encounter_date, p.custom_hospital, a.custom_clinic, e.practitioner
+        """,
+        (from_date, to_date),
+    )
+    for date, hospital, clinic, practitioner, visits in rows:
+        totals.add(summary_key(date, hospital, clinic, practitioner), visits=visits)
+
+
+def _count_invoices(totals, from_date, to_date):
+    """Add the submitted patient invoices of a date range, a page at a time."""
+    appointments = visit_table("Patient Appointment", ["name", "custom_clinic"], from_date)
+    after = ""
+    while True:
+        invoices = frappe.db.sql(
+            f"""
+            SELECT si.name, si.posting_date, si.grand_total, si.is_return,
+                si.ref_practitioner, p.custom_hospital,
+                (
+                    SELECT a.custom_clinic
+                    FROM `tabSales Invoice Item` sii
+                    INNER JOIN {appointments} a ON a.name = sii.reference_dn
+                    WHERE sii.parent = si.name AND sii.reference_dt = 'Patient Appointment'
+                    ORDER BY sii.idx
+                    LIMIT 1
+                ) AS clinic
+            FROM `tabSales Invoice` si
+            INNER JOIN `tabPatient` p ON p.name = si.patient
+            WHERE si.docstatus = 1
+                AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s
+                AND si.name > %(after)s
+            ORDER BY si.name
+            LIMIT %(limit)s
+            """,
+            {
+                "from_date": from_date,
+                "to_date": to_date,
+                "after": after,
+                "limit": INVOICE_PAGE_SIZE,
+            },
+            as_dict=True,
+        )
+        if not invoices:
+            return
+        splits = split_invoices([invoice.name for invoice in invoices])
+        for invoice in invoices:
+            totals.add_invoice(
+                summary_key(
+                    invoice.posting_date,
+                    invoice.custom_hospital,
+                    invoice.clinic,
+                    invoice.ref_practitioner,
+                ),
+                invoice.grand_total,
+                splits[invoice.name]["insurer_amount"],
+                is_return=invoice.is_return,
+            )
+        after = invoices[-1].name
+
+
+def _add_to_summaries(totals):
+    """Add deltas to the summary rows, creating rows that do not exist yet."""
+    increments = ", ".join(f"`{m}` = `{m}` + VALUES(`{m}`)" for m in MEASURES)
+    _insert_summaries(totals, f"ON DUPLICATE KEY UPDATE {increments}, modified = VALUES(modified)")
+
+
+def _insert_summaries(totals, on_duplicate=""):
+    rows = totals.rows()
+    if not rows:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for name, key, measures in rows:
+        values += [name, timestamp, timestamp, user, user, *key]
+        values += [measures[measure] for measure in MEASURES]
+
+    row = "({})".format(", ".join(["%s"] * len(SUMMARY_FIELDS)))
+    frappe.db.sql(
+        "INSERT INTO `tabDaily Visit Summary` ({fields}) VALUES {rows} {on_duplicate}".format(
+            fields=", ".join(f"`{field}`" for field in SUMMARY_FIELDS),
+            rows=", ".join([row] * len(rows)),
+            on_duplicate=on_duplicate,
+        ),
+        values,
+    )
+
+
+def _patient_hospital(patient):
+    return frappe.db.get_value("Patient", patient, "custom_hospital")
+
+
+def _first_document_date():
+    dates = frappe.db.sql(
+        """
+        SELECT MIN(encounter_date) FROM `tabPatient Encounter` WHERE docstatus = 1
+        UNION ALL
+        SELECT MIN(posting_date) FROM `tabSales Invoice` WHERE docstatus = 1
+        """
+    )
+    dates = [getdate(row[0]) for row in dates if row[0]]
+    return min(dates) if dates else today()
@@ -0,0 +1,497 @@
+"""Waiting queues of the Reception Console.
+
+Frappe side of `utils.queue_engine`. Queues live in Redis, one per
+practitioner (or clinic) per day, and every operation is a sorted-set
+update instead of an `ORDER BY` query.
+
+Durability is asynchronous: once the request's transaction commits, each
+operation appends an event to a Redis journal and is pushed to the
+consoles, and `flush_queue_journal`, run as a deduplicated background job
+and every scheduler tick, writes the events to `Waiting Queue Entry` in
+batches. A check-in whose transaction rolls back is taken out of the
+queue again. A batch leaves the journal only once committed. A queue missing
+from Redis (restart, eviction, first use of the day) is rebuilt from those
+rows the first time it is touched; of two workers rebuilding it at once,
+only the first rebuild is kept.
+
+Checking a patient in, by `check_in` or by setting a Patient Appointment
+to "Checked In" anywhere else, adds the appointment to its practitioner's
+queue. A check-in recorded offline and replayed later keeps the place of
+the time the patient arrived.
+"""
+
+import datetime
+import hashlib
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cint, get_datetime, now, now_datetime, today
+
+from mofeed_his.mofeed_his.utils.hospital_scope import hospital_scoped
+from mofeed_his.mofeed_his.utils.queue_engine import (
+    NORMAL,
+    PRIORITY_BANDS,
+    QueueEngine,
+    queue_name,
+)
+from mofeed_his.mofeed_his.utils.redis_store import get_redis, site_key
+
+CHECKED_IN = "Checked In"
+# Appointment statuses that take a patient out of the queue
+LEFT_STATUSES = ("Cancelled", "No Show", "Closed", "Checked Out")
+
+JOURNAL_KEY = "mofeed_his:queue_journal"
+FLUSH_JOB_ID = "mofeed_his:flush_queue_journal"
+# Seconds a flush may hold the journal without finishing a batch
+FLUSH_LOCK_SECONDS = 300
+FLUSH_BATCH_SIZE = 500
+# Queue keys outlive their day, so late flushes and lookups still work
+QUEUE_TTL = 36 * 60 * 60
+
+# Journal operation -> Waiting Queue Entry status
+OPERATION_STATUS = {
+    "check_in": "Waiting",
+    "skip": "Waiting",
+    "reprioritize": "Waiting",
+    "call": "Called",
+    "leave": "Left",
+}
+
+ENTRY_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "queue_name",
+    "queue_date",
+    "practitioner",
+    "clinic",
+    "member",
+    "patient",
+    "patient_name",
+    "appointment",
+    "priority",
+    "status",
+    "sort_offset",
+    "arrival_time",
+    "called_time",
+]
+
+
+def get_engine():
+    """Return a queue engine on the site's Redis cache server."""
+    return QueueEngine(
+        get_redis(),
+        prefix=site_key("mofeed_his:queue"),
+        clock=lambda: now_datetime().timestamp(),
+    )
+
+
+@frappe.whitelist()
+@hospital_scoped(appointment="Patient Appointment", patient="Patient", clinic="Clinic")
+def check_in(
+    appointment=None, patient=None, practitioner=None, clinic=None, priority=NORMAL, arrival=None
+):
+    """Check a patient in and add them to the waiting queue.
+
+    Args:
+        appointment: Patient Appointment to check in
+        patient: Walk-in patient without an appointment
+        practitioner: Practitioner of a walk-in
+        clinic: Clinic of a walk-in
+        priority: Normal, Urgent or Emergency
+        arrival: When the patient arrived, for check-ins recorded offline;
+            kept between the start of today and now
+
+    Returns:
+        dict: Position, patients ahead and estimated wait in minutes
+    """
+    _validate_priority(priority)
+    arrival = _arrival_timestamp(arrival)
+
+    if appointment:
+        doc = frappe.get_doc("Patient Appointment", appointment)
+        doc.check_permission("write")
+        if doc.status != CHECKED_IN:
+            doc.db_set("status", CHECKED_IN, notify=True)
+        return add_appointment(doc, priority, arrival)
+
+    if not patient or not (practitioner or clinic):
+        frappe.throw(_("Select an appointment, or a patient and a practitioner or clinic"))
+    frappe.has_permission("Patient Appointment", "create", throw=True)
+
+    queue = queue_name(today(), practitioner, clinic)
+    engine = _get_loaded_engine(queue)
+    _check_in(
+        engine,
+        queue,
+        patient,
+        priority,
+        data={
+            "patient": patient,
+            "patient_name": frappe.db.get_value("Patient", patient, "patient_name"),
+            "practitioner": practitioner,
+            "clinic": clinic,
+            "date": today(),
+        },
+        arrival=arrival,
+    )
+    return engine.estimate(queue, patient)
+
+
+def add_appointment(doc, priority=NORMAL, arrival=None):
+    """Add a checked-in appointment to its practitioner's queue.
+
+    `arrival` is in seconds, as the engine's clock; None means now.
+    """
+    queue = queue_name(doc.appointment_date, doc.practitioner)
+    engine = _get_loaded_engine(queue)
+    _check_in(
+        engine,
+        queue,
+        doc.name,
+        priority,
+        data={
+            "patient": doc.patient,
+            "patient_name": doc.patient_name,
+            "appointment": doc.name,
+            "practitioner": doc.practitioner,
+            "date": str(doc.appointment_date),
+        },
+        arrival=arrival,
+    )
+    return engine.estimate(queue, doc.name)
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def call_next(practitioner=None, clinic=None):
+    """Call the next patient of a queue.
+
+    Returns:
+        dict: The called entry, or None if nobody is waiting
+    """
+    frappe.has_permission("Patient Appointment", "write", throw=True)
+
+    queue = queue_name(today(), practitioner, clinic)
+    entry = _get_loaded_engine(queue).call_next(queue)
+    if entry:
+        _journal("call", queue, entry)
+    return entry
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def skip(member, practitioner=None, clinic=None, places=None):
+    """Move a patient who did not answer a call a few places back.
+
+    Returns:
+        int: New position
+    """
+    frappe.has_permission("Patient Appointment", "write", throw=True)
+
+    queue = queue_name(today(), practitioner, clinic)
+    engine = _get_loaded_engine(queue)
+    args = {"places": cint(places)} if cint(places) > 0 else {}
+    position = engine.skip(queue, member, **args)
+    if position is None:
+        frappe.throw(_("{0} is not waiting in this queue").format(member))
+
+    _journal("skip", queue, engine.get_entry(queue, member))
+    return position
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def reprioritize(member, priority, practitioner=None, clinic=None):
+    """Change the priority of a waiting patient.
+
+    Returns:
+        int: New position
+    """
+    frappe.has_permission("Patient Appointment", "write", throw=True)
+    _validate_priority(priority)
+
+    queue = queue_name(today(), practitioner, clinic)
+    engine = _get_loaded_engine(queue)
+    position = engine.reprioritize(queue, member, priority)
+    if position is None:
+        frappe.throw(_("{0} is not waiting in this queue").format(member))
+
+    _journal("reprioritize", queue, engine.get_entry(queue, member))
+    return position
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def get_queue(practitioner=None, clinic=None):
+    """Return today's waiting patients of a queue with positions and waits."""
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+
+    queue = queue_name(today(), practitioner, clinic)
+    return _get_loaded_engine(queue).snapshot(queue)
+
+
+@frappe.whitelist()
+@hospital_scoped(clinic="Clinic")
+def get_wait(member, practitioner=None, clinic=None):
+    """Return a waiting patient's position and estimated wait, or None."""
+    frappe.has_permission("Patient Appointment", "read", throw=True)
+
+    queue = queue_name(today(), practitioner, clinic)
+    return _get_loaded_engine(queue).estimate(queue, member)
+
+
+def sync_appointment_queue(doc, method=None):
+    """Hook: keep the queue in step with Patient Appointment status changes.
+
+    Covers check-ins and cancellations made outside `check_in`, e.g. from
+    the appointment form.
+    """
+    if not doc.has_value_changed("status"):
+        return
+
+    if doc.status == CHECKED_IN:
+        add_appointment(doc)
+    elif doc.status in LEFT_STATUSES:
+        remove_appointment(doc)
+
+
+def remove_appointment(doc, method=None):
+    """Hook: take an appointment out of its queue once the transaction commits."""
+    queue = queue_name(doc.appointment_date, doc.practitioner)
+    frappe.db.after_commit.add(lambda: _remove(queue, doc.name))
+
+
+def _remove(queue, member):
+    engine = get_engine()
+    entry = engine.get_entry(queue, member)
+    if engine.remove(queue, member) and entry:
+        _push_event("leave", queue, entry)
+
+
+def get_queue_positions(appointments):
+    """Return the queue entries of checked-in appointments by appointment name.
+
+    Args:
+        appointments: Console appointment rows with name, date, practitioner
+            and status
+
+    Returns:
+        dict: appointment -> entry with position, priority and wait_minutes
+    """
+    queues = {
+        queue_name(row["date"], row["practitioner"])
+        for row in appointments
+        if row["status"] == CHECKED_IN
+    }
+
+    positions = {}
+    for queue in queues:
+        for entry in _get_loaded_engine(queue).snapshot(queue):
+            if entry.get("appointment"):
+                positions[entry["appointment"]] = entry
+    return positions
+
+
+def rebuild_queue(engine, queue):
+    """Load a queue's waiting patients from `Waiting Queue Entry` into Redis."""
+    rows = frappe.get_all(
+        "Waiting Queue Entry",
+        filters={"queue_name": queue, "status": "Waiting"},
+        fields=[
+            "member",
+            "priority",
+            "sort_offset",
+            "patient",
+            "patient_name",
+            "appointment",
+            "practitioner",
+            "clinic",
+            "queue_date",
+            "arrival_time",
+        ],
+    )
+
+    engine.load(
+        queue,
+        [
+            {
+                "member": row.member,
+                "priority": row.priority,
+                "offset": int(row.sort_offset),
+                "arrival": row.arrival_time.timestamp() if row.arrival_time else None,
+                "patient": row.patient,
+                "patient_name": row.patient_name,
+                "appointment": row.appointment,
+                "practitioner": row.practitioner,
+                "clinic": row.clinic,
+                "date": str(row.queue_date),
+            }
+            for row in rows
+        ],
+        ttl=QUEUE_TTL,
+    )
+
+
+def flush_queue_journal():
+    """Write journaled queue events to `Waiting Queue Entry` in batches.
+
+    Runs as a deduplicated background job after queue operations, and on
+    every scheduler tick to pick up events pushed while a flush was ending.
+    One flush runs at a time, so events are written in journal order.
+
+    A batch is moved to a processing list and removed from it only once
+    written and committed; a batch left there by a failed flush is written
+    first by the next one.
+    """
+    client = get_engine().store
+    key = site_key(JOURNAL_KEY)
+    processing = f"{key}:processing"
+    lock = f"{key}:lock"
+    if not client.set(lock, 1, nx=True, ex=FLUSH_LOCK_SECONDS):
+        return
+
+    try:
+        while True:
+            events = client.lrange(processing, 0, -1)
+            if not events:
+                pipe = client.pipeline()
+                for _index in range(FLUSH_BATCH_SIZE):
+                    pipe.lmove(key, processing, "LEFT", "RIGHT")
+                events = [event for event in pipe.execute() if event is not None]
+            if not events:
+                break
+
+            _write_events([json.loads(event) for event in events])
+            frappe.db.commit()
+            client.delete(processing)
+            client.expire(lock, FLUSH_LOCK_SECONDS)
+    finally:
+        client.delete(lock)
+
+
+def _get_loaded_engine(queue):
+    engine = get_engine()
+    if not engine.is_loaded(queue):
+        rebuild_queue(engine, queue)
+    return engine
+
+
+def _check_in(engine, queue, member, priority, data, arrival):
+    """Queue a member and journal it.
+
+    The queue is updated now so the caller can return the member's place;
+    a member it did not hold before is taken out again if the transaction
+    rolls back.
+    """
+    queued = engine.position(queue, member) is not None
+    entry = engine.check_in(queue, member, priority, data=data, arrival=arrival)
+    if not queued:
+        frappe.db.after_rollback.add(lambda: engine.remove(queue, member))
+    _journal("check_in", queue, entry)
+    return entry
+
+
+def _journal(operation, queue, entry):
+    """Journal a queue event and tell the consoles, once the transaction commits."""
+    at = str(now_datetime())
+    frappe.db.after_commit.add(lambda: _push_event(operation, queue, entry, at))
+
+
+def _push_event(operation, queue, entry, at=None):
+    """Append a queue event to the journal, schedule a flush and tell the consoles."""
+    from mofeed_his.mofeed_his.reception_console.page.reception_console.reception_console import (
+        publish_queue_change,
+    )
+
+    engine = get_engine()
+    event = dict(entry or {}, op=operation, queue=queue, at=at or str(now_datetime()))
+    engine.store.rpush(site_key(JOURNAL_KEY), json.dumps(event, default=str))
+
+    # Runs after the commit, so the job can be enqueued right away
+    frappe.enqueue(
+        "mofeed_his.mofeed_his.utils.waiting_queue.flush_queue_journal",
+        queue="short",
+        job_id=FLUSH_JOB_ID,
+        deduplicate=True,
+    )
+    publish_queue_change([event] + engine.snapshot(queue))
+
+
+def _write_events(events):
+    """Upsert the latest state of each queued member in one statement."""
+    latest = {}
+    for event in events:
+        latest[(event["queue"], event["member"])] = event
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for (queue, member), event in latest.items():
+        values.append(
+            (
+                hashlib.sha1(f"{queue}|{member}".encode()).hexdigest()[:20],
+                timestamp,
+                timestamp,
+                user,
+                user,
+                queue,
+                event.get("date"),
+                event.get("practitioner"),
+                event.get("clinic"),
+                member,
+                event.get("patient"),
+                event.get("patient_name"),
+                event.get("appointment"),
+                event.get("priority") or NORMAL,
+                OPERATION_STATUS[event["op"]],
+                event.get("offset") or 0,
+                _to_datetime(event.get("arrival")),
+                _to_datetime(event.get("called")),
+            )
+        )
+
+    row = "({})".format(", ".join(["%s"] * len(ENTRY_FIELDS)))
+    frappe.db.sql(
+        """
+        INSERT INTO `tabWaiting Queue Entry` ({fields})
+        VALUES {rows}
+        ON DUPLICATE KEY UPDATE
+            modified = VALUES(modified),
+            priority = VALUES(priority),
+            status = VALUES(status),
+            sort_offset = VALUES(sort_offset),
+            called_time = COALESCE(VALUES(called_time), called_time)
+        """.format(
+            fields=", ".join(f"`{field}`" for field in ENTRY_FIELDS),
+            rows=", ".join([row] * len(values)),
+        ),
+        [value for entry in values for value in entry],
+    )
+
+
+def _validate_priority(priority):
+    if priority not in PRIORITY_BANDS:
+        frappe.throw(_("Priority must be one of {0}").format(", ".join(PRIORITY_BANDS)))
+
+
+def _arrival_timestamp(arrival):
+    """Return an arrival time in engine seconds, or None for now.
+
+    Clamped between the start of today and now, so a desk with a wrong
+    clock cannot date a check-in into another day or the future.
+    """
+    if not arrival:
+        return None
+    current = now_datetime()
+    start_of_day = datetime.datetime.combine(current.date(), datetime.time.min)
+    return max(min(get_datetime(arrival), current), start_of_day).timestamp()
+
+
+def _to_datetime(seconds):
+    if seconds is None:
+        return None
+    return datetime.datetime.fromtimestamp(float(seconds))